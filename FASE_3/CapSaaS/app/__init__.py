@@ -2,6 +2,7 @@
 from flask import Flask
 
 from .config import Settings, init_db_pool
+from .services import structured_log
 from .routes.auth_routes import auth_bp
 from .routes.admin_routes import admin_bp
 from .routes.modules_routes import modules_bp
@@ -18,6 +19,9 @@ def create_app():
     app.config["SECRET_KEY"] = settings.SECRET_KEY
     app.config["DATABASE_URL"] = settings.DATABASE_URL
 
+    # Log estruturado assíncrono (JSON em stdout; LOG_* via ambiente)
+    structured_log.init_app(app, "capssys")
+
     # Mantém seu pool atual (se existir)
     init_db_pool(app)
 
@@ -1,6 +1,7 @@
 # app/routes/admin_app_permissions.py
 from flask import Blueprint, request, jsonify
 from app.config import get_conn, put_conn
+from app.services import structured_log
 
 admin_app_perms_api = Blueprint("admin_app_perms_api", __name__)
 
@@ -28,7 +29,7 @@ def list_app_modules(client_id):
         return jsonify([{"key": r[0], "label": r[1], "enabled": bool(r[2])} for r in rows])
 
     except Exception as e:
-        print(f"[admin_app_permissions] ERRO (modules): {e}")
+        structured_log.evento("admin_apps.erro_modulos", "error", client_id=client_id, exc=e)
         return _json_error(str(e), 500)
     finally:
         if conn:
@@ -70,7 +71,7 @@ def list_app_users(client_id):
         return jsonify({"items": items})
 
     except Exception as e:
-        print(f"[admin_app_permissions] ERRO (users): {e}")
+        structured_log.evento("admin_apps.erro_usuarios", "error", client_id=client_id, exc=e)
         return _json_error(str(e), 500)
     finally:
         if conn:
@@ -108,7 +109,7 @@ def get_user_permissions(client_id, user_id):
         return jsonify({"modules": modules, "permissions": permissions})
 
     except Exception as e:
-        print(f"[admin_app_permissions] ERRO (get permissions): {e}")
+        structured_log.evento("admin_apps.erro_ler_permissoes", "error", client_id=client_id, exc=e)
         return _json_error(str(e), 500)
     finally:
         if conn:
@@ -148,7 +149,7 @@ def put_user_permissions(client_id, user_id):
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"[admin_app_permissions] ERRO (put permissions): {e}")
+        structured_log.evento("admin_apps.erro_gravar_permissoes", "error", client_id=client_id, exc=e)
         return _json_error(str(e), 500)
     finally:
         if conn:
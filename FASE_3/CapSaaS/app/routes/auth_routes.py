@@ -1,5 +1,6 @@
 # app/routes/auth_routes.py
-from flask import Blueprint, render_template, jsonify, session, request, redirect, url_for, current_app
+from flask import Blueprint, render_template, jsonify, session, request, redirect, url_for
+from app.services import structured_log
 from app.services.auth_service import authenticate_user
 
 auth_bp = Blueprint("auth", __name__)
@@ -39,11 +40,11 @@ def api_login():
     try:
         result = authenticate_user(email=email, password=password, ip=ip, user_agent=user_agent)
     except Exception as e:
-        current_app.logger.exception(f"[api_login] erro inesperado no authenticate_user: {e}")
+        structured_log.evento("login.erro", "error", email=email, exc=e)
         return jsonify({"ok": False, "message": "Erro interno"}), 500
 
     if not result.ok:
-        current_app.logger.warning(f"[api_login] acesso negado para email={email} ip={ip} ua={(user_agent or '')[:80]}")
+        structured_log.evento("login.negado", "warning", email=email, ip=ip, user_agent=(user_agent or "")[:80])
         return jsonify({"ok": False, "message": result.message or "Acesso negado. Verifique os dados."}), 401
 
     # Normaliza formato da sessão
@@ -13,6 +13,7 @@ from app.services.sso_service import (
 )
 
 from app.config import get_conn, put_conn
+from app.services import structured_log
 
 sso_bp = Blueprint("sso", __name__)
 
@@ -194,8 +195,8 @@ def sso_exchange():
         }), 200
     except ValueError as e:
         return jsonify({"ok": False, "message": str(e)}), 400
-    except Exception:
-        current_app.logger.exception("Erro inesperado em /api/sso/exchange")
+    except Exception as e:
+        structured_log.evento("sso.erro_exchange", "error", client_id=client_id, exc=e)
         return jsonify({"ok": False, "message": "Erro interno"}), 500
 
 
@@ -6,6 +6,8 @@ import jwt
 from datetime import datetime, timedelta, timezone
 from werkzeug.security import check_password_hash
 
+from app.services import structured_log
+
 # Cache simples em memória (por processo)
 _SSO_CACHE = {"loaded_at": 0, "ttl": 30, "config": None, "clients": None}
 
@@ -90,17 +92,18 @@ def validate_client(app, client_id: str, client_secret: str):
     _, clients = _load_sso_from_db(app)
     client = clients.get(client_id)
     if not client or not client["enabled"]:
-        print(f"[DEBUG SSO] Client {client_id} not found or disabled.")
+        structured_log.evento("sso.cliente_invalido", "warning", client_id=client_id)
         return False, "client inválido ou desabilitado"
 
-    print(f"[DEBUG SSO] Validating client: {client_id}")
-    print(f"[DEBUG SSO] Received secret: {client_secret}")
-    print(f"[DEBUG SSO] Hash in cache: {client['secret_hash']}")
-    
     matches = check_password_hash(client["secret_hash"], client_secret or "")
-    print(f"[DEBUG SSO] Matches: {matches}")
+    # o segredo recebido sai só como hash (campo sensível)
+    structured_log.evento(
+        "sso.validar_cliente", amostrar=True,
+        client_id=client_id, client_secret=client_secret, valido=matches,
+    )
 
     if not matches:
+        structured_log.evento("sso.segredo_invalido", "warning", client_id=client_id)
         return False, "client_secret inválido"
 
     return True, client
@@ -35,6 +35,10 @@ def create_app() -> Flask:
 
     db.init_app(app)
 
+    from app.services import http_client, structured_log
+    structured_log.init_app(app, "cap-transportation")
+    http_client.init_app(app)
+
     # SSO -> g.user
     from app.security.sso import load_current_user
     app.before_request(load_current_user)
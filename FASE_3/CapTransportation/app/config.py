@@ -26,6 +26,28 @@ class Settings:
     SSO_CLIENT_ID = os.getenv("SSO_CLIENT_ID", "captransportation").strip()
     SSO_CLIENT_SECRET = os.getenv("SSO_CLIENT_SECRET", "").strip()
 
+    # Cliente HTTP de saída (CAPSSYS): conexões por host, timeout de conexão e retries
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+
+    # Listagem de pedidos (/api/pedidos): página padrão e máxima (paginação por cursor)
+    PEDIDOS_LIMITE_PADRAO = int(os.getenv("PEDIDOS_LIMITE_PADRAO", "50"))
+    PEDIDOS_LIMITE_MAX = int(os.getenv("PEDIDOS_LIMITE_MAX", "500"))
+
+    # Respostas de pedidos com gzip a partir deste tamanho (bytes), se o cliente aceitar;
+    # 0 = sem gzip (quando o proxy já comprime)
+    PEDIDOS_GZIP_MIN_BYTES = int(os.getenv("PEDIDOS_GZIP_MIN_BYTES", "2048"))
+
+    # Busca (?busca=) pelas colunas geradas busca_tsv/busca_texto de temp/script.sql;
+    # 0 = ILIKE nas colunas (banco sem a migração)
+    PEDIDOS_BUSCA_INDEXADA = os.getenv("PEDIDOS_BUSCA_INDEXADA", "1").strip() == "1"
+
+    # Resumo por etapa (/api/pedidos/resumo) pela tabela de contadores tb_pedidos_resumo;
+    # 0 = GROUP BY em tb_pedidos (banco sem a migração)
+    PEDIDOS_RESUMO_CONTADORES = os.getenv("PEDIDOS_RESUMO_CONTADORES", "1").strip() == "1"
+
     # DB
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "").strip()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -1,3 +1,4 @@
 # app/models/__init__.py
 from .user import User
 from .pedido import Pedido
+from .pedido_resumo import PedidoResumo
@@ -111,4 +111,6 @@ class Pedido(db.Model):
             "valor_faturado": d(self.valor_faturado),
             "chave_nfe": self.chave_nfe,
             "obs_faturamento": self.obs_faturamento,
+
+            "updated_at": d(self.updated_at),
         }
@@ -0,0 +1,20 @@
+# app/models/pedido_resumo.py
+from __future__ import annotations
+
+from app import db
+
+
+class PedidoResumo(db.Model):
+    """
+    Contadores por status/produto/UF de tb_pedidos, mantidos pelo trigger
+    tg_pedidos_resumo (temp/script.sql). Só leitura na aplicação.
+    """
+    __tablename__ = "tb_pedidos_resumo"
+    __table_args__ = {"schema": "ct_app"}
+
+    status = db.Column(db.String(32), primary_key=True)
+    produto = db.Column(db.String(255), primary_key=True, default="")
+    uf_entrega = db.Column(db.String(2), primary_key=True, default="")
+
+    pedidos = db.Column(db.BigInteger, nullable=False, default=0)
+    toneladas = db.Column(db.Numeric(18, 3), nullable=False, default=0)
@@ -5,9 +5,15 @@ from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
 
 from flask import Blueprint, jsonify, request, current_app, g
+from functools import lru_cache
+from sqlalchemy import func
 
 from app import db
 from app.models.pedido import Pedido
+from app.models.pedido_resumo import PedidoResumo
+from app.services import conditional, pagination, search, serializer, summary
+from app.services.pagination import PaginacaoInvalida
+from app.services.serializer import CamposInvalidos
 
 # IMPORTANTE:
 # NÃO usar url_prefix aqui, porque o prefixo já é aplicado em app.register_blueprint(..., url_prefix="/api")
@@ -59,10 +65,30 @@ _PEDIDOS = [
         "valor_faturado": "",
         "chave_nfe": "",
         "obs_faturamento": "",
+        "updated_at": "2025-12-29T00:00:00",
     }
 ]
 _NEXT_ID = 2
 
+# índice de busca do mock: reconstruído quando _PEDIDOS muda
+_MOCK_BUSCA = {"indice": search.IndiceInvertido(), "versao": 0, "indexada": -1}
+
+
+def _mock_alterado():
+    _MOCK_BUSCA["versao"] += 1
+
+
+def _mock_indice() -> search.IndiceInvertido:
+    if _MOCK_BUSCA["indexada"] != _MOCK_BUSCA["versao"]:
+        _MOCK_BUSCA["indice"].reconstruir(_PEDIDOS)
+        _MOCK_BUSCA["indexada"] = _MOCK_BUSCA["versao"]
+    return _MOCK_BUSCA["indice"]
+
+
+# contadores do mock (papel do trigger de tb_pedidos_resumo)
+_MOCK_RESUMO = summary.Contadores()
+_MOCK_RESUMO.reconstruir(_PEDIDOS)
+
 FLOW = ["comercial", "programacao", "industrial", "laboratorio", "faturamento", "finalizado"]
 
 
@@ -147,6 +173,12 @@ def _next_status(current: str) -> str:
     return FLOW[min(idx + 1, len(FLOW) - 1)]
 
 
+def _mock_ultima(itens) -> datetime | None:
+    """max(updated_at) dos pedidos do mock (ISO em texto)."""
+    ultima = max((p.get("updated_at") or "" for p in itens), default="")
+    return datetime.fromisoformat(ultima) if ultima else None
+
+
 def _find_pedido_mock(pedido_id: int):
     for p in _PEDIDOS:
         if p.get("id") == pedido_id:
@@ -158,6 +190,20 @@ def _gen_chave(pedido_id: int) -> str:
     return f"PED-{pedido_id:04d}"
 
 
+# campos da API (?fields=): os mesmos do Pedido.to_dict(), na mesma ordem
+CAMPOS_PEDIDO = tuple(c.key for c in Pedido.__table__.columns if c.key != "created_at")
+
+
+@lru_cache(maxsize=64)
+def _codificador(campos: tuple) -> serializer.Codificador:
+    return serializer.Codificador([Pedido.__table__.c[k] for k in campos])
+
+
+def _colunas(campos: tuple, *extras: str) -> list:
+    """Atributos para o SELECT: os campos pedidos e, no fim, os extras que faltarem."""
+    return [getattr(Pedido, k) for k in campos + tuple(e for e in extras if e not in campos)]
+
+
 def _parse_date(v) -> date | None:
     if v is None:
         return None
@@ -276,11 +322,26 @@ def admin_update_user_permissions(user_id: int):
     return jsonify({"error": "Admin de permissões centralizado no CAPSSYS"}), 501
 
 
+@api_bp.get("/admin/http-metricas")
+def admin_http_metricas():
+    if not _require_admin_permissions():
+        return _deny()
+    from app.services import http_client
+    return jsonify(http_client.cliente().metricas())
+
+
 # ==========================================================
 # PEDIDOS (LISTAGEM + CRUD)
 # ==========================================================
 @api_bp.get("/pedidos")
 def listar_pedidos():
+    """
+    Lista paginada por cursor: ?limit=&after=<next_cursor>&ordem=id|atualizado|relevancia.
+    ?total=1 inclui o total do filtro. Com ?busca= a ordem padrão é por
+    relevância. ?fields=a,b,c limita os campos de cada item. Com ETag e
+    Last-Modified (304 sem montar a página). Ver services/pagination.py,
+    services/search.py, services/serializer.py e services/conditional.py.
+    """
     busca = (request.args.get("busca") or "").strip()
     stage = (request.args.get("stage") or "").strip().lower()
 
@@ -296,37 +357,72 @@ def listar_pedidos():
         if denied:
             return denied
 
+    cfg = current_app.config
+    limite = pagination.ler_limite(
+        request.args.get("limit"), cfg.get("PEDIDOS_LIMITE_PADRAO", 50), cfg.get("PEDIDOS_LIMITE_MAX", 500)
+    )
+    after = (request.args.get("after") or "").strip() or None
+    com_total = (request.args.get("total") or "").strip().lower() in ("1", "true", "sim")
+    try:
+        ordem = pagination.ler_ordem(request.args.get("ordem"), "relevancia" if busca else "id")
+    except PaginacaoInvalida as e:
+        return jsonify({"error": str(e)}), 400
+    if ordem == "relevancia" and not busca:
+        return jsonify({"error": "Ordem por relevância precisa de busca"}), 400
+    try:
+        fields = serializer.ler_campos(request.args.get("fields"), CAMPOS_PEDIDO)
+    except CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
+
     if current_app.config.get("MOCK_MODE", False):
         items = list(_PEDIDOS)
 
         if stage and stage != "mestre":
             items = [p for p in items if (p.get("status") == stage)]
 
+        relevancia = {}
         if busca:
-            b = busca.lower()
-
-            def match(p):
-                fields = [
-                    p.get("chave", ""),
-                    p.get("ov_remessa", ""),
-                    p.get("cliente", ""),
-                    p.get("produto", ""),
-                    p.get("status", ""),
-                ]
-                blob = " ".join(str(x) for x in fields).lower()
-                return b in blob
-
-            items = [p for p in items if match(p)]
-
-        items.sort(key=lambda x: x.get("id", 0), reverse=True)
-        return jsonify({"items": items})
+            relevancia = _mock_indice().buscar(busca)
+            items = [p for p in items if p.get("id") in relevancia]
+
+        ultima = _mock_ultima(items)
+        etag = conditional.etag_lista(ultima, len(items), conditional.parametros())
+        nao_modificado = conditional.nao_modificado(etag, ultima)
+        if nao_modificado:
+            return nao_modificado
+
+        if ordem == "relevancia":
+            def chave(p):
+                return (relevancia[p.get("id")], p.get("id") or 0)
+        elif ordem == "atualizado":
+            def chave(p):
+                return (p.get("updated_at") or "", p.get("id") or 0)
+        else:
+            def chave(p):
+                return (p.get("id") or 0,)
+        try:
+            pagina, next_cursor = pagination.pagina_em_memoria(items, chave, ordem, after, limite)
+        except PaginacaoInvalida as e:
+            return jsonify({"error": str(e)}), 400
+        if fields:
+            pagina = [{k: p.get(k) for k in fields} for p in pagina]
+        body = {"items": pagina, "next_cursor": next_cursor}
+        if com_total:
+            body["total"] = len(items)
+            body["total_aproximado"] = False
+        return conditional.marcar(jsonify(body), etag, ultima)
 
     q = Pedido.query
 
     if stage and stage != "mestre":
         q = q.filter(Pedido.status == stage)
 
-    if busca:
+    relevancia = None
+    if busca and cfg.get("PEDIDOS_BUSCA_INDEXADA", True):
+        condicao, relevancia = search.filtro_sql(Pedido.__table__.fullname, busca)
+        q = q.filter(condicao)
+    elif busca:
+        # sem as colunas de busca (temp/script.sql ainda não aplicado)
         like = f"%{busca}%"
         q = q.filter(
             (Pedido.chave.ilike(like)) |
@@ -335,13 +431,105 @@ def listar_pedidos():
             (Pedido.produto.ilike(like)) |
             (Pedido.status.ilike(like))
         )
+        if ordem == "relevancia":
+            ordem = "id"
+
+    # 1ª página sem busca: versão do filtro antes de buscar a página (index-only em
+    # (status, updated_at, id) / (updated_at, id)). Com cursor ou busca o agregado
+    # custaria O(linhas do filtro) por página: o ETag sai das linhas devolvidas.
+    versao_do_filtro = after is None and not busca
+    quantidade = None
+    if versao_do_filtro:
+        ultima, quantidade = q.with_entities(
+            func.max(Pedido.updated_at), func.count(Pedido.id)
+        ).order_by(None).one()
+        etag = conditional.etag_lista(ultima, quantidade, conditional.parametros())
+        nao_modificado = conditional.nao_modificado(etag, ultima)
+        if nao_modificado:
+            return nao_modificado
+
+    # só as colunas pedidas (mais as do cursor), em tuplas; sem entidades ORM
+    campos = fields or CAMPOS_PEDIDO
+    selecionadas = _colunas(campos, "id", "updated_at")
+    try:
+        if ordem == "relevancia":
+            linhas, next_cursor = pagination.pagina(
+                q.with_entities(*selecionadas, relevancia.label("relevancia")), [relevancia, Pedido.id],
+                ordem, after, limite, valores=lambda linha: [linha.relevancia, linha.id],
+            )
+        else:
+            colunas = pagination.colunas_da_ordem(Pedido, ordem)
+            linhas, next_cursor = pagination.pagina(q.with_entities(*selecionadas), colunas, ordem, after, limite)
+    except PaginacaoInvalida as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not versao_do_filtro:
+        if com_total:
+            # só quando pedido (as telas pedem na 1ª página)
+            quantidade = q.with_entities(func.count(Pedido.id)).order_by(None).scalar()
+        versoes = [(linha.id, linha.updated_at) for linha in linhas]
+        ultima = conditional.ultima_da_pagina(versoes)
+        etag = conditional.etag_pagina(versoes, next_cursor, conditional.parametros(), quantidade)
+        nao_modificado = conditional.nao_modificado(etag, ultima)
+        if nao_modificado:
+            return nao_modificado
+
+    resto = {"next_cursor": next_cursor}
+    if com_total:
+        resto["total"], resto["total_aproximado"] = quantidade, False
+    resp = serializer.resposta_json(serializer.envelope("items", _codificador(campos).lista(linhas), **resto))
+    return conditional.marcar(resp, etag, ultima)
+
+
+@api_bp.get("/pedidos/resumo")
+def resumo_pedidos():
+    """
+    Pedidos e toneladas por etapa e por produto/UF; ?stage= restringe a uma
+    etapa. Lido dos contadores de tb_pedidos_resumo (services/summary.py).
+    """
+    stage = (request.args.get("stage") or "").strip().lower()
+
+    # mesmo RBAC da listagem
+    if not stage or stage == "mestre":
+        stage = ""
+        denied = _require_any("mestre")
+    else:
+        denied = _require_any(stage, "mestre")
+    if denied:
+        return denied
+
+    etapas = [stage] if stage else FLOW
 
-    pedidos = q.order_by(Pedido.id.desc()).all()
-    return jsonify({"items": [p.to_dict() for p in pedidos]})
+    if current_app.config.get("MOCK_MODE", False):
+        return jsonify(summary.montar(_MOCK_RESUMO.linhas(stage or None), etapas))
+
+    if current_app.config.get("PEDIDOS_RESUMO_CONTADORES", True):
+        q = db.session.query(
+            PedidoResumo.status, PedidoResumo.produto, PedidoResumo.uf_entrega,
+            PedidoResumo.pedidos, PedidoResumo.toneladas,
+        ).filter(PedidoResumo.pedidos > 0)
+        if stage:
+            q = q.filter(PedidoResumo.status == stage)
+    else:
+        # sem o trigger (temp/script.sql ainda não aplicado): agrega tb_pedidos
+        produto = func.coalesce(Pedido.produto, "")
+        uf = func.coalesce(Pedido.uf_entrega, "")
+        q = db.session.query(
+            Pedido.status, produto, uf, func.count(Pedido.id), func.sum(Pedido.qtde_solicitada),
+        ).group_by(Pedido.status, produto, uf)
+        if stage:
+            q = q.filter(Pedido.status == stage)
+
+    return jsonify(summary.montar(q.all(), etapas))
 
 
 @api_bp.get("/pedidos/<int:pedido_id>")
 def obter_pedido(pedido_id: int):
+    try:
+        fields = serializer.ler_campos(request.args.get("fields"), CAMPOS_PEDIDO)
+    except CamposInvalidos as e:
+        return jsonify({"error": str(e)}), 400
+
     if current_app.config.get("MOCK_MODE", False):
         p = _find_pedido_mock(pedido_id)
         if not p:
@@ -352,18 +540,34 @@ def obter_pedido(pedido_id: int):
         if denied:
             return denied
 
-        return jsonify({"item": p})
+        ultima = _mock_ultima([p])
+        etag = conditional.etag_item(pedido_id, ultima, fields)
+        nao_modificado = conditional.nao_modificado(etag, ultima)
+        if nao_modificado:
+            return nao_modificado
+        return conditional.marcar(jsonify({"item": {k: p.get(k) for k in fields} if fields else p}), etag, ultima)
 
-    p = Pedido.query.get(pedido_id)
-    if not p:
+    # versão (e status, para o RBAC) pelo índice ix_tb_pedidos_id_versao, sem ler a linha
+    versao = Pedido.query.with_entities(Pedido.status, Pedido.updated_at).filter(Pedido.id == pedido_id).first()
+    if not versao:
         return jsonify({"error": "Pedido não encontrado"}), 404
 
-    status = str(p.status or "").lower()
+    status = str(versao.status or "").lower()
     denied = _require_any(status, "mestre")
     if denied:
         return denied
 
-    return jsonify({"item": p.to_dict()})
+    etag = conditional.etag_item(pedido_id, versao.updated_at, fields)
+    nao_modificado = conditional.nao_modificado(etag, versao.updated_at)
+    if nao_modificado:
+        return nao_modificado
+
+    campos = fields or CAMPOS_PEDIDO
+    linha = Pedido.query.with_entities(*_colunas(campos)).filter(Pedido.id == pedido_id).first()
+    if not linha:
+        return jsonify({"error": "Pedido não encontrado"}), 404
+    resp = serializer.resposta_json(serializer.envelope("item", _codificador(campos).objeto(linha)))
+    return conditional.marcar(resp, etag, versao.updated_at)
 
 
 @api_bp.post("/pedidos")
@@ -383,7 +587,10 @@ def criar_pedido():
         novo["id"] = new_id
         novo["chave"] = novo.get("chave") or _gen_chave(new_id)
         novo["status"] = (novo.get("status") or "comercial").lower()
+        novo["updated_at"] = datetime.utcnow().isoformat()
         _PEDIDOS.append(novo)
+        _MOCK_RESUMO.somar(novo)
+        _mock_alterado()
         return jsonify({"item": novo}), 201
 
     p = Pedido()
@@ -432,6 +639,7 @@ def atualizar_pedido(pedido_id: int):
         if "status" in payload and not _has_access("mestre"):
             payload.pop("status", None)
 
+        _MOCK_RESUMO.tirar(p)
         for k, v in payload.items():
             if k in ("id",):
                 continue
@@ -443,6 +651,9 @@ def atualizar_pedido(pedido_id: int):
         if p.get("status"):
             p["status"] = str(p["status"]).lower()
 
+        p["updated_at"] = datetime.utcnow().isoformat()
+        _MOCK_RESUMO.somar(p)
+        _mock_alterado()
         return jsonify({"item": p})
 
     p = Pedido.query.get(pedido_id)
@@ -496,7 +707,11 @@ def avancar_pedido(pedido_id: int):
             return denied
 
         nxt = _next_status(cur)
+        _MOCK_RESUMO.tirar(p)
         p["status"] = nxt
+        p["updated_at"] = datetime.utcnow().isoformat()
+        _MOCK_RESUMO.somar(p)
+        _mock_alterado()
         return jsonify({"item": p, "from": cur, "to": nxt})
 
     p = Pedido.query.get(pedido_id)
@@ -5,6 +5,8 @@ import requests
 import jwt
 from flask import Blueprint, current_app, request, session, redirect
 
+from app.services import http_client
+
 sso_cb = Blueprint("sso_cb", __name__)
 
 
@@ -33,10 +35,11 @@ def _userinfo(token: str) -> dict:
         return {}
 
     try:
-        r = requests.get(
+        r = http_client.cliente().get(
             f"{base}/api/sso/userinfo",
+            alvo="capssys-sso-userinfo",
             headers={"Authorization": f"Bearer {token}"},
-            timeout=12,
+            read_timeout=12,
         )
     except requests.RequestException:
         return {}
@@ -80,11 +83,15 @@ def sso_callback():
         return "SSO not configured (CAPSSYS_INTERNAL_BASE_URL/SSO_CLIENT_ID/SSO_CLIENT_SECRET)", 500
 
     # Exchange
-    r = requests.post(
-        f"{capssys}/api/sso/exchange",
-        json={"code": code, "client_id": client_id, "client_secret": client_secret},
-        timeout=12,
-    )
+    try:
+        r = http_client.cliente().post(
+            f"{capssys}/api/sso/exchange",
+            alvo="capssys-sso-exchange",
+            json={"code": code, "client_id": client_id, "client_secret": client_secret},
+            read_timeout=12,
+        )
+    except requests.RequestException as e:
+        return f"SSO exchange failed: {e}", 502
     if r.status_code != 200:
         return f"SSO exchange failed: {r.status_code} - {r.text}", 401
 
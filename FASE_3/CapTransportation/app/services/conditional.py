@@ -0,0 +1,89 @@
+# app/services/conditional.py
+"""
+GET condicional (ETag / Last-Modified) nas rotas de pedidos.
+
+As telas recarregam /api/pedidos e /api/pedidos/<id> mesmo sem nada ter
+mudado. A versão do que seria devolvido sai de uma consulta barata:
+
+    listagem, 1ª página sem busca
+              (max(updated_at), count) do filtro + hash dos parâmetros
+              (stage, fields, limit...), antes de buscar a página: com os
+              índices (status, updated_at, id) e (updated_at, id) é index-only
+    listagem, demais páginas ou com busca
+              (id, updated_at) das linhas da página + next_cursor +
+              parâmetros, depois de buscar a página: o agregado do filtro
+              custaria O(linhas do filtro) a cada "Carregar mais"/busca
+    item      (id, updated_at) + fields
+
+Se o cliente já tem essa versão (If-None-Match, ou If-Modified-Since quando
+não há ETag), sai 304 sem serializar nada. O ETag é fraco: o mesmo conteúdo
+pode ir com ou sem gzip.
+
+Cache-Control "private, no-cache" faz o navegador guardar a resposta e
+revalidar a cada fetch(); o 304 chega ao JS como o 200 guardado.
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional, Tuple
+
+from flask import current_app, request
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def _hash(*partes: Any) -> str:
+    return hashlib.sha1(repr(partes).encode("utf-8")).hexdigest()[:20]
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """updated_at é gravado em UTC sem fuso (datetime.utcnow); HTTP só tem segundos."""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def parametros() -> Tuple[Tuple[str, str], ...]:
+    """Parâmetros da requisição em ordem estável (entram no ETag da listagem)."""
+    return tuple(sorted(request.args.items(multi=True)))
+
+
+def etag_lista(ultima: Optional[datetime], quantidade: int, filtro: Iterable[Any]) -> str:
+    return _hash("lista", ultima.isoformat() if ultima else None, quantidade, tuple(filtro))
+
+
+def etag_pagina(versoes: Iterable[Tuple[Any, Any]], next_cursor: Optional[str], filtro: Iterable[Any],
+                total: Optional[int] = None) -> str:
+    """ETag de uma página a partir do (id, updated_at) das linhas devolvidas."""
+    return _hash("pagina", tuple(versoes), next_cursor, total, tuple(filtro))
+
+
+def ultima_da_pagina(versoes: Iterable[Tuple[Any, Any]]) -> Optional[datetime]:
+    return max((u for _, u in versoes if u is not None), default=None)
+
+
+def etag_item(pedido_id: int, ultima: Optional[datetime], campos: Any = None) -> str:
+    return _hash("item", pedido_id, ultima.isoformat() if ultima else None, campos)
+
+
+def nao_modificado(etag: str, ultima: Optional[datetime]):
+    """Resposta 304 se o cliente já tem esta versão; None para seguir com a resposta."""
+    if request.if_none_match:
+        igual = request.if_none_match.contains_weak(etag)
+    else:
+        ims, lm = request.if_modified_since, _utc(ultima)
+        igual = bool(ims and lm and lm <= ims)
+    if not igual:
+        return None
+    return marcar(current_app.response_class(status=304), etag, ultima)
+
+
+def marcar(resp, etag: str, ultima: Optional[datetime]):
+    resp.set_etag(etag, weak=True)
+    if ultima is not None:
+        resp.last_modified = _utc(ultima)
+    resp.headers["Cache-Control"] = CACHE_CONTROL
+    return resp
@@ -0,0 +1,214 @@
+# app/services/http_client.py
+"""
+Cliente HTTP de saída (CAPSSYS), um por processo.
+
+- requests.Session com HTTPAdapter: keep-alive e pool de conexões por host
+  (pool_block=True limita as conexões simultâneas a cada host em
+  HTTP_POOL_MAXSIZE; quem passar disso espera uma conexão livre).
+- Timeouts de conexão e de leitura separados.
+- Retry com backoff exponencial e jitter:
+    * falha de conexão (o request nem saiu) -> qualquer método;
+    * timeout de leitura / 502 / 503 / 504   -> só métodos idempotentes
+      (GET, HEAD, OPTIONS, PUT, DELETE) ou idempotente=True.
+  POST do /api/sso/exchange (code de uso único) não é reenviado depois
+  que saiu.
+- Histograma de latência por alvo (`metricas()`).
+
+A Session é recriada se o PID mudar (fork dos workers do gunicorn).
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+METODOS_IDEMPOTENTES = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+STATUS_RETENTAVEIS = {502, 503, 504}
+
+# Limites superiores dos buckets (ms); o último é +inf
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 240000)
+
+
+class _Histograma:
+    def __init__(self):
+        self.contagens = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.soma_ms = 0.0
+        self.erros = 0
+        self.retries = 0
+        self.status: Dict[str, int] = {}
+
+    def registrar(self, ms: float, status: Optional[int]) -> None:
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.contagens[i] += 1
+        self.total += 1
+        self.soma_ms += ms
+        classe = f"{status // 100}xx" if status else "falha"
+        self.status[classe] = self.status.get(classe, 0) + 1
+
+    def _percentil(self, q: float) -> Optional[float]:
+        if not self.total:
+            return None
+        alvo = q * self.total
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            acumulado += c
+            if acumulado >= alvo:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "erros": self.erros,
+            "retries": self.retries,
+            "status": dict(self.status),
+            "media_ms": round(self.soma_ms / self.total, 1) if self.total else None,
+            "p50_ms_ate": self._percentil(0.50),
+            "p95_ms_ate": self._percentil(0.95),
+            "p99_ms_ate": self._percentil(0.99),
+            "buckets_ms": {
+                (str(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else "+inf"): c
+                for i, c in enumerate(self.contagens)
+            },
+        }
+
+
+class HttpClient:
+    def __init__(self, pool_maxsize: int = 10, pool_hosts: int = 10,
+                 connect_timeout: float = 5.0, max_retries: int = 2, backoff: float = 0.5):
+        self.pool_maxsize = pool_maxsize
+        self.pool_hosts = pool_hosts
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._hist: Dict[str, _Histograma] = {}
+
+    def _sessao(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    s = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_hosts,
+                        pool_maxsize=self.pool_maxsize,
+                        pool_block=True,
+                        max_retries=0,
+                    )
+                    s.mount("http://", adapter)
+                    s.mount("https://", adapter)
+                    self._session, self._pid = s, pid
+        return self._session
+
+    def _histograma(self, alvo: str) -> _Histograma:
+        h = self._hist.get(alvo)
+        if h is None:
+            with self._lock:
+                h = self._hist.setdefault(alvo, _Histograma())
+        return h
+
+    def _espera(self, tentativa: int) -> float:
+        # "full jitter": uniforme entre 0 e backoff * 2^tentativa
+        return random.uniform(0, self.backoff * (2 ** tentativa))
+
+    def request(self, method: str, url: str, *, alvo: str = "", read_timeout: float = 30.0,
+                connect_timeout: Optional[float] = None, idempotente: Optional[bool] = None,
+                **kwargs) -> requests.Response:
+        method = method.upper()
+        if idempotente is None:
+            idempotente = method in METODOS_IDEMPOTENTES
+        timeout = (connect_timeout or self.connect_timeout, read_timeout)
+        hist = self._histograma(alvo or url.split("?", 1)[0])
+
+        tentativa = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                resp = self._sessao().request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                # ConnectTimeout é subclasse de ConnectionError; ReadTimeout não
+                ms = (time.perf_counter() - inicio) * 1000
+                with self._lock:
+                    hist.registrar(ms, None)
+                    hist.erros += 1
+                if tentativa < self.max_retries and _nao_enviado(e, idempotente):
+                    tentativa += 1
+                    with self._lock:
+                        hist.retries += 1
+                    time.sleep(self._espera(tentativa))
+                    continue
+                raise
+            except requests.exceptions.Timeout:
+                ms = (time.perf_counter() - inicio) * 1000
+                with self._lock:
+                    hist.registrar(ms, None)
+                    hist.erros += 1
+                if idempotente and tentativa < self.max_retries:
+                    tentativa += 1
+                    with self._lock:
+                        hist.retries += 1
+                    time.sleep(self._espera(tentativa))
+                    continue
+                raise
+
+            ms = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                hist.registrar(ms, resp.status_code)
+            if idempotente and resp.status_code in STATUS_RETENTAVEIS and tentativa < self.max_retries:
+                tentativa += 1
+                with self._lock:
+                    hist.retries += 1
+                resp.close()
+                time.sleep(self._espera(tentativa))
+                continue
+            return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {alvo: h.to_dict() for alvo, h in self._hist.items()}
+
+
+def _nao_enviado(erro: Exception, idempotente: bool) -> bool:
+    """Falha de conexão antes de enviar é segura para qualquer método."""
+    if idempotente or isinstance(erro, requests.exceptions.ConnectTimeout):
+        return True
+    causa = erro.args[0] if erro.args else None
+    if isinstance(causa, MaxRetryError):
+        causa = causa.reason
+    return isinstance(causa, NewConnectionError)
+
+
+_CLIENTE: Dict[str, Optional[HttpClient]] = {"cliente": None}
+
+
+def cliente() -> HttpClient:
+    if _CLIENTE["cliente"] is None:
+        _CLIENTE["cliente"] = HttpClient()
+    return _CLIENTE["cliente"]
+
+
+def init_app(app) -> None:
+    _CLIENTE["cliente"] = HttpClient(
+        pool_maxsize=int(app.config.get("HTTP_POOL_MAXSIZE", 10)),
+        connect_timeout=float(app.config.get("HTTP_CONNECT_TIMEOUT", 5)),
+        max_retries=int(app.config.get("HTTP_MAX_RETRIES", 2)),
+        backoff=float(app.config.get("HTTP_BACKOFF", 0.5)),
+    )
@@ -0,0 +1,138 @@
+# app/services/pagination.py
+"""
+Paginação por cursor (keyset) das listagens de pedidos.
+
+Em vez de OFFSET (que lê e descarta as linhas anteriores) ou de trazer a
+tabela inteira, cada página continua de onde a anterior parou:
+
+    WHERE (updated_at, id) < (:updated_at, :id) ORDER BY updated_at DESC, id DESC LIMIT :n
+
+Com o índice na mesma ordem, o custo de uma página não depende do tamanho de
+tb_pedidos nem da página em que se está. O cursor ("next_cursor" na resposta,
+"after" no request) é opaco para o cliente: base64 de [ordem, valores...].
+
+Ordens:
+    id          id DESC (padrão; o mais novo primeiro)
+    atualizado  (updated_at DESC, id DESC)
+    relevancia  (relevância da busca DESC, id DESC); padrão quando há busca
+
+O total é opcional (?total=1): na 1ª página sem busca é a contagem que a
+rota já faz para o ETag (services/conditional.py); nos demais casos, um
+count(*) do filtro feito só porque foi pedido.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+ORDENS = ("id", "atualizado", "relevancia")
+
+
+class PaginacaoInvalida(ValueError):
+    pass
+
+
+def ler_limite(valor: Any, padrao: int, maximo: int) -> int:
+    try:
+        n = int(valor)
+    except (TypeError, ValueError):
+        return padrao
+    return max(1, min(n, maximo))
+
+
+def ler_ordem(valor: Any, padrao: str = "id") -> str:
+    ordem = (valor or padrao).strip().lower()
+    if ordem not in ORDENS:
+        raise PaginacaoInvalida(f"Ordem inválida: {ordem} (use {' ou '.join(ORDENS)})")
+    return ordem
+
+
+# ==========================================================
+# Cursor
+# ==========================================================
+def _serializar(v: Any) -> Any:
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def codificar_cursor(ordem: str, valores: Sequence[Any]) -> str:
+    bruto = json.dumps([ordem, *[_serializar(v) for v in valores]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(bruto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, ordem: str) -> Tuple[Any, ...]:
+    """Valores do cursor (na ordem das colunas); PaginacaoInvalida se não for desta ordem."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        dados = json.loads(bruto)
+    except (ValueError, TypeError):
+        raise PaginacaoInvalida("Cursor inválido")
+    if not isinstance(dados, list) or not dados or dados[0] != ordem:
+        raise PaginacaoInvalida("Cursor inválido para esta ordem")
+
+    valores = dados[1:]
+    try:
+        if ordem == "id" and len(valores) == 1:
+            return (int(valores[0]),)
+        if ordem == "atualizado" and len(valores) == 2:
+            return (datetime.fromisoformat(valores[0]), int(valores[1]))
+        if ordem == "relevancia" and len(valores) == 2:
+            return (float(valores[0]), int(valores[1]))
+    except (TypeError, ValueError):
+        pass
+    raise PaginacaoInvalida("Cursor inválido")
+
+
+# ==========================================================
+# Consulta (SQLAlchemy)
+# ==========================================================
+def colunas_da_ordem(modelo, ordem: str) -> List[Any]:
+    if ordem == "atualizado":
+        return [modelo.updated_at, modelo.id]
+    return [modelo.id]
+
+
+def pagina(q, colunas: Sequence[Any], ordem: str, after: Optional[str], limite: int, valores=None):
+    """
+    (linhas, next_cursor). Ordem decrescente em todas as colunas; busca uma
+    linha a mais só para saber se há próxima página. `valores(linha)` dá os
+    valores do cursor quando as colunas não são atributos da entidade (ex.:
+    relevância calculada, com a consulta devolvendo (Pedido, relevancia)).
+    """
+    if after:
+        cursor = decodificar_cursor(after, ordem)
+        if len(colunas) == 1:
+            q = q.filter(colunas[0] < cursor[0])
+        else:
+            q = q.filter(tuple_(*colunas) < tuple_(*cursor))
+
+    linhas = q.order_by(*[c.desc() for c in colunas]).limit(limite + 1).all()
+    if len(linhas) <= limite:
+        return linhas, None
+    linhas = linhas[:limite]
+    ultima = linhas[-1]
+    if valores is None:
+        valores = lambda linha: [getattr(linha, c.key) for c in colunas]  # noqa: E731
+    return linhas, codificar_cursor(ordem, valores(ultima))
+
+
+# ==========================================================
+# Listas em memória (MOCK_MODE)
+# ==========================================================
+def pagina_em_memoria(
+    itens: List[Dict[str, Any]], chave: Callable[[Dict[str, Any]], Tuple], ordem: str,
+    after: Optional[str], limite: int,
+):
+    """Mesma paginação para dicionários (MOCK_MODE); `chave(item)` no formato do cursor."""
+    ordenados = sorted(itens, key=chave, reverse=True)
+    if after:
+        valores = tuple(_serializar(v) for v in decodificar_cursor(after, ordem))
+        ordenados = [p for p in ordenados if chave(p) < valores]
+
+    if len(ordenados) <= limite:
+        return ordenados, None
+    linhas = ordenados[:limite]
+    return linhas, codificar_cursor(ordem, chave(linhas[-1]))
@@ -0,0 +1,149 @@
+# app/services/search.py
+"""
+Busca de pedidos (caixa "busca" das telas; /api/pedidos?busca=).
+
+O filtro antigo era ILIKE '%termo%' em cinco colunas: com o curinga no início
+o Postgres lê a tabela inteira. Agora tb_pedidos tem duas colunas geradas
+(temp/script.sql), ambas sem acento e em minúsculas:
+
+    busca_tsv    tsvector de chave/ov_remessa (peso A), cliente (B),
+                 produto (C) e status (D), índice GIN
+    busca_texto  os mesmos campos concatenados, índice GIN pg_trgm
+
+Um pedido casa quando todos os termos casam como prefixo no tsvector
+("0001" acha PED-0001, "1000" acha OV-10001, "acm" acha ACME) ou quando o
+texto digitado aparece em qualquer ponto de busca_texto (mesma semântica do
+ILIKE antigo, agora pelo índice de trigramas). Os dois lados usam índice
+(BitmapOr). A relevância é ts_rank + similarity() do trigrama; com busca, a
+listagem sai por relevância.
+
+No MOCK_MODE o mesmo papel é do `IndiceInvertido`, em memória.
+"""
+from __future__ import annotations
+
+import bisect
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Set
+
+from sqlalchemy import Float, bindparam, cast, func, literal_column, or_
+
+# campo -> peso (A, B, C, D do setweight)
+PESOS = {"chave": 1.0, "ov_remessa": 1.0, "cliente": 0.4, "produto": 0.2, "status": 0.1}
+
+_TERMO = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto: Any) -> str:
+    """Minúsculas e sem acento (o mesmo que ct_app.f_unaccent(lower(...)) no banco)."""
+    s = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode("ascii")
+    return s.lower()
+
+
+def termos(busca: str) -> List[str]:
+    return _TERMO.findall(normalizar(busca))
+
+
+def _escapar_like(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# ==========================================================
+# Postgres
+# ==========================================================
+def filtro_sql(tabela: str, busca: str):
+    """
+    (condição, relevância) para a busca sobre `tabela` (nome qualificado).
+    Sem termos alfanuméricos, só o lado do trigrama participa.
+    """
+    tsv = literal_column(f"{tabela}.busca_tsv")
+    texto = literal_column(f"{tabela}.busca_texto")
+    digitado = normalizar(busca).strip()
+    padrao = bindparam("busca_padrao", f"%{_escapar_like(digitado)}%")
+    similaridade = func.similarity(texto, bindparam("busca_similar", digitado))
+
+    ts = termos(busca)
+    if not ts:
+        return texto.like(padrao, escape="\\"), cast(similaridade, Float)
+
+    consulta = func.to_tsquery("simple", bindparam("busca_tsquery", " & ".join(f"{t}:*" for t in ts)))
+    condicao = or_(tsv.op("@@")(consulta), texto.like(padrao, escape="\\"))
+    # float8: o valor vai no cursor e volta na comparação sem perder precisão
+    relevancia = cast(func.ts_rank(tsv, consulta) + similaridade, Float)
+    return condicao, relevancia
+
+
+# ==========================================================
+# Em memória (MOCK_MODE)
+# ==========================================================
+def _trigramas(texto: str) -> Set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceInvertido:
+    """
+    termo -> {id: peso} sobre os campos de PESOS, com a lista de termos
+    ordenada para busca por prefixo (bisect), e trigrama -> ids para o
+    "aparece em qualquer ponto" (como o pg_trgm). Reconstruído quando o mock
+    muda, o que é raro e pequeno.
+    """
+
+    def __init__(self, campos: Dict[str, float] = PESOS):
+        self.campos = campos
+        self._postings: Dict[str, Dict[Any, float]] = {}
+        self._termos: List[str] = []
+        self._textos: Dict[Any, str] = {}
+        self._trigramas: Dict[str, Set[Any]] = {}
+
+    def reconstruir(self, itens: Iterable[Dict[str, Any]]) -> None:
+        postings: Dict[str, Dict[Any, float]] = {}
+        textos: Dict[Any, str] = {}
+        trigramas: Dict[str, Set[Any]] = {}
+        for item in itens:
+            pid = item.get("id")
+            partes = []
+            for campo, peso in self.campos.items():
+                valor = normalizar(item.get(campo))
+                partes.append(valor)
+                for termo in _TERMO.findall(valor):
+                    docs = postings.setdefault(termo, {})
+                    docs[pid] = max(docs.get(pid, 0.0), peso)
+            textos[pid] = " ".join(partes)
+            for tri in _trigramas(textos[pid]):
+                trigramas.setdefault(tri, set()).add(pid)
+        self._postings = postings
+        self._termos = sorted(postings)
+        self._textos = textos
+        self._trigramas = trigramas
+
+    def _prefixo(self, prefixo: str) -> Dict[Any, float]:
+        docs: Dict[Any, float] = {}
+        i = bisect.bisect_left(self._termos, prefixo)
+        while i < len(self._termos) and self._termos[i].startswith(prefixo):
+            for pid, peso in self._postings[self._termos[i]].items():
+                docs[pid] = max(docs.get(pid, 0.0), peso)
+            i += 1
+        return docs
+
+    def buscar(self, busca: str) -> Dict[Any, float]:
+        """id -> relevância dos pedidos que casam (mesma regra do filtro_sql)."""
+        resultado: Dict[Any, float] = {}
+        ts = termos(busca)
+        if ts:
+            por_termo = [self._prefixo(t) for t in ts]
+            comuns = set(por_termo[0]).intersection(*por_termo[1:])
+            for pid in comuns:
+                resultado[pid] = sum(docs[pid] for docs in por_termo)
+
+        digitado = normalizar(busca).strip()
+        if digitado:
+            tris = _trigramas(digitado)
+            if tris:
+                candidatos = set.intersection(*(self._trigramas.get(t, set()) for t in tris))
+            else:
+                candidatos = self._textos  # menos de 3 letras: sem trigrama, confere todos
+            for pid in candidatos:
+                texto = self._textos[pid]
+                if digitado in texto:
+                    resultado[pid] = resultado.get(pid, 0.0) + len(digitado) / max(len(texto), 1)
+        return resultado
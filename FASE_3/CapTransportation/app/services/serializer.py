@@ -0,0 +1,110 @@
+# app/services/serializer.py
+"""
+Serialização das listagens de pedidos sem passar por entidades ORM.
+
+O caminho antigo carregava cada linha como `Pedido` (~45 atributos), montava
+um dict com to_dict() (isoformat/str em cada data e Decimal) e só então o
+jsonify percorria tudo de novo. Agora:
+
+    ?fields=chave,status,cliente   só essas colunas entram no SELECT
+    Codificador                    escreve o JSON direto das tuplas do
+                                   resultado, com o conversor de cada coluna
+                                   escolhido uma vez (pelo tipo da coluna)
+    resposta_json                  gzip quando o cliente aceita e o corpo
+                                   passa de PEDIDOS_GZIP_MIN_BYTES
+
+Sem ?fields= saem todos os campos, no mesmo formato do to_dict().
+"""
+from __future__ import annotations
+
+import gzip
+import json
+from datetime import date
+from decimal import Decimal
+from json.encoder import encode_basestring
+from typing import Any, Callable, Iterable, Optional, Sequence, Tuple
+
+from flask import current_app, request
+
+
+class CamposInvalidos(ValueError):
+    pass
+
+
+def ler_campos(valor: Any, disponiveis: Sequence[str]) -> Optional[Tuple[str, ...]]:
+    """?fields=a,b,c -> ('a', 'b', 'c') na ordem pedida; None quando não veio."""
+    nomes = [n.strip() for n in str(valor or "").split(",") if n.strip()]
+    if not nomes:
+        return None
+    invalidos = [n for n in nomes if n not in disponiveis]
+    if invalidos:
+        raise CamposInvalidos(f"Campo inválido: {', '.join(invalidos)}")
+    return tuple(dict.fromkeys(nomes))
+
+
+# ==========================================================
+# Codificador
+# ==========================================================
+def _conversor(coluna) -> Callable[[Any], str]:
+    """Valor não nulo -> JSON, no mesmo formato do to_dict() (datas ISO, Decimal como texto)."""
+    try:
+        tipo = coluna.type.python_type
+    except NotImplementedError:
+        tipo = str
+
+    if issubclass(tipo, date):  # date e datetime
+        return lambda v: '"' + v.isoformat() + '"'
+    if issubclass(tipo, Decimal):
+        return lambda v: '"' + str(v) + '"'
+    if issubclass(tipo, bool):
+        return lambda v: "true" if v else "false"
+    if issubclass(tipo, int):
+        return int.__repr__
+    if issubclass(tipo, float):
+        return float.__repr__
+    return encode_basestring
+
+
+class Codificador:
+    """
+    Objeto JSON por linha a partir de uma tupla de valores na ordem de
+    `colunas`. Chaves e conversores são montados uma vez; linhas com colunas
+    a mais no fim (ex.: as do cursor) têm o excedente ignorado.
+    """
+
+    def __init__(self, colunas: Sequence[Any]):
+        self.nomes = [c.key for c in colunas]
+        self._partes = [(encode_basestring(c.key) + ":", _conversor(c)) for c in colunas]
+
+    def objeto(self, valores: Sequence[Any]) -> str:
+        return "{" + ",".join([
+            chave + ("null" if v is None else conv(v))
+            for (chave, conv), v in zip(self._partes, valores)
+        ]) + "}"
+
+    def lista(self, linhas: Iterable[Sequence[Any]]) -> str:
+        objeto = self.objeto
+        return "[" + ",".join([objeto(linha) for linha in linhas]) + "]"
+
+
+def envelope(chave: str, conteudo: str, **resto: Any) -> str:
+    """'{"<chave>": <conteudo já em JSON>, ...resto}'."""
+    corpo = "{" + encode_basestring(chave) + ":" + conteudo
+    if resto:
+        corpo += "," + json.dumps(resto, ensure_ascii=False, separators=(",", ":"))[1:-1]
+    return corpo + "}"
+
+
+# ==========================================================
+# Resposta
+# ==========================================================
+def resposta_json(corpo: str, status: int = 200):
+    dados = corpo.encode("utf-8")
+    resp = current_app.response_class(dados, status=status, mimetype="application/json")
+    resp.vary.add("Accept-Encoding")
+
+    minimo = current_app.config.get("PEDIDOS_GZIP_MIN_BYTES", 0)
+    if minimo and len(dados) >= minimo and request.accept_encodings["gzip"]:
+        resp.set_data(gzip.compress(dados, compresslevel=5, mtime=0))
+        resp.headers["Content-Encoding"] = "gzip"
+    return resp
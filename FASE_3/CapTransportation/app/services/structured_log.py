@@ -0,0 +1,303 @@
+# app/services/structured_log.py
+"""
+Log estruturado (JSON) e assíncrono.
+
+Este arquivo é o mesmo em cap-price-app, CapSaaS e CapTransportation (cada
+app tem a sua imagem Docker e não há pacote compartilhado); mudou num,
+copie para os outros.
+
+Os caminhos quentes faziam print() síncrono de payloads inteiros (payload do
+front, corpo do n8n, cenários com o laudo, segredo do SSO). Aqui:
+
+    structured_log.evento("simulacao.payload", amostrar=True, payload=payload)
+
+    - a chamada só resume os campos e enfileira o registro (QueueHandler);
+      JSON, traceback e escrita em stdout ficam na thread do QueueListener;
+    - textos acima de LOG_MAX_CAMPO caracteres viram início + tamanho +
+      sha256; dicts/listas são resumidos com o mesmo orçamento, sem
+      serializar a estrutura inteira;
+    - campos com nome sensível (secret, senha, token, ...) saem só como hash;
+    - eventos com `amostrar=True` têm limite por (evento, rota):
+      LOG_TAXA_POR_ROTA por segundo, rajada de LOG_RAJADA. Os descartados
+      aparecem em "suprimidos" no próximo registro que passar. Erros nunca
+      são descartados;
+    - com a fila cheia (LOG_FILA_MAX), o registro é descartado e contado:
+      a requisição nunca espera pelo log.
+
+O logger do Flask (app.logger) passa pela mesma fila, e cada requisição
+gera um evento "http" (amostrado por rota; 5xx sempre).
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, Tuple
+
+from flask import g, has_request_context, request
+
+LOGGER = logging.getLogger("cap.eventos")
+
+NIVEIS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+# trechos de nome de campo que nunca saem em claro
+CAMPOS_SENSIVEIS = ("secret", "senha", "password", "token", "authorization", "cookie")
+MAX_TRACEBACK = 8000
+
+_LOCK = threading.Lock()
+_ESTADO: Dict[str, Any] = {
+    "app": "",
+    "handler": None,
+    "listener": None,
+    "max_campo": 500,
+    "limitador": None,
+}
+
+
+# ============================================================
+# Resumo de campos (na thread da requisição: barato e limitado)
+# ============================================================
+def _hash(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8", "replace")).hexdigest()[:16]
+
+
+def _sensivel(chave: str) -> bool:
+    chave = chave.lower()
+    return any(trecho in chave for trecho in CAMPOS_SENSIVEIS)
+
+
+def _resumir(valor: Any, orcamento: int) -> Tuple[Any, int]:
+    """(valor resumido, custo aproximado em caracteres)."""
+    if valor is None or isinstance(valor, (bool, int, float)):
+        return valor, 8
+    if isinstance(valor, str):
+        if len(valor) <= orcamento:
+            return valor, len(valor)
+        return {
+            "inicio": valor[:max(orcamento, 0)],
+            "tamanho": len(valor),
+            "sha256": _hash(valor),
+        }, orcamento + 40
+    if isinstance(valor, dict):
+        saida: Dict[str, Any] = {}
+        gasto = 2
+        for i, (k, v) in enumerate(valor.items()):
+            if gasto >= orcamento:
+                saida["..."] = f"+{len(valor) - i} chave(s)"
+                break
+            k = str(k)
+            if _sensivel(k):
+                saida[k] = {"sha256": _hash(str(v))}
+                gasto += len(k) + 30
+                continue
+            saida[k], custo = _resumir(v, orcamento - gasto - len(k))
+            gasto += len(k) + custo
+        return saida, gasto
+    if isinstance(valor, (list, tuple, set)):
+        itens = list(valor) if isinstance(valor, set) else valor
+        lista = []
+        gasto = 2
+        for i, v in enumerate(itens):
+            if gasto >= orcamento:
+                lista.append(f"... +{len(itens) - i} item(ns)")
+                break
+            resumido, custo = _resumir(v, orcamento - gasto)
+            lista.append(resumido)
+            gasto += custo
+        return lista, gasto
+    return _resumir(str(valor), orcamento)
+
+
+def _campo(chave: str, valor: Any) -> Any:
+    if _sensivel(chave) and valor not in (None, ""):
+        return {"sha256": _hash(str(valor))}
+    return _resumir(valor, _ESTADO["max_campo"])[0]
+
+
+# ============================================================
+# Limite por rota (eventos de alto volume)
+# ============================================================
+class _Limitador:
+    """Balde de fichas por chave; conta o que foi suprimido desde o último registro."""
+
+    def __init__(self, taxa: float, rajada: int):
+        self.taxa = taxa
+        self.rajada = max(1, rajada)
+        self._lock = threading.Lock()
+        self._baldes: Dict[tuple, list] = {}  # chave -> [fichas, atualizado_em, suprimidos]
+        self.suprimidos_total = 0
+
+    def permitir(self, chave: tuple) -> Tuple[bool, int]:
+        if self.taxa <= 0:
+            return True, 0
+        agora = time.monotonic()
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = [float(self.rajada), agora, 0]
+            balde[0] = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+            if balde[0] < 1:
+                balde[2] += 1
+                self.suprimidos_total += 1
+                return False, 0
+            balde[0] -= 1
+            suprimidos, balde[2] = balde[2], 0
+            return True, suprimidos
+
+
+# ============================================================
+# Fila e formatação (thread do QueueListener)
+# ============================================================
+class _FilaNaoBloqueante(QueueHandler):
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # a formatação fica para a thread do listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class _FormatoJson(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        d: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname.lower(),
+            "app": _ESTADO["app"],
+        }
+        campos = getattr(record, "campos", None)
+        if campos:
+            d.update(campos)
+        else:
+            d["logger"] = record.name
+            d["msg"] = _resumir(record.getMessage(), _ESTADO["max_campo"])[0]
+        if record.exc_info:
+            d["traceback"] = self.formatException(record.exc_info)[-MAX_TRACEBACK:]
+        return json.dumps(d, ensure_ascii=False, default=str)
+
+
+# ============================================================
+# API
+# ============================================================
+def _rota_atual() -> Optional[str]:
+    if not has_request_context():
+        return None
+    regra = request.url_rule
+    return regra.rule if regra is not None else "(sem rota)"
+
+
+def evento(nome: str, nivel: str = "info", *, amostrar: bool = False,
+           exc: Optional[BaseException] = None, **campos: Any) -> None:
+    """
+    Registra um evento estruturado. `amostrar=True` marca eventos de alto
+    volume (payloads, corpos de resposta), sujeitos ao limite por rota.
+    """
+    nivel_num = NIVEIS.get(nivel, logging.INFO)
+    if not LOGGER.isEnabledFor(nivel_num):
+        return
+
+    rota = _rota_atual()
+    suprimidos = 0
+    limitador = _ESTADO["limitador"]
+    if amostrar and nivel_num < logging.ERROR and limitador is not None:
+        permitido, suprimidos = limitador.permitir((nome, rota))
+        if not permitido:
+            return
+
+    registro: Dict[str, Any] = {"evento": nome}
+    if rota:
+        registro["rota"] = rota
+    for chave, valor in campos.items():
+        registro[chave] = _campo(chave, valor)
+    if suprimidos:
+        registro["suprimidos"] = suprimidos
+
+    exc_info = None
+    if exc is not None:
+        registro["erro"] = _campo("erro", f"{type(exc).__name__}: {exc}")
+        if nivel_num >= logging.ERROR:
+            exc_info = (type(exc), exc, exc.__traceback__)
+    LOGGER.log(nivel_num, nome, extra={"campos": registro}, exc_info=exc_info)
+
+
+def estatisticas() -> Dict[str, Any]:
+    handler = _ESTADO["handler"]
+    limitador = _ESTADO["limitador"]
+    return {
+        "fila": handler.queue.qsize() if handler is not None else 0,
+        "descartados_fila": handler.descartados if handler is not None else 0,
+        "suprimidos_limite": limitador.suprimidos_total if limitador is not None else 0,
+    }
+
+
+def _config(app, chave: str, padrao: str) -> str:
+    valor = app.config.get(chave)
+    return str(valor) if valor not in (None, "") else os.getenv(chave, padrao)
+
+
+def _inicio_requisicao():
+    g._log_inicio = time.perf_counter()
+
+
+def _fim_requisicao(resp):
+    inicio = getattr(g, "_log_inicio", None)
+    if inicio is not None and request.endpoint != "static":
+        evento(
+            "http",
+            "error" if resp.status_code >= 500 else "info",
+            amostrar=True,
+            metodo=request.method,
+            status=resp.status_code,
+            ms=round((time.perf_counter() - inicio) * 1000, 2),
+        )
+    return resp
+
+
+def init_app(app, nome_app: Optional[str] = None) -> None:
+    nivel = NIVEIS.get(_config(app, "LOG_NIVEL", "info").lower(), logging.INFO)
+    with _LOCK:
+        if _ESTADO["listener"] is None:
+            fila = queue.Queue(maxsize=int(_config(app, "LOG_FILA_MAX", "10000")))
+            saida = logging.StreamHandler(sys.stdout)
+            saida.setFormatter(_FormatoJson())
+            listener = QueueListener(fila, saida)
+            listener.start()
+            # esvazia a fila ao encerrar o processo (gunicorn/CLI)
+            atexit.register(listener.stop)
+            _ESTADO["listener"] = listener
+            _ESTADO["handler"] = _FilaNaoBloqueante(fila)
+
+        _ESTADO["app"] = nome_app or app.import_name
+        _ESTADO["max_campo"] = int(_config(app, "LOG_MAX_CAMPO", "500"))
+        _ESTADO["limitador"] = _Limitador(
+            float(_config(app, "LOG_TAXA_POR_ROTA", "5")),
+            int(_config(app, "LOG_RAJADA", "20")),
+        )
+
+    for logger in (LOGGER, app.logger):
+        logger.handlers = [_ESTADO["handler"]]
+        logger.setLevel(nivel)
+        logger.propagate = False
+
+    if _config(app, "LOG_ACESSO", "1").strip() == "1":
+        app.before_request(_inicio_requisicao)
+        app.after_request(_fim_requisicao)
@@ -0,0 +1,102 @@
+# app/services/summary.py
+"""
+Resumo dos pedidos por etapa (/api/pedidos/resumo): quantos pedidos e quantas
+toneladas (qtde_solicitada) há em cada status e por produto/UF.
+
+As telas listavam os pedidos só para saber quantos esperavam na etapa. Agora
+tb_pedidos_resumo guarda os contadores por (status, produto, UF) e o trigger
+tg_pedidos_resumo (temp/script.sql) os ajusta a cada insert, update (o
+avanço de etapa inclusive) e delete em tb_pedidos. Ler o resumo custa
+O(etapas x produtos x UFs), não O(pedidos).
+
+No MOCK_MODE o mesmo papel é do `Contadores`, ajustado nas mesmas operações.
+"""
+from __future__ import annotations
+
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# (status, produto, uf_entrega, pedidos, toneladas)
+Linha = Tuple[str, str, str, int, Any]
+
+
+def _toneladas(v: Any) -> Decimal:
+    if v is None or v == "":
+        return Decimal(0)
+    try:
+        return Decimal(str(v).replace(",", "."))
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+
+
+def _numero(t: Decimal) -> float:
+    return round(float(t), 3)
+
+
+def montar(linhas: Iterable[Linha], etapas: Sequence[str]) -> Dict[str, Any]:
+    """Corpo da resposta a partir dos contadores; etapas sem pedido saem zeradas."""
+    por_status: Dict[str, List] = {st: [0, Decimal(0)] for st in etapas}
+    por_produto_uf: Dict[Tuple[str, str], List] = {}
+
+    for status, produto, uf, pedidos, toneladas in linhas:
+        if not pedidos:
+            continue
+        t = _toneladas(toneladas)
+        s = por_status.setdefault(status, [0, Decimal(0)])
+        s[0] += pedidos
+        s[1] += t
+        c = por_produto_uf.setdefault((produto or "", uf or ""), [0, Decimal(0)])
+        c[0] += pedidos
+        c[1] += t
+
+    return {
+        "por_status": {st: {"pedidos": n, "toneladas": _numero(t)} for st, (n, t) in por_status.items()},
+        "por_produto_uf": [
+            {"produto": produto, "uf": uf, "pedidos": n, "toneladas": _numero(t)}
+            for (produto, uf), (n, t) in sorted(por_produto_uf.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        ],
+        "total": {
+            "pedidos": sum(n for n, _ in por_status.values()),
+            "toneladas": _numero(sum((t for _, t in por_status.values()), Decimal(0))),
+        },
+    }
+
+
+# ==========================================================
+# Em memória (MOCK_MODE)
+# ==========================================================
+class Contadores:
+    """
+    Os mesmos contadores de tb_pedidos_resumo para os dicionários do mock:
+    `tirar(p)` antes de alterar um pedido e `somar(p)` depois, como o trigger
+    faz com OLD e NEW.
+    """
+
+    def __init__(self):
+        self._c: Dict[Tuple[str, str, str], List] = {}
+
+    @staticmethod
+    def _chave(item: Dict[str, Any]) -> Tuple[str, str, str]:
+        return (
+            str(item.get("status") or "").lower(),
+            str(item.get("produto") or ""),
+            str(item.get("uf_entrega") or ""),
+        )
+
+    def somar(self, item: Dict[str, Any], sinal: int = 1) -> None:
+        c = self._c.setdefault(self._chave(item), [0, Decimal(0)])
+        c[0] += sinal
+        c[1] += sinal * _toneladas(item.get("qtde_solicitada"))
+
+    def tirar(self, item: Dict[str, Any]) -> None:
+        self.somar(item, -1)
+
+    def reconstruir(self, itens: Iterable[Dict[str, Any]]) -> None:
+        self._c = {}
+        for item in itens:
+            self.somar(item)
+
+    def linhas(self, stage: Optional[str] = None) -> Iterator[Linha]:
+        for (status, produto, uf), (n, t) in self._c.items():
+            if stage is None or status == stage:
+                yield status, produto, uf, n, t
@@ -34,6 +34,74 @@ export async function apiPut(url, body) {
   return data;
 }
 
+// ===============================
+// Paginação por cursor (/api/pedidos?limit=&after=)
+// ===============================
+export const PAGE_SIZE = 50;
+
+/**
+ * Lê a listagem página a página: next() devolve os itens da próxima página
+ * (a primeira já pede o total). hasMore fica false quando acaba.
+ */
+export function createPager(url, { limit = PAGE_SIZE } = {}) {
+  let after = null;
+  const sep = url.includes("?") ? "&" : "?";
+  const pager = {
+    url,
+    hasMore: true,
+    total: null,
+    totalAproximado: false,
+    async next() {
+      if (!pager.hasMore) return [];
+      const cursor = after ? `&after=${encodeURIComponent(after)}` : "&total=1";
+      const data = await apiGet(`${url}${sep}limit=${limit}${cursor}`);
+      after = data.next_cursor || null;
+      pager.hasMore = !!after;
+      if (data.total !== undefined && data.total !== null) {
+        pager.total = data.total;
+        pager.totalAproximado = !!data.total_aproximado;
+      }
+      return data.items || [];
+    },
+  };
+  return pager;
+}
+
+/** Todas as páginas de uma listagem (exportação CSV). */
+export async function fetchAll(url) {
+  const pager = createPager(url, { limit: 500 });
+  let items = [];
+  while (pager.hasMore) items = items.concat(await pager.next());
+  return items;
+}
+
+/** Mostra/esconde o "Carregar mais" (o botão fica dentro de um wrapper). */
+export function syncLoadMore(button, pager, loaded) {
+  if (!button) return;
+  const wrap = button.parentElement || button;
+  wrap.classList.toggle("d-none", !pager?.hasMore);
+  if (pager?.total !== null && pager?.total !== undefined) {
+    button.textContent = `Carregar mais (${loaded} de ${pager.totalAproximado ? "~" : ""}${pager.total})`;
+  } else {
+    button.textContent = "Carregar mais";
+  }
+}
+
+// ===============================
+// Resumo por etapa (/api/pedidos/resumo)
+// ===============================
+/**
+ * Contagem e toneladas por etapa, dos contadores do servidor (não depende de
+ * quantas páginas foram carregadas). null se falhar: os KPIs caem no pager.
+ */
+export async function fetchResumo(stage = "") {
+  try {
+    return await apiGet(`/api/pedidos/resumo${stage ? `?stage=${encodeURIComponent(stage)}` : ""}`);
+  } catch {
+    return null;
+  }
+}
+
 // ===============================
 // Text/HTML helpers (evita [object Object])
 // ===============================
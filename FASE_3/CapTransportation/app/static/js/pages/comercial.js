@@ -1,4 +1,4 @@
-import { qs, apiGet, apiPost, apiPut, fillSelect, setFormValues, getFormValues } from "./_shared.js";
+import { qs, apiGet, apiPost, apiPut, fillSelect, setFormValues, getFormValues, createPager, fetchAll, syncLoadMore, fetchResumo } from "./_shared.js";
 
 // ===============================
 // Helpers
@@ -140,6 +140,9 @@ export async function initComercial() {
   const comercialPedidoOv = qs("#comercialPedidoOv");
 
   let cacheItems = [];
+  let pager = null;
+  let resumo = null;
+  const btnMais = qs("#btnMais");
   let editingId = null;
 
   // Auxiliares (mantém para o modal)
@@ -150,14 +153,21 @@ export async function initComercial() {
   fillSelect(form?.querySelector("[name=assessor]"), aux.assessores || []);
   fillSelect(form?.querySelector("[name=assistente]"), aux.assistentes || []);
 
-  async function load() {
-    const q = (busca?.value || "").trim();
-    const url = `/api/pedidos?stage=comercial${q ? `&busca=${encodeURIComponent(q)}` : ""}`;
-    const data = await apiGet(url);
-    const items = data.items || [];
-    cacheItems = items;
-
-    const total = items.length;
+  async function load(mais = false) {
+    if (!mais) {
+      const q = (busca?.value || "").trim();
+      pager = createPager(`/api/pedidos?stage=comercial${q ? `&busca=${encodeURIComponent(q)}` : ""}`);
+      cacheItems = [];
+    }
+    const atual = pager;
+    // o resumo só muda com escrita: não precisa vir de novo a cada "Carregar mais"
+    const [novos, r] = await Promise.all([atual.next(), mais ? resumo : fetchResumo("comercial")]);
+    if (atual !== pager) return; // outra busca começou enquanto esta página chegava
+    resumo = r;
+    const items = cacheItems = cacheItems.concat(novos);
+    syncLoadMore(btnMais, pager, items.length);
+
+    const total = resumo?.por_status?.comercial?.pedidos ?? pager.total ?? items.length;
     const semOV = items.filter(p => !safeText(p.ov_remessa).trim()).length;
     const semCliente = items.filter(p => !safeText(p.cliente).trim()).length;
     const semProduto = items.filter(p => !safeText(p.produto).trim()).length;
@@ -300,9 +310,15 @@ export async function initComercial() {
   btnNovo?.addEventListener("click", openNew);
   btnSalvar?.addEventListener("click", () => save().catch(e => alert(e.message)));
 
+  btnMais?.addEventListener("click", () => load(true).catch(e => alert(e.message)));
+
+  // exporta a listagem inteira (todas as páginas), não só o que já foi carregado
   btnExportar?.addEventListener("click", () => {
-    const csv = toCSV(cacheItems);
-    download(`comercial_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    const todos = pager?.hasMore ? fetchAll(pager.url) : Promise.resolve(cacheItems);
+    todos.then(items => {
+      const csv = toCSV(items);
+      download(`comercial_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    }).catch(e => alert(e.message));
   });
 
   let t = null;
@@ -1,5 +1,5 @@
 // app/static/js/pages/faturamento.js
-import { qs, apiGet, apiPost, apiPut, setFormValues, getFormValues } from "./_shared.js";
+import { qs, apiGet, apiPost, apiPut, setFormValues, getFormValues, createPager, fetchAll, syncLoadMore, fetchResumo } from "./_shared.js";
 
 // ===============================
 // Helpers
@@ -128,17 +128,27 @@ export async function initFaturamento() {
   const faturamentoPedidoOv = qs("#faturamentoPedidoOv");
 
   let cacheItems = [];
+  let pager = null;
+  let resumo = null;
+  const btnMais = qs("#btnMais");
   let editingId = null;
 
-  async function load() {
-    const q = (busca?.value || "").trim();
-    const url = `/api/pedidos?stage=faturamento${q ? `&busca=${encodeURIComponent(q)}` : ""}`;
-    const data = await apiGet(url);
-    const items = data.items || [];
-    cacheItems = items;
+  async function load(mais = false) {
+    if (!mais) {
+      const q = (busca?.value || "").trim();
+      pager = createPager(`/api/pedidos?stage=faturamento${q ? `&busca=${encodeURIComponent(q)}` : ""}`);
+      cacheItems = [];
+    }
+    const atual = pager;
+    // o resumo só muda com escrita: não precisa vir de novo a cada "Carregar mais"
+    const [novos, r] = await Promise.all([atual.next(), mais ? resumo : fetchResumo("faturamento")]);
+    if (atual !== pager) return; // outra busca começou enquanto esta página chegava
+    resumo = r;
+    const items = cacheItems = cacheItems.concat(novos);
+    syncLoadMore(btnMais, pager, items.length);
 
     // KPIs
-    const total = items.length;
+    const total = resumo?.por_status?.faturamento?.pedidos ?? pager.total ?? items.length;
     const semNF = items.filter(p => !safeText(p.numero_nf).trim()).length;
     const semData = items.filter(p => !safeText(p.data_faturamento).trim()).length;
     const semValor = items.filter(p => !safeText(p.valor_faturado).trim()).length;
@@ -257,9 +267,15 @@ export async function initFaturamento() {
   // Eventos
   btnSalvar?.addEventListener("click", () => save().catch(e => alert(e.message)));
 
+  btnMais?.addEventListener("click", () => load(true).catch(e => alert(e.message)));
+
+  // exporta a listagem inteira (todas as páginas), não só o que já foi carregado
   btnExportar?.addEventListener("click", () => {
-    const csv = toCSV(cacheItems);
-    download(`faturamento_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    const todos = pager?.hasMore ? fetchAll(pager.url) : Promise.resolve(cacheItems);
+    todos.then(items => {
+      const csv = toCSV(items);
+      download(`faturamento_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    }).catch(e => alert(e.message));
   });
 
   let t = null;
@@ -1,5 +1,5 @@
 // app/static/js/pages/industrial.js
-import { qs, apiGet, apiPost, apiPut, setFormValues, getFormValues } from "./_shared.js";
+import { qs, apiGet, apiPost, apiPut, setFormValues, getFormValues, createPager, fetchAll, syncLoadMore, fetchResumo } from "./_shared.js";
 
 // ===============================
 // Helpers
@@ -127,17 +127,27 @@ export async function initIndustrial() {
   const industrialPedidoOv = qs("#industrialPedidoOv");
 
   let cacheItems = [];
+  let pager = null;
+  let resumo = null;
+  const btnMais = qs("#btnMais");
   let editingId = null;
 
-  async function load() {
-    const q = (busca?.value || "").trim();
-    const url = `/api/pedidos?stage=industrial${q ? `&busca=${encodeURIComponent(q)}` : ""}`;
-    const data = await apiGet(url);
-    const items = data.items || [];
-    cacheItems = items;
+  async function load(mais = false) {
+    if (!mais) {
+      const q = (busca?.value || "").trim();
+      pager = createPager(`/api/pedidos?stage=industrial${q ? `&busca=${encodeURIComponent(q)}` : ""}`);
+      cacheItems = [];
+    }
+    const atual = pager;
+    // o resumo só muda com escrita: não precisa vir de novo a cada "Carregar mais"
+    const [novos, r] = await Promise.all([atual.next(), mais ? resumo : fetchResumo("industrial")]);
+    if (atual !== pager) return; // outra busca começou enquanto esta página chegava
+    resumo = r;
+    const items = cacheItems = cacheItems.concat(novos);
+    syncLoadMore(btnMais, pager, items.length);
 
     // KPIs
-    const total = items.length;
+    const total = resumo?.por_status?.industrial?.pedidos ?? pager.total ?? items.length;
     const semChegada = items.filter(p => !safeText(p.hora_chegada).trim()).length;
     const semEntrada = items.filter(p => !safeText(p.hora_entrada).trim()).length;
     const semSaida = items.filter(p => !safeText(p.hora_saida).trim()).length;
@@ -254,9 +264,15 @@ export async function initIndustrial() {
   // Eventos
   btnSalvar?.addEventListener("click", () => save().catch(e => alert(e.message)));
 
+  btnMais?.addEventListener("click", () => load(true).catch(e => alert(e.message)));
+
+  // exporta a listagem inteira (todas as páginas), não só o que já foi carregado
   btnExportar?.addEventListener("click", () => {
-    const csv = toCSV(cacheItems);
-    download(`industrial_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    const todos = pager?.hasMore ? fetchAll(pager.url) : Promise.resolve(cacheItems);
+    todos.then(items => {
+      const csv = toCSV(items);
+      download(`industrial_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    }).catch(e => alert(e.message));
   });
 
   let t = null;
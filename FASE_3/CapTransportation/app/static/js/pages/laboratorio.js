@@ -1,5 +1,5 @@
 // app/static/js/pages/laboratorio.js
-import { qs, apiGet, apiPost, apiPut, setFormValues, getFormValues } from "./_shared.js";
+import { qs, apiGet, apiPost, apiPut, setFormValues, getFormValues, createPager, fetchAll, syncLoadMore, fetchResumo } from "./_shared.js";
 
 // ===============================
 // Helpers
@@ -128,17 +128,27 @@ export async function initLaboratorio() {
   const laboratorioPedidoOv = qs("#laboratorioPedidoOv");
 
   let cacheItems = [];
+  let pager = null;
+  let resumo = null;
+  const btnMais = qs("#btnMais");
   let editingId = null;
 
-  async function load() {
-    const q = (busca?.value || "").trim();
-    const url = `/api/pedidos?stage=laboratorio${q ? `&busca=${encodeURIComponent(q)}` : ""}`;
-    const data = await apiGet(url);
-    const items = data.items || [];
-    cacheItems = items;
+  async function load(mais = false) {
+    if (!mais) {
+      const q = (busca?.value || "").trim();
+      pager = createPager(`/api/pedidos?stage=laboratorio${q ? `&busca=${encodeURIComponent(q)}` : ""}`);
+      cacheItems = [];
+    }
+    const atual = pager;
+    // o resumo só muda com escrita: não precisa vir de novo a cada "Carregar mais"
+    const [novos, r] = await Promise.all([atual.next(), mais ? resumo : fetchResumo("laboratorio")]);
+    if (atual !== pager) return; // outra busca começou enquanto esta página chegava
+    resumo = r;
+    const items = cacheItems = cacheItems.concat(novos);
+    syncLoadMore(btnMais, pager, items.length);
 
     // KPIs
-    const total = items.length;
+    const total = resumo?.por_status?.laboratorio?.pedidos ?? pager.total ?? items.length;
     const semLote = items.filter(p => !safeText(p.lote).trim()).length;
     const semLiberacao = items.filter(p => !safeText(p.data_liberacao).trim()).length;
 
@@ -253,9 +263,15 @@ export async function initLaboratorio() {
   // Eventos
   btnSalvar?.addEventListener("click", () => save().catch(e => alert(e.message)));
 
+  btnMais?.addEventListener("click", () => load(true).catch(e => alert(e.message)));
+
+  // exporta a listagem inteira (todas as páginas), não só o que já foi carregado
   btnExportar?.addEventListener("click", () => {
-    const csv = toCSV(cacheItems);
-    download(`laboratorio_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    const todos = pager?.hasMore ? fetchAll(pager.url) : Promise.resolve(cacheItems);
+    todos.then(items => {
+      const csv = toCSV(items);
+      download(`laboratorio_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    }).catch(e => alert(e.message));
   });
 
   let t = null;
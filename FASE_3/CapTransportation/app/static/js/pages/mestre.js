@@ -3,11 +3,16 @@ import {
   qs, apiGet, apiPost, apiPut,
   fillSelect, setFormValues, getFormValues,
   safeText, safeHtml,
-  requireAccess, canAccess
+  requireAccess, canAccess,
+  createPager, fetchAll, syncLoadMore, fetchResumo
 } from "./_shared.js";
 
 const FLOW = ["comercial", "programacao", "industrial", "laboratorio", "faturamento", "finalizado"];
 
+// a tabela e o CSV só usam estes campos (?fields=); o modal busca o pedido inteiro
+const CSV_COLS = ["chave", "ov_remessa", "cliente", "produto", "status", "qtde_solicitada", "refinaria", "transportador", "numero_nf"];
+const LIST_FIELDS = ["id", ...CSV_COLS].join(",");
+
 function statusLabel(st) {
   const map = {
     comercial: "COMERCIAL",
@@ -72,7 +77,7 @@ function buildKpiCard({ label, value, iconType, iconBg, iconColor }) {
 }
 
 function toCSV(items) {
-  const cols = ["chave", "ov_remessa", "cliente", "produto", "status", "qtde_solicitada", "refinaria", "transportador", "numero_nf"];
+  const cols = CSV_COLS;
   const head = cols.join(";");
   const lines = (items || []).map(p =>
     cols.map(c => safeText(p?.[c]).replaceAll(";", ",")).join(";")
@@ -119,6 +124,9 @@ export async function initMestre() {
   if (!kpiRow || !tbody) return;
 
   let cacheItems = [];
+  let pager = null;
+  let resumo = null;
+  const btnMais = qs("#btnMais");
   let editingId = null;
 
   // criação nasce no Comercial
@@ -151,17 +159,31 @@ export async function initMestre() {
     if (idInput) idInput.value = "";
   }
 
-  async function load() {
-    const q = (busca?.value || "").trim();
-    const url = `/api/pedidos?stage=mestre${q ? `&busca=${encodeURIComponent(q)}` : ""}`;
-    const data = await apiGet(url);
-    const items = data.items || [];
-    cacheItems = items;
-
-    const totalAtivos = items.filter(p => p.status !== "finalizado").length;
-    const emOperacao = items.filter(p => p.status !== "finalizado").length;
-    const aguardFaturar = items.filter(p => p.status === "faturamento").length;
-    const concluidos = items.filter(p => p.status === "finalizado").length;
+  async function load(mais = false) {
+    if (!mais) {
+      const q = (busca?.value || "").trim();
+      pager = createPager(`/api/pedidos?stage=mestre&fields=${LIST_FIELDS}${q ? `&busca=${encodeURIComponent(q)}` : ""}`);
+      cacheItems = [];
+    }
+    const atual = pager;
+    // o resumo só muda com escrita: não precisa vir de novo a cada "Carregar mais"
+    const [novos, r] = await Promise.all([atual.next(), mais ? resumo : fetchResumo()]);
+    if (atual !== pager) return; // outra busca começou enquanto esta página chegava
+    resumo = r;
+    const items = cacheItems = cacheItems.concat(novos);
+    syncLoadMore(btnMais, pager, items.length);
+
+    // KPIs da base inteira (contadores do servidor), não só das páginas carregadas
+    const porStatus = resumo?.por_status;
+    const contar = (st) => porStatus ? (porStatus[st]?.pedidos ?? 0) : items.filter(p => p.status === st).length;
+    const ativos = porStatus
+      ? Object.entries(porStatus).reduce((n, [st, c]) => n + (st === "finalizado" ? 0 : c.pedidos), 0)
+      : items.filter(p => p.status !== "finalizado").length;
+
+    const totalAtivos = ativos;
+    const emOperacao = ativos;
+    const aguardFaturar = contar("faturamento");
+    const concluidos = contar("finalizado");
 
     kpiRow.innerHTML = [
       buildKpiCard({ label: "TOTAL ATIVOS", value: totalAtivos, iconType: "db", iconBg: "#eef2ff", iconColor: "#4338ca" }),
@@ -240,7 +262,7 @@ export async function initMestre() {
       return;
     }
 
-    const item = cacheItems.find(p => p.id === id) || await apiGet(`/api/pedidos/${id}`);
+    const { item } = await apiGet(`/api/pedidos/${id}`);
     if (!item) return;
 
     editingId = id;
@@ -294,9 +316,13 @@ export async function initMestre() {
   if (btnNovo) btnNovo.addEventListener("click", openNew);
   if (busca) busca.addEventListener("input", () => load());
 
+  if (btnMais) btnMais.addEventListener("click", () => load(true));
+
+  // exporta a listagem inteira (todas as páginas), não só o que já foi carregado
   if (btnExportar) {
-    btnExportar.addEventListener("click", () => {
-      const csv = toCSV(cacheItems);
+    btnExportar.addEventListener("click", async () => {
+      const items = pager?.hasMore ? await fetchAll(pager.url) : cacheItems;
+      const csv = toCSV(items);
       download("pedidos.csv", csv, "text/csv;charset=utf-8");
     });
   }
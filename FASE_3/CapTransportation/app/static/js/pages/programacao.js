@@ -1,5 +1,5 @@
 // app/static/js/pages/programacao.js
-import { qs, apiGet, apiPost, apiPut, fillSelect, setFormValues, getFormValues } from "./_shared.js";
+import { qs, apiGet, apiPost, apiPut, fillSelect, setFormValues, getFormValues, createPager, fetchAll, syncLoadMore, fetchResumo } from "./_shared.js";
 
 // ===============================
 // Helpers
@@ -128,20 +128,30 @@ export async function initProgramacao() {
   const programacaoPedidoOv = qs("#programacaoPedidoOv");
 
   let cacheItems = [];
+  let pager = null;
+  let resumo = null;
+  const btnMais = qs("#btnMais");
   let editingId = null;
 
   const aux = await apiGet("/api/auxiliares");
   fillSelect(form?.querySelector("[name=refinaria]"), aux.refinarias || []);
   fillSelect(form?.querySelector("[name=transportador]"), aux.transportadores || []);
 
-  async function load() {
-    const q = (busca?.value || "").trim();
-    const url = `/api/pedidos?stage=programacao${q ? `&busca=${encodeURIComponent(q)}` : ""}`;
-    const data = await apiGet(url);
-    const items = data.items || [];
-    cacheItems = items;
-
-    const total = items.length;
+  async function load(mais = false) {
+    if (!mais) {
+      const q = (busca?.value || "").trim();
+      pager = createPager(`/api/pedidos?stage=programacao${q ? `&busca=${encodeURIComponent(q)}` : ""}`);
+      cacheItems = [];
+    }
+    const atual = pager;
+    // o resumo só muda com escrita: não precisa vir de novo a cada "Carregar mais"
+    const [novos, r] = await Promise.all([atual.next(), mais ? resumo : fetchResumo("programacao")]);
+    if (atual !== pager) return; // outra busca começou enquanto esta página chegava
+    resumo = r;
+    const items = cacheItems = cacheItems.concat(novos);
+    syncLoadMore(btnMais, pager, items.length);
+
+    const total = resumo?.por_status?.programacao?.pedidos ?? pager.total ?? items.length;
     const semRefinaria = items.filter(p => !safeText(p.refinaria).trim()).length;
     const semAgend = items.filter(p => !safeText(p.agendamento_refinaria).trim()).length;
     const semTransportador = items.filter(p => !safeText(p.transportador).trim()).length;
@@ -266,9 +276,15 @@ export async function initProgramacao() {
 
   btnSalvar?.addEventListener("click", () => save().catch(e => alert(e.message)));
 
+  btnMais?.addEventListener("click", () => load(true).catch(e => alert(e.message)));
+
+  // exporta a listagem inteira (todas as páginas), não só o que já foi carregado
   btnExportar?.addEventListener("click", () => {
-    const csv = toCSV(cacheItems);
-    download(`programacao_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    const todos = pager?.hasMore ? fetchAll(pager.url) : Promise.resolve(cacheItems);
+    todos.then(items => {
+      const csv = toCSV(items);
+      download(`programacao_${new Date().toISOString().slice(0, 10)}.csv`, csv, "text/csv;charset=utf-8");
+    }).catch(e => alert(e.message));
   });
 
   let t = null;
@@ -0,0 +1,138 @@
+# benchmarks/bench_serializacao.py
+"""
+Benchmark da serialização da listagem de pedidos (app/services/serializer.py).
+
+Compara, para a mesma consulta (ORDER BY id DESC LIMIT n):
+
+    to_dict      caminho antigo: entidades Pedido + to_dict() + jsonify
+    todos        SELECT das colunas + Codificador, todos os campos
+    fields       idem com ?fields= da tela do Mestre (10 campos)
+    fields+gzip  idem, comprimido como na resposta (resposta_json)
+
+Roda sobre SQLite em memória (o schema ct_app é um banco anexado), então
+mede a parte da aplicação (carga das linhas + JSON), não a rede nem o
+Postgres. Confere antes que "todos" gera exatamente os mesmos itens do
+to_dict().
+
+Uso (na pasta CapTransportation):
+    python benchmarks/bench_serializacao.py
+    python benchmarks/bench_serializacao.py --linhas 10000 100000 --repeticoes 5
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("MOCK_MODE", "0")
+os.environ.setdefault("LOG_NIVEL", "error")
+
+from flask import jsonify  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import Pedido  # noqa: E402
+from app.routes.api_routes import CAMPOS_PEDIDO, _codificador, _colunas  # noqa: E402
+from app.services import serializer  # noqa: E402
+
+CAMPOS_MESTRE = ("id", "chave", "ov_remessa", "cliente", "produto", "status",
+                 "qtde_solicitada", "refinaria", "transportador", "numero_nf")
+
+
+def _preparar(app, total):
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def _anexar(conexao, _registro):
+            conexao.execute("ATTACH DATABASE ':memory:' AS ct_app")
+
+        db.engine.dispose()
+        Pedido.__table__.create(db.engine)
+
+        rnd = random.Random(42)
+        inicio = datetime(2025, 1, 1)
+        linhas = []
+        for i in range(1, total + 1):
+            linhas.append({
+                "id": i, "chave": f"PED-{i:06d}", "status": rnd.choice(["comercial", "programacao", "faturamento"]),
+                "data": date(2025, 1, 1) + timedelta(days=i % 365), "ov_remessa": f"OV-{100000 + i}",
+                "cif_fob": "CIF", "cliente": f"Cliente São João {i % 500} LTDA", "produto": "CAP 50/70",
+                "local_entrega": "Belo Horizonte", "uf_entrega": "MG",
+                "qtde_solicitada": Decimal(rnd.randint(10, 40)), "assessor": "João", "assistente": "Ana",
+                "refinaria": "Refinaria A", "transportador": "Trans A", "placa_cavalo": "ABC1D23",
+                "motorista": "Fulano", "valor_faturado": Decimal("12345.67"), "obs_faturamento": "ok",
+                "created_at": inicio, "updated_at": inicio + timedelta(seconds=i),
+            })
+        with db.engine.begin() as conexao:
+            conexao.execute(Pedido.__table__.insert(), linhas)
+
+
+def _to_dict(n):
+    pedidos = Pedido.query.order_by(Pedido.id.desc()).limit(n).all()
+    return jsonify({"items": [p.to_dict() for p in pedidos], "next_cursor": None}).get_data()
+
+
+def _codificado(n, campos):
+    linhas = Pedido.query.with_entities(*_colunas(campos, "id")).order_by(Pedido.id.desc()).limit(n).all()
+    return serializer.envelope("items", _codificador(campos).lista(linhas), next_cursor=None).encode("utf-8")
+
+
+def _medir(fn, repeticoes):
+    melhor, saida = float("inf"), None
+    for _ in range(repeticoes):
+        db.session.expunge_all()
+        inicio = time.perf_counter()
+        saida = fn()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, saida
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        app = create_app()
+    finally:
+        sys.stdout = stdout
+    _preparar(app, max(args.linhas))
+
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        # mesma saída que o to_dict() antes de comparar tempos
+        antigo = json.loads(_to_dict(1000))["items"]
+        novo = json.loads(_codificado(1000, CAMPOS_PEDIDO))["items"]
+        if antigo != novo:
+            print("FALHOU: o Codificador não reproduz o to_dict()")
+            sys.exit(1)
+
+        print(f"{'linhas':>8}  {'caminho':<12} {'ms':>9} {'MB':>8}  {'vs to_dict':>10}")
+        for n in args.linhas:
+            base, corpo = _medir(lambda: _to_dict(n), args.repeticoes)
+            resultados = [("to_dict", base, len(corpo))]
+
+            t, corpo = _medir(lambda: _codificado(n, CAMPOS_PEDIDO), args.repeticoes)
+            resultados.append(("todos", t, len(corpo)))
+
+            t, corpo = _medir(lambda: _codificado(n, CAMPOS_MESTRE), args.repeticoes)
+            resultados.append(("fields", t, len(corpo)))
+
+            t, comprimido = _medir(lambda: gzip.compress(_codificado(n, CAMPOS_MESTRE), compresslevel=5, mtime=0),
+                                   args.repeticoes)
+            resultados.append(("fields+gzip", t, len(comprimido)))
+
+            for nome, t, tamanho in resultados:
+                print(f"{n:>8}  {nome:<12} {t * 1000:>9.1f} {tamanho / 1e6:>8.2f}  {base / t:>9.1f}x")
+            print()
+
+
+if __name__ == "__main__":
+    main()
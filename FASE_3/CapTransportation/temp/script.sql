@@ -115,6 +115,104 @@ CREATE INDEX IF NOT EXISTS ix_tb_pedidos_ov_remessa ON ct_app.tb_pedidos (ov_rem
 CREATE INDEX IF NOT EXISTS ix_tb_pedidos_cliente ON ct_app.tb_pedidos (cliente);
 CREATE INDEX IF NOT EXISTS ix_tb_pedidos_produto ON ct_app.tb_pedidos (produto);
 
+-- Paginação por cursor do /api/pedidos (?after=): uma página = um range scan
+-- no índice da ordem pedida, com ou sem filtro de etapa
+CREATE INDEX IF NOT EXISTS ix_tb_pedidos_status_id ON ct_app.tb_pedidos (status, id DESC);
+CREATE INDEX IF NOT EXISTS ix_tb_pedidos_updated_id ON ct_app.tb_pedidos (updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_tb_pedidos_status_updated_id ON ct_app.tb_pedidos (status, updated_at DESC, id DESC);
+-- ETag de /api/pedidos/<id>: (status, updated_at) por id sem ler a linha (index-only).
+-- O ETag da listagem (max(updated_at), count) usa os dois índices acima.
+CREATE INDEX IF NOT EXISTS ix_tb_pedidos_id_versao ON ct_app.tb_pedidos (id) INCLUDE (status, updated_at);
+
+-- Busca do /api/pedidos?busca= (app/services/search.py). Colunas geradas sem
+-- acento e em minúsculas: tsvector com peso por campo (prefixo de chave/OV,
+-- cliente, produto) e texto concatenado para o pg_trgm ("aparece em qualquer
+-- ponto", o antigo ILIKE '%termo%'), cada uma com índice GIN.
+-- O ADD COLUMN reescreve a tabela: rode fora do horário de uso.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() é STABLE; coluna gerada exige função IMMUTABLE (dicionário fixo)
+CREATE OR REPLACE FUNCTION ct_app.f_unaccent(text) RETURNS text
+  LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+  AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+ALTER TABLE ct_app.tb_pedidos
+  ADD COLUMN IF NOT EXISTS busca_tsv tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', lower(ct_app.f_unaccent(coalesce(chave, '')))), 'A') ||
+    setweight(to_tsvector('simple', lower(ct_app.f_unaccent(coalesce(ov_remessa, '')))), 'A') ||
+    setweight(to_tsvector('simple', lower(ct_app.f_unaccent(coalesce(cliente, '')))), 'B') ||
+    setweight(to_tsvector('simple', lower(ct_app.f_unaccent(coalesce(produto, '')))), 'C') ||
+    setweight(to_tsvector('simple', coalesce(status, '')), 'D')
+  ) STORED,
+  ADD COLUMN IF NOT EXISTS busca_texto text GENERATED ALWAYS AS (
+    lower(ct_app.f_unaccent(
+      coalesce(chave, '') || ' ' || coalesce(ov_remessa, '') || ' ' || coalesce(cliente, '') || ' ' ||
+      coalesce(produto, '') || ' ' || coalesce(status, '')
+    ))
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_tb_pedidos_busca_tsv ON ct_app.tb_pedidos USING GIN (busca_tsv);
+CREATE INDEX IF NOT EXISTS ix_tb_pedidos_busca_trgm ON ct_app.tb_pedidos USING GIN (busca_texto gin_trgm_ops);
+
+-- Resumo por etapa (/api/pedidos/resumo): contadores de pedidos e toneladas
+-- (qtde_solicitada) por status/produto/UF, mantidos por trigger em
+-- tb_pedidos. Ler o resumo custa O(linhas do resumo), não O(pedidos).
+-- produto/UF nulos entram como '' (fazem parte da chave).
+CREATE TABLE IF NOT EXISTS ct_app.tb_pedidos_resumo (
+  status       VARCHAR(32)   NOT NULL,
+  produto      VARCHAR(255)  NOT NULL DEFAULT '',
+  uf_entrega   VARCHAR(2)    NOT NULL DEFAULT '',
+  pedidos      BIGINT        NOT NULL DEFAULT 0,
+  toneladas    NUMERIC(18,3) NOT NULL DEFAULT 0,
+  PRIMARY KEY (status, produto, uf_entrega)
+);
+
+CREATE OR REPLACE FUNCTION ct_app.f_pedidos_resumo() RETURNS trigger
+  LANGUAGE plpgsql
+AS $$
+BEGIN
+  IF TG_OP = 'UPDATE'
+     AND (OLD.status, OLD.produto, OLD.uf_entrega, OLD.qtde_solicitada)
+         IS NOT DISTINCT FROM (NEW.status, NEW.produto, NEW.uf_entrega, NEW.qtde_solicitada) THEN
+    RETURN NULL;
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE ct_app.tb_pedidos_resumo
+       SET pedidos = pedidos - 1,
+           toneladas = toneladas - coalesce(OLD.qtde_solicitada, 0)
+     WHERE status = OLD.status
+       AND produto = coalesce(OLD.produto, '')
+       AND uf_entrega = coalesce(OLD.uf_entrega, '');
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO ct_app.tb_pedidos_resumo AS r (status, produto, uf_entrega, pedidos, toneladas)
+    VALUES (NEW.status, coalesce(NEW.produto, ''), coalesce(NEW.uf_entrega, ''), 1, coalesce(NEW.qtde_solicitada, 0))
+    ON CONFLICT (status, produto, uf_entrega)
+    DO UPDATE SET pedidos = r.pedidos + 1, toneladas = r.toneladas + EXCLUDED.toneladas;
+  END IF;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tg_pedidos_resumo ON ct_app.tb_pedidos;
+CREATE TRIGGER tg_pedidos_resumo
+  AFTER INSERT OR DELETE OR UPDATE OF status, produto, uf_entrega, qtde_solicitada
+  ON ct_app.tb_pedidos
+  FOR EACH ROW EXECUTE FUNCTION ct_app.f_pedidos_resumo();
+
+-- Carga inicial (e recontagem, se um dia divergir): bloqueia escritas em
+-- tb_pedidos até o COMMIT para não perder alterações entre a contagem e o trigger.
+LOCK TABLE ct_app.tb_pedidos IN SHARE MODE;
+DELETE FROM ct_app.tb_pedidos_resumo;
+INSERT INTO ct_app.tb_pedidos_resumo (status, produto, uf_entrega, pedidos, toneladas)
+SELECT status, coalesce(produto, ''), coalesce(uf_entrega, ''), count(*), coalesce(sum(qtde_solicitada), 0)
+  FROM ct_app.tb_pedidos
+ GROUP BY 1, 2, 3;
+
 COMMIT;
 
 
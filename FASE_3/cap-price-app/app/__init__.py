@@ -19,10 +19,38 @@ def create_app():
 
     app.config.from_object(Config)
 
+    # Log estruturado assíncrono: antes de tudo, os init_app abaixo já registram eventos
+    from app.services import structured_log
+    structured_log.init_app(app, "cap-price-app")
+
+    # ============================================================
+    # Postgres (opcional - usado pelo motor de precificação local)
+    # ============================================================
+    from app.config import init_db_pool
+    init_db_pool(app)
+
+    from app.services import (
+        admission, city_index, db_listener, freight_matrix, http_client, idempotency, job_store, laudo_store,
+        price_surface, result_cache, tax_cache,
+    )
+    http_client.init_app(app)
+    freight_matrix.init_app(app)
+    city_index.init_app(app)
+    tax_cache.init_app(app)
+    result_cache.init_app(app)
+    job_store.init_app(app)
+    idempotency.init_app(app)
+    laudo_store.init_app(app)
+    price_surface.init_app(app)
+    admission.init_app(app)
+
     # ============================================================
     # Blueprints
     # ============================================================
     from .routes import main
     app.register_blueprint(main.main_bp)
 
+    # LISTEN/NOTIFY (invalidação dos caches) - depois de todos registrarem seus canais
+    db_listener.iniciar(app)
+
     return app
@@ -1,4 +1,157 @@
 import os
 
+from flask import current_app
+from psycopg2.pool import ThreadedConnectionPool
+
+
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "change-me")
+
+    # Postgres (mesma base do CAPSSYS: cap_refinarias, cap_precos_refinarias, ...)
+    DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+
+    # "local" = motor de precificação em Python (precisa de DATABASE_URL)
+    # "n8n"   = workflow CAP_PRICE_OFICIAL_V5 (Diretor de Pricing)
+    PRICING_ENGINE = os.getenv("PRICING_ENGINE", "local").strip().lower()
+
+    # Frete (mesmos números do nó "Calcula Frete" do n8n)
+    FRETE_CCD = float(os.getenv("FRETE_CCD", "5.8595"))            # R$/km
+    FRETE_CCD_FIXO = float(os.getenv("FRETE_CCD_FIXO", "683.37"))  # carga e descarga (R$)
+    FRETE_FATOR_VOLTA = float(os.getenv("FRETE_FATOR_VOLTA", "0.92"))
+    FRETE_CAPACIDADE = float(os.getenv("FRETE_CAPACIDADE", "25"))  # toneladas (3 eixos)
+    FRETE_FATOR_ESTRADA = float(os.getenv("FRETE_FATOR_ESTRADA", "1.3"))
+
+    # Matriz de frete pré-calculada (vazio = <instance>/frete)
+    FREIGHT_MATRIX_DIR = os.getenv("FREIGHT_MATRIX_DIR", "").strip()
+    FREIGHT_MATRIX_TTL = int(os.getenv("FREIGHT_MATRIX_TTL", "600"))
+    # Thread de sincronização: de quanto em quanto tempo confere se o meta.json mudou
+    FREIGHT_MATRIX_RECARGA_S = int(os.getenv("FREIGHT_MATRIX_RECARGA_S", "30"))
+
+    # Índice de cidades (autocomplete /api/cidades e destino): recarga de cap_cidades
+    CIDADES_TTL = int(os.getenv("CIDADES_TTL", "86400"))
+
+    # Poda espacial das refinarias no motor local: k mais próximas + raio de
+    # equilíbrio de frete (0 = avalia todas). Só liga a partir de
+    # REFINARIAS_PODA_MIN origens: abaixo disso a avaliação completa é mais rápida
+    REFINARIAS_PODA_K = int(os.getenv("REFINARIAS_PODA_K", "8"))
+    REFINARIAS_PODA_MIN = int(os.getenv("REFINARIAS_PODA_MIN", "1500"))
+
+    # Superfície de preços produto × cidade (job noturno `flask superficie-precos`);
+    # vazio = <instance>/superficie, 0 workers = núcleos da máquina
+    PRICE_SURFACE_DIR = os.getenv("PRICE_SURFACE_DIR", "").strip()
+    PRICE_SURFACE_WORKERS = int(os.getenv("PRICE_SURFACE_WORKERS", "0"))
+    PRICE_SURFACE_MARGENS = os.getenv("PRICE_SURFACE_MARGENS", "0,5,10,15")
+    PRICE_SURFACE_CUSTO_FIXO = float(os.getenv("PRICE_SURFACE_CUSTO_FIXO", "0"))
+
+    # Tabelas de impostos: invalidadas por LISTEN/NOTIFY; TTL é só rede de
+    # segurança caso os triggers não estejam instalados (0 = desligado)
+    TAX_CACHE_TTL = int(os.getenv("TAX_CACHE_TTL", "3600"))
+
+    # Cliente HTTP de saída (n8n, CAPSSYS): conexões por host (0 = calculado pelos
+    # limites de admissão e workers de jobs/lote, ver http_client.tamanho_pool),
+    # espera máxima por conexão livre (depois, 503), timeout de conexão e retries
+    HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "0"))
+    HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+
+    # Cache de resultados do /api/simular (0 = desligado)
+    SIM_CACHE_MAX_BYTES = int(os.getenv("SIM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    SIM_CACHE_TTL = int(os.getenv("SIM_CACHE_TTL", "3600"))
+
+    # Janela do header Idempotency-Key nos POST de simulação (0 = desligado)
+    SIM_IDEMPOTENCIA_TTL = int(os.getenv("SIM_IDEMPOTENCIA_TTL", "600"))
+    SIM_IDEMPOTENCIA_MAX = int(os.getenv("SIM_IDEMPOTENCIA_MAX", "1000"))
+
+    # Laudos sob demanda (/api/laudo/<id>); vazio = <instance>/laudos
+    LAUDO_DIR = os.getenv("LAUDO_DIR", "").strip()
+    LAUDO_TTL = int(os.getenv("LAUDO_TTL", "86400"))
+    LAUDO_MAX_INSUMOS = int(os.getenv("LAUDO_MAX_INSUMOS", "2000"))
+    LAUDO_CACHE_MAX_BYTES = int(os.getenv("LAUDO_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+    # Resposta v2 do /api/simular e dos jobs (Accept ou ?v=2): comprime acima de
+    # RESPOSTA_COMPRIMIR_MIN bytes (brotli se instalado, senão gzip). Níveis baixos:
+    # com o laudo HTML, ~24 KB viram ~5 KB já no gzip 1; o nível 6 custa o dobro de CPU
+    RESPOSTA_COMPRIMIR_MIN = int(os.getenv("RESPOSTA_COMPRIMIR_MIN", "1024"))
+    RESPOSTA_GZIP_NIVEL = int(os.getenv("RESPOSTA_GZIP_NIVEL", "1"))
+    RESPOSTA_BROTLI_NIVEL = int(os.getenv("RESPOSTA_BROTLI_NIVEL", "4"))
+
+    # Chat em streaming (/api/chat/stream): espera máxima entre dois pedaços do
+    # n8n e duração total da resposta (segundos)
+    CHAT_STREAM_IDLE_TIMEOUT = float(os.getenv("CHAT_STREAM_IDLE_TIMEOUT", "30"))
+    CHAT_STREAM_MAX_S = float(os.getenv("CHAT_STREAM_MAX_S", "300"))
+    # Relay em aiohttp (relay.py, ver services/chat_relay.py): streams de chat
+    # abertos ao mesmo tempo (cada um é um socket no event loop, não uma thread),
+    # gunicorn para onde vão as demais rotas e tamanho máximo do corpo repassado
+    CHAT_RELAY_MAX_STREAMS = int(os.getenv("CHAT_RELAY_MAX_STREAMS", "500"))
+    CHAT_RELAY_UPSTREAM = os.getenv("CHAT_RELAY_UPSTREAM", "unix:/tmp/capprice.sock")
+    CHAT_RELAY_MAX_CORPO = int(os.getenv("CHAT_RELAY_MAX_CORPO", str(32 * 1024 * 1024)))
+
+    # Controle de admissão (ver services/admission.py), por processo: execuções
+    # simultâneas no total e por usuário, tamanho da fila e espera máxima
+    # (0 no GLOBAL = desligado). Quem executa ou espera na fila ocupa uma thread
+    # do gunicorn: GLOBAL + FILA de todas as classes < --threads (16 no Dockerfile;
+    # lá o chat_stream é atendido pelo relay e não conta)
+    ADMISSAO_SIMULAR_GLOBAL = int(os.getenv("ADMISSAO_SIMULAR_GLOBAL", "3"))
+    ADMISSAO_SIMULAR_POR_USUARIO = int(os.getenv("ADMISSAO_SIMULAR_POR_USUARIO", "2"))
+    ADMISSAO_SIMULAR_FILA = int(os.getenv("ADMISSAO_SIMULAR_FILA", "1"))
+    ADMISSAO_LOTE_GLOBAL = int(os.getenv("ADMISSAO_LOTE_GLOBAL", "1"))
+    ADMISSAO_LOTE_POR_USUARIO = int(os.getenv("ADMISSAO_LOTE_POR_USUARIO", "1"))
+    ADMISSAO_LOTE_FILA = int(os.getenv("ADMISSAO_LOTE_FILA", "0"))
+    ADMISSAO_CHAT_GLOBAL = int(os.getenv("ADMISSAO_CHAT_GLOBAL", "2"))
+    ADMISSAO_CHAT_POR_USUARIO = int(os.getenv("ADMISSAO_CHAT_POR_USUARIO", "1"))
+    ADMISSAO_CHAT_FILA = int(os.getenv("ADMISSAO_CHAT_FILA", "1"))
+    # Chat em SSE pela rota Flask (python run.py; no Docker quem atende é o relay,
+    # com CHAT_RELAY_MAX_STREAMS e o mesmo POR_USUARIO): streams abertos ao mesmo
+    # tempo (a vaga dura a resposta inteira, então não há fila: sem vaga sai 429 na hora)
+    ADMISSAO_CHAT_STREAM_GLOBAL = int(os.getenv("ADMISSAO_CHAT_STREAM_GLOBAL", "6"))
+    ADMISSAO_CHAT_STREAM_POR_USUARIO = int(os.getenv("ADMISSAO_CHAT_STREAM_POR_USUARIO", "2"))
+    ADMISSAO_CHAT_STREAM_FILA = int(os.getenv("ADMISSAO_CHAT_STREAM_FILA", "0"))
+    # Espera do resultado dos jobs (SSE e long-poll ?wait=): conexões paradas ao
+    # mesmo tempo; sem vaga, 429 e o front tenta de novo depois do Retry-After
+    ADMISSAO_JOBS_ESPERA_GLOBAL = int(os.getenv("ADMISSAO_JOBS_ESPERA_GLOBAL", "6"))
+    ADMISSAO_JOBS_ESPERA_POR_USUARIO = int(os.getenv("ADMISSAO_JOBS_ESPERA_POR_USUARIO", "2"))
+    ADMISSAO_JOBS_ESPERA_FILA = int(os.getenv("ADMISSAO_JOBS_ESPERA_FILA", "0"))
+    ADMISSAO_ESPERA_S = float(os.getenv("ADMISSAO_ESPERA_S", "5"))
+
+    # Lote de cotações (/api/simular/lote)
+    SIM_LOTE_WORKERS = int(os.getenv("SIM_LOTE_WORKERS", "4"))
+    SIM_LOTE_MAX_LINHAS = int(os.getenv("SIM_LOTE_MAX_LINHAS", "500"))
+
+    # Grade what-if (/api/simular/grid): limite de células margem x custo_fixo x preco_net x refinaria
+    SIM_GRID_MAX_CELULAS = int(os.getenv("SIM_GRID_MAX_CELULAS", "60000"))
+
+    # Jobs assíncronos (/api/simular/jobs)
+    SIM_JOBS_WORKERS = int(os.getenv("SIM_JOBS_WORKERS", "4"))
+    SIM_JOBS_MAX = int(os.getenv("SIM_JOBS_MAX", "200"))
+    SIM_JOBS_TTL = int(os.getenv("SIM_JOBS_TTL", "600"))      # segundos após terminar
+    SIM_JOBS_SSE_MAX = int(os.getenv("SIM_JOBS_SSE_MAX", "55"))  # o navegador reconecta
+
+
+def init_db_pool(app):
+    """
+    Pool opcional: sem DATABASE_URL a app continua funcionando só com o n8n.
+    """
+    dsn = (app.config.get("DATABASE_URL") or "").strip()
+    if not dsn:
+        app.extensions["db_pool"] = None
+        return
+    app.extensions["db_pool"] = ThreadedConnectionPool(minconn=1, maxconn=10, dsn=dsn)
+
+
+def db_disponivel() -> bool:
+    return current_app.extensions.get("db_pool") is not None
+
+
+def get_conn():
+    pool = current_app.extensions.get("db_pool")
+    if not pool:
+        raise RuntimeError("Pool não inicializado. Verifique DATABASE_URL / init_db_pool(app).")
+    return pool.getconn()
+
+
+def put_conn(conn):
+    pool = current_app.extensions.get("db_pool")
+    if pool and conn:
+        pool.putconn(conn)
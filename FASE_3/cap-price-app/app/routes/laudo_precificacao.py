@@ -3,6 +3,8 @@ from typing import Any, Dict, List, Tuple, Optional
 
 from flask import render_template
 
+from app.services.simulation_normalizer import RespostaNormalizada
+
 
 def _fmt_moeda(valor: Any) -> str:
     """Formata número como moeda brasileira."""
@@ -46,80 +48,6 @@ def _fmt_km(valor: Any) -> str:
     )
 
 
-def _find_first_list(obj: Any, key: str) -> Tuple[Optional[List], Optional[Dict]]:
-    """
-    Procura recursivamente a primeira lista com a chave `key`.
-
-    Retorna (lista_encontrada, dict_que_contem_essa_lista).
-    """
-    if isinstance(obj, dict):
-        if key in obj and isinstance(obj[key], list):
-            return obj[key], obj
-        for v in obj.values():
-            lista, dono = _find_first_list(v, key)
-            if lista is not None:
-                return lista, dono
-    elif isinstance(obj, list):
-        for item in obj:
-            lista, dono = _find_first_list(item, key)
-            if lista is not None:
-                return lista, dono
-    return None, None
-
-
-def _extrair_cenario_principal(
-    n8n_json: Any,
-) -> Tuple[Optional[Dict], List[Dict], Optional[Dict], Any]:
-    """
-    Extrai o cenário principal e os alternativos do JSON vindo do n8n.
-
-    Compatível com dois formatos:
-
-    1) Antigo: um objeto com `dados.jsons[0]` como principal e
-       `dados.jsons[0].cenariosAlternativos` como alternativas.
-
-    2) Novo: a lista `dados.jsons` já vem com as N melhores opções,
-       onde o primeiro item é o vencedor e os demais são alternativas.
-    """
-    raiz = n8n_json
-    if isinstance(raiz, list) and raiz and isinstance(raiz[0], dict):
-        raiz = raiz[0]
-
-    # tenta achar primeiro em dados.jsons, depois em 'cenarios'
-    jsons, owner = _find_first_list(raiz, "jsons")
-    if not jsons:
-        jsons, owner = _find_first_list(raiz, "cenarios")
-
-    # fallback: se a raiz já for uma lista de cenários
-    if not jsons:
-        if isinstance(raiz, list):
-            jsons = [it for it in raiz if isinstance(it, dict)]
-        elif isinstance(raiz, dict):
-            jsons = [raiz]
-
-    if not jsons:
-        return None, [], None, raiz
-
-    principal = jsons[0] if isinstance(jsons[0], dict) else None
-    if principal is None:
-        return None, [], owner, raiz
-
-    # ----- monta lista de alternativos -----
-    alternativos: List[Dict] = []
-
-    # 1) Se o principal já tiver 'cenariosAlternativos', usa esse campo
-    embutidos = principal.get("cenariosAlternativos")
-    if isinstance(embutidos, list) and embutidos:
-        alternativos = [alt for alt in embutidos if isinstance(alt, dict)]
-    else:
-        # 2) Caso novo: usamos as demais posições de jsons como alternativas
-        for alt in jsons[1:]:
-            if isinstance(alt, dict):
-                alternativos.append(alt)
-
-    return principal, alternativos, owner, raiz
-
-
 def _split_cidade_uf(
     cidade_uf: Any,
     cidade_fallback: str = "",
@@ -138,7 +66,8 @@ def _split_cidade_uf(
 def _montar_contexto_laudo(
     cenario: Dict,
     cenarios_alternativos: List[Dict],
-    raiz: Any,
+    quantidade_raiz: Any = 0,
+    exibir_tabela_v: bool = False,
 ) -> Dict[str, Any]:
     """Monta o dicionário de contexto usado pelo template Jinja do laudo."""
 
@@ -146,11 +75,7 @@ def _montar_contexto_laudo(
     laudo_texto = cenario.get("laudo") or ""
     motivo = cenario.get("motivo") or ""
 
-    quantidade = (
-        cenario.get("quantidade")
-        or (raiz.get("quantidade") if isinstance(raiz, dict) else 0)
-        or 0
-    )
+    quantidade = cenario.get("quantidade") or quantidade_raiz or 0
 
     preco_final = cenario.get("precoFinal") or 0
     preco_net = cenario.get("precoNet") or 0
@@ -213,16 +138,6 @@ def _montar_contexto_laudo(
             }
         )
 
-    # Detecta se deve exibir a tabela interativa (se "TabelaV" estiver no laudo ou motivo)
-    # Broadened search: case-insensitive and checking multiple sources
-    search_str = "tabelav"
-    exibir_tabela_v = (
-        search_str in laudo_texto.lower() or 
-        search_str in motivo.lower() or
-        search_str in str(cenario).lower() or
-        search_str in str(raiz).lower()
-    )
-
     # Alíquotas
     aliquotas: List[Dict[str, str]] = []
     if icms_aliq is not None:
@@ -342,30 +257,28 @@ def _montar_contexto_laudo(
     }
 
 
-def gerar_laudo_para_resposta_simulacao(n8n_json: Any) -> Any:
+def insumos_laudo(resposta: RespostaNormalizada) -> Optional[Dict[str, Any]]:
     """
-    Recebe o JSON bruto do n8n, gera o HTML do laudo e injeta em `htmls`.
-
-    Mantém a estrutura original do JSON, apenas adicionando/atualizando o campo
-    `htmls` no mesmo nível em que estiverem os `jsons`/`cenarios`.
+    Dados canônicos para gerar o laudo depois (/api/laudo/<id>).
+    A flag TabelaV já vem da passada do normalizador (resposta inteira).
     """
-    try:
-        principal, alternativos, owner, raiz = _extrair_cenario_principal(n8n_json)
-        if principal is None:
-            # Nada para fazer, devolve como veio
-            return n8n_json
-
-        contexto = _montar_contexto_laudo(principal, alternativos, raiz)
-        laudo_html = render_template("laudo_precificacao.html", **contexto)
-
-        # Define onde guardar o HTML gerado
-        if owner is not None and isinstance(owner, dict):
-            owner["htmls"] = [laudo_html]
-        elif isinstance(raiz, dict):
-            raiz["htmls"] = [laudo_html]
-
-        return n8n_json
-    except Exception:
-        # Qualquer erro aqui não pode quebrar a simulação inteira:
-        # devolve o JSON original sem mexer.
-        return n8n_json
+    if resposta.principal is None:
+        return None
+    raiz = resposta.raiz if isinstance(resposta.raiz, dict) else {}
+    return {
+        "principal": resposta.principal,
+        "alternativos": resposta.alternativos,
+        "quantidade_raiz": raiz.get("quantidade") or 0,
+        "tabela_v": resposta.tabela_v,
+    }
+
+
+def renderizar_laudo(insumos: Dict[str, Any]) -> str:
+    """Renderiza o laudo_precificacao.html a partir dos insumos guardados."""
+    contexto = _montar_contexto_laudo(
+        insumos["principal"],
+        insumos.get("alternativos") or [],
+        insumos.get("quantidade_raiz") or 0,
+        bool(insumos.get("tabela_v")),
+    )
+    return render_template("laudo_precificacao.html", **contexto)
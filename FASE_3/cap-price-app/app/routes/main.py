@@ -1,12 +1,32 @@
 # app/routes/main.py
-from flask import Blueprint, render_template, jsonify, request, redirect, session
+from flask import (
+    Blueprint, render_template, jsonify, request, redirect, session, current_app,
+    Response, stream_with_context,
+)
 import requests
 import os
 import json
+import time
 import jwt
 
 # 👇 Laudo
-from .laudo_precificacao import gerar_laudo_para_resposta_simulacao
+from .laudo_precificacao import insumos_laudo, renderizar_laudo
+
+# 👇 Motor de precificação local (substitui o Diretor de Pricing do n8n)
+from app.config import db_disponivel
+from app.services import (
+    admission, batch_quote, chat_stream, city_index, http_client, idempotency, job_store, laudo_store, price_surface,
+    request_timing, result_cache, simulation_response, structured_log, tax_cache,
+)
+from app.services.idempotency import IdempotencyConflict
+from app.services.simulation_normalizer import normalizar_resposta
+from app.services.single_flight import SingleFlight
+from app.services.pricing_engine import (
+    ContextoLote,
+    PricingError,
+    simular as simular_local,
+    simular_grade,
+)
 
 # 👇 Guard de sessão
 from app.security.guards import login_required
@@ -21,10 +41,8 @@ N8N_SIMULATOR_WEBHOOK_URL = os.getenv(
     "https://automacoes-n8n.infrassys.com/webhook/CPV5x",
 )
 
-N8N_CHAT_WEBHOOK_URL = os.getenv(
-    "N8N_CHAT_WEBHOOK_URL",
-    "https://automacoes-n8n.infrassys.com/webhook/capchat",
-)
+# o relay de streaming (services/chat_relay.py) usa a mesma URL
+N8N_CHAT_WEBHOOK_URL = chat_stream.N8N_CHAT_WEBHOOK_URL
 
 # ============================================================
 # SSO (CAPSSYS)
@@ -43,186 +61,22 @@ SSO_AUDIENCE = os.getenv("SSO_AUDIENCE", "")
 # ============================================================
 # Helpers
 # ============================================================
-def _mapear_resultados_simulacao(n8n_json):
+def _mapear_resultados_simulacao(resposta, laudo_id=None):
     """
-    Converte a resposta do n8n para o formato que o frontend espera.
-    [ ... SEU TEXTO ORIGINAL AQUI (mantive igual) ... ]
+    Converte a resposta normalizada (RespostaNormalizada) para o formato que o
+    frontend espera: uma lista de cenários. O laudo vai só como referência
+    (`laudoId`/`laudoUrl`) e é gerado quando o usuário abre.
     """
-
-    def _find_first_list(obj, key_name):
-        """Procura recursivamente pela primeira lista em obj com a chave key_name."""
-        if isinstance(obj, dict):
-            if key_name in obj and isinstance(obj[key_name], list):
-                return obj[key_name], obj
-            for v in obj.values():
-                lst, owner = _find_first_list(v, key_name)
-                if lst is not None:
-                    return lst, owner
-        elif isinstance(obj, list):
-            for it in obj:
-                lst, owner = _find_first_list(it, key_name)
-                if lst is not None:
-                    return lst, owner
-        return None, None
-
-    # ---------- Normaliza raiz ----------
-    raiz = n8n_json
-    if isinstance(raiz, list) and raiz and isinstance(raiz[0], dict):
-        raiz = raiz[0]
-
-    # ---------- Descobre de onde vêm os cenários/jsons ----------
-    jsons = []
-    owner = None
-
-    # 1) Tenta achar "jsons" (formato antigo)
-    jsons, owner = _find_first_list(n8n_json, "jsons")
-    # 2) Se não achou, tenta "cenarios" (formato novo)
-    if not jsons:
-        jsons, owner = _find_first_list(n8n_json, "cenarios")
-    # 3) Se ainda não achou, tenta "results"
-    if not jsons:
-        jsons, owner = _find_first_list(n8n_json, "results")
-
-    # 4) Fallback: se n8n_json já for lista de objetos simples
-    if not jsons:
-        if isinstance(n8n_json, list):
-            jsons = [it for it in n8n_json if isinstance(it, dict)]
-        elif isinstance(n8n_json, dict):
-            jsons = [n8n_json]
-
-    if not jsons:
-        return []
-
-    # ---------- Descobre os htmls (laudo) ----------
-    raw_htmls = None
-
-    # Se o "owner" (dict que contém jsons/cenarios) tiver htmls, usa ele
-    if isinstance(owner, dict) and "htmls" in owner:
-        raw_htmls = owner.get("htmls")
-
-    # Se não tiver, tenta na raiz
-    if raw_htmls is None and isinstance(raiz, dict):
-        raw_htmls = raiz.get("htmls")
-
-    # Fallback geral: percorre procurando key "htmls"
-    if raw_htmls is None:
-        _, owner_html = _find_first_list(n8n_json, "htmls")
-        if isinstance(owner_html, dict):
-            raw_htmls = owner_html.get("htmls")
-
-    # ---------- Normaliza laudo HTML ----------
-    laudo_html = None
-    if isinstance(raw_htmls, list) and raw_htmls:
-        first = raw_htmls[0]
-        if isinstance(first, str):
-            laudo_html = first
-        elif isinstance(first, dict):
-            laudo_html = (
-                first.get("html")
-                or first.get("content")
-                or first.get("body")
-            )
-    elif isinstance(raw_htmls, dict):
-        laudo_html = (
-            raw_htmls.get("html")
-            or raw_htmls.get("content")
-            or raw_htmls.get("body")
-        )
-
-    # ---------- Monta o array no formato que o front espera ----------
     resultados = []
-
-    for item in jsons:
-        if not isinstance(item, dict):
-            continue
-
-        def _num(val, default=0.0):
-            try:
-                return float(val)
-            except (TypeError, ValueError):
-                return default
-
-        origem = (
-            item.get("origem")
-            or item.get("refinariaNome")
-            or item.get("refinaria_nome")
-            or item.get("refinaria_codigo")
-            or "Origem não informada"
-        )
-
-        destino = (
-            item.get("destino")
-            or item.get("destinoCidade")
-            or ""
-        )
-
-        quantidade = item.get("quantidade") or raiz.get("quantidade") or 0
-
-        preco_net = (
-            item.get("precoNet")
-            or item.get("preco_net")
-            or 0
-        )
-
-        frete = (
-            item.get("frete")
-            or item.get("frete_por_ton")
-            or 0
-        )
-
-        cmv = (
-            item.get("cmv")
-            or item.get("CMV")
-            or item.get("preco_com_margem")
-            or 0
-        )
-
-        margem = (
-            item.get("margem")
-            or item.get("margem_percentual")
-            or 0
-        )
-
-        preco_final = (
-            item.get("precoFinal")
-            or item.get("preco_final")
-            or item.get("preco_final_unitario")
-            or 0
-        )
-
-        valor_total = (
-            item.get("valorTotal")
-            or item.get("valor_total")
-            or 0
-        )
-
-        resultado = {
-            "origem": origem,
-            "destino": destino,
-            "quantidade": quantidade,
-            "precoNet": _num(preco_net),
-            "frete": _num(frete),
-            "impostos": _num(item.get("impostos")),
-            "difal": _num(item.get("difal")),
-            "cmv": _num(cmv),
-            "margem": _num(margem),
-            "precoFinal": _num(preco_final),
-            "produto": item.get("produto") or raiz.get("produto") or "",
-            "destinoCidade": item.get("destinoCidade") or raiz.get("destinoCidade") or "",
-            "destinoUF": item.get("destinoUF") or raiz.get("destinoUF") or "",
-            "refinariaNome": item.get("refinariaNome") or item.get("refinaria_nome") or "",
-            "filialRecomendada": item.get("filialRecomendada") or "",
-            "distanciaKm": _num(item.get("distanciaKm")),
-            "custoFixo": _num(item.get("custoFixo") or item.get("custo_fixo")),
-            "valorTotal": _num(valor_total),
-        }
-
-        # 👇 Aqui o laudo entra na resposta que o front enxerga
-        if laudo_html:
-            resultado["laudoHtml"] = laudo_html
-
+    for cenario in resposta.cenarios:
+        resultado = cenario.to_front()
+        # 👇 Referência do laudo (GET /api/laudo/<id>)
+        if laudo_id:
+            resultado["laudoId"] = laudo_id
+            resultado["laudoUrl"] = f"/api/laudo/{laudo_id}"
+        elif resposta.laudo_html:
+            resultado["laudoHtml"] = resposta.laudo_html
         resultados.append(resultado)
-
     return resultados
 
 
@@ -241,15 +95,16 @@ def sso_callback():
         return "SSO inválido: CAPSSYS_INTERNAL_BASE_URL não configurada", 500
 
     try:
-        r = requests.post(
+        r = http_client.cliente().post(
             f"{CAPSSYS_INTERNAL_BASE_URL}/api/sso/exchange",
+            alvo="capssys-sso-exchange",
             json={
                 "code": code,
                 "client_id": SSO_CLIENT_ID,
                 "client_secret": SSO_CLIENT_SECRET,
                 "state": state,  # se o CAPSSYS ignorar, ok
             },
-            timeout=10,
+            read_timeout=10,
         )
     except requests.RequestException as e:
         return f"Falha de conexão no SSO exchange: {str(e)}", 502
@@ -319,91 +174,623 @@ def precificar():
 # ============================================================
 # API de simulação
 # ============================================================
-@main_bp.route("/api/simular", methods=["POST"])
-@login_required
-def api_simular():
-    try:
-        payload = request.get_json(silent=True) or {}
-        print(f"[SIMULACAO] Payload recebido do frontend: {payload}")
+def _motor_local_habilitado() -> bool:
+    return (
+        current_app.config.get("PRICING_ENGINE") == "local"
+        and db_disponivel()
+    )
 
-        try:
-            n8n_response = requests.post(
+
+def _chamar_motor_n8n(payload):
+    """
+    Chama o workflow do n8n e devolve (json_do_n8n, None) ou (None, (corpo_erro, status)).
+    """
+    try:
+        with request_timing.fase("upstream", "n8n"):
+            n8n_response = http_client.cliente().post(
                 N8N_SIMULATOR_WEBHOOK_URL,
+                alvo="n8n-simulador",
                 json=payload,
-                timeout=240,
+                read_timeout=240,
             )
-        except requests.exceptions.Timeout:
-            print("[SIMULACAO] Timeout ao chamar o n8n.")
-            return jsonify({
-                "status": "error",
-                "message": "O motor de simulação demorou demais para responder."
-            }), 504
-        except requests.exceptions.RequestException as e:
-            print(f"[SIMULACAO] Erro de requisição ao n8n: {e}")
-            return jsonify({
-                "status": "error",
-                "message": f"Falha ao conectar no motor de simulação: {str(e)}"
-            }), 502
+    except http_client.PoolEsgotado:
+        structured_log.evento("simulacao.n8n_pool_esgotado", "warning")
+        return None, ({
+            "status": "error",
+            "message": "Muitas simulações em andamento. Tente novamente em instantes."
+        }, 503)
+    except requests.exceptions.Timeout:
+        structured_log.evento("simulacao.n8n_timeout", "warning")
+        return None, ({
+            "status": "error",
+            "message": "O motor de simulação demorou demais para responder."
+        }, 504)
+    except requests.exceptions.RequestException as e:
+        structured_log.evento("simulacao.n8n_falha", "error", exc=e)
+        return None, ({
+            "status": "error",
+            "message": f"Falha ao conectar no motor de simulação: {str(e)}"
+        }, 502)
 
-        status_code = n8n_response.status_code
-        raw_body = n8n_response.text or ""
-        print(f"[SIMULACAO] HTTP {status_code} do n8n. Corpo (primeiros 500 chars): {raw_body[:500]}")
+    status_code = n8n_response.status_code
+    raw_body = n8n_response.text or ""
+    structured_log.evento("simulacao.n8n_resposta", amostrar=True, http_status=status_code, corpo=raw_body)
 
-        if not n8n_response.ok:
-            return jsonify({
-                "status": "error",
-                "message": f"Erro ao chamar o motor de simulação (HTTP {status_code}).",
-                "raw": raw_body
-            }), 502
+    if not n8n_response.ok:
+        return None, ({
+            "status": "error",
+            "message": f"Erro ao chamar o motor de simulação (HTTP {status_code}).",
+            "raw": raw_body
+        }, 502)
 
-        if not raw_body.strip():
-            print("[SIMULACAO] Resposta vazia do n8n.")
-            return jsonify({
-                "status": "error",
-                "message": "O motor de simulação respondeu vazio (sem JSON).",
-                "raw": raw_body
-            }), 502
+    if not raw_body.strip():
+        structured_log.evento("simulacao.n8n_vazia", "warning", http_status=status_code)
+        return None, ({
+            "status": "error",
+            "message": "O motor de simulação respondeu vazio (sem JSON).",
+            "raw": raw_body
+        }, 502)
 
-        try:
+    try:
+        with request_timing.fase("decode"):
             n8n_json = n8n_response.json()
-        except json.JSONDecodeError:
-            print(f"[SIMULACAO] Resposta não-JSON do n8n: {raw_body[:500]}")
-            return jsonify({
-                "status": "error",
-                "message": "Resposta inválida do motor de simulação (não é JSON).",
-                "raw": raw_body
-            }), 502
+        request_timing.registrar_tempos_n8n(n8n_json)
+        return n8n_json, None
+    except json.JSONDecodeError:
+        structured_log.evento("simulacao.n8n_nao_json", "warning", corpo=raw_body)
+        return None, ({
+            "status": "error",
+            "message": "Resposta inválida do motor de simulação (não é JSON).",
+            "raw": raw_body
+        }, 502)
 
-        # 👇 AQUI: gera o laudo e insere em "htmls" no payload do n8n
-        n8n_json_com_laudo = gerar_laudo_para_resposta_simulacao(n8n_json)
 
-        # Depois disso, o mapper continua o fluxo normal
-        simulation_results = _mapear_resultados_simulacao(n8n_json_com_laudo)
+def _destino_canonico(payload):
+    """
+    O "Consulta Cidade" do n8n compara o nome exato (acento e caixa) e sem UF:
+    troca a cidade digitada pelo nome como está em cap_cidades, se o índice achar.
+    """
+    cidade = city_index.resolver(payload.get("destino_cidade", ""), payload.get("destino_uf", ""))
+    if cidade is None or cidade["nome"] == payload.get("destino_cidade"):
+        return payload
+    return {**payload, "destino_cidade": cidade["nome"]}
 
-        if not simulation_results:
-            print(f"[SIMULACAO] JSON recebido, mas sem cenários válidos: {n8n_json_com_laudo}")
-            return jsonify({
-                "status": "error",
-                "message": "Resposta do motor de simulação não contém cenários válidos.",
-                "raw": n8n_json_com_laudo
-            }), 502
 
-        print(f"[SIMULACAO] Cenários mapeados: {simulation_results}")
-        return jsonify(simulation_results), 200
+def _executar_simulacao(payload, contexto=None):
+    """
+    Executa a simulação completa (motor + laudo + mapeamento).
+    Devolve (corpo_json, status_http); não depende do request atual.
+    `contexto` (ContextoLote) compartilha frete/preços/impostos entre linhas de um lote.
+    """
+    if _motor_local_habilitado():
+        try:
+            with request_timing.fase("upstream", "motor local"):
+                n8n_json = simular_local(payload, contexto)
+        except PricingError as e:
+            return {"status": "error", "message": str(e)}, 422
+    else:
+        n8n_json, erro = _chamar_motor_n8n(_destino_canonico(payload))
+        if erro:
+            return erro
+
+    # Uma passada só pela resposta: cenários tipados + insumos do laudo
+    with request_timing.fase("normalizar"):
+        resposta = normalizar_resposta(n8n_json)
+
+    # 👇 AQUI: guarda os insumos do laudo; o HTML só é gerado em /api/laudo/<id>
+    laudo_id = None
+    with request_timing.fase("laudo", "insumos"):
+        insumos = insumos_laudo(resposta)
+        if insumos is not None:
+            laudo_id = laudo_store.store().guardar_insumos(insumos)
+
+    with request_timing.fase("mapear"):
+        simulation_results = _mapear_resultados_simulacao(resposta, laudo_id)
+
+    if not simulation_results:
+        structured_log.evento("simulacao.sem_cenarios", "warning", resposta=n8n_json)
+        return {
+            "status": "error",
+            "message": "Resposta do motor de simulação não contém cenários válidos.",
+            "raw": n8n_json
+        }, 502
+
+    structured_log.evento("simulacao.cenarios", amostrar=True, cenarios=simulation_results)
+    return simulation_results, 200
+
+
+def _motor_atual() -> str:
+    return "local" if _motor_local_habilitado() else "n8n"
+
+
+# Simulações idênticas em andamento neste processo viram uma execução só
+_SIMULACOES_EM_VOO = SingleFlight()
+
+
+def _simular_com_cache(payload, contexto=None):
+    """
+    `_executar_simulacao` com o cache de resultados e o single-flight na frente.
+    Devolve (corpo_json, status_http, hit_no_cache).
+    """
+    chave = result_cache.chave_cache(payload, _motor_atual())
+    cache = result_cache.cache()
+    if cache is not None:
+        body = cache.obter(chave)
+        if body is not None:
+            return body, 200, True
+
+    def _executar():
+        body, status = _executar_simulacao(payload, contexto)
+        if status == 200 and cache is not None:
+            cache.guardar(chave, body)
+        return body, status
+
+    (body, status), compartilhada = _SIMULACOES_EM_VOO.executar(chave, _executar)
+    if compartilhada:
+        structured_log.evento("simulacao.single_flight", amostrar=True)
+    return body, status, False
+
+
+def _dono_sessao():
+    user = session.get("user") or {}
+    if isinstance(user, dict):
+        return user.get("user_id") or user.get("email")
+    return user
+
+
+def _com_idempotencia(escopo, payload, funcao):
+    """
+    Aplica o header Idempotency-Key (se enviado) a `funcao()` -> (corpo, status).
+    Devolve (corpo, status, repetida).
+    """
+    chave = (request.headers.get("Idempotency-Key") or "").strip()
+    store = idempotency.store()
+    if not chave or store is None:
+        body, status = funcao()
+        return body, status, False
+
+    if len(chave) > 255:
+        return {"status": "error", "message": "Idempotency-Key muito longa (máx. 255)."}, 400, False
+
+    chave_completa = f"{escopo}|{_dono_sessao()}|{chave}"
+    impressao = result_cache.chave_simulacao(payload)
+    try:
+        (body, status), repetida = store.executar(chave_completa, impressao, funcao)
+    except IdempotencyConflict as e:
+        return {"status": "error", "message": str(e)}, 422, False
+    return body, status, repetida
+
+
+@main_bp.route("/api/simular", methods=["POST"])
+@login_required
+@admission.limitar("simular")
+def api_simular():
+    try:
+        payload = request.get_json(silent=True) or {}
+        structured_log.evento("simulacao.payload", amostrar=True, payload=payload)
+
+        info = {"hit": False}
+
+        def _rodar():
+            body, status, info["hit"] = _simular_com_cache(payload)
+            return body, status
+
+        with request_timing.medir("simular") as cronometro:
+            body, status, repetida = _com_idempotencia("simular", payload, _rodar)
+            with request_timing.fase("encode"):
+                # v2 (Accept/?v=2): laudo uma vez só, cenários compactos, gzip/br
+                if simulation_response.quer_v2():
+                    resp = simulation_response.resposta(body, status)
+                else:
+                    resp = jsonify(body)
+        resp.headers["Server-Timing"] = cronometro.server_timing()
+        resp.headers["X-Cache"] = "HIT" if info["hit"] else "MISS"
+        if status == 503:
+            resp.headers["Retry-After"] = str(http_client.RETRY_AFTER_POOL)
+        if repetida:
+            resp.headers["Idempotent-Replayed"] = "true"
+        return resp, status
 
     except Exception as e:
-        print(f"[SIMULACAO] Erro inesperado: {e}")
+        structured_log.evento("simulacao.erro", "error", exc=e)
         return jsonify({
             "status": "error",
             "message": f"Erro interno na simulação: {str(e)}"
         }), 500
 
 
+@main_bp.route("/api/simular/lote", methods=["POST"])
+@login_required
+@admission.limitar("lote")
+def api_simular_lote():
+    """
+    Cotação em lote: array JSON ou CSV com vários payloads do /api/simular.
+    Responde em NDJSON, uma linha por item assim que fica pronto (fora de ordem;
+    use "linha" para casar com a entrada) e uma linha final com o resumo.
+    """
+    try:
+        itens = batch_quote.ler_lote(request)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    max_linhas = current_app.config.get("SIM_LOTE_MAX_LINHAS", 500)
+    if not itens:
+        return jsonify({"status": "error", "message": "Lote vazio."}), 400
+    if len(itens) > max_linhas:
+        return jsonify({
+            "status": "error",
+            "message": f"Lote com {len(itens)} itens; o máximo é {max_linhas}."
+        }), 413
+
+    app = current_app._get_current_object()
+    workers = current_app.config.get("SIM_LOTE_WORKERS", 4)
+    contexto = ContextoLote() if _motor_local_habilitado() else None
+    structured_log.evento("simulacao_lote.inicio", itens=len(itens), workers=workers)
+
+    def _rodar(payload):
+        with app.app_context():
+            return _simular_com_cache(payload, contexto)
+
+    def _linha(obj):
+        return json.dumps(obj, ensure_ascii=False, default=str) + "\n"
+
+    def gerar():
+        inicio = time.perf_counter()
+        sucesso = erros = 0
+        for indice, resultado, erro in batch_quote.executar_em_pool(itens, _rodar, workers):
+            item = itens[indice]
+            base = {"linha": indice + 1}
+            if item.get("ref") not in (None, ""):
+                base["ref"] = item.get("ref")
+
+            if erro is not None:
+                structured_log.evento("simulacao_lote.erro_linha", "error", linha=indice + 1, exc=erro)
+                erros += 1
+                yield _linha({**base, "status": "error", "http_status": 500,
+                              "message": f"Erro interno na simulação: {str(erro)}"})
+                continue
+
+            body, status, hit = resultado
+            if status == 200:
+                sucesso += 1
+                yield _linha({**base, "status": "success", "cache": hit, "cenarios": body})
+            else:
+                erros += 1
+                yield _linha({**base, "status": "error", "http_status": status,
+                              "message": (body or {}).get("message", "Falha na simulação.")})
+
+        yield _linha({
+            "status": "fim",
+            "total": len(itens),
+            "sucesso": sucesso,
+            "erros": erros,
+            "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        })
+
+    return Response(
+        stream_with_context(gerar()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ============================================================
+# Grade what-if (margem x custo fixo x preço net x refinaria)
+# ============================================================
+@main_bp.route("/api/simular/grid", methods=["POST"])
+@login_required
+@admission.limitar("simular")
+def api_simular_grid():
+    """
+    Grade what-if sobre uma cotação base: o mesmo payload do /api/simular mais
+    "grade": {"margem": ..., "custo_fixo": ..., "preco_net": ...}, cada eixo
+    como lista de valores ou {"min", "max", "passo"}. Frete e alíquotas vêm da
+    cotação base; a resposta é colunar para os sliders da tela de precificação.
+    """
+    if not db_disponivel():
+        return jsonify({
+            "status": "error",
+            "message": "Grade indisponível: banco de preços/frete não configurado."
+        }), 503
+
+    payload = request.get_json(silent=True) or {}
+    eixos = payload.get("grade") or {}
+    if not isinstance(eixos, dict):
+        return jsonify({"status": "error", "message": "'grade' deve ser um objeto."}), 400
+
+    inicio = time.perf_counter()
+    try:
+        grade = simular_grade(
+            payload, eixos, current_app.config.get("SIM_GRID_MAX_CELULAS", 60000)
+        )
+    except PricingError as e:
+        return jsonify({"status": "error", "message": str(e)}), 422
+    except Exception as e:
+        structured_log.evento("simulacao_grid.erro", "error", exc=e)
+        return jsonify({
+            "status": "error",
+            "message": f"Erro interno na grade: {str(e)}"
+        }), 500
+
+    structured_log.evento(
+        "simulacao_grid.concluida", amostrar=True,
+        forma=grade["forma"], ms=round((time.perf_counter() - inicio) * 1000, 1),
+    )
+    return jsonify(grade)
+
+
+# ============================================================
+# Jobs assíncronos: POST devolve o id, resultado por polling ou SSE
+# ============================================================
+def _resposta_job(job):
+    return {
+        **job.to_dict(com_resultado=False),
+        "poll_url": f"/api/simular/jobs/{job.id}",
+        "stream_url": f"/api/simular/jobs/{job.id}/stream",
+    }
+
+
+@main_bp.route("/api/simular/jobs", methods=["POST"])
+@login_required
+def api_simular_job_criar():
+    payload = request.get_json(silent=True) or {}
+    structured_log.evento("simulacao_job.payload", amostrar=True, payload=payload)
+
+    app = current_app._get_current_object()
+
+    def _rodar():
+        with app.app_context():
+            body, status, _ = _simular_com_cache(payload)
+            return body, status
+
+    def _criar():
+        job = job_store.store().criar(_dono_sessao(), _rodar)
+        if job is None:
+            return {
+                "status": "error",
+                "message": "Muitas simulações em andamento. Tente novamente em instantes."
+            }, 503
+        return _resposta_job(job), 202
+
+    # Com Idempotency-Key, um POST repetido devolve o mesmo job
+    body, status, repetida = _com_idempotencia("jobs", payload, _criar)
+    resp = jsonify(body)
+    if status == 503:
+        resp.headers["Retry-After"] = "5"
+    if repetida:
+        resp.headers["Idempotent-Replayed"] = "true"
+    return resp, status
+
+
+def _long_poll():
+    return request.args.get("wait", default=0, type=float) > 0
+
+
+@main_bp.route("/api/simular/jobs/<job_id>")
+@login_required
+@admission.limitar("jobs_espera", quando=_long_poll)
+def api_simular_job_status(job_id):
+    store = job_store.store()
+    job = store.obter(job_id, _dono_sessao())
+    if job is None:
+        return jsonify({"status": "error", "message": "Job não encontrado ou expirado."}), 404
+
+    # long-poll opcional: ?wait=20 segura até o status mudar
+    espera = min(request.args.get("wait", default=0, type=float), 30.0)
+    if espera > 0:
+        store.aguardar(job, espera)
+
+    body = job.to_dict()
+    if job.status == job_store.PENDENTE:
+        body["posicao_fila"] = store.posicao_na_fila(job)
+    if simulation_response.quer_v2():
+        if "resultado" in body:
+            body["resultado"] = simulation_response.compactar(body["resultado"])
+        return simulation_response.resposta(body), 200
+    return jsonify(body), 200
+
+
+@main_bp.route("/api/simular/jobs/<job_id>/stream")
+@login_required
+@admission.limitar("jobs_espera")
+def api_simular_job_stream(job_id):
+    store = job_store.store()
+    job = store.obter(job_id, _dono_sessao())
+    if job is None:
+        return jsonify({"status": "error", "message": "Job não encontrado ou expirado."}), 404
+
+    limite = current_app.config.get("SIM_JOBS_SSE_MAX", 55)
+    # EventSource não manda headers: o v2 vem por ?v=2 (sem compressão no stream)
+    v2 = simulation_response.quer_v2()
+
+    def _resultado():
+        body = job.to_dict()
+        if v2 and "resultado" in body:
+            body["resultado"] = simulation_response.compactar(body["resultado"])
+        return body
+
+    def _evento(nome, dados):
+        return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
+
+    def gerar():
+        inicio = time.monotonic()
+        yield "retry: 2000\n\n"
+        ultimo = None
+        while True:
+            if job.status != ultimo:
+                ultimo = job.status
+                if ultimo in job_store.FINAIS:
+                    yield _evento("resultado", _resultado())
+                    return
+                yield _evento("status", {
+                    **job.to_dict(com_resultado=False),
+                    "posicao_fila": store.posicao_na_fila(job),
+                })
+            restante = limite - (time.monotonic() - inicio)
+            if restante <= 0:
+                # fecha; o EventSource reconecta sozinho depois do "retry"
+                return
+            store.aguardar(job, min(15.0, restante))
+            if job.status == ultimo:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(gerar()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@main_bp.route("/api/simular/jobs/metricas")
+@login_required
+def api_simular_jobs_metricas():
+    """Profundidade da fila, jobs em execução e tempos de espera/execução."""
+    return jsonify(job_store.store().metricas()), 200
+
+
+@main_bp.route("/api/laudo/<laudo_id>")
+@login_required
+def api_laudo(laudo_id):
+    """HTML do laudo de uma simulação, renderizado sob demanda (LRU em memória)."""
+    store = laudo_store.store()
+    with request_timing.medir("laudo") as cronometro:
+        html = store.obter_html(laudo_id)
+        if html is None:
+            insumos = store.obter_insumos(laudo_id)
+            if insumos is None:
+                return jsonify({
+                    "status": "error",
+                    "message": "Laudo não encontrado ou expirado. Refaça a simulação."
+                }), 404
+            with request_timing.fase("laudo", "render"):
+                html = renderizar_laudo(insumos)
+            store.guardar_html(laudo_id, html)
+
+    resp = Response(html, mimetype="text/html")
+    resp.headers["Server-Timing"] = cronometro.server_timing()
+    resp.headers["Cache-Control"] = "private, max-age=3600"
+    return resp
+
+
+@main_bp.route("/api/simular/cache")
+@login_required
+def api_simular_cache():
+    """Contadores do cache de resultados, do single-flight e do Idempotency-Key."""
+    cache = result_cache.cache()
+    idem = idempotency.store()
+    body = {"habilitado": False} if cache is None else {"habilitado": True, **cache.stats()}
+    body["single_flight"] = _SIMULACOES_EM_VOO.stats()
+    body["laudos"] = laudo_store.store().stats()
+    body["idempotencia_repeticoes"] = idem.repeticoes if idem is not None else None
+    return jsonify(body), 200
+
+
+@main_bp.route("/api/simular/tempos")
+@login_required
+def api_simular_tempos():
+    """Histogramas por fase (upstream, decode, laudo, mapear, encode, n8n-*) de cada rota."""
+    return jsonify(request_timing.metricas()), 200
+
+
+@main_bp.route("/api/http/metricas")
+@login_required
+def api_http_metricas():
+    """Latência (histograma), status e retries das chamadas de saída por alvo."""
+    return jsonify(http_client.metricas()), 200
+
+
+@main_bp.route("/api/admissao/metricas")
+@login_required
+def api_admissao_metricas():
+    """Execuções em andamento, fila, recusas (429) e tempo de espera por classe de endpoint."""
+    return jsonify(admission.metricas()), 200
+
+
+@main_bp.route("/api/impostos/versao")
+@login_required
+def api_impostos_versao():
+    """Versão das tabelas de ICMS/PIS/COFINS carregadas neste processo."""
+    return jsonify(tax_cache.versao()), 200
+
+
+@main_bp.route("/api/cotacao/instantanea")
+@login_required
+def api_cotacao_instantanea():
+    """
+    Cotação na hora a partir da superfície de preços (job noturno):
+    ?produto=&cidade=&uf= e, opcionais, &margem=&custo_fixo=.
+    """
+    if price_surface.superficie_atual() is None:
+        return jsonify({
+            "status": "error",
+            "message": "Superfície de preços ainda não gerada (flask superficie-precos)."
+        }), 503
+
+    args = request.args
+    try:
+        margem = float(args["margem"].replace(",", ".")) if args.get("margem") else None
+        custo_fixo = float(args["custo_fixo"].replace(",", ".")) if args.get("custo_fixo") else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "margem/custo_fixo inválidos."}), 400
+
+    cotacao = price_surface.cotar(
+        args.get("produto", ""), args.get("cidade", ""), args.get("uf", ""), margem, custo_fixo
+    )
+    if cotacao is None:
+        return jsonify({
+            "status": "error",
+            "message": "Produto ou cidade fora da superfície de preços."
+        }), 404
+    return jsonify({"status": "success", **cotacao}), 200
+
+
+@main_bp.route("/api/cotacao/superficie")
+@login_required
+def api_cotacao_superficie():
+    """Resumo da superfície em uso (produtos, cidades, última execução)."""
+    resumo = price_surface.resumo()
+    if resumo is None:
+        return jsonify({"status": "error", "message": "Superfície de preços ainda não gerada."}), 404
+    return jsonify(resumo), 200
+
+
+@main_bp.route("/api/cidades")
+@login_required
+def api_cidades():
+    """
+    Autocomplete de cidades a partir do índice em memória (cap_cidades):
+    ?uf=SP&q=camp (sem acento/caixa). Sem `q`, devolve a UF inteira.
+    """
+    indice = city_index.indice_atual()
+    if indice is None:
+        return jsonify({
+            "status": "error",
+            "message": "Índice de cidades indisponível (verifique DATABASE_URL)."
+        }), 503
+
+    uf = (request.args.get("uf") or "").strip().upper()
+    q = request.args.get("q") or ""
+    if not uf and not q.strip():
+        return jsonify({"status": "error", "message": "Informe 'uf' e/ou 'q'."}), 400
+    try:
+        limite = int(request.args.get("limite") or 20)
+    except ValueError:
+        return jsonify({"status": "error", "message": "limite inválido."}), 400
+
+    cidades = indice.buscar(uf, q, limite)
+    resp = jsonify({"status": "success", "uf": uf, "q": q, "cidades": cidades})
+    # a resposta só muda com o conteúdo do índice: a assinatura é a mesma em todos os workers
+    resp.set_etag(f"cidades-{indice.assinatura}-{uf}-{city_index.normalizar_cidade(q)}-{limite}")
+    resp.headers["Cache-Control"] = "private, max-age=3600"
+    return resp.make_conditional(request)
+
+
 # ============================================================
 # API de chat
 # ============================================================
 @main_bp.route("/api/chat", methods=["POST"])
 @login_required
+@admission.limitar("chat", corpo=lambda mensagem: {"reply": mensagem})
 def api_chat():
     try:
         data = request.get_json(silent=True) or {}
@@ -419,44 +806,124 @@ def api_chat():
         }
 
         try:
-            n8n_response = requests.post(
+            n8n_response = http_client.cliente().post(
                 N8N_CHAT_WEBHOOK_URL,
+                alvo="n8n-chat",
                 json=payload_para_n8n,
-                timeout=30,
+                read_timeout=30,
             )
+        except http_client.PoolEsgotado:
+            structured_log.evento("chat.n8n_pool_esgotado", "warning")
+            resp = jsonify({"reply": "Servidor ocupado. Tente novamente em alguns segundos."})
+            resp.headers["Retry-After"] = str(http_client.RETRY_AFTER_POOL)
+            return resp, 503
         except requests.exceptions.Timeout:
             return jsonify({
                 "reply": "Desculpe, o assistente demorou muito para responder."
             }), 504
         except requests.exceptions.RequestException as e:
-            print(f"[CHAT] Erro de requisição ao n8n: {e}")
+            structured_log.evento("chat.n8n_falha", "error", exc=e)
             return jsonify({
                 "reply": "Falha ao conectar com o assistente."
             }), 502
 
         status_code = n8n_response.status_code
         raw_body = n8n_response.text or ""
-        print(f"[CHAT] HTTP {status_code} do n8n. Corpo (primeiros 500 chars): {raw_body[:500]}")
+        structured_log.evento("chat.n8n_resposta", amostrar=True, http_status=status_code, corpo=raw_body)
 
         if not n8n_response.ok:
             return jsonify({"reply": "Erro ao falar com o assistente."}), 502
 
         reply_message = raw_body
         try:
-            n8n_json = n8n_response.json()
-            if isinstance(n8n_json, dict) and "output" in n8n_json:
-                reply_message = n8n_json["output"]
-            elif isinstance(n8n_json, dict) and "reply" in n8n_json:
-                reply_message = n8n_json["reply"]
-            elif isinstance(n8n_json, str):
-                reply_message = n8n_json
+            reply_message = chat_stream.extrair_resposta(n8n_response.json(), raw_body)
         except json.JSONDecodeError:
             pass
 
         return jsonify({"reply": reply_message}), 200
 
     except Exception as e:
-        print(f"[CHAT] Erro inesperado: {e}")
+        structured_log.evento("chat.erro", "error", exc=e)
         return jsonify({
             "reply": f"Ocorreu um erro interno: {str(e)}"
         }), 500
+
+
+@main_bp.route("/api/chat/stream", methods=["POST"])
+@login_required
+@admission.limitar("chat_stream", corpo=lambda mensagem: {"reply": mensagem})
+def api_chat_stream():
+    """
+    Mesmo contrato do /api/chat, mas a resposta sai em SSE à medida que o
+    n8n gera o texto (eventos delta/fim/erro; ver services/chat_stream.py).
+    Erros antes do stream começar continuam em JSON ({"reply": ...}).
+    No Docker quem atende é o relay em aiohttp (services/chat_relay.py), na
+    frente do gunicorn; esta rota vale para o `python run.py`.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = data.get("message")
+    session_id = data.get("session_id", "default_web_session")
+
+    if not user_message:
+        return jsonify({"reply": "Mensagem está vazia."}), 400
+
+    config = current_app.config
+    try:
+        # pool próprio: o stream segura a conexão pela resposta inteira
+        n8n_response = http_client.cliente("chat_stream").post(
+            N8N_CHAT_WEBHOOK_URL,
+            alvo="n8n-chat-stream",
+            json={"message": user_message, "session_id": session_id},
+            headers={"Accept": "text/event-stream, application/x-ndjson, application/json"},
+            # timeout de leitura por pedaço, não para a resposta inteira
+            read_timeout=config.get("CHAT_STREAM_IDLE_TIMEOUT", 30),
+            stream=True,
+        )
+    except http_client.PoolEsgotado:
+        structured_log.evento("chat.n8n_pool_esgotado", "warning")
+        resp = jsonify({"reply": "Servidor ocupado. Tente novamente em alguns segundos."})
+        resp.headers["Retry-After"] = str(http_client.RETRY_AFTER_POOL)
+        return resp, 503
+    except requests.exceptions.Timeout:
+        return jsonify({"reply": "Desculpe, o assistente demorou muito para responder."}), 504
+    except requests.exceptions.RequestException as e:
+        structured_log.evento("chat.n8n_falha", "error", exc=e)
+        return jsonify({"reply": "Falha ao conectar com o assistente."}), 502
+
+    if not n8n_response.ok:
+        structured_log.evento("chat.n8n_resposta", "warning", http_status=n8n_response.status_code,
+                              corpo=n8n_response.text)
+        n8n_response.close()
+        return jsonify({"reply": "Erro ao falar com o assistente."}), 502
+
+    max_s = config.get("CHAT_STREAM_MAX_S", 300)
+
+    def gerar():
+        inicio = time.perf_counter()
+        primeiro_ms = None
+        partes = []
+        try:
+            for pedaco in chat_stream.fragmentos(n8n_response, max_s):
+                if primeiro_ms is None:
+                    primeiro_ms = round((time.perf_counter() - inicio) * 1000, 1)
+                partes.append(pedaco)
+                yield chat_stream.evento_sse("delta", {"texto": pedaco})
+            yield chat_stream.evento_sse("fim", {"reply": "".join(partes)})
+        except requests.exceptions.Timeout:
+            yield chat_stream.evento_sse("erro", {"reply": "Desculpe, o assistente demorou muito para responder."})
+        except (requests.exceptions.RequestException, chat_stream.ChatStreamError) as e:
+            structured_log.evento("chat.stream_falha", "error", exc=e)
+            yield chat_stream.evento_sse("erro", {"reply": "A resposta do assistente foi interrompida."})
+        finally:
+            # cliente desconectou ou o stream terminou: devolve a conexão ao pool
+            n8n_response.close()
+            structured_log.evento(
+                "chat.stream", amostrar=True, fragmentos=len(partes), primeiro_ms=primeiro_ms,
+                total_ms=round((time.perf_counter() - inicio) * 1000, 1), resposta="".join(partes),
+            )
+
+    return Response(
+        stream_with_context(gerar()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
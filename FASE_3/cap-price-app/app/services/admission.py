@@ -0,0 +1,305 @@
+# app/services/admission.py
+"""
+Controle de admissão dos endpoints caros.
+
+O gunicorn roda com poucas threads (--threads 16). Um usuário que dispara
+várias simulações ou chats seguidos ocupava todas elas, e os outros usuários
+recebiam 504. Cada classe de endpoint tem agora:
+
+    global       requisições executando ao mesmo tempo neste processo
+    por_usuario  requisições executando ao mesmo tempo por usuário
+    fila         quantas podem esperar por uma vaga (em ordem de chegada)
+    espera_s     quanto tempo esperam antes de desistir
+
+Sem vaga, a requisição entra na fila se houver lugar (e se o usuário não tiver
+já `por_usuario` requisições esperando); senão sai na hora com 429 e
+Retry-After. Quem espera mais que `espera_s` também sai com 429. A espera
+ocupa a thread do worker, por isso a fila é curta: `global` + `fila` de todas
+as classes deve ficar abaixo do --threads, sobrando thread para as páginas e
+o polling dos jobs.
+
+Classes:
+
+    simular      /api/simular e /api/simular/grid
+    lote         /api/simular/lote (NDJSON; a vaga vale até o último item)
+    chat         /api/chat
+    chat_stream  /api/chat/stream (SSE; a vaga vale até o stream fechar)
+    jobs_espera  /api/simular/jobs/<id>/stream (SSE) e o long-poll ?wait= de
+                 /api/simular/jobs/<id>: conexões paradas esperando o job
+
+Respostas em streaming seguram a vaga até o fim do stream, por isso o chat em
+SSE tem classe própria: uma conversa longa não tira a vaga do /api/chat, e o
+limite dela é o de streams abertos ao mesmo tempo (cada um ocupa uma thread).
+No Docker o /api/chat/stream nem chega ao gunicorn: o relay em aiohttp
+(services/chat_relay.py) atende no event loop, com limites próprios.
+O POST /api/simular/jobs fica de fora: só enfileira e responde 202 na hora, e
+a execução roda no pool do job_store (SIM_JOBS_WORKERS threads, fila até
+SIM_JOBS_MAX, 503 com Retry-After quando cheia), fora das threads do gunicorn.
+Quem espera o resultado é que segura thread (até SIM_JOBS_SSE_MAX no SSE, 30 s
+no long-poll), por isso jobs_espera; a consulta sem ?wait= responde na hora e
+não passa pela admissão.
+
+Profundidade da fila, recusas e tempos de espera em GET /api/admissao/metricas.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+from flask import jsonify, make_response, request, session
+
+from app.services import structured_log
+
+CLASSES = ("simular", "lote", "chat", "chat_stream", "jobs_espera")
+
+# motivos de recusa (chaves de "recusados" nas métricas)
+FILA_CHEIA = "fila_cheia"
+LIMITE_USUARIO = "limite_usuario"
+TIMEOUT = "timeout"
+
+RETRY_AFTER_MAX = 60
+
+
+class AdmissaoRecusada(Exception):
+    def __init__(self, motivo: str, retry_after: int):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = retry_after
+
+
+def _percentis(amostras) -> Dict[str, Optional[float]]:
+    if not amostras:
+        return {"p50": None, "p95": None, "max": None}
+    ordenadas = sorted(amostras)
+    n = len(ordenadas)
+    return {
+        "p50": round(ordenadas[int(0.50 * (n - 1))], 1),
+        "p95": round(ordenadas[int(0.95 * (n - 1))], 1),
+        "max": round(ordenadas[-1], 1),
+    }
+
+
+class _Espera:
+    __slots__ = ("usuario", "inicio")
+
+    def __init__(self, usuario: str):
+        self.usuario = usuario
+        self.inicio = time.monotonic()
+
+
+class Ficha:
+    """Vaga concedida; `liberar` pode ser chamado mais de uma vez."""
+
+    def __init__(self, controle: "Controle", usuario: str):
+        self._controle = controle
+        self.usuario = usuario
+        self.inicio = time.monotonic()
+        self._liberada = False
+
+    def liberar(self) -> None:
+        if not self._liberada:
+            self._liberada = True
+            self._controle._liberar(self)
+
+
+class Controle:
+    def __init__(self, nome: str, global_: int, por_usuario: int, fila: int, espera_s: float):
+        self.nome = nome
+        self.global_ = max(0, global_)
+        self.por_usuario = max(0, por_usuario)
+        self.fila_max = max(0, fila)
+        self.espera_s = max(0.0, espera_s)
+        self._cond = threading.Condition()
+        self._em_execucao = 0
+        self._por_usuario: Dict[str, int] = {}
+        self._fila: "deque[_Espera]" = deque()  # em ordem de chegada
+        self._espera_ms = deque(maxlen=500)
+        self._execucao_media_s: Optional[float] = None
+        self.admitidos = 0
+        self.admitidos_apos_espera = 0
+        self.fila_pico = 0
+        self.recusados = {FILA_CHEIA: 0, LIMITE_USUARIO: 0, TIMEOUT: 0}
+
+    @property
+    def habilitado(self) -> bool:
+        return self.global_ > 0
+
+    # ---------- admissão ----------
+    def _cabe(self, usuario: str) -> bool:
+        if self._em_execucao >= self.global_:
+            return False
+        return not self.por_usuario or self._por_usuario.get(usuario, 0) < self.por_usuario
+
+    def _minha_vez(self, posicao: int, usuario: str) -> bool:
+        # FIFO, mas quem está barrado só pelo limite do próprio usuário não segura os outros
+        if not self._cabe(usuario):
+            return False
+        return not any(self._cabe(e.usuario) for e in list(self._fila)[:posicao])
+
+    def _retry_after(self) -> int:
+        media = self._execucao_media_s or 1.0
+        estimativa = media * (len(self._fila) + 1) / max(1, self.global_)
+        return max(1, min(RETRY_AFTER_MAX, math.ceil(estimativa)))
+
+    def _recusar(self, motivo: str) -> AdmissaoRecusada:
+        self.recusados[motivo] += 1
+        return AdmissaoRecusada(motivo, self._retry_after())
+
+    def entrar(self, usuario: str) -> Ficha:
+        """Ficha com a vaga, esperando na fila se preciso; AdmissaoRecusada se não der."""
+        with self._cond:
+            if self._minha_vez(len(self._fila), usuario):
+                self._espera_ms.append(0.0)
+                return self._admitir(usuario)
+
+            barrado = bool(self.por_usuario) and self._por_usuario.get(usuario, 0) >= self.por_usuario
+            if len(self._fila) >= self.fila_max or not self.espera_s:
+                raise self._recusar(LIMITE_USUARIO if barrado else FILA_CHEIA)
+            if self.por_usuario and sum(1 for e in self._fila if e.usuario == usuario) >= self.por_usuario:
+                raise self._recusar(LIMITE_USUARIO)
+
+            espera = _Espera(usuario)
+            self._fila.append(espera)
+            self.fila_pico = max(self.fila_pico, len(self._fila))
+            try:
+                admitido = self._cond.wait_for(
+                    lambda: self._minha_vez(self._fila.index(espera), usuario),
+                    timeout=self.espera_s,
+                )
+            finally:
+                self._fila.remove(espera)
+                # a saída da fila pode liberar a vez de quem está atrás
+                self._cond.notify_all()
+            self._espera_ms.append((time.monotonic() - espera.inicio) * 1000)
+            if not admitido:
+                raise self._recusar(TIMEOUT)
+            self.admitidos_apos_espera += 1
+            return self._admitir(usuario)
+
+    def _admitir(self, usuario: str) -> Ficha:
+        self._em_execucao += 1
+        self._por_usuario[usuario] = self._por_usuario.get(usuario, 0) + 1
+        self.admitidos += 1
+        return Ficha(self, usuario)
+
+    def _liberar(self, ficha: Ficha) -> None:
+        duracao = time.monotonic() - ficha.inicio
+        with self._cond:
+            self._em_execucao -= 1
+            restantes = self._por_usuario.get(ficha.usuario, 1) - 1
+            if restantes > 0:
+                self._por_usuario[ficha.usuario] = restantes
+            else:
+                self._por_usuario.pop(ficha.usuario, None)
+            media = self._execucao_media_s
+            self._execucao_media_s = duracao if media is None else 0.8 * media + 0.2 * duracao
+            self._cond.notify_all()
+
+    # ---------- métricas ----------
+    def metricas(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "habilitado": self.habilitado,
+                "limites": {
+                    "global": self.global_,
+                    "por_usuario": self.por_usuario,
+                    "fila": self.fila_max,
+                    "espera_s": self.espera_s,
+                },
+                "em_execucao": self._em_execucao,
+                "usuarios_ativos": len(self._por_usuario),
+                "na_fila": len(self._fila),
+                "fila_pico": self.fila_pico,
+                "admitidos": self.admitidos,
+                "admitidos_apos_espera": self.admitidos_apos_espera,
+                "recusados": dict(self.recusados),
+                "espera_ms": _percentis(self._espera_ms),
+                "execucao_media_s": (
+                    round(self._execucao_media_s, 3) if self._execucao_media_s is not None else None
+                ),
+            }
+
+
+_CONTROLES: Dict[str, Controle] = {}
+
+
+def controle(nome: str) -> Optional[Controle]:
+    return _CONTROLES.get(nome)
+
+
+def _usuario() -> str:
+    user = session.get("user") or {}
+    return str(user.get("user_id") or user.get("email") or request.remote_addr or "anonimo")
+
+
+def _corpo_padrao(mensagem: str) -> Dict[str, Any]:
+    return {"status": "error", "message": mensagem}
+
+
+def limitar(nome: str, corpo: Callable[[str], Dict[str, Any]] = _corpo_padrao,
+            quando: Optional[Callable[[], bool]] = None):
+    """
+    Decorator das rotas: admite ou responde 429 com Retry-After. Vem depois do
+    login_required, para a vaga ser contada por usuário. `quando` restringe a
+    admissão às requisições em que devolve True (ex.: só o long-poll).
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            ctl = _CONTROLES.get(nome)
+            if ctl is None or not ctl.habilitado or (quando is not None and not quando()):
+                return fn(*args, **kwargs)
+            try:
+                ficha = ctl.entrar(_usuario())
+            except AdmissaoRecusada as e:
+                structured_log.evento(
+                    "admissao.recusada", "warning", amostrar=True, classe=nome, motivo=e.motivo,
+                    retry_after=e.retry_after,
+                )
+                mensagem = (
+                    "Você já tem requisições em andamento. Aguarde terminarem."
+                    if e.motivo == LIMITE_USUARIO
+                    else "Servidor ocupado. Tente novamente em alguns segundos."
+                )
+                resp = jsonify(corpo(mensagem))
+                resp.status_code = 429
+                resp.headers["Retry-After"] = str(e.retry_after)
+                return resp
+
+            try:
+                resp = make_response(fn(*args, **kwargs))
+            except BaseException:
+                ficha.liberar()
+                raise
+            if resp.is_streamed:
+                # SSE/NDJSON: a vaga vale até o servidor fechar o stream
+                resp.call_on_close(ficha.liberar)
+            else:
+                ficha.liberar()
+            return resp
+
+        return wrapper
+
+    return decorator
+
+
+def metricas() -> Dict[str, Dict[str, Any]]:
+    return {nome: ctl.metricas() for nome, ctl in _CONTROLES.items()}
+
+
+def init_app(app) -> None:
+    config = app.config
+    espera_s = float(config.get("ADMISSAO_ESPERA_S", 5))
+    for nome in CLASSES:
+        prefixo = f"ADMISSAO_{nome.upper()}"
+        _CONTROLES[nome] = Controle(
+            nome,
+            global_=int(config.get(f"{prefixo}_GLOBAL", 0)),
+            por_usuario=int(config.get(f"{prefixo}_POR_USUARIO", 0)),
+            fila=int(config.get(f"{prefixo}_FILA", 0)),
+            espera_s=espera_s,
+        )
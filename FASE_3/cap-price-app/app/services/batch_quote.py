@@ -0,0 +1,93 @@
+# app/services/batch_quote.py
+"""
+Lote de cotações (/api/simular/lote).
+
+`ler_lote` aceita o corpo como array JSON (ou {"itens": [...]}) ou CSV
+(upload multipart no campo "arquivo" ou corpo text/csv, separador ";" ou ",").
+As colunas do CSV têm os mesmos nomes do payload do /api/simular;
+refinarias_permitidas vem separada por "|".
+
+`executar_em_pool` distribui as linhas num pool de threads limitado e
+devolve cada resultado assim que fica pronto (fora de ordem), mantendo no
+máximo 2× workers linhas em voo para não enfileirar o lote inteiro.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+
+def _linha_csv(row: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {
+        k.strip().lower(): (v or "").strip()
+        for k, v in row.items()
+        if k is not None and not isinstance(v, list)
+    }
+    permitidas = payload.get("refinarias_permitidas")
+    if permitidas:
+        payload["refinarias_permitidas"] = [p.strip() for p in permitidas.split("|") if p.strip()]
+    else:
+        payload.pop("refinarias_permitidas", None)
+    return payload
+
+
+def _ler_csv(texto: str) -> List[Dict[str, Any]]:
+    texto = texto.lstrip("\ufeff")
+    primeira = texto.split("\n", 1)[0]
+    delimitador = ";" if primeira.count(";") >= primeira.count(",") else ","
+    leitor = csv.DictReader(io.StringIO(texto), delimiter=delimitador)
+    return [_linha_csv(row) for row in leitor if any(isinstance(v, str) and v.strip() for v in row.values())]
+
+
+def ler_lote(req) -> List[Dict[str, Any]]:
+    """Extrai a lista de payloads do request. ValueError se o formato for inválido."""
+    arquivo = req.files.get("arquivo")
+    if arquivo is not None:
+        return _ler_csv(arquivo.read().decode("utf-8-sig", errors="replace"))
+
+    if "csv" in (req.mimetype or ""):
+        return _ler_csv(req.get_data(as_text=True))
+
+    try:
+        dados = json.loads(req.get_data(as_text=True) or "null")
+    except json.JSONDecodeError:
+        raise ValueError("Corpo inválido: envie um array JSON ou um CSV.")
+
+    if isinstance(dados, dict):
+        dados = dados.get("itens")
+    if not isinstance(dados, list):
+        raise ValueError("Corpo inválido: envie um array JSON ou um CSV.")
+    if not all(isinstance(item, dict) for item in dados):
+        raise ValueError("Cada item do lote deve ser um objeto JSON.")
+    return dados
+
+
+def executar_em_pool(
+    itens: List[Any],
+    funcao: Callable[[Any], Any],
+    workers: int,
+) -> Iterator[Tuple[int, Any, BaseException]]:
+    """
+    Gera (indice, resultado, erro) na ordem em que terminam.
+    Se o consumidor parar (cliente desconectou), as linhas pendentes são canceladas.
+    """
+    workers = max(1, workers)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lote")
+    pendentes: Dict[Any, int] = {}
+    proximo = 0
+    try:
+        while proximo < len(itens) or pendentes:
+            while proximo < len(itens) and len(pendentes) < workers * 2:
+                pendentes[pool.submit(funcao, itens[proximo])] = proximo
+                proximo += 1
+
+            prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for fut in prontos:
+                indice = pendentes.pop(fut)
+                erro = fut.exception()
+                yield indice, (None if erro else fut.result()), erro
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,349 @@
+# app/services/chat_relay.py
+"""
+Relay do chat em streaming num event loop (aiohttp), na frente do gunicorn.
+
+No gunicorn (gthread) cada /api/chat/stream aberto segurava uma thread
+parada no socket do n8n por até CHAT_STREAM_MAX_S: com --threads 16, meia
+dúzia de conversas já disputava thread com o resto do app. Aqui o processo
+do relay (relay.py) recebe todas as requisições:
+
+    POST /api/chat/stream         atendido no event loop: lê o n8n com o
+                                  aiohttp (sem thread por stream) e repassa
+                                  os eventos SSE de services/chat_stream.py;
+    GET /api/chat/relay/metricas  streams abertos, recusas, tempos;
+    qualquer outra rota           proxy para o gunicorn (CHAT_RELAY_UPSTREAM),
+                                  com a resposta repassada em streaming
+                                  (SSE dos jobs e NDJSON do lote continuam
+                                  saindo pedaço a pedaço).
+
+Mesmo contrato da rota Flask (que continua valendo no `python run.py`):
+eventos delta/fim/erro, erros antes do stream em JSON ({"reply": ...}) com
+400/401/429/502/504. O usuário vem do cookie de sessão do Flask, validado
+com o mesmo SECRET_KEY; as vagas são CHAT_RELAY_MAX_STREAMS no total e
+ADMISSAO_CHAT_STREAM_POR_USUARIO por usuário, e acima delas sai 429 com
+Retry-After. Uma vaga custa um socket e alguns KB, não uma thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+from aiohttp import web
+from flask import Flask
+
+from app.services import chat_stream, structured_log
+
+# cabeçalhos por conexão: não passam pelo proxy (RFC 9110, 7.6.1)
+HOP_BY_HOP = frozenset((
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "transfer-encoding", "upgrade",
+))
+RETRY_AFTER = 5
+
+CHAVE_ESTADO = web.AppKey("estado_relay", dict)
+
+
+# ============================================================
+# Sessão do Flask (mesmo cookie assinado do app)
+# ============================================================
+class LeitorSessao:
+    def __init__(self, config: Dict[str, Any]):
+        flask_app = Flask("chat_relay")
+        flask_app.config.update(config)
+        self._serializador = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.cookie = flask_app.config["SESSION_COOKIE_NAME"]
+        self._max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    def usuario(self, request: web.Request) -> Optional[str]:
+        valor = request.cookies.get(self.cookie)
+        if not valor or self._serializador is None:
+            return None
+        try:
+            dados = self._serializador.loads(valor, max_age=self._max_age)
+        except Exception:
+            return None
+        user = dados.get("user") if isinstance(dados, dict) else None
+        if not user:
+            return None
+        return str(user.get("user_id") or user.get("email") or _ip(request))
+
+
+def _ip(request: web.Request) -> str:
+    # como o ProxyFix(x_for=1) do app: o último salto do X-Forwarded-For
+    encaminhado = request.headers.get("X-Forwarded-For")
+    if encaminhado:
+        return encaminhado.split(",")[-1].strip()
+    return request.remote or "anonimo"
+
+
+# ============================================================
+# Vagas (sem lock: tudo roda no mesmo event loop)
+# ============================================================
+class Vagas:
+    def __init__(self, global_: int, por_usuario: int):
+        self.global_ = global_
+        self.por_usuario = por_usuario
+        self.abertos = 0
+        self.pico = 0
+        self.por_dono: Dict[str, int] = {}
+        self.recusados = {"global": 0, "limite_usuario": 0}
+
+    def entrar(self, usuario: str) -> Optional[str]:
+        """None se admitiu; senão o motivo da recusa."""
+        if self.global_ and self.abertos >= self.global_:
+            self.recusados["global"] += 1
+            return "global"
+        if self.por_usuario and self.por_dono.get(usuario, 0) >= self.por_usuario:
+            self.recusados["limite_usuario"] += 1
+            return "limite_usuario"
+        self.abertos += 1
+        self.pico = max(self.pico, self.abertos)
+        self.por_dono[usuario] = self.por_dono.get(usuario, 0) + 1
+        return None
+
+    def sair(self, usuario: str) -> None:
+        self.abertos -= 1
+        restantes = self.por_dono.get(usuario, 1) - 1
+        if restantes:
+            self.por_dono[usuario] = restantes
+        else:
+            self.por_dono.pop(usuario, None)
+
+
+# ============================================================
+# POST /api/chat/stream
+# ============================================================
+def _json(dados: Dict[str, Any], status: int, **headers: str) -> web.Response:
+    return web.Response(
+        text=json.dumps(dados, ensure_ascii=False), status=status, content_type="application/json",
+        headers=headers,
+    )
+
+
+async def chat_stream_sse(request: web.Request) -> web.StreamResponse:
+    estado = request.app[CHAVE_ESTADO]
+    usuario = estado["sessao"].usuario(request)
+    if usuario is None:
+        return _json({"ok": False, "message": "Não autenticado"}, 401)
+
+    try:
+        data = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        data = None
+    data = data if isinstance(data, dict) else {}
+    user_message = data.get("message")
+    session_id = data.get("session_id", "default_web_session")
+    if not user_message:
+        return _json({"reply": "Mensagem está vazia."}, 400)
+
+    vagas: Vagas = estado["vagas"]
+    motivo = vagas.entrar(usuario)
+    if motivo is not None:
+        structured_log.evento(
+            "admissao.recusada", "warning", amostrar=True, classe="chat_stream", motivo=motivo,
+            retry_after=RETRY_AFTER,
+        )
+        mensagem = (
+            "Você já tem requisições em andamento. Aguarde terminarem."
+            if motivo == "limite_usuario"
+            else "Servidor ocupado. Tente novamente em alguns segundos."
+        )
+        return _json({"reply": mensagem}, 429, **{"Retry-After": str(RETRY_AFTER)})
+
+    try:
+        return await _relay(request, estado, user_message, session_id)
+    finally:
+        vagas.sair(usuario)
+
+
+async def _relay(request: web.Request, estado: Dict[str, Any], user_message: str,
+                 session_id: str) -> web.StreamResponse:
+    config = estado["config"]
+    try:
+        n8n_response = await estado["n8n"].post(
+            estado["webhook_url"],
+            json={"message": user_message, "session_id": session_id},
+            headers={"Accept": "text/event-stream, application/x-ndjson, application/json"},
+        )
+    except asyncio.TimeoutError:
+        return _json({"reply": "Desculpe, o assistente demorou muito para responder."}, 504)
+    except aiohttp.ClientError as e:
+        structured_log.evento("chat.n8n_falha", "error", exc=e)
+        return _json({"reply": "Falha ao conectar com o assistente."}, 502)
+
+    async with n8n_response:
+        if n8n_response.status >= 400:
+            corpo = await n8n_response.text(errors="replace")
+            structured_log.evento("chat.n8n_resposta", "warning", http_status=n8n_response.status,
+                                  corpo=corpo)
+            return _json({"reply": "Erro ao falar com o assistente."}, 502)
+
+        resp = web.StreamResponse(headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        resp.content_type = "text/event-stream"
+        resp.charset = "utf-8"
+        await resp.prepare(request)
+
+        max_s = float(config.get("CHAT_STREAM_MAX_S", 300))
+        decodificador = chat_stream.Decodificador(n8n_response.headers.get("Content-Type") or "")
+        inicio = time.perf_counter()
+        primeiro_ms = None
+        partes = []
+
+        async def _enviar(pedacos):
+            nonlocal primeiro_ms
+            for pedaco in pedacos:
+                if primeiro_ms is None:
+                    primeiro_ms = round((time.perf_counter() - inicio) * 1000, 1)
+                partes.append(pedaco)
+                await resp.write(chat_stream.evento_sse("delta", {"texto": pedaco}).encode("utf-8"))
+            if max_s and time.perf_counter() - inicio > max_s:
+                raise chat_stream.ChatStreamError("resposta do assistente excedeu o tempo máximo")
+
+        final = None
+        try:
+            async for bloco in n8n_response.content.iter_any():
+                await _enviar(decodificador.alimentar(bloco))
+                if decodificador.encerrado:
+                    break
+            await _enviar(decodificador.finalizar())
+            final = chat_stream.evento_sse("fim", {"reply": "".join(partes)})
+        except asyncio.TimeoutError:
+            final = chat_stream.evento_sse("erro", {"reply": "Desculpe, o assistente demorou muito para responder."})
+        except (aiohttp.ClientError, ConnectionResetError, chat_stream.ChatStreamError) as e:
+            if request.transport is None or request.transport.is_closing():
+                # o navegador fechou a conversa: solta o n8n (async with) e a vaga
+                pass
+            else:
+                structured_log.evento("chat.stream_falha", "error", exc=e)
+                final = chat_stream.evento_sse("erro", {"reply": "A resposta do assistente foi interrompida."})
+        finally:
+            estado["concluidos"] += 1
+            structured_log.evento(
+                "chat.stream", amostrar=True, fragmentos=len(partes), primeiro_ms=primeiro_ms,
+                total_ms=round((time.perf_counter() - inicio) * 1000, 1), resposta="".join(partes),
+            )
+
+        if final is not None:
+            try:
+                await resp.write(final.encode("utf-8"))
+                await resp.write_eof()
+            except ConnectionResetError:
+                pass
+        return resp
+
+
+async def metricas(request: web.Request) -> web.Response:
+    estado = request.app[CHAVE_ESTADO]
+    usuario = estado["sessao"].usuario(request)
+    if usuario is None:
+        return _json({"ok": False, "message": "Não autenticado"}, 401)
+    vagas: Vagas = estado["vagas"]
+    return _json({
+        "abertos": vagas.abertos,
+        "pico": vagas.pico,
+        "limite": vagas.global_,
+        "por_usuario": vagas.por_usuario,
+        "concluidos": estado["concluidos"],
+        "recusados": dict(vagas.recusados),
+    }, 200)
+
+
+# ============================================================
+# Proxy para o gunicorn (demais rotas)
+# ============================================================
+async def proxy(request: web.Request) -> web.StreamResponse:
+    estado = request.app[CHAVE_ESTADO]
+    headers = [(k, v) for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP]
+    # o app confia em um salto (ProxyFix x_for=1): o relay é esse salto
+    if "X-Forwarded-For" not in request.headers:
+        headers.append(("X-Forwarded-For", request.remote or ""))
+    if "X-Forwarded-Proto" not in request.headers:
+        headers.append(("X-Forwarded-Proto", request.scheme))
+    if "X-Forwarded-Host" not in request.headers and request.host:
+        headers.append(("X-Forwarded-Host", request.host))
+
+    corpo = await request.read() if request.body_exists else None
+    try:
+        upstream = await estado["gunicorn"].request(
+            request.method, estado["upstream_base"] + request.rel_url.raw_path_qs,
+            headers=headers, data=corpo, allow_redirects=False, auto_decompress=False,
+        )
+    except aiohttp.ClientError as e:
+        structured_log.evento("relay.upstream_falha", "error", exc=e, rota=request.path)
+        return _json({"ok": False, "message": "Serviço indisponível."}, 502)
+
+    async with upstream:
+        resp = web.StreamResponse(status=upstream.status, reason=upstream.reason)
+        for chave, valor in upstream.headers.items():
+            if chave.lower() not in HOP_BY_HOP:
+                resp.headers.add(chave, valor)
+        await resp.prepare(request)
+        try:
+            async for bloco in upstream.content.iter_any():
+                await resp.write(bloco)
+            await resp.write_eof()
+        except (ConnectionResetError, aiohttp.ClientError):
+            # cliente saiu ou o gunicorn caiu no meio: a conexão é descartada
+            pass
+        return resp
+
+
+# ============================================================
+# App
+# ============================================================
+def _conector_upstream(upstream: str):
+    """(conector, URL base) do gunicorn: "unix:/caminho.sock" ou "http://host:porta"."""
+    # conexões sem limite: quem segura requisição demais é a admissão do app,
+    # como se o cliente falasse direto com o gunicorn
+    if upstream.startswith("unix:"):
+        return aiohttp.UnixConnector(path=upstream[len("unix:"):], limit=0), "http://gunicorn"
+    return aiohttp.TCPConnector(limit=0), upstream.rstrip("/")
+
+
+def criar_app(config: Dict[str, Any], upstream: str, webhook_url: str = chat_stream.N8N_CHAT_WEBHOOK_URL,
+              ) -> web.Application:
+    """`config`: o dict do Config do app (SECRET_KEY, CHAT_*, ADMISSAO_CHAT_STREAM_*, HTTP_CONNECT_TIMEOUT)."""
+    app = web.Application(client_max_size=int(config.get("CHAT_RELAY_MAX_CORPO", 32 * 1024 * 1024)))
+    app[CHAVE_ESTADO] = {
+        "config": config,
+        "sessao": LeitorSessao(config),
+        "vagas": Vagas(
+            global_=int(config.get("CHAT_RELAY_MAX_STREAMS", 500)),
+            por_usuario=int(config.get("ADMISSAO_CHAT_STREAM_POR_USUARIO", 2)),
+        ),
+        "webhook_url": webhook_url,
+        "concluidos": 0,
+    }
+
+    async def _sessoes(app: web.Application):
+        estado = app[CHAVE_ESTADO]
+        vagas: Vagas = estado["vagas"]
+        # pool próprio do chat: uma conexão por stream aberto, no máximo
+        estado["n8n"] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=vagas.global_),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=float(config.get("HTTP_CONNECT_TIMEOUT", 5)),
+                # tempo máximo entre dois pedaços, não para a resposta inteira
+                sock_read=float(config.get("CHAT_STREAM_IDLE_TIMEOUT", 30)),
+            ),
+        )
+        conector, estado["upstream_base"] = _conector_upstream(upstream)
+        estado["gunicorn"] = aiohttp.ClientSession(
+            connector=conector,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=float(config.get("HTTP_CONNECT_TIMEOUT", 5))),
+            auto_decompress=False,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        yield
+        await estado["n8n"].close()
+        await estado["gunicorn"].close()
+
+    app.cleanup_ctx.append(_sessoes)
+    app.router.add_post("/api/chat/stream", chat_stream_sse)
+    app.router.add_get("/api/chat/relay/metricas", metricas)
+    app.router.add_route("*", "/{caminho:.*}", proxy)
+    return app
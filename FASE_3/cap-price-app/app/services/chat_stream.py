@@ -0,0 +1,257 @@
+# app/services/chat_stream.py
+"""
+Relay do chat do n8n em streaming (POST /api/chat/stream).
+
+O /api/chat espera o workflow terminar (até 30 s) e só então devolve a
+resposta inteira. Aqui a resposta do n8n é lida em streaming e cada pedaço
+de texto sai para o navegador como evento SSE assim que chega:
+
+    event: delta   data: {"texto": "..."}
+    event: fim     data: {"reply": "<resposta completa>"}
+    event: erro    data: {"reply": "<mensagem>"}
+
+Formatos aceitos do upstream (pelo Content-Type e pelo conteúdo):
+
+    - JSON por linha do webhook do n8n em modo streaming:
+      {"type": "begin"|"item"|"end"|"error", "content": "..."};
+    - SSE (linhas "data: ..."; "[DONE]" encerra);
+    - text/plain (cada pedaço vira um delta);
+    - JSON único do modo antigo ({"output": ...} / {"reply": ...} / string):
+      sai num delta só, no fim.
+
+O timeout de leitura vale por pedaço (CHAT_STREAM_IDLE_TIMEOUT), não para a
+resposta inteira; CHAT_STREAM_MAX_S limita a duração total.
+
+A leitura dos formatos fica no Decodificador (bytes entram, pedaços de
+texto saem), usado pelos dois relays:
+
+    - services/chat_relay.py, em aiohttp, o que atende no Docker: todos os
+      streams no mesmo event loop, sem thread por stream;
+    - a rota Flask (requests stream=True + `fragmentos`), para o
+      `python run.py`: cada stream ocupa uma thread do gunicorn, limitada
+      pela classe de admissão chat_stream.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import os
+import time
+from typing import Any, Iterator, List, Optional
+
+import requests
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+
+N8N_CHAT_WEBHOOK_URL = os.getenv(
+    "N8N_CHAT_WEBHOOK_URL",
+    "https://automacoes-n8n.infrassys.com/webhook/capchat",
+)
+
+TIPOS_N8N = ("begin", "item", "end", "error")
+CHAVES_TEXTO = ("content", "output", "reply", "text", "delta")
+TAMANHO_LEITURA = 4096
+
+
+class ChatStreamError(RuntimeError):
+    """Erro reportado pelo upstream no meio do stream (tipo "error" do n8n)."""
+
+
+def extrair_resposta(n8n_json: Any, padrao: str = "") -> str:
+    """Texto da resposta no formato não-streaming do workflow de chat."""
+    if isinstance(n8n_json, dict) and "output" in n8n_json:
+        return n8n_json["output"]
+    if isinstance(n8n_json, dict) and "reply" in n8n_json:
+        return n8n_json["reply"]
+    if isinstance(n8n_json, str):
+        return n8n_json
+    return padrao
+
+
+def _texto_do_evento(dados: Any) -> Optional[str]:
+    if isinstance(dados, str):
+        return dados
+    if isinstance(dados, dict):
+        for chave in CHAVES_TEXTO:
+            valor = dados.get(chave)
+            if isinstance(valor, str):
+                return valor
+    return None
+
+
+def _blocos(resp: requests.Response) -> Iterator[bytes]:
+    """
+    Bytes do corpo assim que chegam (sem esperar encher um buffer fixo).
+    Timeout entre pedaços sai como requests ReadTimeout; conexão caída, como
+    requests ConnectionError.
+    """
+    raw = resp.raw
+    try:
+        if getattr(raw, "chunked", False) or not hasattr(raw, "read1"):
+            # chunked: um bloco por chunk HTTP, do jeito que o n8n mandou
+            yield from resp.iter_content(chunk_size=None)
+            return
+        while True:
+            bloco = raw.read1(TAMANHO_LEITURA)
+            if not bloco:
+                return
+            yield bloco
+    except requests.exceptions.ConnectionError as e:
+        # o iter_content embrulha o timeout de leitura em ConnectionError
+        if e.args and isinstance(e.args[0], ReadTimeoutError):
+            raise requests.exceptions.ReadTimeout(e) from e
+        raise
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ReadTimeout(e) from e
+    except ProtocolError as e:
+        raise requests.exceptions.ConnectionError(e) from e
+
+
+def _charset(tipo: str) -> str:
+    # sem charset no header o requests assume ISO-8859-1 para text/*; SSE e o n8n são UTF-8
+    for parte in tipo.split(";")[1:]:
+        nome, _, valor = parte.strip().partition("=")
+        if nome.lower() == "charset" and valor:
+            return valor.strip('"')
+    return "utf-8"
+
+
+class Decodificador:
+    """
+    Pedaços de texto a partir dos bytes do upstream, na ordem em que chegam,
+    para qualquer formato aceito. Recebe os blocos por `alimentar` (serve
+    tanto para o requests, síncrono, quanto para o relay em aiohttp);
+    `finalizar` no fim do corpo. `encerrado` fica True no "[DONE]" do SSE:
+    o resto do corpo pode ser ignorado. Erro do upstream sai como ChatStreamError.
+    """
+
+    def __init__(self, content_type: str):
+        tipo = (content_type or "").lower()
+        if "text/event-stream" in tipo:
+            self.formato = "sse"
+        elif tipo.startswith("text/plain"):
+            self.formato = "texto"
+        else:
+            self.formato = "json"
+        try:
+            self._decodificador = codecs.getincrementaldecoder(_charset(tipo))(errors="replace")
+        except LookupError:
+            self._decodificador = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._bruto: List[str] = []
+        self._em_stream = False
+        self.encerrado = False
+
+    def alimentar(self, bloco: bytes) -> List[str]:
+        if self.encerrado:
+            return []
+        return self._texto(self._decodificador.decode(bloco))
+
+    def finalizar(self) -> List[str]:
+        if self.encerrado:
+            return []
+        pedacos = self._texto(self._decodificador.decode(b"", final=True))
+        if self.formato != "json" or self.encerrado:
+            return pedacos
+
+        if self._buffer.strip():
+            pedaco, self._em_stream = _linha_n8n(self._buffer, self._em_stream)
+            if pedaco:
+                pedacos.append(pedaco)
+        self._buffer = ""
+        if self._em_stream:
+            return pedacos
+
+        # modo antigo: um JSON só com a resposta inteira
+        corpo = "".join(self._bruto)
+        try:
+            resposta = extrair_resposta(json.loads(corpo), corpo)
+        except json.JSONDecodeError:
+            resposta = corpo
+        if resposta:
+            pedacos.append(resposta)
+        return pedacos
+
+    def _texto(self, texto: str) -> List[str]:
+        if not texto:
+            return []
+        if self.formato == "texto":
+            return [texto]
+        if self.formato == "sse":
+            return self._de_sse(texto)
+        return self._de_json(texto)
+
+    def _de_sse(self, texto: str) -> List[str]:
+        pedacos = []
+        self._buffer += texto.replace("\r\n", "\n")
+        while "\n\n" in self._buffer:
+            bruto, self._buffer = self._buffer.split("\n\n", 1)
+            dados = "\n".join(
+                linha[5:].lstrip(" ") for linha in bruto.split("\n") if linha.startswith("data:")
+            )
+            if not dados:
+                continue
+            if dados.strip() == "[DONE]":
+                self.encerrado = True
+                break
+            try:
+                evento = json.loads(dados)
+            except json.JSONDecodeError:
+                evento = dados
+            if isinstance(evento, dict) and evento.get("type") == "error":
+                raise ChatStreamError(_texto_do_evento(evento) or "erro no upstream")
+            pedaco = _texto_do_evento(evento)
+            if pedaco:
+                pedacos.append(pedaco)
+        return pedacos
+
+    def _de_json(self, texto: str) -> List[str]:
+        pedacos = []
+        if not self._em_stream:
+            self._bruto.append(texto)
+        self._buffer += texto
+        while "\n" in self._buffer:
+            linha, self._buffer = self._buffer.split("\n", 1)
+            pedaco, self._em_stream = _linha_n8n(linha, self._em_stream)
+            if pedaco:
+                pedacos.append(pedaco)
+        return pedacos
+
+
+def _linha_n8n(linha: str, em_stream: bool):
+    """(texto, em_stream) de uma linha do stream do n8n; linhas de outro formato são ignoradas."""
+    linha = linha.strip()
+    if not linha or linha[0] != "{":
+        return None, em_stream
+    try:
+        evento = json.loads(linha)
+    except json.JSONDecodeError:
+        return None, em_stream
+    if not isinstance(evento, dict) or evento.get("type") not in TIPOS_N8N:
+        return None, em_stream
+    if evento["type"] == "error":
+        raise ChatStreamError(_texto_do_evento(evento) or "erro no upstream")
+    if evento["type"] == "item":
+        return _texto_do_evento(evento), True
+    return None, True
+
+
+def fragmentos(resp: requests.Response, max_s: float = 0) -> Iterator[str]:
+    """Pedaços de texto da resposta do upstream (requests, stream=True), na ordem em que chegam."""
+    decodificador = Decodificador(resp.headers.get("Content-Type") or "")
+    inicio = time.monotonic()
+
+    def _pedacos():
+        for bloco in _blocos(resp):
+            yield from decodificador.alimentar(bloco)
+            if decodificador.encerrado:
+                return
+        yield from decodificador.finalizar()
+
+    for pedaco in _pedacos():
+        yield pedaco
+        if max_s and time.monotonic() - inicio > max_s:
+            raise ChatStreamError("resposta do assistente excedeu o tempo máximo")
+
+
+def evento_sse(nome: str, dados: Any) -> str:
+    return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
@@ -0,0 +1,165 @@
+# app/services/city_index.py
+"""
+Índice em memória das cidades (cap_cidades) para autocomplete e destino.
+
+A tela de precificação buscava a lista de municípios na API pública do IBGE
+a cada troca de UF, e o nó "Consulta Cidade" do n8n resolvia o destino com
+`WHERE nome = ...`: sem filtro de UF e sensível a acento e caixa. Aqui as
+cidades são carregadas uma vez do Postgres e indexadas por nome dobrado
+(sem acento, maiúsculo, espaços simples):
+
+    - uma trie de prefixos por UF (e uma geral, chave ""), em que cada nó
+      já guarda as primeiras cidades em ordem alfabética: o autocomplete
+      custa len(q) passos, não uma varredura;
+    - um dicionário (UF, nome dobrado) -> cidade para resolver o destino
+      antes de qualquer SQL.
+
+Cada cidade leva código IBGE (se a coluna existir na base), lat e lon.
+O índice é recarregado a cada CIDADES_TTL segundos. `assinatura` é o hash
+do conteúdo: igual em todos os workers com os mesmos dados, é a base do
+ETag do /api/cidades (a `versao` é só um contador deste processo).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+
+from app.config import db_disponivel
+from app.services import pricing_data, structured_log
+
+# Cidades guardadas em cada nó da trie (teto do `limite` do autocomplete)
+MAX_POR_NO = 50
+
+_LOCK = threading.Lock()
+_ESTADO: Dict[str, Any] = {"indice": None, "versao": 0, "carregado_em": 0.0}
+
+
+def normalizar_cidade(nome: str) -> str:
+    s = unicodedata.normalize("NFKD", str(nome or ""))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.upper().split())
+
+
+class _No:
+    __slots__ = ("filhos", "ids")
+
+    def __init__(self):
+        self.filhos: Dict[str, "_No"] = {}
+        self.ids: List[int] = []
+
+
+class IndiceCidades:
+    def __init__(self, cidades: List[Dict[str, Any]], versao: int):
+        self.versao = versao
+        # ordem alfabética pelo nome dobrado (o JSON desempata): os ids de cada nó
+        # já saem ordenados, e a ordem não depende da ordem em que o banco devolveu
+        serializadas = [json.dumps(c, sort_keys=True, default=str) for c in cidades]
+        ordem = sorted(
+            range(len(cidades)),
+            key=lambda i: (normalizar_cidade(cidades[i]["nome"]), cidades[i]["uf"], serializadas[i]),
+        )
+        self.cidades = [cidades[i] for i in ordem]
+        self.assinatura = hashlib.sha1(
+            "\n".join(serializadas[i] for i in ordem).encode("utf-8")
+        ).hexdigest()[:16]
+        self._por_uf: Dict[str, List[int]] = {}
+        self._por_nome: Dict[tuple, int] = {}
+        self._raizes: Dict[str, _No] = {}
+
+        for i, cidade in enumerate(self.cidades):
+            dobrado = normalizar_cidade(cidade["nome"])
+            uf = cidade["uf"]
+            self._por_uf.setdefault(uf, []).append(i)
+            self._por_nome.setdefault((uf, dobrado), i)
+            self._por_nome.setdefault(("", dobrado), i)
+            for chave in (uf, ""):
+                no = self._raizes.setdefault(chave, _No())
+                for ch in dobrado:
+                    if len(no.ids) < MAX_POR_NO:
+                        no.ids.append(i)
+                    no = no.filhos.setdefault(ch, _No())
+                if len(no.ids) < MAX_POR_NO:
+                    no.ids.append(i)
+
+    def __len__(self) -> int:
+        return len(self.cidades)
+
+    def buscar(self, uf: str, q: str = "", limite: int = 20) -> List[Dict[str, Any]]:
+        """
+        Cidades da UF (vazia = todas) cujo nome começa com `q`, ignorando
+        acento e caixa. Sem `q`, devolve a UF inteira.
+        """
+        uf = str(uf or "").strip().upper()
+        prefixo = normalizar_cidade(q)
+        if not prefixo:
+            if not uf:
+                return []
+            return [self.cidades[i] for i in self._por_uf.get(uf, [])]
+
+        no = self._raizes.get(uf)
+        for ch in prefixo:
+            if no is None:
+                return []
+            no = no.filhos.get(ch)
+        if no is None:
+            return []
+        return [self.cidades[i] for i in no.ids[:max(1, min(limite, MAX_POR_NO))]]
+
+    def resolver(self, nome: str, uf: str) -> Optional[Dict[str, Any]]:
+        """Cidade exata (sem acento/caixa) na UF informada; sem UF, a primeira com o nome."""
+        i = self._por_nome.get((str(uf or "").strip().upper(), normalizar_cidade(nome)))
+        return None if i is None else self.cidades[i]
+
+
+def _carregar(versao: int) -> IndiceCidades:
+    inicio = time.perf_counter()
+    indice = IndiceCidades(pricing_data.carregar_cidades_indice(), versao)
+    structured_log.evento(
+        "cidades.indice_carregado", cidades=len(indice), versao=versao, assinatura=indice.assinatura,
+        ms=round((time.perf_counter() - inicio) * 1000),
+    )
+    return indice
+
+
+def _expirado(ttl: float) -> bool:
+    return ttl > 0 and time.time() - _ESTADO["carregado_em"] >= ttl
+
+
+def indice_atual() -> Optional[IndiceCidades]:
+    """Índice deste processo (None sem banco ou se a carga falhar)."""
+    ttl = float(current_app.config.get("CIDADES_TTL", 0) or 0)
+    if _ESTADO["indice"] is not None and not _expirado(ttl):
+        return _ESTADO["indice"]
+    if not db_disponivel():
+        return _ESTADO["indice"]
+
+    with _LOCK:
+        # confere de novo com o lock: quem esperou a recarga de outra thread
+        # usa o índice novo em vez de recarregar outra vez
+        if _ESTADO["indice"] is None or _expirado(ttl):
+            try:
+                _ESTADO["indice"] = _carregar(_ESTADO["versao"] + 1)
+                _ESTADO["versao"] += 1
+            except Exception as e:
+                # mantém o índice anterior (se houver); tenta de novo no próximo TTL
+                structured_log.evento("cidades.falha_carga", "error", exc=e)
+            _ESTADO["carregado_em"] = time.time()
+        return _ESTADO["indice"]
+
+
+def resolver(nome: str, uf: str) -> Optional[Dict[str, Any]]:
+    indice = indice_atual()
+    return None if indice is None else indice.resolver(nome, uf)
+
+
+def init_app(app) -> None:
+    if not (app.config.get("DATABASE_URL") or "").strip():
+        return
+    with app.app_context():
+        indice_atual()
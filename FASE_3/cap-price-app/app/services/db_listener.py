@@ -0,0 +1,88 @@
+# app/services/db_listener.py
+"""
+LISTEN/NOTIFY do Postgres para invalidar caches em memória.
+
+Cada cache registra o canal que escuta (`registrar`) no init_app e, no fim
+do create_app, `iniciar(app)` sobe uma thread por processo com uma conexão
+dedicada (fora do pool) em autocommit. Os triggers que disparam os
+pg_notify ficam em db_init/notify_triggers.sql.
+"""
+from __future__ import annotations
+
+import re
+import select
+import threading
+import time
+from typing import Callable, Dict, List
+
+import psycopg2
+import psycopg2.extensions
+
+from app.services import structured_log
+
+_CANAL_VALIDO = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+_CALLBACKS: Dict[str, List[Callable[[str], None]]] = {}
+_ESTADO = {"thread": None}
+
+
+def registrar(canal: str, callback: Callable[[str], None]) -> None:
+    """`callback(payload)` é chamado na thread do listener: mantenha-o barato."""
+    if not _CANAL_VALIDO.match(canal):
+        raise ValueError(f"Canal inválido para LISTEN: {canal!r}")
+    _CALLBACKS.setdefault(canal, []).append(callback)
+
+
+def _disparar(canal: str, payload: str) -> None:
+    for cb in _CALLBACKS.get(canal, []):
+        try:
+            cb(payload)
+        except Exception as e:
+            structured_log.evento("db_listen.erro_callback", "error", canal=canal, exc=e)
+
+
+def _loop(dsn: str) -> None:
+    primeira_conexao = True
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                for canal in _CALLBACKS:
+                    cur.execute(f"LISTEN {canal};")
+
+            # Reconexão: notificações podem ter se perdido enquanto estava fora
+            if not primeira_conexao:
+                for canal in _CALLBACKS:
+                    _disparar(canal, "reconexao")
+            primeira_conexao = False
+
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    n = conn.notifies.pop(0)
+                    _disparar(n.channel, n.payload)
+        except Exception as e:
+            structured_log.evento("db_listen.conexao_perdida", "warning", erro=str(e), nova_tentativa_s=5)
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def iniciar(app) -> None:
+    dsn = (app.config.get("DATABASE_URL") or "").strip()
+    if not dsn or not _CALLBACKS:
+        return
+    t = _ESTADO["thread"]
+    if t is not None and t.is_alive():
+        return
+    t = threading.Thread(target=_loop, args=(dsn,), name="db-listener", daemon=True)
+    t.start()
+    _ESTADO["thread"] = t
@@ -0,0 +1,419 @@
+# app/services/freight_matrix.py
+"""
+Matriz de frete pré-calculada (cidade × refinaria).
+
+O nó "Calcula Frete" do n8n refazia Haversine × 1.3 e o custo da viagem para
+cada refinaria a cada simulação. Aqui o cálculo é feito uma vez, vetorizado,
+para todos os pares (cap_cidades, cap_refinarias) e gravado em disco como
+.npy (lido com mmap). No caminho da precificação o frete de um destino vira
+uma fatia de linha: sem trigonometria e sem ida ao banco.
+
+Arquivos em FREIGHT_MATRIX_DIR:
+    meta.json           versão, constantes, refinarias (colunas) e cidades (linhas)
+    distancia_km.npy    float32 [n_cidades, n_refinarias]
+    frete_por_ton.npy   float32 [n_cidades, n_refinarias]
+
+A sincronização é incremental: coordenadas alteradas de uma refinaria
+recalculam só aquela coluna; mudança das constantes de frete recalcula o
+frete a partir da distância já gravada (sem Haversine). Os .npy nunca são
+alterados no lugar: cada gravação vai para um temporário trocado com
+os.replace, e o meta.json por último (os outros workers leem por mmap).
+
+A matriz é montada no startup (init_app) e mantida por uma thread por
+processo, que sincroniza com o banco a cada FREIGHT_MATRIX_TTL e recarrega
+quando o meta.json muda (outro worker ou `flask frete-matriz`). A cotação só
+lê a referência já carregada: sem lock, sem stat e sem banco.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+
+from app.services import pricing_data, structured_log
+
+try:
+    import fcntl
+except ImportError:  # Windows (ambiente de dev)
+    fcntl = None
+
+ARQ_META = "meta.json"
+ARQ_DISTANCIA = "distancia_km.npy"
+ARQ_FRETE = "frete_por_ton.npy"
+ARQ_LOCK = ".lock"
+
+RAIO_TERRA_KM = 6371.0
+
+_LOCK = threading.Lock()  # só a recarga; a leitura (matriz_atual) não trava
+_ESTADO: Dict[str, Any] = {"matriz": None, "meta_mtime": 0, "thread": None}
+
+
+# ============================================================
+# Fórmulas (mesmas do nó "Calcula Frete")
+# ============================================================
+def constantes_frete(config=None) -> Dict[str, float]:
+    cfg = config if config is not None else current_app.config
+    return {
+        "ccd": float(cfg.get("FRETE_CCD", 5.8595)),
+        "ccd_fixo": float(cfg.get("FRETE_CCD_FIXO", 683.37)),
+        "fator_volta": float(cfg.get("FRETE_FATOR_VOLTA", 0.92)),
+        "capacidade": float(cfg.get("FRETE_CAPACIDADE", 25)),
+        "fator_estrada": float(cfg.get("FRETE_FATOR_ESTRADA", 1.3)),
+    }
+
+
+def distancia_rodoviaria_km(lat_origem, lon_origem, lat_destino, lon_destino, fator_estrada: float) -> np.ndarray:
+    """Haversine × fator de estrada. Aceita arrays (broadcast)."""
+    lat1 = np.radians(np.asarray(lat_origem, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon_origem, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat_destino, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon_destino, dtype=np.float64))
+
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return RAIO_TERRA_KM * c * fator_estrada
+
+
+def frete_por_tonelada(distancia_km, k: Dict[str, float]) -> np.ndarray:
+    """Custo de ida + volta (com redutor) dividido pela capacidade do caminhão."""
+    km = np.asarray(distancia_km, dtype=np.float64)
+    custo_ida = k["ccd"] * km + k["ccd_fixo"]
+    custo_volta = k["ccd"] * k["fator_volta"] * km + k["ccd_fixo"]
+    return (custo_ida + custo_volta) / k["capacidade"]
+
+
+def chave_cidade(nome: str, uf: str) -> str:
+    return f"{str(uf or '').strip().upper()}|{str(nome or '').strip().upper()}"
+
+
+def _coords(itens: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    lat = np.array([np.nan if it.get("lat") is None else it["lat"] for it in itens], dtype=np.float64)
+    lon = np.array([np.nan if it.get("lon") is None else it["lon"] for it in itens], dtype=np.float64)
+    return lat, lon
+
+
+def _calcular(cidades, refinarias, k) -> Tuple[np.ndarray, np.ndarray]:
+    """Bloco [n_cidades, n_refinarias] de distância e frete."""
+    c_lat, c_lon = _coords(cidades)
+    r_lat, r_lon = _coords(refinarias)
+    dist = distancia_rodoviaria_km(r_lat[None, :], r_lon[None, :], c_lat[:, None], c_lon[:, None], k["fator_estrada"])
+    return dist, frete_por_tonelada(dist, k)
+
+
+# ============================================================
+# Persistência
+# ============================================================
+def _diretorio() -> str:
+    d = current_app.config.get("FREIGHT_MATRIX_DIR") or os.path.join(current_app.instance_path, "frete")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def _ler_meta(diretorio: str) -> Optional[Dict[str, Any]]:
+    caminho = os.path.join(diretorio, ARQ_META)
+    if not all(os.path.exists(os.path.join(diretorio, a)) for a in (ARQ_META, ARQ_DISTANCIA, ARQ_FRETE)):
+        return None
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_atomico(diretorio: str, nome: str, escrever) -> None:
+    tmp = os.path.join(diretorio, f".{nome}.tmp")
+    escrever(tmp)
+    os.replace(tmp, os.path.join(diretorio, nome))
+
+
+def _gravar_meta(diretorio: str, meta: Dict[str, Any]) -> None:
+    def escrever(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+    _gravar_atomico(diretorio, ARQ_META, escrever)
+
+
+def _gravar_matrizes(diretorio: str, dist: np.ndarray, frete: np.ndarray) -> None:
+    def salvar(arr):
+        def escrever(tmp):
+            # file object: np.save não acrescenta ".npy" ao nome temporário
+            with open(tmp, "wb") as f:
+                np.save(f, arr.astype(np.float32))
+        return escrever
+
+    _gravar_atomico(diretorio, ARQ_DISTANCIA, salvar(dist))
+    _gravar_atomico(diretorio, ARQ_FRETE, salvar(frete))
+
+
+class _LockArquivo:
+    """Serializa a reconstrução entre workers do gunicorn (no-op no Windows)."""
+
+    def __init__(self, diretorio: str):
+        self._caminho = os.path.join(diretorio, ARQ_LOCK)
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = open(self._caminho, "w")
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._fd.close()
+        return False
+
+
+# ============================================================
+# Construção / sincronização
+# ============================================================
+def _refinaria_meta(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "codigo": r["codigo"],
+        "nome": r.get("nome") or "",
+        "cidade": r.get("cidade") or "",
+        "estado": r.get("estado") or "",
+        "lat": r.get("lat"),
+        "lon": r.get("lon"),
+    }
+
+
+def sincronizar(
+    diretorio: str,
+    refinarias: List[Dict[str, Any]],
+    cidades: Optional[List[Dict[str, Any]]],
+    k: Dict[str, float],
+) -> Dict[str, Any]:
+    """
+    Garante que a matriz em disco reflete refinarias/cidades/constantes.
+
+    `cidades=None` reaproveita as linhas já gravadas (evita recarregar
+    cap_cidades a cada verificação). Retorna um resumo do que foi feito.
+    """
+    refinarias = sorted((_refinaria_meta(r) for r in refinarias), key=lambda r: r["codigo"])
+
+    with _LockArquivo(diretorio):
+        meta = _ler_meta(diretorio)
+
+        if cidades is None:
+            if meta is None:
+                raise ValueError("Matriz inexistente: informe as cidades para a construção completa.")
+            cidades = meta["cidades"]
+        else:
+            cidades = [
+                {"chave": chave_cidade(c["nome"], c["uf"]), "nome": c["nome"], "uf": c["uf"],
+                 "lat": c.get("lat"), "lon": c.get("lon")}
+                for c in cidades
+            ]
+
+        mesmas_cidades = meta is not None and [
+            (c["chave"], c["lat"], c["lon"]) for c in meta["cidades"]
+        ] == [(c["chave"], c["lat"], c["lon"]) for c in cidades]
+
+        # ---------- Construção completa ----------
+        if not mesmas_cidades:
+            dist, frete = _calcular(cidades, refinarias, k)
+            _gravar_matrizes(diretorio, dist, frete)
+            _gravar_meta(diretorio, {
+                "versao": (meta or {}).get("versao", 0) + 1,
+                "constantes": k,
+                "refinarias": refinarias,
+                "cidades": cidades,
+                "atualizado_em": time.time(),
+            })
+            return {"acao": "completa", "cidades": len(cidades), "refinarias": len(refinarias)}
+
+        antigas = {r["codigo"]: (j, r) for j, r in enumerate(meta["refinarias"])}
+        k_antigo = meta.get("constantes") or k
+        mudou_constantes = k_antigo != k
+
+        def _mudou(r):
+            old = antigas.get(r["codigo"])
+            return old is None or (old[1]["lat"], old[1]["lon"]) != (r["lat"], r["lon"])
+
+        alteradas = [j for j, r in enumerate(refinarias) if _mudou(r)]
+        mesmas_colunas = [r["codigo"] for r in meta["refinarias"]] == [r["codigo"] for r in refinarias]
+        metadados_mudaram = meta["refinarias"] != refinarias
+
+        if not alteradas and not mudou_constantes and mesmas_colunas:
+            if metadados_mudaram:  # só nome/cidade/UF
+                meta["refinarias"] = refinarias
+                meta["versao"] += 1
+                _gravar_meta(diretorio, meta)
+            return {"acao": "nenhuma"}
+
+        escala = k["fator_estrada"] / k_antigo["fator_estrada"] if k_antigo.get("fator_estrada") else 1.0
+
+        if mesmas_colunas:
+            # ---------- Incremental (mesmo shape): cópia em memória, troca atômica ----------
+            # nada de mmap "r+": os outros workers leem estes arquivos por mmap
+            dist = np.array(np.load(os.path.join(diretorio, ARQ_DISTANCIA), mmap_mode="r"), dtype=np.float64)
+            frete = np.array(np.load(os.path.join(diretorio, ARQ_FRETE), mmap_mode="r"), dtype=np.float64)
+            if escala != 1.0:
+                dist *= escala
+            if alteradas:
+                d_cols, f_cols = _calcular(cidades, [refinarias[j] for j in alteradas], k)
+                dist[:, alteradas] = d_cols
+                frete[:, alteradas] = f_cols
+            if mudou_constantes:
+                frete = frete_por_tonelada(dist, k)
+            _gravar_matrizes(diretorio, dist, frete)
+        else:
+            # ---------- Incremental com novo shape (refinaria incluída/removida) ----------
+            dist_old = np.load(os.path.join(diretorio, ARQ_DISTANCIA), mmap_mode="r")
+            dist = np.empty((len(cidades), len(refinarias)), dtype=np.float64)
+            for j, r in enumerate(refinarias):
+                if j not in alteradas:
+                    dist[:, j] = dist_old[:, antigas[r["codigo"]][0]] * escala
+            if alteradas:
+                d_cols, _ = _calcular(cidades, [refinarias[j] for j in alteradas], k)
+                dist[:, alteradas] = d_cols
+            del dist_old
+            _gravar_matrizes(diretorio, dist, frete_por_tonelada(dist, k))
+
+        meta.update({
+            "versao": meta["versao"] + 1,
+            "constantes": k,
+            "refinarias": refinarias,
+            "atualizado_em": time.time(),
+        })
+        _gravar_meta(diretorio, meta)
+        return {
+            "acao": "incremental",
+            "colunas_recalculadas": [refinarias[j]["codigo"] for j in alteradas],
+            "constantes_alteradas": mudou_constantes,
+        }
+
+
+def reconstruir(completa: bool = False) -> Dict[str, Any]:
+    """Sincroniza a matriz com o Postgres (cap_refinarias / cap_cidades)."""
+    diretorio = _diretorio()
+    cidades = None
+    meta = _ler_meta(diretorio)
+    if completa or meta is None or len(meta["cidades"]) != pricing_data.contar_cidades():
+        cidades = pricing_data.carregar_cidades()
+    return sincronizar(diretorio, pricing_data.carregar_refinarias(), cidades, constantes_frete())
+
+
+# ============================================================
+# Leitura (caminho da precificação)
+# ============================================================
+class MatrizFrete:
+    def __init__(self, diretorio: str, meta: Dict[str, Any]):
+        self.diretorio = diretorio
+        self.versao = meta["versao"]
+        self.refinarias: List[Dict[str, Any]] = meta["refinarias"]
+        self.cidades: List[Dict[str, Any]] = meta["cidades"]
+        self._linhas = {c["chave"]: i for i, c in enumerate(meta["cidades"])}
+        self.distancia_km = np.load(os.path.join(diretorio, ARQ_DISTANCIA), mmap_mode="r")
+        self.frete_por_ton = np.load(os.path.join(diretorio, ARQ_FRETE), mmap_mode="r")
+        forma = (len(self.cidades), len(self.refinarias))
+        if self.distancia_km.shape != forma or self.frete_por_ton.shape != forma:
+            # .npy de uma gravação mais nova que este meta.json: a próxima recarga acerta
+            raise ValueError(f"Matriz {self.distancia_km.shape} não bate com o meta.json {forma}")
+
+    def indice_cidade(self, nome: str, uf: str) -> Optional[int]:
+        return self._linhas.get(chave_cidade(nome, uf))
+
+    def linha(self, idx_cidade: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(distancia_km, frete_por_ton) de todas as refinarias para a cidade."""
+        return (
+            np.asarray(self.distancia_km[idx_cidade], dtype=np.float64),
+            np.asarray(self.frete_por_ton[idx_cidade], dtype=np.float64),
+        )
+
+    def valor(self, idx_cidade: int, idx_refinaria: int) -> Tuple[float, float]:
+        return (
+            float(self.distancia_km[idx_cidade, idx_refinaria]),
+            float(self.frete_por_ton[idx_cidade, idx_refinaria]),
+        )
+
+
+def recarregar() -> Optional[MatrizFrete]:
+    """Relê a matriz do disco se o meta.json mudou desde a última carga."""
+    diretorio = _diretorio()
+    with _LOCK:
+        try:
+            mtime = os.stat(os.path.join(diretorio, ARQ_META)).st_mtime_ns
+        except OSError:
+            return _ESTADO["matriz"]
+        if _ESTADO["matriz"] is None or mtime != _ESTADO["meta_mtime"]:
+            meta = _ler_meta(diretorio)
+            if meta is not None:
+                _ESTADO["matriz"] = MatrizFrete(diretorio, meta)
+                _ESTADO["meta_mtime"] = mtime
+        return _ESTADO["matriz"]
+
+
+def sincronizar_e_recarregar() -> Optional[MatrizFrete]:
+    resumo = reconstruir()
+    if resumo.get("acao") != "nenhuma":
+        structured_log.evento("frete.matriz_sincronizada", resumo=resumo)
+    return recarregar()
+
+
+def matriz_atual() -> Optional[MatrizFrete]:
+    """
+    Matriz carregada neste processo, sem lock nem I/O: quem a mantém é a
+    thread de sincronização. Sem a thread (CLI, scripts), carrega do disco na
+    primeira chamada.
+    """
+    matriz = _ESTADO["matriz"]
+    if matriz is not None or _ESTADO["thread"] is not None:
+        return matriz
+    try:
+        return recarregar()
+    except Exception as e:
+        structured_log.evento("frete.matriz_indisponivel", "warning", amostrar=True, erro=str(e))
+        return None
+
+
+def _loop(app) -> None:
+    ttl = float(app.config.get("FREIGHT_MATRIX_TTL", 600))
+    intervalo = max(1.0, min(ttl, float(app.config.get("FREIGHT_MATRIX_RECARGA_S", 30))))
+    proxima_sincronizacao = time.monotonic() + ttl
+    while True:
+        time.sleep(intervalo)
+        try:
+            with app.app_context():
+                if time.monotonic() >= proxima_sincronizacao:
+                    proxima_sincronizacao = time.monotonic() + ttl
+                    sincronizar_e_recarregar()
+                else:
+                    recarregar()
+        except Exception as e:
+            structured_log.evento("frete.matriz_indisponivel", "warning", amostrar=True, erro=str(e))
+
+
+def init_app(app) -> None:
+    @app.cli.command("frete-matriz")
+    def _cmd_frete_matriz():
+        """Reconstrói a matriz de frete a partir do Postgres."""
+        inicio = time.perf_counter()
+        resumo = reconstruir(completa=True)
+        print(f"{resumo} em {time.perf_counter() - inicio:.2f}s")
+
+    if not (app.config.get("DATABASE_URL") or "").strip():
+        return
+
+    # startup: constrói/sincroniza (o lock de arquivo serializa os workers) e carrega
+    with app.app_context():
+        try:
+            sincronizar_e_recarregar()
+        except Exception as e:
+            structured_log.evento("frete.matriz_indisponivel", "warning", erro=str(e))
+
+    t = _ESTADO["thread"]
+    if t is None or not t.is_alive():
+        t = threading.Thread(target=_loop, args=(app,), name="frete-matriz", daemon=True)
+        t.start()
+        _ESTADO["thread"] = t
@@ -0,0 +1,297 @@
+# app/services/http_client.py
+"""
+Cliente HTTP de saída (n8n, CAPSSYS), um por processo.
+
+- requests.Session com HTTPAdapter: keep-alive e pool de conexões por host
+  (pool_block=True limita as conexões simultâneas a cada host em
+  HTTP_POOL_MAXSIZE; quem passar disso espera uma conexão livre por até
+  HTTP_POOL_TIMEOUT segundos e então recebe PoolEsgotado, que as rotas
+  devolvem como 503 com Retry-After). Sem HTTP_POOL_MAXSIZE, o tamanho sai
+  dos limites que já existem (`tamanho_pool`): cabe toda chamada ao n8n que
+  a admissão e os pools de jobs/lote deixam rodar ao mesmo tempo.
+- Clientes separados por nome: o chat em streaming (`cliente("chat_stream")`)
+  segura a conexão pela resposta inteira e tem pool próprio, para não tirar
+  conexão do simulador e do /api/chat.
+- Timeouts de conexão e de leitura separados.
+- Retry com backoff exponencial e jitter:
+    * falha de conexão (o request nem saiu) -> qualquer método;
+    * timeout de leitura / 502 / 503 / 504   -> só métodos idempotentes
+      (GET, HEAD, OPTIONS, PUT, DELETE) ou idempotente=True.
+  POST do simulador (LLM) e do /api/sso/exchange (code de uso único) não
+  são reenviados depois que saíram.
+- Histograma de latência por alvo (`metricas()`).
+
+A Session é recriada se o PID mudar (fork dos workers do gunicorn).
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError, MaxRetryError, NewConnectionError
+
+METODOS_IDEMPOTENTES = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+STATUS_RETENTAVEIS = {502, 503, 504}
+# Retry-After (s) das respostas 503 por pool esgotado
+RETRY_AFTER_POOL = 5
+
+# Limites superiores dos buckets (ms); o último é +inf
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 240000)
+
+
+class PoolEsgotado(requests.exceptions.ConnectionError):
+    """Nenhuma conexão livre para o host dentro de HTTP_POOL_TIMEOUT (o request não saiu)."""
+
+
+class _Adaptador(HTTPAdapter):
+    """
+    HTTPAdapter com espera limitada por conexão livre: o requests não repassa
+    pool_timeout ao urllib3, e com pool_block=True a espera seria infinita.
+    """
+
+    def __init__(self, pool_timeout: float, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        espera = self.pool_timeout
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _com_espera(HTTPConnectionPool, espera),
+            "https": _com_espera(HTTPSConnectionPool, espera),
+        }
+
+
+def _com_espera(classe, espera: float):
+    def _get_conn(self, timeout=None):
+        return classe._get_conn(self, timeout=espera if timeout is None else timeout)
+
+    return type(classe.__name__, (classe,), {"_get_conn": _get_conn})
+
+
+class _Histograma:
+    def __init__(self):
+        self.contagens = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.soma_ms = 0.0
+        self.erros = 0
+        self.retries = 0
+        self.pool_esgotado = 0
+        self.status: Dict[str, int] = {}
+
+    def registrar(self, ms: float, status: Optional[int]) -> None:
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.contagens[i] += 1
+        self.total += 1
+        self.soma_ms += ms
+        classe = f"{status // 100}xx" if status else "falha"
+        self.status[classe] = self.status.get(classe, 0) + 1
+
+    def _percentil(self, q: float) -> Optional[float]:
+        if not self.total:
+            return None
+        alvo = q * self.total
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            acumulado += c
+            if acumulado >= alvo:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "erros": self.erros,
+            "retries": self.retries,
+            "pool_esgotado": self.pool_esgotado,
+            "status": dict(self.status),
+            "media_ms": round(self.soma_ms / self.total, 1) if self.total else None,
+            "p50_ms_ate": self._percentil(0.50),
+            "p95_ms_ate": self._percentil(0.95),
+            "p99_ms_ate": self._percentil(0.99),
+            "buckets_ms": {
+                (str(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else "+inf"): c
+                for i, c in enumerate(self.contagens)
+            },
+        }
+
+
+class HttpClient:
+    def __init__(self, pool_maxsize: int = 10, pool_hosts: int = 10, pool_timeout: float = 5.0,
+                 connect_timeout: float = 5.0, max_retries: int = 2, backoff: float = 0.5):
+        self.pool_maxsize = pool_maxsize
+        self.pool_hosts = pool_hosts
+        self.pool_timeout = pool_timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._session: Optional[requests.Session] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._hist: Dict[str, _Histograma] = {}
+
+    def _sessao(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    s = requests.Session()
+                    adapter = _Adaptador(
+                        self.pool_timeout,
+                        pool_connections=self.pool_hosts,
+                        pool_maxsize=self.pool_maxsize,
+                        pool_block=True,
+                        max_retries=0,
+                    )
+                    s.mount("http://", adapter)
+                    s.mount("https://", adapter)
+                    self._session, self._pid = s, pid
+        return self._session
+
+    def _histograma(self, alvo: str) -> _Histograma:
+        h = self._hist.get(alvo)
+        if h is None:
+            with self._lock:
+                h = self._hist.setdefault(alvo, _Histograma())
+        return h
+
+    def _espera(self, tentativa: int) -> float:
+        # "full jitter": uniforme entre 0 e backoff * 2^tentativa
+        return random.uniform(0, self.backoff * (2 ** tentativa))
+
+    def request(self, method: str, url: str, *, alvo: str = "", read_timeout: float = 30.0,
+                connect_timeout: Optional[float] = None, idempotente: Optional[bool] = None,
+                **kwargs) -> requests.Response:
+        method = method.upper()
+        if idempotente is None:
+            idempotente = method in METODOS_IDEMPOTENTES
+        timeout = (connect_timeout or self.connect_timeout, read_timeout)
+        hist = self._histograma(alvo or url.split("?", 1)[0])
+
+        tentativa = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                resp = self._sessao().request(method, url, timeout=timeout, **kwargs)
+            except EmptyPoolError as e:
+                # todas as conexões do host ocupadas: falha rápida, sem retry
+                with self._lock:
+                    hist.pool_esgotado += 1
+                raise PoolEsgotado(e) from e
+            except requests.exceptions.ConnectionError as e:
+                # ConnectTimeout é subclasse de ConnectionError; ReadTimeout não
+                ms = (time.perf_counter() - inicio) * 1000
+                with self._lock:
+                    hist.registrar(ms, None)
+                    hist.erros += 1
+                if tentativa < self.max_retries and _nao_enviado(e, idempotente):
+                    tentativa += 1
+                    with self._lock:
+                        hist.retries += 1
+                    time.sleep(self._espera(tentativa))
+                    continue
+                raise
+            except requests.exceptions.Timeout:
+                ms = (time.perf_counter() - inicio) * 1000
+                with self._lock:
+                    hist.registrar(ms, None)
+                    hist.erros += 1
+                if idempotente and tentativa < self.max_retries:
+                    tentativa += 1
+                    with self._lock:
+                        hist.retries += 1
+                    time.sleep(self._espera(tentativa))
+                    continue
+                raise
+
+            ms = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                hist.registrar(ms, resp.status_code)
+            if idempotente and resp.status_code in STATUS_RETENTAVEIS and tentativa < self.max_retries:
+                tentativa += 1
+                with self._lock:
+                    hist.retries += 1
+                resp.close()
+                time.sleep(self._espera(tentativa))
+                continue
+            return resp
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {alvo: h.to_dict() for alvo, h in self._hist.items()}
+
+
+def _nao_enviado(erro: Exception, idempotente: bool) -> bool:
+    """Falha de conexão antes de enviar é segura para qualquer método."""
+    if idempotente or isinstance(erro, requests.exceptions.ConnectTimeout):
+        return True
+    causa = erro.args[0] if erro.args else None
+    if isinstance(causa, MaxRetryError):
+        causa = causa.reason
+    return isinstance(causa, NewConnectionError)
+
+
+_CLIENTES: Dict[str, HttpClient] = {}
+
+
+def cliente(nome: str = "padrao") -> HttpClient:
+    c = _CLIENTES.get(nome)
+    if c is None:
+        c = _CLIENTES.setdefault(nome, HttpClient())
+    return c
+
+
+def metricas() -> Dict[str, Any]:
+    """Histogramas de todos os clientes, por alvo."""
+    return {alvo: h for c in list(_CLIENTES.values()) for alvo, h in c.metricas().items()}
+
+
+def tamanho_pool(config) -> int:
+    """
+    Conexões ao n8n que podem estar em uso ao mesmo tempo, pelos limites do app:
+    simulações e chats admitidos, workers dos jobs e de cada lote admitido.
+    0 se alguma dessas classes de admissão estiver desligada (sem teto).
+    """
+    simular = int(config.get("ADMISSAO_SIMULAR_GLOBAL", 0))
+    chat = int(config.get("ADMISSAO_CHAT_GLOBAL", 0))
+    lote = int(config.get("ADMISSAO_LOTE_GLOBAL", 0))
+    if not (simular and chat and lote):
+        return 0
+    return (
+        simular + chat
+        + lote * int(config.get("SIM_LOTE_WORKERS", 4))
+        + int(config.get("SIM_JOBS_WORKERS", 4))
+    )
+
+
+def init_app(app) -> None:
+    config = app.config
+    comum = dict(
+        pool_timeout=float(config.get("HTTP_POOL_TIMEOUT", 5)),
+        connect_timeout=float(config.get("HTTP_CONNECT_TIMEOUT", 5)),
+        max_retries=int(config.get("HTTP_MAX_RETRIES", 2)),
+        backoff=float(config.get("HTTP_BACKOFF", 0.5)),
+    )
+    _CLIENTES["padrao"] = HttpClient(
+        pool_maxsize=int(config.get("HTTP_POOL_MAXSIZE") or 0) or tamanho_pool(config) or 10,
+        **comum,
+    )
+    # uma conexão por stream admitido (classe chat_stream da rota Flask)
+    _CLIENTES["chat_stream"] = HttpClient(
+        pool_maxsize=int(config.get("ADMISSAO_CHAT_STREAM_GLOBAL", 0)) or 10,
+        **comum,
+    )
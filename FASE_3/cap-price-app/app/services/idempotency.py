@@ -0,0 +1,90 @@
+# app/services/idempotency.py
+"""
+Idempotency-Key para os POST de simulação.
+
+O cliente manda o header Idempotency-Key; dentro da janela (SIM_IDEMPOTENCIA_TTL)
+um POST repetido com a mesma chave devolve a resposta guardada em vez de
+simular de novo. Repetições simultâneas esperam a primeira (single-flight).
+A mesma chave com outro payload é conflito (IdempotencyConflict).
+Respostas 5xx não são guardadas: o retry executa de novo.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.services.single_flight import SingleFlight
+
+
+class IdempotencyConflict(Exception):
+    """Idempotency-Key reutilizada com um payload diferente."""
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float, max_itens: int):
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[str, tuple]" = OrderedDict()  # chave -> (impressao, (corpo, status), criado_em)
+        self._lock = threading.Lock()
+        self._voo = SingleFlight()
+        self.repeticoes = 0
+
+    def _buscar(self, chave: str) -> Optional[tuple]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if time.time() - item[2] > self.ttl:
+                del self._itens[chave]
+                return None
+            return item
+
+    def _guardar(self, chave: str, impressao: str, resposta: Tuple[Any, int]) -> None:
+        with self._lock:
+            self._itens[chave] = (impressao, resposta, time.time())
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def executar(self, chave: str, impressao: str,
+                 funcao: Callable[[], Tuple[Any, int]]) -> Tuple[Tuple[Any, int], bool]:
+        """
+        `funcao()` devolve (corpo, status). Retorna ((corpo, status), repetida).
+        """
+        item = self._buscar(chave)
+        if item is None:
+            def _primeira():
+                resposta = funcao()
+                if resposta[1] < 500:
+                    self._guardar(chave, impressao, resposta)
+                return impressao, resposta
+
+            (impressao_original, resposta), compartilhada = self._voo.executar(chave, _primeira)
+            if not compartilhada:
+                return resposta, False
+        else:
+            impressao_original, resposta, _ = item
+
+        if impressao_original != impressao:
+            raise IdempotencyConflict(
+                "Idempotency-Key já usada com outro payload."
+            )
+        with self._lock:
+            self.repeticoes += 1
+        return resposta, True
+
+
+_ESTADO: Dict[str, Optional[IdempotencyStore]] = {"store": None}
+
+
+def store() -> Optional[IdempotencyStore]:
+    return _ESTADO["store"]
+
+
+def init_app(app) -> None:
+    ttl = float(app.config.get("SIM_IDEMPOTENCIA_TTL", 0) or 0)
+    if ttl <= 0:
+        return
+    _ESTADO["store"] = IdempotencyStore(ttl, int(app.config.get("SIM_IDEMPOTENCIA_MAX", 1000)))
@@ -0,0 +1,192 @@
+# app/services/job_store.py
+"""
+Jobs assíncronos de simulação (/api/simular/jobs).
+
+O POST só enfileira e devolve o id; a simulação (n8n ou motor local) roda
+num pool de threads próprio, fora da thread do request, e o navegador busca
+o resultado por polling ou SSE. Assim uma cotação de 240s no n8n não prende
+um worker do gunicorn.
+
+Os jobs ficam num dicionário limitado (SIM_JOBS_MAX): terminados expiram após
+SIM_JOBS_TTL segundos e, se faltar espaço, saem os terminados mais antigos.
+Com o armazenamento cheio só de jobs em andamento, `criar` devolve None.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.services import request_timing, structured_log
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+
+FINAIS = (CONCLUIDO, ERRO)
+
+
+def _percentis(amostras) -> Dict[str, Optional[float]]:
+    if not amostras:
+        return {"p50": None, "p95": None, "max": None}
+    ordenadas = sorted(amostras)
+    n = len(ordenadas)
+    return {
+        "p50": round(ordenadas[int(0.50 * (n - 1))], 1),
+        "p95": round(ordenadas[int(0.95 * (n - 1))], 1),
+        "max": round(ordenadas[-1], 1),
+    }
+
+
+class Job:
+    def __init__(self, dono: Any):
+        self.id = uuid.uuid4().hex
+        self.dono = dono
+        self.status = PENDENTE
+        self.criado_em = time.time()
+        self.iniciado_em: Optional[float] = None
+        self.concluido_em: Optional[float] = None
+        self.resultado: Any = None
+        self.http_status: Optional[int] = None
+        self.tempos: Optional[Dict[str, float]] = None
+
+    def to_dict(self, com_resultado: bool = True) -> Dict[str, Any]:
+        d = {
+            "job_id": self.id,
+            "status": self.status,
+            "criado_em": self.criado_em,
+            "iniciado_em": self.iniciado_em,
+            "concluido_em": self.concluido_em,
+        }
+        if self.status in FINAIS:
+            d["http_status"] = self.http_status
+            if self.tempos is not None:
+                d["tempos_ms"] = self.tempos
+            if com_resultado:
+                d["resultado"] = self.resultado
+        return d
+
+
+class JobStore:
+    def __init__(self, workers: int, max_jobs: int, ttl: float):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sim-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._espera_ms = deque(maxlen=500)
+        self._execucao_ms = deque(maxlen=500)
+        self.concluidos = 0
+        self.erros = 0
+        self.rejeitados = 0
+
+    # ---------- armazenamento ----------
+    def _podar(self) -> None:
+        agora = time.time()
+        for jid in [j.id for j in self._jobs.values()
+                    if j.status in FINAIS and agora - j.concluido_em > self.ttl]:
+            del self._jobs[jid]
+        if len(self._jobs) < self.max_jobs:
+            return
+        for jid in [j.id for j in self._jobs.values() if j.status in FINAIS]:
+            del self._jobs[jid]
+            if len(self._jobs) < self.max_jobs:
+                return
+
+    def criar(self, dono: Any, funcao: Callable[[], tuple]) -> Optional[Job]:
+        """`funcao()` devolve (corpo, status_http). None se não houver espaço."""
+        with self._cond:
+            self._podar()
+            if len(self._jobs) >= self.max_jobs:
+                self.rejeitados += 1
+                return None
+            job = Job(dono)
+            self._jobs[job.id] = job
+        self._pool.submit(self._executar, job, funcao)
+        return job
+
+    def obter(self, job_id: str, dono: Any = None) -> Optional[Job]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is None or (dono is not None and job.dono != dono):
+            return None
+        return job
+
+    def aguardar(self, job: Job, timeout: float) -> Job:
+        """Bloqueia até o job mudar de status (ou timeout)."""
+        with self._cond:
+            status = job.status
+            if status not in FINAIS:
+                self._cond.wait_for(lambda: job.status != status, timeout=timeout)
+        return job
+
+    def posicao_na_fila(self, job: Job) -> int:
+        with self._cond:
+            if job.status != PENDENTE:
+                return 0
+            return 1 + sum(1 for j in self._jobs.values()
+                           if j.status == PENDENTE and j.criado_em < job.criado_em)
+
+    # ---------- execução ----------
+    def _executar(self, job: Job, funcao: Callable[[], tuple]) -> None:
+        with self._cond:
+            job.status = EXECUTANDO
+            job.iniciado_em = time.time()
+            self._espera_ms.append((job.iniciado_em - job.criado_em) * 1000)
+            self._cond.notify_all()
+        with request_timing.medir("simular_jobs") as cronometro:
+            try:
+                corpo, status = funcao()
+            except Exception as e:
+                structured_log.evento("simulacao_job.erro", "error", job_id=job.id, exc=e)
+                corpo, status = {"status": "error", "message": f"Erro interno na simulação: {str(e)}"}, 500
+
+        with self._cond:
+            job.tempos = cronometro.como_dict()
+            job.resultado = corpo
+            job.http_status = status
+            job.status = CONCLUIDO if status == 200 else ERRO
+            job.concluido_em = time.time()
+            self._execucao_ms.append((job.concluido_em - job.iniciado_em) * 1000)
+            if status == 200:
+                self.concluidos += 1
+            else:
+                self.erros += 1
+            self._cond.notify_all()
+
+    # ---------- métricas ----------
+    def metricas(self) -> Dict[str, Any]:
+        with self._cond:
+            por_status = {PENDENTE: 0, EXECUTANDO: 0, CONCLUIDO: 0, ERRO: 0}
+            for j in self._jobs.values():
+                por_status[j.status] += 1
+            return {
+                "fila": por_status[PENDENTE],
+                "executando": por_status[EXECUTANDO],
+                "armazenados": len(self._jobs),
+                "max_jobs": self.max_jobs,
+                "concluidos": self.concluidos,
+                "erros": self.erros,
+                "rejeitados": self.rejeitados,
+                "espera_ms": _percentis(self._espera_ms),
+                "execucao_ms": _percentis(self._execucao_ms),
+            }
+
+
+_ESTADO: Dict[str, Optional[JobStore]] = {"store": None}
+
+
+def store() -> Optional[JobStore]:
+    return _ESTADO["store"]
+
+
+def init_app(app) -> None:
+    _ESTADO["store"] = JobStore(
+        workers=int(app.config.get("SIM_JOBS_WORKERS", 4)),
+        max_jobs=int(app.config.get("SIM_JOBS_MAX", 200)),
+        ttl=float(app.config.get("SIM_JOBS_TTL", 600)),
+    )
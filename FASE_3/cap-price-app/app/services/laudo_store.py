@@ -0,0 +1,167 @@
+# app/services/laudo_store.py
+"""
+Laudos sob demanda (/api/laudo/<simulation_id>).
+
+A simulação não renderiza mais o laudo: guarda só os insumos canônicos
+(cenário principal, alternativos, quantidade da raiz e a flag TabelaV da
+resposta) e devolve a referência. O id é o hash desses
+insumos, então cenários idênticos compartilham o mesmo laudo.
+
+- Insumos: memória (LRU por quantidade) + arquivo em LAUDO_DIR, para que
+  qualquer worker do gunicorn encontre o laudo gerado por outro.
+- HTML renderizado: LRU em memória limitado por bytes (LAUDO_CACHE_MAX_BYTES).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.services import structured_log
+
+_ID_VALIDO = set("0123456789abcdef")
+
+
+class _LRU:
+    def __init__(self, max_itens: int = 0, max_bytes: int = 0):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._itens: "OrderedDict[str, tuple]" = OrderedDict()  # chave -> (valor, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obter(self, chave: str) -> Optional[Any]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return item[0]
+
+    def guardar(self, chave: str, valor: Any, tamanho: int = 0) -> None:
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._bytes -= antigo[1]
+            self._itens[chave] = (valor, tamanho)
+            self._bytes += tamanho
+            while self._itens and (
+                (self.max_itens and len(self._itens) > self.max_itens)
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                _, (_, t) = self._itens.popitem(last=False)
+                self._bytes -= t
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entradas": len(self._itens), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class LaudoStore:
+    def __init__(self, diretorio: str, ttl: float, max_insumos: int, max_bytes_html: int):
+        self.diretorio = diretorio
+        self.ttl = ttl
+        self._insumos = _LRU(max_itens=max_insumos)
+        self._html = _LRU(max_bytes=max_bytes_html)
+        self._gravacoes = 0
+
+    # ---------- insumos ----------
+    def guardar_insumos(self, insumos: Dict[str, Any]) -> str:
+        bruto = json.dumps(insumos, sort_keys=True, ensure_ascii=False, default=str)
+        laudo_id = hashlib.sha256(bruto.encode("utf-8")).hexdigest()[:32]
+        if self._insumos.obter(laudo_id) is None:
+            self._insumos.guardar(laudo_id, insumos)
+            self._gravar_arquivo(laudo_id, bruto)
+        return laudo_id
+
+    def obter_insumos(self, laudo_id: str) -> Optional[Dict[str, Any]]:
+        if not laudo_id or len(laudo_id) != 32 or not set(laudo_id) <= _ID_VALIDO:
+            return None
+        insumos = self._insumos.obter(laudo_id)
+        if insumos is not None:
+            return insumos
+        insumos = self._ler_arquivo(laudo_id)
+        if insumos is not None:
+            self._insumos.guardar(laudo_id, insumos)
+        return insumos
+
+    # ---------- HTML ----------
+    def obter_html(self, laudo_id: str) -> Optional[str]:
+        return self._html.obter(laudo_id)
+
+    def guardar_html(self, laudo_id: str, html: str) -> None:
+        self._html.guardar(laudo_id, html, len(html.encode("utf-8")))
+
+    # ---------- disco ----------
+    def _caminho(self, laudo_id: str) -> str:
+        return os.path.join(self.diretorio, f"{laudo_id}.json")
+
+    def _gravar_arquivo(self, laudo_id: str, bruto: str) -> None:
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            destino = self._caminho(laudo_id)
+            tmp = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(bruto)
+            os.replace(tmp, destino)
+        except OSError as e:
+            # sem disco o laudo ainda funciona neste processo (memória)
+            structured_log.evento("laudo.falha_gravacao", "warning", laudo_id=laudo_id, erro=str(e))
+            return
+        self._gravacoes += 1
+        if self._gravacoes % 200 == 0:
+            self._podar_arquivos()
+
+    def _ler_arquivo(self, laudo_id: str) -> Optional[Dict[str, Any]]:
+        caminho = self._caminho(laudo_id)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(caminho) > self.ttl:
+                return None
+            with open(caminho, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _podar_arquivos(self) -> None:
+        if not self.ttl:
+            return
+        limite = time.time() - self.ttl
+        try:
+            with os.scandir(self.diretorio) as it:
+                for entrada in it:
+                    if entrada.name.endswith(".json") and entrada.stat().st_mtime < limite:
+                        try:
+                            os.remove(entrada.path)
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"insumos": self._insumos.stats(), "html": self._html.stats()}
+
+
+_ESTADO: Dict[str, Optional[LaudoStore]] = {"store": None}
+
+
+def store() -> LaudoStore:
+    return _ESTADO["store"]
+
+
+def init_app(app) -> None:
+    diretorio = app.config.get("LAUDO_DIR") or os.path.join(app.instance_path, "laudos")
+    _ESTADO["store"] = LaudoStore(
+        diretorio=diretorio,
+        ttl=float(app.config.get("LAUDO_TTL", 86400) or 0),
+        max_insumos=int(app.config.get("LAUDO_MAX_INSUMOS", 2000)),
+        max_bytes_html=int(app.config.get("LAUDO_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+    )
@@ -0,0 +1,455 @@
+# app/services/price_surface.py
+"""
+Superfície nacional de preços (produto × cidade), gerada de madrugada.
+
+Para "quanto cobraríamos em X?" não é preciso simular cidade por cidade: um
+job em lote (`flask --app run superficie-precos`) avalia as fórmulas do motor
+local para todo produto de cap_produtos e toda cidade de cap_cidades, usando a
+matriz de frete e as tabelas de impostos. Cada produto roda num processo do
+pool (PRICE_SURFACE_WORKERS, padrão = núcleos da máquina).
+
+Por linha (produto, cidade) ficam as 3 melhores refinarias (a 1ª é a
+vencedora), com frete_por_ton, preço NET, ICMS, CMV e o precoFinal nas
+margens de referência (PRICE_SURFACE_MARGENS, custo fixo
+PRICE_SURFACE_CUSTO_FIXO).
+
+Tabela colunar em PRICE_SURFACE_DIR (mesmo esquema da matriz de frete):
+    meta.json                       refinarias, cidades (linhas), produtos e a última execução
+    produtos/<slug>-<hash>/*.npy    uma coluna por arquivo, linhas alinhadas com as cidades
+        refinaria.npy    int16   [cidades, 3]   índice em meta["refinarias"] (-1 = sem cenário)
+        frete.npy        float32 [cidades, 3]
+        preco_net.npy    float32 [cidades, 3]
+        icms.npy         float32 [cidades, 3]
+        cmv.npy          float32 [cidades, 3]
+        preco_final.npy  float32 [cidades, 3, margens]
+
+Cada produto guarda a assinatura dos seus preços: numa nova execução só os
+produtos com preço alterado são recalculados (frete, impostos, refinarias ou
+parâmetros diferentes recalculam tudo). O meta.json é trocado por último, então
+quem está lendo vê a versão anterior inteira até lá. As pastas da versão
+anterior só são apagadas na execução seguinte: um processo que ainda está com
+o meta antigo continua achando as colunas que carrega sob demanda (e, se não
+achar, `cotar` relê o meta.json uma vez).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import click
+import numpy as np
+from flask import current_app
+
+from app.services import freight_matrix, pricing_data, structured_log, tax_cache
+from app.services.freight_matrix import chave_cidade
+
+ARQ_META = "meta.json"
+DIR_PRODUTOS = "produtos"
+TOP = 3
+
+_LOCK = threading.Lock()
+_ESTADO: Dict[str, Any] = {"superficie": None, "meta_mtime": 0}
+
+
+# ============================================================
+# Parâmetros
+# ============================================================
+def _diretorio() -> str:
+    return current_app.config.get("PRICE_SURFACE_DIR") or os.path.join(current_app.instance_path, "superficie")
+
+
+def margens_referencia(config=None) -> List[float]:
+    cfg = config if config is not None else current_app.config
+    bruto = str(cfg.get("PRICE_SURFACE_MARGENS", "0,5,10,15"))
+    return sorted({float(m) for m in bruto.replace(";", ",").split(",") if m.strip()})
+
+
+def _hash(obj: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _slug(nome: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", nome).strip("_").lower()[:40] or "produto"
+
+
+# ============================================================
+# Cálculo de um produto (roda num processo do pool)
+# ============================================================
+def _salvar(destino: str, nome: str, arr: np.ndarray) -> None:
+    tmp = os.path.join(destino, f".{nome}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, os.path.join(destino, nome))
+
+
+def calcular_produto(tarefa: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Top-3 refinarias de todas as cidades para um produto.
+
+    `frete` [cidades, refinarias]; `icms_uf` [ufs, refinarias] e `uf_cidade`
+    [cidades] (índice da UF de destino); `precos` [refinarias] (NaN = sem preço).
+    precoFinal = (preco_net + frete + custo_fixo) * (1 + margem/100) / divisor,
+    então a ordem das refinarias não depende da margem.
+    """
+    inicio = time.perf_counter()
+    frete = tarefa["frete"]
+    precos = tarefa["precos"]
+    icms = tarefa["icms_uf"][tarefa["uf_cidade"]]                       # [C, R]
+    divisor = 1 - (icms + tarefa["pis"] + tarefa["cofins"]) / 100
+    margens = np.asarray(tarefa["margens"], dtype=np.float64)
+
+    cmv = precos[None, :] + frete + tarefa["custo_fixo"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        base = np.where((divisor > 0) & np.isfinite(cmv), cmv / divisor, np.inf)
+
+    n_ref = base.shape[1]
+    k = min(TOP, n_ref)
+    if k < n_ref:
+        top = np.argpartition(base, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(n_ref), (base.shape[0], 1))
+    top = np.take_along_axis(top, np.argsort(np.take_along_axis(base, top, 1), axis=1, kind="stable"), 1)
+    base_top = np.take_along_axis(base, top, 1)
+    ok = np.isfinite(base_top)
+
+    def coluna(matriz):
+        valores = np.take_along_axis(matriz, top, 1) if matriz.ndim == 2 else matriz[top]
+        return np.where(ok, valores, np.nan).astype(np.float32)
+
+    preco_final = np.where(ok[:, :, None], base_top[:, :, None] * (1 + margens / 100), np.nan)
+
+    # Sempre TOP colunas, mesmo com menos refinarias cadastradas
+    faltam = TOP - k
+    colunas = {
+        "refinaria.npy": np.where(ok, top, -1).astype(np.int16),
+        "frete.npy": coluna(frete),
+        "preco_net.npy": coluna(precos),
+        "icms.npy": coluna(icms),
+        "cmv.npy": coluna(cmv),
+        "preco_final.npy": preco_final.astype(np.float32),
+    }
+    if faltam:
+        for nome, arr in colunas.items():
+            forma = list(arr.shape)
+            forma[1] = faltam
+            vazio = np.full(forma, -1 if arr.dtype == np.int16 else np.nan, dtype=arr.dtype)
+            colunas[nome] = np.concatenate([arr, vazio], axis=1)
+
+    destino = tarefa["destino"]
+    os.makedirs(destino, exist_ok=True)
+    for nome, arr in colunas.items():
+        _salvar(destino, nome, arr)
+
+    return {
+        "produto": tarefa["produto"],
+        "linhas": int(base.shape[0]),
+        "com_cenario": int(ok[:, 0].sum()),
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+# ============================================================
+# Geração (job noturno)
+# ============================================================
+def _ler_meta(diretorio: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(diretorio, ARQ_META), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def gerar(completa: bool = False, workers: int = 0) -> Dict[str, Any]:
+    """Recalcula a superfície (só produtos com preço alterado, salvo `completa`)."""
+    inicio = time.perf_counter()
+    diretorio = _diretorio()
+    os.makedirs(os.path.join(diretorio, DIR_PRODUTOS), exist_ok=True)
+
+    freight_matrix.reconstruir()
+    matriz = freight_matrix.recarregar()
+    if matriz is None:
+        raise RuntimeError("Matriz de frete indisponível.")
+    impostos = tax_cache.tabelas()
+    produtos = pricing_data.carregar_precos_todos()
+
+    margens = margens_referencia()
+    custo_fixo = float(current_app.config.get("PRICE_SURFACE_CUSTO_FIXO", 0) or 0)
+    refinarias = matriz.refinarias
+    codigos = [r["codigo"] for r in refinarias]
+    cidades = [{"chave": c["chave"], "nome": c["nome"], "uf": c["uf"]} for c in matriz.cidades]
+
+    # ---------- ICMS por UF de destino ----------
+    ufs = sorted({c["uf"] for c in cidades})
+    uf_idx = {uf: i for i, uf in enumerate(ufs)}
+    uf_origem = [r["estado"] for r in refinarias]
+    icms_uf = np.array([impostos.icms_por_origem(uf_origem, uf) for uf in ufs], dtype=np.float64)
+    uf_cidade = np.array([uf_idx[c["uf"]] for c in cidades], dtype=np.int64)
+
+    # Qualquer mudança aqui invalida todos os produtos
+    assinatura_global = _hash({
+        "matriz": matriz.versao,
+        "cidades": [c["chave"] for c in cidades],
+        "refinarias": codigos,
+        "icms": icms_uf.round(4).tolist(),
+        "pis": impostos.pis,
+        "cofins": impostos.cofins,
+        "margens": margens,
+        "custo_fixo": custo_fixo,
+    })
+
+    anterior = _ler_meta(diretorio) or {}
+    produtos_anteriores = (
+        anterior.get("produtos", {})
+        if anterior.get("assinatura") == assinatura_global and not completa else {}
+    )
+
+    frete = np.asarray(matriz.frete_por_ton, dtype=np.float64)
+    novos: Dict[str, Dict[str, Any]] = {}
+    tarefas = []
+    for produto, precos in produtos.items():
+        assinatura = _hash(precos)
+        antigo = produtos_anteriores.get(produto)
+        if antigo and antigo["assinatura"] == assinatura and os.path.isdir(
+            os.path.join(diretorio, DIR_PRODUTOS, antigo["dir"])
+        ):
+            novos[produto] = antigo
+            continue
+        pasta = f"{_slug(produto)}-{_hash([assinatura_global, assinatura, produto])[:12]}"
+        novos[produto] = {"dir": pasta, "assinatura": assinatura}
+        tarefas.append({
+            "produto": produto,
+            "destino": os.path.join(diretorio, DIR_PRODUTOS, pasta),
+            "frete": frete,
+            "precos": np.array([precos.get(c, np.nan) for c in codigos], dtype=np.float64),
+            "icms_uf": icms_uf,
+            "uf_cidade": uf_cidade,
+            "pis": impostos.pis,
+            "cofins": impostos.cofins,
+            "margens": margens,
+            "custo_fixo": custo_fixo,
+        })
+
+    workers = workers or int(current_app.config.get("PRICE_SURFACE_WORKERS", 0) or 0) or os.cpu_count() or 1
+    workers = max(1, min(workers, len(tarefas) or 1))
+    linhas = 0
+    inicio_calculo = time.perf_counter()
+    if tarefas:
+        structured_log.evento("superficie.inicio", produtos=len(tarefas), workers=workers)
+        # spawn: não herda o pool do Postgres nem a thread do LISTEN
+        contexto = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as pool:
+            futuros = [pool.submit(calcular_produto, t) for t in tarefas]
+            for futuro in as_completed(futuros):
+                r = futuro.result()
+                linhas += r["linhas"]
+                novos[r["produto"]].update({"linhas": r["linhas"], "com_cenario": r["com_cenario"]})
+                structured_log.evento(
+                    "superficie.produto", produto=r["produto"], linhas=r["linhas"], segundos=round(r["segundos"], 2)
+                )
+
+    fim = time.perf_counter()
+    segundos, calculo = fim - inicio, fim - inicio_calculo
+    execucao = {
+        "em": time.time(),
+        "segundos": round(segundos, 3),
+        "calculo_segundos": round(calculo, 3),
+        "linhas": linhas,
+        "linhas_por_s": round(linhas / segundos, 1) if segundos > 0 else None,
+        "produtos_recalculados": len(tarefas),
+        "produtos_reaproveitados": len(novos) - len(tarefas),
+        "workers": workers if tarefas else 0,
+    }
+    meta = {
+        "versao": anterior.get("versao", 0) + (1 if tarefas or novos.keys() != anterior.get("produtos", {}).keys() else 0),
+        "assinatura": assinatura_global,
+        "matriz_versao": matriz.versao,
+        "margens": margens,
+        "custo_fixo": custo_fixo,
+        "pis": impostos.pis,
+        "cofins": impostos.cofins,
+        "refinarias": [
+            {"codigo": r["codigo"], "nome": r["nome"], "cidade": r["cidade"], "estado": r["estado"]}
+            for r in refinarias
+        ],
+        "cidades": cidades,
+        "produtos": novos,
+        "ultima_execucao": execucao,
+        "gerado_em": time.time() if tarefas else anterior.get("gerado_em", time.time()),
+    }
+    tmp = os.path.join(diretorio, f".{ARQ_META}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(diretorio, ARQ_META))
+
+    # Pastas de versões antigas (leitores já abertos seguem com o mmap). As da
+    # versão anterior ficam até a próxima execução: quem ainda está com o meta
+    # antigo carrega as colunas de lá sob demanda
+    em_uso = {p["dir"] for p in novos.values()}
+    em_uso.update(p["dir"] for p in anterior.get("produtos", {}).values())
+    for nome in os.listdir(os.path.join(diretorio, DIR_PRODUTOS)):
+        if nome not in em_uso:
+            shutil.rmtree(os.path.join(diretorio, DIR_PRODUTOS, nome), ignore_errors=True)
+
+    return execucao
+
+
+# ============================================================
+# Leitura (cotação instantânea)
+# ============================================================
+class SuperficiePrecos:
+    COLUNAS = ("refinaria", "frete", "preco_net", "icms", "cmv", "preco_final")
+
+    def __init__(self, diretorio: str, meta: Dict[str, Any]):
+        self.diretorio = diretorio
+        self.meta = meta
+        self.margens: List[float] = meta["margens"]
+        self._linhas = {c["chave"]: i for i, c in enumerate(meta["cidades"])}
+        self._produtos = {nome.upper(): nome for nome in meta["produtos"]}
+        self._colunas: Dict[str, Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def _colunas_produto(self, produto: str) -> Dict[str, np.ndarray]:
+        cols = self._colunas.get(produto)
+        if cols is None:
+            pasta = os.path.join(self.diretorio, DIR_PRODUTOS, self.meta["produtos"][produto]["dir"])
+            cols = {c: np.load(os.path.join(pasta, f"{c}.npy"), mmap_mode="r") for c in self.COLUNAS}
+            with self._lock:
+                self._colunas[produto] = cols
+        return cols
+
+    def cotar(self, produto: str, cidade: str, uf: str,
+              margem: Optional[float] = None, custo_fixo: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Top-3 da linha (produto, cidade). Margem/custo fixo fora da referência
+        são recalculados a partir do CMV e das alíquotas gravadas (a ordem das
+        refinarias continua a do custo fixo de referência).
+        """
+        nome = self._produtos.get(str(produto or "").strip().upper())
+        linha = self._linhas.get(chave_cidade(cidade, uf))
+        if nome is None or linha is None:
+            return None
+
+        cols = self._colunas_produto(nome)
+        margem = self.margens[0] if margem is None else float(margem)
+        cf_ref = float(self.meta["custo_fixo"])
+        custo_fixo = cf_ref if custo_fixo is None else float(custo_fixo)
+        im = self.margens.index(margem) if margem in self.margens and custo_fixo == cf_ref else None
+
+        pis, cofins = self.meta["pis"], self.meta["cofins"]
+        refinarias = self.meta["refinarias"]
+        cenarios = []
+        for j in range(TOP):
+            ir = int(cols["refinaria"][linha, j])
+            if ir < 0:
+                continue
+            ref = refinarias[ir]
+            icms = float(cols["icms"][linha, j])
+            cmv = float(cols["cmv"][linha, j]) + (custo_fixo - cf_ref)
+            if im is not None:
+                preco_final = float(cols["preco_final"][linha, j, im])
+            else:
+                preco_final = cmv * (1 + margem / 100) / (1 - (icms + pis + cofins) / 100)
+            cenarios.append({
+                "refinariaCodigo": ref["codigo"],
+                "refinariaNome": ref["nome"],
+                "origem": f"{ref['cidade']}/{ref['estado']}",
+                "precoNet": round(float(cols["preco_net"][linha, j]), 2),
+                "frete": round(float(cols["frete"][linha, j]), 2),
+                "icms": round(icms, 2),
+                "cmv": round(cmv, 2),
+                "precoFinal": round(preco_final, 2),
+                "precosReferencia": {
+                    f"{m:g}": round(float(cols["preco_final"][linha, j, k]), 2)
+                    for k, m in enumerate(self.margens)
+                },
+            })
+        cenarios.sort(key=lambda c: c["precoFinal"])
+
+        cidade_meta = self.meta["cidades"][linha]
+        return {
+            "produto": nome,
+            "destinoCidade": cidade_meta["nome"],
+            "destinoUF": cidade_meta["uf"],
+            "margem": margem,
+            "custoFixo": custo_fixo,
+            "referencia": im is not None,
+            "gerado_em": self.meta.get("gerado_em"),
+            "cenarios": cenarios,
+        }
+
+
+def superficie_atual(forcar: bool = False) -> Optional[SuperficiePrecos]:
+    """Superfície carregada neste processo (recarrega quando o meta.json muda)."""
+    diretorio = _diretorio()
+    caminho = os.path.join(diretorio, ARQ_META)
+    try:
+        mtime = os.stat(caminho).st_mtime_ns
+    except OSError:
+        return None
+    with _LOCK:
+        if forcar or _ESTADO["superficie"] is None or mtime != _ESTADO["meta_mtime"]:
+            meta = _ler_meta(diretorio)
+            if meta is None:
+                return None
+            _ESTADO["superficie"] = SuperficiePrecos(diretorio, meta)
+            _ESTADO["meta_mtime"] = mtime
+        return _ESTADO["superficie"]
+
+
+def cotar(produto: str, cidade: str, uf: str,
+          margem: Optional[float] = None, custo_fixo: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    `SuperficiePrecos.cotar` na superfície atual. Se as colunas do produto já
+    não existem (duas gerações rodaram desde que este processo leu o meta.json),
+    relê o meta.json e tenta uma vez mais.
+    """
+    sup = superficie_atual()
+    if sup is None:
+        return None
+    try:
+        return sup.cotar(produto, cidade, uf, margem, custo_fixo)
+    except FileNotFoundError:
+        structured_log.evento("superficie.releitura", "warning", produto=produto)
+        sup = superficie_atual(forcar=True)
+        return sup.cotar(produto, cidade, uf, margem, custo_fixo) if sup is not None else None
+
+
+def resumo() -> Optional[Dict[str, Any]]:
+    sup = superficie_atual()
+    if sup is None:
+        return None
+    meta = sup.meta
+    return {
+        "versao": meta.get("versao"),
+        "gerado_em": meta.get("gerado_em"),
+        "margens": meta["margens"],
+        "custo_fixo": meta["custo_fixo"],
+        "cidades": len(meta["cidades"]),
+        "produtos": sorted(meta["produtos"]),
+        "ultima_execucao": meta.get("ultima_execucao"),
+    }
+
+
+def init_app(app) -> None:
+    @app.cli.command("superficie-precos")
+    @click.option("--completa", is_flag=True, help="Recalcula todos os produtos.")
+    @click.option("--workers", type=int, default=0, help="Processos do pool (0 = PRICE_SURFACE_WORKERS / núcleos).")
+    def _cmd_superficie_precos(completa, workers):
+        """Gera a superfície de preços produto × cidade (job noturno)."""
+        execucao = gerar(completa=completa, workers=workers)
+        print(
+            f"{execucao['linhas']} linhas em {execucao['segundos']:.2f}s "
+            f"({execucao['linhas_por_s']} linhas/s); "
+            f"{execucao['produtos_recalculados']} produto(s) recalculado(s), "
+            f"{execucao['produtos_reaproveitados']} reaproveitado(s)."
+        )
@@ -0,0 +1,237 @@
+# app/services/pricing_data.py
+"""
+Consultas de referência usadas pelo motor de precificação local.
+
+São as mesmas consultas que o workflow CAP_PRICE_OFICIAL_V5 faz no Postgres
+(Consulta Refinarias, Consulta Cidade, Consuta Preços Por Refinaria,
+BuscaDadosICMS e RETORNA_PIS_COFINS), agora parametrizadas.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import get_conn, put_conn
+
+
+def _fetchall(sql: str, params: tuple = ()) -> list:
+    conn = None
+    try:
+        conn = get_conn()
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+    finally:
+        if conn:
+            put_conn(conn)
+
+
+def _parse_coordenadas(valor: Any) -> Tuple[Optional[float], Optional[float]]:
+    """
+    `cap_refinarias.coordenadas` pode vir como json ({lat, lng}), texto
+    "lat,lng" ou lista [lat, lng]. Retorna (lat, lon) ou (None, None).
+    """
+    if valor is None:
+        return None, None
+
+    if isinstance(valor, str):
+        s = valor.strip()
+        if not s:
+            return None, None
+        try:
+            valor = json.loads(s)
+        except ValueError:
+            partes = s.strip("()[] ").split(",")
+            if len(partes) != 2:
+                return None, None
+            valor = partes
+
+    lat = lon = None
+    if isinstance(valor, dict):
+        lat = valor.get("lat", valor.get("latitude"))
+        lon = valor.get("lng", valor.get("lon", valor.get("longitude")))
+    elif isinstance(valor, (list, tuple)) and len(valor) == 2:
+        lat, lon = valor
+
+    try:
+        return float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None, None
+
+
+def carregar_refinarias() -> List[Dict[str, Any]]:
+    rows = _fetchall("""
+        SELECT codigo, nome, cidade, estado, coordenadas
+        FROM public.cap_refinarias
+        ORDER BY codigo
+    """)
+    refinarias = []
+    for codigo, nome, cidade, estado, coordenadas in rows:
+        lat, lon = _parse_coordenadas(coordenadas)
+        refinarias.append({
+            "codigo": str(codigo or "").strip().upper(),
+            "nome": nome or "",
+            "cidade": cidade or "",
+            "estado": str(estado or "").strip().upper(),
+            "lat": lat,
+            "lon": lon,
+        })
+    return refinarias
+
+
+def buscar_cidade(nome: str, uf: str) -> Optional[Dict[str, Any]]:
+    """Coordenadas do destino (prioriza a cidade da UF informada)."""
+    rows = _fetchall("""
+        SELECT lon, lat, nome, uf
+        FROM public.cap_cidades
+        WHERE UPPER(nome) = UPPER(%s)
+        ORDER BY (uf = %s) DESC
+        LIMIT 1
+    """, (nome.strip(), uf.strip().upper()))
+    if not rows:
+        return None
+    lon, lat, nome_db, uf_db = rows[0]
+    try:
+        return {"nome": nome_db, "uf": uf_db, "lat": float(lat), "lon": float(lon)}
+    except (TypeError, ValueError):
+        return None
+
+
+def carregar_cidades() -> List[Dict[str, Any]]:
+    rows = _fetchall("""
+        SELECT nome, uf, lat, lon
+        FROM public.cap_cidades
+        ORDER BY uf, nome
+    """)
+    cidades = []
+    for nome, uf, lat, lon in rows:
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            lat = lon = None
+        cidades.append({"nome": nome or "", "uf": str(uf or "").strip().upper(), "lat": lat, "lon": lon})
+    return cidades
+
+
+# Nomes que a coluna do código IBGE costuma ter em cap_cidades (a primeira encontrada vale)
+COLUNAS_IBGE = ("codigo_ibge", "cod_ibge", "ibge", "codigo_municipio", "cod_municipio")
+
+
+def carregar_cidades_indice() -> List[Dict[str, Any]]:
+    """cap_cidades com o código IBGE, quando a base tiver a coluna (índice de cidades)."""
+    rows = _fetchall("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+          AND table_name = 'cap_cidades'
+          AND column_name = ANY(%s)
+    """, (list(COLUNAS_IBGE),))
+    existentes = {r[0] for r in rows}
+    coluna = next((c for c in COLUNAS_IBGE if c in existentes), None)
+
+    # `coluna` vem da lista fixa acima: seguro para interpolar
+    rows = _fetchall(f"""
+        SELECT nome, uf, lat, lon, {coluna or 'NULL'}
+        FROM public.cap_cidades
+        ORDER BY uf, nome
+    """)
+    cidades = []
+    for nome, uf, lat, lon, ibge in rows:
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            lat = lon = None
+        cidades.append({
+            "nome": str(nome or "").strip(),
+            "uf": str(uf or "").strip().upper(),
+            "ibge": None if ibge is None else str(ibge).strip(),
+            "lat": lat,
+            "lon": lon,
+        })
+    return [c for c in cidades if c["nome"]]
+
+
+def contar_cidades() -> int:
+    rows = _fetchall("SELECT COUNT(*) FROM public.cap_cidades")
+    return int(rows[0][0]) if rows else 0
+
+
+def carregar_precos(produto: str) -> Dict[str, float]:
+    """preco_net atual (preco_atual = 'S') por refinaria para o produto."""
+    rows = _fetchall("""
+        SELECT r.codigo, pr.preco_net
+        FROM cap_precos_refinarias pr
+        JOIN cap_refinarias r ON pr.refinaria_codigo = r.codigo
+        JOIN cap_produtos p ON pr.produto_id = p.id
+        WHERE p.nome = %s
+          AND pr.preco_atual = 'S'
+    """, (produto.strip(),))
+    precos = {}
+    for codigo, preco_net in rows:
+        if codigo and preco_net is not None:
+            precos[str(codigo).strip().upper()] = float(preco_net)
+    return precos
+
+
+def carregar_precos_todos() -> Dict[str, Dict[str, float]]:
+    """
+    preco_net atual por refinaria de todos os produtos de cap_produtos
+    (produto sem preço atual aparece com dict vazio).
+    """
+    rows = _fetchall("""
+        SELECT p.nome, r.codigo, pr.preco_net
+        FROM cap_produtos p
+        LEFT JOIN cap_precos_refinarias pr
+               ON pr.produto_id = p.id AND pr.preco_atual = 'S'
+        LEFT JOIN cap_refinarias r ON pr.refinaria_codigo = r.codigo
+        ORDER BY p.nome
+    """)
+    produtos: Dict[str, Dict[str, float]] = {}
+    for nome, codigo, preco_net in rows:
+        if not nome:
+            continue
+        precos = produtos.setdefault(str(nome).strip(), {})
+        if codigo and preco_net is not None:
+            precos[str(codigo).strip().upper()] = float(preco_net)
+    return produtos
+
+
+def carregar_icms_interestadual() -> List[Tuple[str, str, float]]:
+    """Tabela inteira: (origem_uf, destino_uf, aliquota)."""
+    rows = _fetchall("""
+        SELECT origem_uf, destino_uf, aliquota_icms
+        FROM icms_interestadual
+    """)
+    return [
+        (str(origem).strip().upper(), str(destino).strip().upper(), float(aliq))
+        for origem, destino, aliq in rows
+        if origem and destino and aliq is not None
+    ]
+
+
+def carregar_icms_interno() -> Dict[str, float]:
+    rows = _fetchall("""
+        SELECT uf, aliquota_interna
+        FROM icms_interno_uf
+    """)
+    return {
+        str(uf).strip().upper(): float(aliq)
+        for uf, aliq in rows
+        if uf and aliq is not None
+    }
+
+
+def carregar_pis_cofins() -> Tuple[Optional[float], Optional[float]]:
+    rows = _fetchall("""
+        SELECT pis_aliquota, cofins_aliquota
+        FROM impostos_federais_venda
+        WHERE regime = 'CUMULATIVO'
+        LIMIT 1
+    """)
+    if not rows:
+        return None, None
+    pis, cofins = rows[0]
+    return (
+        float(pis) if pis is not None else None,
+        float(cofins) if cofins is not None else None,
+    )
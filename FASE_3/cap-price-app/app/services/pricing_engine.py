@@ -0,0 +1,664 @@
+# app/services/pricing_engine.py
+"""
+Motor de precificação local.
+
+Reproduz, de forma determinística, as regras de cálculo que o agente
+"Diretor de Pricing" (workflow CAP_PRICE_OFICIAL_V5) aplicava:
+
+    CMV             = preco_net + frete_por_ton + custo_fixo
+    precoComMargem  = CMV * (1 + margem/100)
+    divisor         = 1 - (ICMS% + PIS% + COFINS%) / 100
+    precoFinal      = precoComMargem / divisor
+    valorTotal      = precoFinal * quantidade
+
+Todas as refinarias são avaliadas de uma vez (arrays NumPy) e a resposta sai
+no mesmo formato do nó "Code Unifica Json" (`dados.jsons` com até 3
+cenários), que é o que o laudo e o `_mapear_resultados_simulacao` consomem.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import threading
+
+import numpy as np
+from flask import current_app
+
+from app.services import city_index, freight_matrix, pricing_data, refinery_index, tax_cache
+from app.services.freight_matrix import (
+    constantes_frete,
+    distancia_rodoviaria_km,
+    frete_por_tonelada,
+)
+from app.services.tax_cache import TabelasTributarias
+
+MAX_CENARIOS = 3
+# Abaixo disso a poda espacial não compensa: avalia direto as refinarias válidas
+PODA_MINIMO_VALIDAS = 64
+
+
+class PricingError(ValueError):
+    """Dados insuficientes para precificar (equivale ao ERRO_DADOS do agente)."""
+
+
+# ============================================================
+# Helpers
+# ============================================================
+def _to_float(valor: Any, default: float = 0.0) -> float:
+    if isinstance(valor, str):
+        valor = valor.strip().replace(",", ".")
+    try:
+        v = float(valor)
+    except (TypeError, ValueError):
+        return default
+    return v if np.isfinite(v) else default
+
+
+def _fmt_brl(valor: float) -> str:
+    return (
+        f"R$ {valor:,.2f}"
+        .replace(",", "X")
+        .replace(".", ",")
+        .replace("X", ".")
+    )
+
+
+def normalizar_entrada(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliza o payload do front (mesmos nomes que o Webhook do n8n recebe)."""
+    payload = payload or {}
+
+    permitidas = payload.get("refinarias_permitidas")
+    if not isinstance(permitidas, list):
+        permitidas = []
+
+    return {
+        "produto": str(payload.get("produto") or "").strip(),
+        "destino_cidade": str(
+            payload.get("destino_cidade") or payload.get("cidade_destino") or ""
+        ).strip(),
+        "destino_uf": str(
+            payload.get("destino_uf") or payload.get("uf_destino") or ""
+        ).strip().upper(),
+        "quantidade": _to_float(payload.get("quantidade") or payload.get("quantidade_ton"), 1.0),
+        "margem": _to_float(payload.get("margem")),
+        "custo_fixo": _to_float(payload.get("custo_fixo")),
+        "preco_net": _to_float(payload.get("preco_net")),
+        "refinaria": str(payload.get("refinaria") or "").strip().upper(),
+        "refinarias_permitidas": [
+            str(r).strip().upper() for r in permitidas if str(r or "").strip()
+        ],
+    }
+
+
+# ============================================================
+# Cálculo dos cenários
+# ============================================================
+def _preco_net(entrada: Dict[str, Any], codigos: np.ndarray, precos: Dict[str, float]) -> np.ndarray:
+    """Preço NET por refinaria (NaN = sem preço), com o override do payload."""
+    preco_net = np.array([precos.get(c, np.nan) for c in codigos], dtype=np.float64)
+    if entrada["preco_net"] > 0:
+        alvo = codigos == entrada["refinaria"] if entrada["refinaria"] else np.ones(len(codigos), dtype=bool)
+        preco_net[alvo] = entrada["preco_net"]
+    return preco_net
+
+
+def _permitidas(entrada: Dict[str, Any], codigos: np.ndarray) -> np.ndarray:
+    permitidas = entrada["refinarias_permitidas"]
+    if not permitidas and entrada["refinaria"]:
+        permitidas = [entrada["refinaria"]]
+    return np.isin(codigos, permitidas) if permitidas else np.ones(len(codigos), dtype=bool)
+
+
+def calcular_cenarios(
+    entrada: Dict[str, Any],
+    refinarias: List[Dict[str, Any]],
+    distancia_km: np.ndarray,
+    frete: np.ndarray,
+    precos: Dict[str, float],
+    impostos: TabelasTributarias,
+) -> List[Dict[str, Any]]:
+    """
+    Avalia as fórmulas para todas as refinarias e devolve os cenários
+    válidos ordenados do menor para o maior precoFinal (no máximo 3).
+
+    `distancia_km` e `frete` são arrays alinhados com `refinarias`
+    (NaN quando a refinaria não tem coordenadas).
+    """
+    n = len(refinarias)
+    if n == 0:
+        raise PricingError("Nenhuma refinaria cadastrada.")
+
+    codigos = np.array([r["codigo"] for r in refinarias], dtype=object)
+    uf_origem = np.array([r["estado"] for r in refinarias], dtype=object)
+    uf_destino = entrada["destino_uf"]
+
+    # ---------- Preço NET e refinarias permitidas ----------
+    preco_net = _preco_net(entrada, codigos, precos)
+    permitida = _permitidas(entrada, codigos)
+
+    # ---------- Alíquotas (cache das tabelas de impostos) ----------
+    operacao_interna = uf_origem == uf_destino
+    aliq_icms = impostos.icms_por_origem(uf_origem, uf_destino)
+    pis = impostos.pis
+    cofins = impostos.cofins
+
+    # ---------- Fórmulas ----------
+    frete = np.asarray(frete, dtype=np.float64)
+    distancia_km = np.asarray(distancia_km, dtype=np.float64)
+
+    cmv = preco_net + frete + entrada["custo_fixo"]
+    preco_com_margem = cmv * (1 + entrada["margem"] / 100)
+    divisor = 1 - (aliq_icms + pis + cofins) / 100
+
+    validos = permitida & np.isfinite(cmv) & (divisor > 0)
+    if not validos.any():
+        faltantes = []
+        if not np.isfinite(preco_net[permitida]).any():
+            faltantes.append("preço líquido")
+        if not np.isfinite(frete[permitida]).any():
+            faltantes.append("frete (coordenadas)")
+        detalhe = ", ".join(faltantes) or "match entre refinarias"
+        raise PricingError(f"Nenhuma refinaria com dados completos ({detalhe}).")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        preco_final = np.where(validos, preco_com_margem / divisor, np.inf)
+        impacto_frete = np.where(cmv != 0, frete / cmv * 100, 0.0)
+
+    valor_total = preco_final * entrada["quantidade"]
+    vlr_icms = preco_final * aliq_icms / 100
+    vlr_pis = preco_final * pis / 100
+    vlr_cofins = preco_final * cofins / 100
+
+    idx_validos = np.flatnonzero(validos)
+    ordem = idx_validos[np.argsort(preco_final[idx_validos], kind="stable")][:MAX_CENARIOS]
+    menor_frete = float(np.min(frete[idx_validos]))
+
+    destino = f"{entrada['destino_cidade']}/{uf_destino}"
+    vencedor_preco = float(preco_final[ordem[0]])
+
+    cenarios: List[Dict[str, Any]] = []
+    for posicao, i in enumerate(ordem):
+        ref = refinarias[i]
+        interna_op = bool(operacao_interna[i])
+        pf = float(preco_final[i])
+
+        if posicao == 0:
+            motivo = "Melhor combinação de preço líquido e frete."
+            vantagem = "Menor preço final."
+        else:
+            diff = (pf / vencedor_preco - 1) * 100 if vencedor_preco else 0.0
+            motivo = f"Alternativa {diff:.2f}% acima do cenário vencedor."
+            vantagem = "Opção de abastecimento alternativa."
+
+        if float(frete[i]) <= menor_frete:
+            justificativa = "Refinaria próxima ao destino, reduzindo custo logístico."
+        else:
+            justificativa = "Frete competitivo para a distância envolvida."
+
+        cenarios.append({
+            "status_execucao": "SUCESSO",
+            "dados_faltantes": [],
+            "laudo": (
+                f"{ref['nome'] or ref['codigo']} ({ref['cidade']}/{ref['estado']}) "
+                f"entrega em {destino} a {_fmt_brl(pf)}/t."
+            ),
+            "origem": f"{ref['cidade']}/{ref['estado']}",
+            "destino": destino,
+            "quantidade": entrada["quantidade"],
+            "precoNet": round(float(preco_net[i]), 2),
+            "frete": round(float(frete[i]), 2),
+            "impostos": round(float(vlr_icms[i] + vlr_pis[i] + vlr_cofins[i]), 2),
+            "difal": 0,
+            "cmv": round(float(cmv[i]), 2),
+            "margem": entrada["margem"],
+            "precoFinal": round(pf, 2),
+            "produto": entrada["produto"],
+            "destinoCidade": entrada["destino_cidade"],
+            "destinoUF": uf_destino,
+            "refinariaNome": ref["nome"],
+            "refinariaCodigo": ref["codigo"],
+            "filialRecomendada": "Filial Local" if interna_op else "Filial Interestadual",
+            "motivo": motivo,
+            "distanciaKm": round(float(distancia_km[i]), 2),
+            "custoFixo": entrada["custo_fixo"],
+            "baseTributavel": round(pf, 2),
+            "icms": round(float(aliq_icms[i]), 2),
+            "vlr_icms": round(float(vlr_icms[i]), 2),
+            "pis": pis,
+            "vlr_pis": round(float(vlr_pis[i]), 2),
+            "cofins": cofins,
+            "vlr_cofins": round(float(vlr_cofins[i]), 2),
+            "valorTotal": round(float(valor_total[i]), 2),
+            "impactoFretePercentual": round(float(impacto_frete[i]), 2),
+            "situacaoFiscal": "Operação interna" if interna_op else "Operação interestadual",
+            "usoSaldoCredor": (
+                "Possível compensação de créditos." if interna_op
+                else "Sem uso relevante de saldo credor."
+            ),
+            "justificativaLogistica": justificativa,
+            "principalVantagem": vantagem,
+            "riscoFiscal": "Nenhum" if interna_op else "Operação interestadual sujeita a ICMS e DIFAL.",
+            "versaoImpostos": impostos.versao,
+        })
+
+    return cenarios
+
+
+def montar_resposta(cenarios: List[Dict[str, Any]], versao_impostos: Optional[int] = None) -> Dict[str, Any]:
+    """Mesmo pacote que o nó "Code Unifica Json" devolve para a app."""
+    return {
+        "status": "success",
+        "motor": "local",
+        "versao_impostos": versao_impostos,
+        "registros": {
+            "total_jsons": len(cenarios),
+            "total_htmls": 0,
+        },
+        "dados": {
+            "jsons": cenarios,
+            "htmls": [],
+        },
+    }
+
+
+# ============================================================
+# Orquestração (substitui a chamada ao webhook do n8n)
+# ============================================================
+class DestinoFrete:
+    """
+    Frete das refinarias para um destino. Com a matriz pré-calculada é uma
+    fatia da linha da cidade; sem ela (cidade fora da matriz), Haversine só
+    nas refinarias pedidas. `fretes(indices)` devolve (distancia_km, frete).
+    """
+
+    def __init__(self, refinarias: List[Dict[str, Any]], lat: Optional[float], lon: Optional[float],
+                 matriz=None, idx_cidade: Optional[int] = None):
+        self.refinarias = refinarias
+        self.lat = lat
+        self.lon = lon
+        self._matriz = matriz
+        self._idx = idx_cidade
+        self._completo = None
+
+    def fretes(self, indices: Optional[np.ndarray] = None):
+        if indices is None:
+            if self._completo is None:
+                self._completo = self._calcular(None)
+            return self._completo
+        if self._completo is not None:
+            return self._completo[0][indices], self._completo[1][indices]
+        return self._calcular(np.asarray(indices, dtype=np.int64))
+
+    def _calcular(self, indices: Optional[np.ndarray]):
+        if self._matriz is not None:
+            if indices is None:
+                return self._matriz.linha(self._idx)
+            return (
+                np.asarray(self._matriz.distancia_km[self._idx, indices], dtype=np.float64),
+                np.asarray(self._matriz.frete_por_ton[self._idx, indices], dtype=np.float64),
+            )
+        refs = self.refinarias if indices is None else [self.refinarias[i] for i in indices]
+        k = constantes_frete()
+        lat = np.array([np.nan if r["lat"] is None else r["lat"] for r in refs], dtype=np.float64)
+        lon = np.array([np.nan if r["lon"] is None else r["lon"] for r in refs], dtype=np.float64)
+        distancia_km = distancia_rodoviaria_km(lat, lon, self.lat, self.lon, k["fator_estrada"])
+        return distancia_km, frete_por_tonelada(distancia_km, k)
+
+
+def _destino_frete(entrada: Dict[str, Any]) -> DestinoFrete:
+    """
+    Frete de todas as refinarias para o destino: uma linha da matriz
+    pré-calculada; cálculo direto (Haversine) só se a cidade não estiver nela.
+    O destino é resolvido no índice de cidades (sem acento/caixa, na UF
+    informada); a consulta ao banco fica só para quando o índice não carregou.
+    """
+    indice = city_index.indice_atual()
+    if indice is not None:
+        cidade = indice.resolver(entrada["destino_cidade"], entrada["destino_uf"])
+    else:
+        cidade = pricing_data.buscar_cidade(entrada["destino_cidade"], entrada["destino_uf"])
+    if not cidade or cidade.get("lat") is None or cidade.get("lon") is None:
+        raise PricingError(
+            f"Cidade de destino não encontrada: {entrada['destino_cidade']}/{entrada['destino_uf']}."
+        )
+
+    matriz = freight_matrix.matriz_atual()
+    if matriz is not None:
+        idx = matriz.indice_cidade(cidade["nome"], cidade["uf"])
+        if idx is not None:
+            linha = matriz.cidades[idx]
+            return DestinoFrete(matriz.refinarias, linha.get("lat"), linha.get("lon"), matriz, idx)
+
+    return DestinoFrete(pricing_data.carregar_refinarias(), cidade["lat"], cidade["lon"])
+
+
+class ContextoLote:
+    """
+    Consultas compartilhadas entre as linhas de um lote (/api/simular/lote):
+    frete por destino, preços por produto e uma única versão das tabelas de
+    impostos. Seguro para as threads do pool do lote.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fretes: Dict[tuple, Any] = {}
+        self._precos: Dict[str, Dict[str, float]] = {}
+        self._impostos: Optional[TabelasTributarias] = None
+
+    def _memo(self, tabela: Dict, chave, carregar):
+        with self._lock:
+            if chave in tabela:
+                return tabela[chave]
+        valor = carregar()
+        with self._lock:
+            return tabela.setdefault(chave, valor)
+
+    def fretes(self, entrada: Dict[str, Any]) -> DestinoFrete:
+        chave = freight_matrix.chave_cidade(entrada["destino_cidade"], entrada["destino_uf"])
+        return self._memo(self._fretes, chave, lambda: _destino_frete(entrada))
+
+    def precos(self, produto: str) -> Dict[str, float]:
+        return self._memo(self._precos, produto.upper(), lambda: pricing_data.carregar_precos(produto))
+
+    def impostos(self) -> TabelasTributarias:
+        if self._impostos is None:
+            self._impostos = tax_cache.tabelas()
+        return self._impostos
+
+
+def _carregar_insumos(entrada: Dict[str, Any], contexto: Optional[ContextoLote] = None):
+    """Valida a entrada e devolve (destino, precos, impostos)."""
+    if not entrada["produto"]:
+        raise PricingError("Produto não informado para cálculo de Preço NET.")
+    if not entrada["destino_cidade"] or not entrada["destino_uf"]:
+        raise PricingError("Destino incompleto. Informe 'destino_cidade' e 'destino_uf'.")
+
+    if contexto is not None:
+        destino = contexto.fretes(entrada)
+        precos = contexto.precos(entrada["produto"])
+        impostos = contexto.impostos()
+    else:
+        destino = _destino_frete(entrada)
+        precos = pricing_data.carregar_precos(entrada["produto"])
+        impostos = tax_cache.tabelas()
+    return destino, precos, impostos
+
+
+# ============================================================
+# Poda espacial das refinarias candidatas
+# ============================================================
+def refinarias_candidatas(
+    entrada: Dict[str, Any],
+    destino: DestinoFrete,
+    precos: Dict[str, float],
+    impostos: TabelasTributarias,
+    k_vizinhas: int,
+    minimo_refinarias: int = 0,
+) -> Optional[np.ndarray]:
+    """
+    Posições (ordenadas) das refinarias que ainda podem entrar nos
+    MAX_CENARIOS cenários; None = avaliar todas.
+
+    1. As k refinarias válidas mais próximas do destino (índice espacial)
+       são avaliadas e dão o teto: o precoFinal do MAX_CENARIOS-ésimo melhor.
+    2. Qualquer outra refinaria j custa pelo menos
+           (net_min + frete(d_j) + custo_fixo) * (1 + margem/100) / divisor_max
+       (menor NET e maior divisor entre as válidas). Acima
+       do teto ela não entra; como o frete cresce com a distância, isso vira
+       um raio de equilíbrio e o índice devolve só quem está dentro dele.
+    Empates no teto são mantidos, então o resultado é o mesmo da avaliação
+    exaustiva (ver tests/test_poda_refinarias.py).
+
+    Com menos de `minimo_refinarias` origens a poda custa mais do que poupa
+    (benchmarks/bench_poda_refinarias.py) e todas são avaliadas.
+    """
+    refinarias = destino.refinarias
+    if (
+        k_vizinhas <= 0 or destino.lat is None or destino.lon is None
+        or len(refinarias) <= k_vizinhas or len(refinarias) < minimo_refinarias
+    ):
+        return None
+    fator_margem = 1 + entrada["margem"] / 100
+    if fator_margem <= 0:
+        return None
+
+    indice = refinery_index.indice_para(refinarias)
+    uf_destino = entrada["destino_uf"]
+
+    # Divisor por UF de origem (27 valores + "UF desconhecida" no fim)
+    ufs_origem = list(tax_cache.UFS) + [""]
+    divisor_uf = 1 - (impostos.icms_por_origem(ufs_origem, uf_destino) + impostos.pis + impostos.cofins) / 100
+    divisor = divisor_uf[indice.uf_idx]
+    preco_net = _preco_net(entrada, indice.codigos, precos)
+    validas = _permitidas(entrada, indice.codigos) & np.isfinite(preco_net) & (divisor > 0)
+    n_validas = int(np.count_nonzero(validas))
+    if n_validas == 0:
+        return None
+    if n_validas <= PODA_MINIMO_VALIDAS:
+        # poucas válidas (ex.: refinarias_permitidas curta): avalia só elas, sem árvore
+        return np.flatnonzero(validas)
+
+    proximas = indice.mais_proximas(destino.lat, destino.lon, max(k_vizinhas, MAX_CENARIOS), validas)
+    if len(proximas) < MAX_CENARIOS:
+        return None
+
+    _, frete = destino.fretes(proximas)
+    preco_final = (preco_net[proximas] + frete + entrada["custo_fixo"]) * fator_margem / divisor[proximas]
+    preco_final = preco_final[np.isfinite(preco_final)]
+    if len(preco_final) < MAX_CENARIOS:
+        return None
+    teto = float(np.sort(preco_final)[MAX_CENARIOS - 1])
+
+    # Limites inferiores para qualquer refinaria válida
+    net_min = float(preco_net[validas].min())
+    divisor_max = float(divisor[validas].max())
+
+    # Frete máximo que ainda empata com o teto -> distância rodoviária -> raio
+    frete_max = teto * divisor_max / fator_margem - net_min - entrada["custo_fixo"]
+    k = constantes_frete()
+    km_rodoviario = (
+        (frete_max * k["capacidade"] - 2 * k["ccd_fixo"])
+        / (k["ccd"] * (1 + k["fator_volta"]))
+    )
+    if km_rodoviario < 0:
+        return np.sort(proximas)
+    # 0,1% de folga cobre o arredondamento float32 da matriz de frete
+    raio_km = km_rodoviario / k["fator_estrada"] * 1.001
+    return np.union1d(proximas, indice.no_raio(destino.lat, destino.lon, raio_km, validas))
+
+
+def simular(payload: Dict[str, Any], contexto: Optional[ContextoLote] = None) -> Dict[str, Any]:
+    entrada = normalizar_entrada(payload)
+    destino, precos, impostos = _carregar_insumos(entrada, contexto)
+
+    k_vizinhas = int(current_app.config.get("REFINARIAS_PODA_K", 8) or 0)
+    minimo = int(current_app.config.get("REFINARIAS_PODA_MIN", 1500) or 0)
+    candidatas = refinarias_candidatas(entrada, destino, precos, impostos, k_vizinhas, minimo)
+    if candidatas is None:
+        refinarias = destino.refinarias
+        distancia_km, frete = destino.fretes()
+    else:
+        refinarias = [destino.refinarias[i] for i in candidatas]
+        distancia_km, frete = destino.fretes(candidatas)
+
+    cenarios = calcular_cenarios(entrada, refinarias, distancia_km, frete, precos, impostos)
+    return montar_resposta(cenarios, impostos.versao)
+
+
+# ============================================================
+# Grade "what-if" (/api/simular/grid)
+# ============================================================
+MAX_PONTOS_EIXO = 401
+
+
+def eixo_grade(nome: str, valor: Any, padrao: float) -> np.ndarray:
+    """
+    Valores de um eixo da grade. Aceita número, lista de números ou
+    {"min", "max", "passo"} (intervalo fechado). Sem valor -> só o da cotação base.
+    """
+    if valor is None or valor == "":
+        return np.array([padrao], dtype=np.float64)
+
+    if isinstance(valor, dict):
+        minimo = _to_float(valor.get("min"), padrao)
+        maximo = _to_float(valor.get("max"), minimo)
+        passo = _to_float(valor.get("passo"), 0.0)
+        if maximo < minimo:
+            raise PricingError(f"Eixo '{nome}': max menor que min.")
+        if passo <= 0:
+            if maximo != minimo:
+                raise PricingError(f"Eixo '{nome}': informe um passo maior que zero.")
+            return np.array([minimo], dtype=np.float64)
+        pontos = int(np.floor((maximo - minimo) / passo + 1e-9)) + 1
+        if pontos > MAX_PONTOS_EIXO:
+            raise PricingError(f"Eixo '{nome}' com {pontos} pontos; o máximo é {MAX_PONTOS_EIXO}.")
+        return np.round(minimo + passo * np.arange(pontos), 6)
+
+    if not isinstance(valor, list):
+        valor = [valor]
+    if len(valor) > MAX_PONTOS_EIXO:
+        raise PricingError(f"Eixo '{nome}' com {len(valor)} pontos; o máximo é {MAX_PONTOS_EIXO}.")
+    pontos = [_to_float(v, np.nan) for v in valor]
+    if not pontos or any(np.isnan(v) for v in pontos):
+        raise PricingError(f"Eixo '{nome}' com valor não numérico.")
+    # ordenado e sem repetição: o slider anda de um índice para o vizinho
+    return np.unique(np.array(pontos, dtype=np.float64))
+
+
+def _lista_json(arr: np.ndarray, casas: int = 2) -> List[Any]:
+    """Array -> lista achatada (ordem C), NaN/inf viram null."""
+    plano = np.round(arr, casas).ravel()
+    validos = np.isfinite(plano)
+    lista = plano.tolist()
+    if not validos.all():
+        for i in np.flatnonzero(~validos):
+            lista[i] = None
+    return lista
+
+
+def calcular_grade(
+    entrada: Dict[str, Any],
+    refinarias: List[Dict[str, Any]],
+    distancia_km: np.ndarray,
+    frete: np.ndarray,
+    precos: Dict[str, float],
+    impostos: TabelasTributarias,
+    margens: np.ndarray,
+    custos_fixos: np.ndarray,
+    precos_net: np.ndarray,
+    max_celulas: int = 0,
+) -> Dict[str, Any]:
+    """
+    Avalia as fórmulas na grade margem x custo_fixo x preco_net x refinaria
+    de uma vez (broadcast), com frete e alíquotas da cotação base.
+
+    No eixo preco_net, 0 significa "preço da tabela" da refinaria; valores
+    positivos sobrescrevem como no /api/simular (só na `refinaria` do payload,
+    se ela vier). As colunas saem achatadas em ordem C com `forma`
+    [margem, custo_fixo, preco_net, refinaria]:
+        i = ((im * C + ic) * P + ip) * R + ir
+    """
+    codigos = np.array([r["codigo"] for r in refinarias], dtype=object)
+    uf_origem = np.array([r["estado"] for r in refinarias], dtype=object)
+    frete = np.asarray(frete, dtype=np.float64)
+    distancia_km = np.asarray(distancia_km, dtype=np.float64)
+
+    permitida = _permitidas(entrada, codigos)
+
+    aliq_icms = impostos.icms_por_origem(uf_origem, entrada["destino_uf"])
+    pis = impostos.pis
+    cofins = impostos.cofins
+    divisor = 1 - (aliq_icms + pis + cofins) / 100
+    preco_tabela = np.array([precos.get(c, np.nan) for c in codigos], dtype=np.float64)
+
+    # Refinarias que entram na grade: permitidas, com frete, alíquota válida e
+    # algum preço (da tabela ou de um override do eixo)
+    tem_override = bool((precos_net > 0).any())
+    alvo_override = (
+        codigos == entrada["refinaria"] if entrada["refinaria"] else np.ones(len(codigos), dtype=bool)
+    )
+    com_preco = np.isfinite(preco_tabela) | (alvo_override & tem_override)
+    sel = np.flatnonzero(permitida & np.isfinite(frete) & (divisor > 0) & com_preco)
+    if sel.size == 0:
+        raise PricingError("Nenhuma refinaria com dados completos para a grade.")
+
+    celulas = margens.size * custos_fixos.size * precos_net.size * sel.size
+    if max_celulas and celulas > max_celulas:
+        raise PricingError(
+            f"Grade com {celulas} células; o máximo é {max_celulas}. "
+            "Reduza os eixos ou restrinja as refinarias."
+        )
+
+    # ---------- Preço NET [P, R] ----------
+    net = np.where(
+        (precos_net[:, None] > 0) & alvo_override[sel][None, :],
+        precos_net[:, None],
+        preco_tabela[sel][None, :],
+    )
+
+    # ---------- Fórmulas [M, C, P, R] ----------
+    cmv = net[None, :, :] + frete[sel] + custos_fixos[:, None, None]                 # [C, P, R]
+    preco_final = (
+        cmv[None] * (1 + margens / 100)[:, None, None, None] / divisor[sel]          # [M, C, P, R]
+    )
+    valor_total = preco_final * entrada["quantidade"]
+    vlr_icms = preco_final * (aliq_icms[sel] / 100)
+    vlr_pis = preco_final * (pis / 100)
+    vlr_cofins = preco_final * (cofins / 100)
+
+    # Refinaria vencedora de cada combinação (índice no eixo refinaria)
+    with np.errstate(invalid="ignore"):
+        vencedora = np.argmin(np.where(np.isfinite(preco_final), preco_final, np.inf), axis=-1)
+    vencedora = np.where(np.isfinite(preco_final).any(axis=-1), vencedora, -1)
+
+    return {
+        "status": "success",
+        "versao_impostos": impostos.versao,
+        "quantidade": entrada["quantidade"],
+        "forma": list(preco_final.shape),
+        "eixos": {
+            "margem": margens.tolist(),
+            "custo_fixo": custos_fixos.tolist(),
+            "preco_net": precos_net.tolist(),
+            "refinaria": [refinarias[i]["codigo"] for i in sel],
+        },
+        "refinarias": [
+            {
+                "codigo": refinarias[i]["codigo"],
+                "nome": refinarias[i]["nome"],
+                "origem": f"{refinarias[i]['cidade']}/{refinarias[i]['estado']}",
+                "distanciaKm": round(float(distancia_km[i]), 2),
+                "frete": round(float(frete[i]), 2),
+                "precoTabela": None if not np.isfinite(preco_tabela[i]) else round(float(preco_tabela[i]), 2),
+                "icms": round(float(aliq_icms[i]), 2),
+            }
+            for i in sel
+        ],
+        "pis": pis,
+        "cofins": cofins,
+        "colunas": {
+            "precoFinal": _lista_json(preco_final),
+            "valorTotal": _lista_json(valor_total),
+            "vlr_icms": _lista_json(vlr_icms),
+            "vlr_pis": _lista_json(vlr_pis),
+            "vlr_cofins": _lista_json(vlr_cofins),
+        },
+        "vencedora": vencedora.ravel().tolist(),
+    }
+
+
+def simular_grade(payload: Dict[str, Any], eixos: Dict[str, Any], max_celulas: int) -> Dict[str, Any]:
+    """Cotação base (payload do /api/simular) + eixos -> grade colunar."""
+    entrada = normalizar_entrada(payload)
+    margens = eixo_grade("margem", eixos.get("margem"), entrada["margem"])
+    custos_fixos = eixo_grade("custo_fixo", eixos.get("custo_fixo"), entrada["custo_fixo"])
+    precos_net = eixo_grade("preco_net", eixos.get("preco_net"), entrada["preco_net"])
+    if (precos_net < 0).any():
+        raise PricingError("Eixo 'preco_net' não aceita valores negativos.")
+
+    destino, precos, impostos = _carregar_insumos(entrada)
+    distancia_km, frete = destino.fretes()
+    return calcular_grade(
+        entrada, destino.refinarias, distancia_km, frete, precos, impostos,
+        margens, custos_fixos, precos_net, max_celulas,
+    )
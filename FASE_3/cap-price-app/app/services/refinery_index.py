@@ -0,0 +1,205 @@
+# app/services/refinery_index.py
+"""
+Índice espacial das refinarias/terminais (KD-tree sobre a esfera).
+
+O "Calcula Frete" avaliava todas as linhas de Consulta Refinarias para cada
+destino. Com muitas origens cadastradas, quase todas ficam longe demais para
+ganhar; o motor local usa este índice para buscar só:
+
+    - as k origens mais próximas do destino (`mais_proximas`);
+    - as origens dentro de um raio (`no_raio`), o raio de equilíbrio de frete
+      calculado em pricing_engine a partir da diferença de preços NET.
+
+As coordenadas viram vetores unitários 3D: a distância em linha reta (corda)
+cresce junto com a distância de Haversine, então "mais próximo" e "dentro do
+raio" são os mesmos nos dois espaços. As duas buscas aceitam uma máscara
+(refinarias permitidas, com preço) e ignoram as posições fora dela; a
+árvore só visita as folhas perto do destino.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.freight_matrix import RAIO_TERRA_KM
+from app.services.tax_cache import UF_IDX
+
+FOLHA = 8
+
+
+def _vetores(lat, lon) -> np.ndarray:
+    la = np.radians(np.asarray(lat, dtype=np.float64))
+    lo = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack([np.cos(la) * np.cos(lo), np.cos(la) * np.sin(lo), np.sin(la)], axis=-1)
+
+
+def corda_para_km(raio_km: float) -> float:
+    """Raio em km sobre a superfície -> corda no espaço dos vetores unitários."""
+    angulo = min(max(raio_km, 0.0) / RAIO_TERRA_KM, np.pi)
+    return 2.0 * np.sin(angulo / 2.0)
+
+
+class KDTree3:
+    """
+    KD-tree em 3D com caixas envolventes por nó. `nos` guarda
+    (inicio, fim, esq, dir, caixa_min, caixa_max); folhas têm esq = -1 e
+    cobrem ordem[inicio:fim].
+    """
+
+    def __init__(self, pontos: np.ndarray, folha: int = FOLHA):
+        self.pontos = np.asarray(pontos, dtype=np.float64)
+        self.ordem = np.arange(len(self.pontos))
+        self.folha = folha
+        self.nos: List[tuple] = []
+        if len(self.pontos):
+            self._construir(0, len(self.pontos))
+
+    def _construir(self, inicio: int, fim: int) -> int:
+        idx = self.ordem[inicio:fim]
+        bloco = self.pontos[idx]
+        # caixas como tuplas de float: distância ponto-caixa sem overhead de array
+        cmin, cmax = tuple(bloco.min(axis=0).tolist()), tuple(bloco.max(axis=0).tolist())
+        no = len(self.nos)
+        self.nos.append(None)
+        if fim - inicio <= self.folha:
+            self.nos[no] = (inicio, fim, -1, -1, cmin, cmax)
+            return no
+        eixo = int(np.argmax(np.subtract(cmax, cmin)))
+        meio = (fim - inicio) // 2
+        self.ordem[inicio:fim] = idx[np.argpartition(bloco[:, eixo], meio)]
+        esq = self._construir(inicio, inicio + meio)
+        dir_ = self._construir(inicio + meio, fim)
+        self.nos[no] = (inicio, fim, esq, dir_, cmin, cmax)
+        return no
+
+    @staticmethod
+    def _dist_caixa(p: tuple, cmin: tuple, cmax: tuple) -> float:
+        soma = 0.0
+        for x, lo, hi in zip(p, cmin, cmax):
+            d = lo - x if x < lo else (x - hi if x > hi else 0.0)
+            soma += d * d
+        return math.sqrt(soma)
+
+    def _folha(self, p: np.ndarray, inicio: int, fim: int, mascara: Optional[np.ndarray]):
+        idx = self.ordem[inicio:fim]
+        if mascara is not None:
+            idx = idx[mascara[idx]]
+        d = np.sqrt(((self.pontos[idx] - p) ** 2).sum(axis=1))
+        return idx, d
+
+    def k_mais_proximos(self, p: np.ndarray, k: int, mascara: Optional[np.ndarray] = None) -> np.ndarray:
+        """Índices dos k pontos mais próximos (entre os da máscara), do mais perto ao mais longe."""
+        if not self.nos or k <= 0:
+            return np.empty(0, dtype=np.int64)
+        pt = tuple(np.asarray(p, dtype=np.float64).tolist())
+        melhores: List[tuple] = []  # heap de (-dist, idx): o pior no topo
+        fila = [(0.0, 0)]
+        while fila:
+            dist_no, no = heapq.heappop(fila)
+            if len(melhores) == k and dist_no > -melhores[0][0]:
+                break
+            inicio, fim, esq, dir_, _, _ = self.nos[no]
+            if esq < 0:
+                idx, d = self._folha(p, inicio, fim, mascara)
+                for i, di in zip(idx.tolist(), d.tolist()):
+                    if len(melhores) < k:
+                        heapq.heappush(melhores, (-di, i))
+                    elif di < -melhores[0][0]:
+                        heapq.heapreplace(melhores, (-di, i))
+                continue
+            for filho in (esq, dir_):
+                _, _, _, _, cmin, cmax = self.nos[filho]
+                heapq.heappush(fila, (self._dist_caixa(pt, cmin, cmax), filho))
+        melhores.sort(key=lambda x: (-x[0], x[1]))
+        return np.array([i for _, i in melhores], dtype=np.int64)
+
+    def no_raio(self, p: np.ndarray, raio: float, mascara: Optional[np.ndarray] = None) -> np.ndarray:
+        """Índices (ordenados) dos pontos a até `raio` de p."""
+        if not self.nos or raio < 0:
+            return np.empty(0, dtype=np.int64)
+        pt = tuple(np.asarray(p, dtype=np.float64).tolist())
+        achados = []
+        pilha = [0]
+        while pilha:
+            inicio, fim, esq, dir_, cmin, cmax = self.nos[pilha.pop()]
+            if self._dist_caixa(pt, cmin, cmax) > raio:
+                continue
+            if esq < 0:
+                idx, d = self._folha(p, inicio, fim, mascara)
+                achados.append(idx[d <= raio])
+            else:
+                pilha.extend((esq, dir_))
+        if not achados:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(achados))
+
+
+class IndiceRefinarias:
+    """
+    Índice sobre uma lista de refinarias (as sem coordenadas ficam de fora,
+    o que equivale ao frete NaN do cálculo exaustivo). Índices e máscaras
+    são por posição na lista original.
+    """
+
+    def __init__(self, refinarias: List[Dict[str, Any]]):
+        self.refinarias = refinarias
+        self.codigos = np.array([r["codigo"] for r in refinarias], dtype=object)
+        ufs = [r["estado"] for r in refinarias]
+        # UF de origem como índice de tax_cache.UFS (-1 = desconhecida)
+        self.uf_idx = np.array([UF_IDX.get(uf, -1) for uf in ufs], dtype=np.int64)
+        self.ufs_presentes = sorted(set(ufs))
+        lat = np.array([np.nan if r.get("lat") is None else r["lat"] for r in refinarias], dtype=np.float64)
+        lon = np.array([np.nan if r.get("lon") is None else r["lon"] for r in refinarias], dtype=np.float64)
+        self._posicoes = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        self._arvore = KDTree3(_vetores(lat[self._posicoes], lon[self._posicoes]))
+
+    def _mascara(self, mascara: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        return None if mascara is None else np.asarray(mascara, dtype=bool)[self._posicoes]
+
+    def mais_proximas(self, lat: float, lon: float, k: int,
+                      mascara: Optional[np.ndarray] = None) -> np.ndarray:
+        p = _vetores(lat, lon)
+        return self._posicoes[self._arvore.k_mais_proximos(p, k, self._mascara(mascara))]
+
+    def no_raio(self, lat: float, lon: float, raio_km: float,
+                mascara: Optional[np.ndarray] = None) -> np.ndarray:
+        """Refinarias a até `raio_km` (Haversine, sem fator de estrada) do ponto."""
+        p = _vetores(lat, lon)
+        # folga numérica: nenhuma refinaria na borda pode ficar de fora
+        raio = corda_para_km(raio_km) * (1 + 1e-9) + 1e-12
+        return self._posicoes[self._arvore.no_raio(p, raio, self._mascara(mascara))]
+
+
+_CACHE: "OrderedDict[Any, tuple]" = OrderedDict()
+_CACHE_MAX = 8
+_LOCK = threading.Lock()
+
+
+def indice_para(refinarias: List[Dict[str, Any]]) -> IndiceRefinarias:
+    """
+    Índice da lista, reaproveitado enquanto códigos e coordenadas não mudarem.
+    A mesma lista (ex.: refinarias da matriz de frete) é achada pela
+    identidade, sem percorrer o conteúdo.
+    """
+    with _LOCK:
+        item = _CACHE.get(id(refinarias))
+        if item is not None and item[0] is refinarias:
+            return item[1]
+
+    chave = tuple((r["codigo"], r.get("lat"), r.get("lon")) for r in refinarias)
+    with _LOCK:
+        item = _CACHE.get(chave)
+    indice = item[1] if item is not None else IndiceRefinarias(refinarias)
+
+    with _LOCK:
+        # guarda a lista junto: o id não é reaproveitado enquanto ela estiver aqui
+        _CACHE[id(refinarias)] = (refinarias, indice)
+        _CACHE[chave] = (refinarias, indice)
+        while len(_CACHE) > _CACHE_MAX:
+            _CACHE.popitem(last=False)
+    return indice
@@ -0,0 +1,202 @@
+# app/services/request_timing.py
+"""
+Tempo por fase das simulações (header Server-Timing + histogramas).
+
+Quando uma cotação demorava, não dava para saber se o tempo tinha ido para o
+n8n (e o LLM lá dentro), para o laudo ou para a serialização. Cada
+requisição instrumentada abre um `Cronometro` (contextvar, então vale também
+para as threads de jobs). O caminho quente marca as fases com `fase(...)`:
+
+    upstream    chamada ao n8n (ou o motor local)
+    decode      JSON da resposta do n8n
+    normalizar  normalizar_resposta
+    laudo       insumos do laudo (gravação) ou renderização em /api/laudo
+    mapear      _mapear_resultados_simulacao
+    encode      jsonify da resposta
+
+Fora de um cronômetro, `fase` não faz nada. No fim da requisição as fases
+viram o header Server-Timing e entram nos histogramas por rota
+(GET /api/simular/tempos).
+
+Se a resposta do n8n trouxer tempos de execução, eles entram como fases
+"n8n-<nome>": {"tempos": {"Diretor de Pricing": 41230, ...}} (ms por nó) e/ou
+"executionTime"/"tempo_execucao_ms" (total), na raiz ou no primeiro item.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# fases internas ficam abaixo de 1 ms; o upstream chega a minutos
+BUCKETS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+    1000, 2500, 5000, 10000, 30000, 60000, 120000, 240000,
+)
+CHAVES_TEMPOS_N8N = ("tempos", "timings")
+CHAVES_TOTAL_N8N = ("executionTime", "tempo_execucao_ms")
+
+_ATUAL: ContextVar[Optional["Cronometro"]] = ContextVar("cronometro_fases", default=None)
+_LOCK = threading.Lock()
+_HISTOGRAMAS: Dict[Tuple[str, str], "_Histograma"] = {}
+
+
+class _Histograma:
+    def __init__(self):
+        self.contagens = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.soma_ms = 0.0
+        self.max_ms = 0.0
+
+    def registrar(self, ms: float) -> None:
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.contagens[i] += 1
+        self.total += 1
+        self.soma_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def _percentil(self, q: float) -> Optional[float]:
+        if not self.total:
+            return None
+        alvo = q * self.total
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            acumulado += c
+            if acumulado >= alvo:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else float("inf")
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "media_ms": round(self.soma_ms / self.total, 3) if self.total else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms_ate": self._percentil(0.50),
+            "p95_ms_ate": self._percentil(0.95),
+            "p99_ms_ate": self._percentil(0.99),
+            "buckets_ms": {
+                (str(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else "+inf"): c
+                for i, c in enumerate(self.contagens)
+            },
+        }
+
+
+class Cronometro:
+    def __init__(self, rota: str):
+        self.rota = rota
+        self.inicio = time.perf_counter()
+        self.fases: List[Tuple[str, float, Optional[str]]] = []
+
+    def registrar(self, nome: str, ms: float, desc: Optional[str] = None) -> None:
+        self.fases.append((nome, ms, desc))
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def como_dict(self) -> Dict[str, float]:
+        """Fases somadas por nome (uma fase pode ocorrer mais de uma vez)."""
+        tempos: Dict[str, float] = {}
+        for nome, ms, _ in self.fases:
+            tempos[nome] = round(tempos.get(nome, 0.0) + ms, 3)
+        tempos["total"] = round(self.total_ms(), 3)
+        return tempos
+
+    def server_timing(self) -> str:
+        partes = []
+        for nome, ms, desc in self.fases:
+            item = f"{_token(nome)};dur={ms:.2f}"
+            if desc:
+                item += f';desc="{_ascii(desc)}"'
+            partes.append(item)
+        partes.append(f"total;dur={self.total_ms():.2f}")
+        return ", ".join(partes)
+
+
+def _ascii(texto: str) -> str:
+    # valor de header: sem acento (nomes de nós do n8n) e sem aspas
+    s = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return s.replace('"', "").replace("\\", "")
+
+
+def _token(nome: str) -> str:
+    # Server-Timing aceita só "token" no nome da métrica
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", _ascii(nome)).strip("-") or "fase"
+
+
+@contextmanager
+def medir(rota: str) -> Iterator[Cronometro]:
+    """Abre o cronômetro da requisição e, no fim, alimenta os histogramas da rota."""
+    cronometro = Cronometro(rota)
+    token = _ATUAL.set(cronometro)
+    try:
+        yield cronometro
+    finally:
+        _ATUAL.reset(token)
+        tempos = cronometro.como_dict()
+        with _LOCK:
+            for nome, ms in tempos.items():
+                hist = _HISTOGRAMAS.get((rota, nome))
+                if hist is None:
+                    hist = _HISTOGRAMAS[(rota, nome)] = _Histograma()
+                hist.registrar(ms)
+
+
+@contextmanager
+def fase(nome: str, desc: Optional[str] = None) -> Iterator[None]:
+    cronometro = _ATUAL.get()
+    if cronometro is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        cronometro.registrar(nome, (time.perf_counter() - inicio) * 1000, desc)
+
+
+def registrar_tempos_n8n(resposta: Any) -> None:
+    """Tempos de execução que o workflow devolveu (se houver) viram fases n8n-*."""
+    cronometro = _ATUAL.get()
+    if cronometro is None:
+        return
+    raiz = resposta[0] if isinstance(resposta, list) and resposta else resposta
+    if isinstance(raiz, dict) and isinstance(raiz.get("json"), dict):
+        raiz = raiz["json"]
+    if not isinstance(raiz, dict):
+        return
+
+    for chave in CHAVES_TOTAL_N8N:
+        ms = _ms(raiz.get(chave))
+        if ms is not None:
+            cronometro.registrar("n8n-total", ms, "execução do workflow")
+            break
+    for chave in CHAVES_TEMPOS_N8N:
+        tempos = raiz.get(chave)
+        if isinstance(tempos, dict):
+            for no, valor in tempos.items():
+                ms = _ms(valor)
+                if ms is not None:
+                    cronometro.registrar(f"n8n-{no}", ms, str(no))
+            break
+
+
+def _ms(valor: Any) -> Optional[float]:
+    try:
+        ms = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return ms if ms >= 0 else None
+
+
+def metricas() -> Dict[str, Dict[str, Any]]:
+    with _LOCK:
+        por_rota: Dict[str, Dict[str, Any]] = {}
+        for (rota, nome), hist in sorted(_HISTOGRAMAS.items()):
+            por_rota.setdefault(rota, {})[nome] = hist.to_dict()
+        return por_rota
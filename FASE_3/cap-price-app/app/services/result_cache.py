@@ -0,0 +1,138 @@
+# app/services/result_cache.py
+"""
+Cache de resultados de simulação (na frente do /api/simular).
+
+A chave é o payload canonicalizado: produto/UF em maiúsculas, cidade sem
+acentos e espaços repetidos, refinarias ordenadas e números arredondados.
+Assim "Vitória"/"VITORIA " e margem "5"/"5.0" caem na mesma entrada.
+
+LRU limitado por bytes (tamanho do JSON de cada resultado). Invalidado por
+inteiro quando chega NOTIFY de cap_precos (linhas com preco_atual='S' em
+cap_precos_refinarias) ou cap_impostos. A chave do cache (`chave_cache`) leva
+também a versão da matriz de frete: coordenadas de refinaria ou constantes de
+frete alteradas (a sincronização da matriz sobe a versão) deixam de acertar as
+entradas antigas, que saem pelo LRU/TTL. Contadores de hit/miss ficam em
+`stats()` para dimensionar SIM_CACHE_MAX_BYTES.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.services import db_listener, freight_matrix, structured_log
+from app.services.city_index import normalizar_cidade
+from app.services.pricing_engine import normalizar_entrada
+
+CANAL_PRECOS = "cap_precos"
+CANAL_IMPOSTOS = "cap_impostos"
+
+
+def chave_simulacao(payload: Dict[str, Any], motor: str = "", versao_frete: Optional[int] = None) -> str:
+    e = normalizar_entrada(payload)
+    canonico = {
+        "motor": motor,
+        "versao_frete": versao_frete,
+        "produto": " ".join(e["produto"].upper().split()),
+        "destino_cidade": normalizar_cidade(e["destino_cidade"]),
+        "destino_uf": e["destino_uf"],
+        "quantidade": round(e["quantidade"], 3),
+        "margem": round(e["margem"], 4),
+        "custo_fixo": round(e["custo_fixo"], 2),
+        "preco_net": round(e["preco_net"], 2),
+        "refinaria": e["refinaria"],
+        "refinarias_permitidas": sorted(set(e["refinarias_permitidas"])),
+    }
+    bruto = json.dumps(canonico, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def chave_cache(payload: Dict[str, Any], motor: str = "") -> str:
+    """`chave_simulacao` com a versão da matriz de frete carregada neste processo."""
+    matriz = freight_matrix.matriz_atual()
+    return chave_simulacao(payload, motor, matriz.versao if matriz is not None else None)
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, ttl: float = 0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._itens: "OrderedDict[str, tuple]" = OrderedDict()  # chave -> (valor, bytes, criado_em)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidacoes = 0
+
+    def obter(self, chave: str) -> Optional[Any]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            valor, tamanho, criado_em = item
+            if self.ttl and time.time() - criado_em > self.ttl:
+                del self._itens[chave]
+                self._bytes -= tamanho
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def guardar(self, chave: str, valor: Any) -> None:
+        tamanho = len(json.dumps(valor, ensure_ascii=False, default=str).encode("utf-8"))
+        if tamanho > self.max_bytes:
+            return
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._bytes -= antigo[1]
+            self._itens[chave] = (valor, tamanho, time.time())
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes and self._itens:
+                _, (_, t, _) = self._itens.popitem(last=False)
+                self._bytes -= t
+                self.evictions += 1
+
+    def limpar(self, motivo: str = "") -> None:
+        with self._lock:
+            self._itens.clear()
+            self._bytes = 0
+            self.invalidacoes += 1
+        structured_log.evento("cache.invalidado", motivo=motivo or "manual")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._itens),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidacoes": self.invalidacoes,
+            }
+
+
+_ESTADO: Dict[str, Optional[ResultCache]] = {"cache": None}
+
+
+def cache() -> Optional[ResultCache]:
+    return _ESTADO["cache"]
+
+
+def init_app(app) -> None:
+    max_bytes = int(app.config.get("SIM_CACHE_MAX_BYTES", 0) or 0)
+    if max_bytes <= 0:
+        return
+    c = ResultCache(max_bytes, float(app.config.get("SIM_CACHE_TTL", 0) or 0))
+    _ESTADO["cache"] = c
+    db_listener.registrar(CANAL_PRECOS, lambda payload: c.limpar(f"{CANAL_PRECOS}:{payload}"))
+    db_listener.registrar(CANAL_IMPOSTOS, lambda payload: c.limpar(f"{CANAL_IMPOSTOS}:{payload}"))
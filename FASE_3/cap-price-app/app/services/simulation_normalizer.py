@@ -0,0 +1,295 @@
+# app/services/simulation_normalizer.py
+"""
+Normalizador único das respostas de simulação (n8n ou motor local).
+
+Antes, a mesma resposta era percorrida várias vezes: o laudo procurava
+"jsons" e "cenarios", o mapper procurava "jsons", "cenarios", "results" e
+"htmls" de novo, e entre uma busca e outra o laudo injetava o HTML na árvore.
+
+Aqui a árvore é percorrida uma vez só (pré-ordem, mesma precedência do antigo
+`_find_first_list`), o formato é detectado e sai uma `RespostaNormalizada`
+com os cenários tipados (`Cenario`, que vira o dict do front em `to_front`)
+e os insumos do laudo. O mapper do front e o laudo consomem esse objeto e não
+mexem mais no JSON original. A mesma passada procura "TabelaV" (sem caixa) nas chaves e textos
+da resposta inteira, como o laudo antigo fazia com str(raiz), e guarda o
+resultado em `tabela_v`; o laudo não varre mais nada ao ser aberto.
+
+Formatos conhecidos (campo `formato`):
+    "jsons"     -> Code Unifica Json do n8n / motor local (dados.jsons)
+    "cenarios"  -> lista em "cenarios"
+    "results"   -> lista em "results"
+    "lista"     -> a própria resposta é uma lista de cenários
+    "objeto"    -> a própria resposta é um único cenário
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+CHAVES_CENARIOS = ("jsons", "cenarios", "results")
+CHAVES_BUSCADAS = CHAVES_CENARIOS + ("htmls",)
+
+
+def _num(val: Any, default: float = 0.0) -> float:
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return default
+
+
+class Cenario(NamedTuple):
+    """
+    Cenário canônico, com os campos do formato que o n8nMapper.js espera (o
+    mesmo do antigo mapper). Tupla nomeada: montar um por cenário custa pouco
+    mais que o dict, mesmo em respostas com milhares de cenários.
+    """
+    origem: str
+    destino: str
+    quantidade: Any
+    precoNet: float
+    frete: float
+    impostos: float
+    difal: float
+    cmv: float
+    margem: float
+    precoFinal: float
+    produto: str
+    destinoCidade: str
+    destinoUF: str
+    refinariaNome: str
+    filialRecomendada: str
+    distanciaKm: float
+    custoFixo: float
+    valorTotal: float
+    # Versão das tabelas de impostos usada no cálculo (motor local)
+    versaoImpostos: Any = None
+
+    def to_front(self) -> Dict[str, Any]:
+        """Dict novo a cada chamada (o mapper acrescenta a referência do laudo)."""
+        d = dict(zip(_CAMPOS_FRONT, self))
+        if self.versaoImpostos is not None:
+            d["versaoImpostos"] = self.versaoImpostos
+        return d
+
+
+# versaoImpostos só vai para o front quando existe
+_CAMPOS_FRONT = Cenario._fields[:-1]
+
+
+@dataclass
+class RespostaNormalizada:
+    formato: str
+    cenarios: List[Cenario]
+    raiz: Any
+    # Insumos do laudo: principal + alternativos (cenariosAlternativos embutidos
+    # no principal, ou as demais posições da lista)
+    principal: Optional[Dict[str, Any]] = None
+    alternativos: List[Dict[str, Any]] = field(default_factory=list)
+    # HTML de laudo que já veio na resposta (htmls), se houver
+    laudo_html: Optional[str] = None
+    # "TabelaV" citado em alguma chave ou texto da resposta (exibe a tabela no laudo)
+    tabela_v: bool = False
+
+
+def _resolvido(achados: Dict[str, Tuple[list, dict]], raiz: Dict[str, Any]) -> bool:
+    """
+    True quando nada mais adiante na árvore muda o resultado: a lista de
+    cenários vencedora já é conhecida (jsons > cenarios > results; a primeira
+    de cada chave, pulando as vazias) e o htmls já foi achado ou está no dono.
+    """
+    dono = None
+    for chave in CHAVES_CENARIOS:
+        if chave not in achados:
+            return False
+        lista, owner = achados[chave]
+        if lista:
+            dono = owner
+            break
+    else:
+        return False
+    return "htmls" in achados or "htmls" in dono or "htmls" in raiz
+
+
+def _cita_tabela_v(textos) -> bool:
+    # um lower() por nó em vez de um por texto; chaves não-str (motor local) via str()
+    try:
+        return "tabelav" in "\n".join(textos).lower()
+    except TypeError:
+        return "tabelav" in "\n".join(map(str, textos)).lower()
+
+
+def _varrer(obj: Any, raiz: Dict[str, Any]) -> Tuple[Dict[str, Tuple[list, dict]], bool]:
+    """
+    Uma passada em pré-ordem: para cada chave de CHAVES_BUSCADAS guarda a
+    primeira lista encontrada e o dict dono dela, e procura "tabelav" nas
+    chaves e textos. Para quando as duas respostas estão decididas: a lista
+    pelo `_resolvido`, a TabelaV ao ser achada (senão a árvore vai até o fim).
+    """
+    achados: Dict[str, Tuple[list, dict]] = {}
+    resolvido = False
+    tabela_v = isinstance(obj, str) and "tabelav" in obj.lower()
+    pilha = [obj]
+    while pilha:
+        atual = pilha.pop()
+        if isinstance(atual, dict):
+            if not resolvido:
+                novo = False
+                for chave in CHAVES_BUSCADAS:
+                    if chave not in achados:
+                        v = atual.get(chave)
+                        if isinstance(v, list):
+                            achados[chave] = (v, atual)
+                            novo = True
+                resolvido = novo and _resolvido(achados, raiz)
+            filhos = atual.values()
+            if not tabela_v:
+                tabela_v = _cita_tabela_v(atual) or _cita_tabela_v(
+                    [v for v in filhos if isinstance(v, str)]
+                )
+        elif isinstance(atual, list):
+            filhos = atual
+            if not tabela_v:
+                tabela_v = _cita_tabela_v([v for v in filhos if isinstance(v, str)])
+        else:
+            continue
+        if resolvido and tabela_v:
+            break
+        pilha.extend([v for v in reversed(filhos) if isinstance(v, (dict, list))])
+    return achados, tabela_v
+
+
+def _html_de(raw_htmls: Any) -> Optional[str]:
+    if isinstance(raw_htmls, list) and raw_htmls:
+        first = raw_htmls[0]
+        if isinstance(first, str):
+            return first
+        if isinstance(first, dict):
+            return first.get("html") or first.get("content") or first.get("body")
+    elif isinstance(raw_htmls, dict):
+        return raw_htmls.get("html") or raw_htmls.get("content") or raw_htmls.get("body")
+    return None
+
+
+def _padroes_raiz(raiz: Dict[str, Any]) -> Dict[str, Any]:
+    """Valores da raiz usados quando o cenário não traz o campo (lidos uma vez)."""
+    return {
+        "quantidade": raiz.get("quantidade") or 0,
+        "produto": raiz.get("produto") or "",
+        "destinoCidade": raiz.get("destinoCidade") or "",
+        "destinoUF": raiz.get("destinoUF") or "",
+    }
+
+
+def _cenario(item: Dict[str, Any], raiz: Dict[str, Any]) -> Cenario:
+    """
+    `Cenario` de um item da resposta; `raiz` são os padrões de `_padroes_raiz`.
+
+    `float(v or 0)` dá o mesmo que `_num(v)` sempre que não levanta erro; só
+    cenários com algum valor não numérico caem no caminho com `_num`.
+    """
+    get = item.get
+    try:
+        numeros = (
+            float(get("precoNet") or get("preco_net") or 0),
+            float(get("frete") or get("frete_por_ton") or 0),
+            float(get("impostos") or 0),
+            float(get("difal") or 0),
+            float(get("cmv") or get("CMV") or get("preco_com_margem") or 0),
+            float(get("margem") or get("margem_percentual") or 0),
+            float(get("precoFinal") or get("preco_final") or get("preco_final_unitario") or 0),
+            float(get("distanciaKm") or 0),
+            float(get("custoFixo") or get("custo_fixo") or 0),
+            float(get("valorTotal") or get("valor_total") or 0),
+        )
+    except (TypeError, ValueError):
+        numeros = (
+            _num(get("precoNet") or get("preco_net") or 0),
+            _num(get("frete") or get("frete_por_ton") or 0),
+            _num(get("impostos")),
+            _num(get("difal")),
+            _num(get("cmv") or get("CMV") or get("preco_com_margem") or 0),
+            _num(get("margem") or get("margem_percentual") or 0),
+            _num(get("precoFinal") or get("preco_final") or get("preco_final_unitario") or 0),
+            _num(get("distanciaKm")),
+            _num(get("custoFixo") or get("custo_fixo")),
+            _num(get("valorTotal") or get("valor_total") or 0),
+        )
+    preco_net, frete, impostos, difal, cmv, margem, preco_final, distancia, custo_fixo, valor_total = numeros
+    return Cenario(
+        get("origem") or get("refinariaNome") or get("refinaria_nome")
+        or get("refinaria_codigo") or "Origem não informada",
+        get("destino") or get("destinoCidade") or "",
+        get("quantidade") or raiz["quantidade"],
+        preco_net,
+        frete,
+        impostos,
+        difal,
+        cmv,
+        margem,
+        preco_final,
+        get("produto") or raiz["produto"],
+        get("destinoCidade") or raiz["destinoCidade"],
+        get("destinoUF") or raiz["destinoUF"],
+        get("refinariaNome") or get("refinaria_nome") or "",
+        get("filialRecomendada") or "",
+        distancia,
+        custo_fixo,
+        valor_total,
+        get("versaoImpostos"),
+    )
+
+
+def normalizar_resposta(resposta: Any) -> RespostaNormalizada:
+    raiz = resposta
+    if isinstance(raiz, list) and raiz and isinstance(raiz[0], dict):
+        raiz = raiz[0]
+    raiz_dict = raiz if isinstance(raiz, dict) else {}
+
+    achados, tabela_v = _varrer(resposta, raiz_dict)
+
+    formato, itens, dono = "", None, None
+    for chave in CHAVES_CENARIOS:
+        lista, owner = achados.get(chave, (None, None))
+        if lista:
+            formato, itens, dono = chave, lista, owner
+            break
+
+    if not itens:
+        if isinstance(resposta, list):
+            formato, itens = "lista", resposta
+        elif isinstance(resposta, dict):
+            formato, itens = "objeto", [resposta]
+        else:
+            itens = []
+
+    padroes = _padroes_raiz(raiz_dict)
+    cenarios = [_cenario(it, padroes) for it in itens if isinstance(it, dict)]
+
+    # ---------- Laudo: principal + alternativos ----------
+    principal = itens[0] if itens and isinstance(itens[0], dict) else None
+    alternativos: List[Dict[str, Any]] = []
+    if principal is not None:
+        embutidos = principal.get("cenariosAlternativos")
+        if isinstance(embutidos, list) and embutidos:
+            alternativos = [alt for alt in embutidos if isinstance(alt, dict)]
+        else:
+            alternativos = [alt for alt in itens[1:] if isinstance(alt, dict)]
+
+    # ---------- HTML que já veio na resposta ----------
+    raw_htmls = None
+    if isinstance(dono, dict) and "htmls" in dono:
+        raw_htmls = dono.get("htmls")
+    if raw_htmls is None and "htmls" in raiz_dict:
+        raw_htmls = raiz_dict.get("htmls")
+    if raw_htmls is None and "htmls" in achados:
+        raw_htmls = achados["htmls"][0]
+
+    return RespostaNormalizada(
+        formato=formato,
+        cenarios=cenarios,
+        raiz=raiz,
+        principal=principal,
+        alternativos=alternativos,
+        laudo_html=_html_de(raw_htmls),
+        tabela_v=tabela_v,
+    )
@@ -0,0 +1,158 @@
+# app/services/simulation_response.py
+"""
+Formato v2 da resposta de simulação (compacto e comprimido).
+
+No formato v1 (padrão, lista de cenários) cada cenário repete o laudo
+(laudoId/laudoUrl ou, sem insumos, o laudoHtml inteiro) e os campos que são
+iguais em todos (produto, destino, quantidade, margem, ...), com as chaves
+escritas de novo em cada item. O v2 é pedido com
+
+    Accept: application/vnd.capprice.simulacao.v2+json   ou   ?v=2
+
+e tem a forma
+
+    {
+      "versao": 2,
+      "laudo": {"id": ..., "url": ...} | {"html": ...} | null,
+      "comum": {"produto": "CAP 50/70", "destinoUF": "SP", ...},
+      "campos": ["origem", "precoNet", "frete", ...],
+      "cenarios": [["Paulínia", 3100.0, 210.5, ...], ...]
+    }
+
+em que cada cenário é `comum` + zip(campos, linha); campo ausente num cenário
+vem como null. O corpo é serializado uma vez, sem sort_keys, e, acima de
+RESPOSTA_COMPRIMIR_MIN bytes, comprimido com brotli (se o pacote estiver
+instalado) ou gzip, conforme o Accept-Encoding. Corpos que não são lista de
+cenários (erros) saem como estão.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+from typing import Any, Dict, List
+
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só gzip
+    brotli = None
+
+MIME_V2 = "application/vnd.capprice.simulacao.v2+json"
+VERSAO = 2
+
+# chave no cenário v1 -> chave em "laudo"
+CAMPOS_LAUDO = {"laudoId": "id", "laudoUrl": "url", "laudoHtml": "html"}
+
+_AUSENTE = object()
+
+
+def quer_v2() -> bool:
+    """Formato pedido pelo request atual (?v=2 / ?formato=v2 ou header Accept)."""
+    versao = (request.args.get("v") or request.args.get("formato") or "").strip().lower()
+    if versao in ("2", "v2"):
+        return True
+    return MIME_V2 in (request.headers.get("Accept") or "")
+
+
+def compactar(resultados: Any) -> Any:
+    """Lista de cenários v1 -> corpo v2. Não altera a lista (ela pode estar no cache)."""
+    if not isinstance(resultados, list) or not resultados:
+        return resultados
+    if not all(isinstance(c, dict) for c in resultados):
+        return resultados
+
+    primeiro = resultados[0]
+    laudo: Dict[str, Any] = {}
+    for chave, curta in CAMPOS_LAUDO.items():
+        for cenario in resultados:
+            if cenario.get(chave):
+                laudo[curta] = cenario[chave]
+                break
+
+    ordem = list(primeiro)
+    if all(list(c) == ordem for c in resultados[1:]):
+        # caso normal (cenários do normalizador): mesmas chaves na mesma ordem; transpõe em C
+        comum, campos, linhas = _por_colunas(ordem, resultados)
+    else:
+        comum, campos, linhas = _por_chaves(primeiro, resultados)
+
+    return {
+        "versao": VERSAO,
+        "laudo": laudo or None,
+        "comum": comum,
+        "campos": campos,
+        "cenarios": linhas,
+    }
+
+
+def _constante(coluna: tuple) -> bool:
+    # 1 == 1.0 == True em Python; no JSON são valores diferentes
+    return coluna.count(coluna[0]) == len(coluna) and len(set(map(type, coluna))) == 1
+
+
+def _por_colunas(ordem: List[str], resultados: List[Dict[str, Any]]):
+    comum: Dict[str, Any] = {}
+    campos: List[str] = []
+    variaveis = []
+    for chave, coluna in zip(ordem, zip(*(c.values() for c in resultados))):
+        if chave in CAMPOS_LAUDO:
+            continue
+        if _constante(coluna):
+            comum[chave] = coluna[0]
+        else:
+            campos.append(chave)
+            variaveis.append(coluna)
+    linhas = [list(linha) for linha in zip(*variaveis)] if variaveis else [[] for _ in resultados]
+    return comum, campos, linhas
+
+
+def _por_chaves(primeiro: Dict[str, Any], resultados: List[Dict[str, Any]]):
+    chaves = [k for k in primeiro if k not in CAMPOS_LAUDO]
+    vistas = set(CAMPOS_LAUDO).union(chaves)
+    for cenario in resultados[1:]:
+        for chave in cenario:
+            if chave not in vistas:
+                vistas.add(chave)
+                chaves.append(chave)
+
+    comum: Dict[str, Any] = {}
+    campos: List[str] = []
+    for chave in chaves:
+        coluna = tuple(c.get(chave, _AUSENTE) for c in resultados)
+        if coluna[0] is not _AUSENTE and _constante(coluna):
+            comum[chave] = coluna[0]
+        else:
+            campos.append(chave)
+    linhas = [[c.get(chave) for chave in campos] for c in resultados]
+    return comum, campos, linhas
+
+
+def _comprimir(dados: bytes):
+    """(corpo, Content-Encoding) conforme o Accept-Encoding do request atual."""
+    if len(dados) < int(current_app.config.get("RESPOSTA_COMPRIMIR_MIN", 1024)):
+        return dados, None
+    opcoes = ["br", "gzip"] if brotli is not None else ["gzip"]
+    codificacao = request.accept_encodings.best_match(opcoes)
+    if codificacao == "br":
+        nivel = int(current_app.config.get("RESPOSTA_BROTLI_NIVEL", 4))
+        return brotli.compress(dados, quality=nivel), "br"
+    if codificacao == "gzip":
+        nivel = int(current_app.config.get("RESPOSTA_GZIP_NIVEL", 1))
+        return gzip.compress(dados, compresslevel=nivel, mtime=0), "gzip"
+    return dados, None
+
+
+def codificar(corpo: Any) -> bytes:
+    # ensure_ascii: o encoder em C é mais rápido assim, e o escape some na compressão
+    return json.dumps(corpo, separators=(",", ":"), default=str).encode("ascii")
+
+
+def resposta(corpo: Any, status: int = 200) -> Response:
+    """Response v2: corpo compactado (se for lista de cenários), JSON enxuto e comprimido."""
+    dados, codificacao = _comprimir(codificar(compactar(corpo)))
+    resp = Response(dados, status=status, mimetype=MIME_V2)
+    if codificacao:
+        resp.headers["Content-Encoding"] = codificacao
+    resp.headers["Vary"] = "Accept, Accept-Encoding"
+    return resp
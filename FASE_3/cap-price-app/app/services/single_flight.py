@@ -0,0 +1,55 @@
+# app/services/single_flight.py
+"""
+Single-flight: chamadas idênticas em andamento viram uma só.
+
+O primeiro chamador de uma chave executa a função; quem chega com a mesma
+chave enquanto ela roda espera o mesmo Future em vez de disparar outra
+execução (ex.: duplo clique em "Simular" ou vários representantes cotando a
+mesma rota no n8n). Vale por processo.
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_voo: Dict[str, Future] = {}
+        self.execucoes = 0
+        self.compartilhadas = 0
+
+    def executar(self, chave: str, funcao: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Devolve (resultado, compartilhado). Exceções do líder chegam a todos."""
+        with self._lock:
+            fut = self._em_voo.get(chave)
+            if fut is not None:
+                self.compartilhadas += 1
+                lider = False
+            else:
+                fut = Future()
+                self._em_voo[chave] = fut
+                self.execucoes += 1
+                lider = True
+
+        if not lider:
+            return fut.result(), True
+
+        try:
+            fut.set_result(funcao())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._em_voo.pop(chave, None)
+        return fut.result(), False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "em_voo": len(self._em_voo),
+                "execucoes": self.execucoes,
+                "compartilhadas": self.compartilhadas,
+            }
@@ -0,0 +1,135 @@
+# app/services/tax_cache.py
+"""
+Cache em memória das tabelas de impostos (ICMS e PIS/COFINS).
+
+Substitui as consultas BuscaDadosICMS e RETORNA_PIS_COFINS que o workflow
+fazia a cada cotação. As tabelas são carregadas no startup em arrays densos:
+
+    icms_inter[origem, destino]   matriz 27×27 (icms_interestadual)
+    icms_interno[uf]              vetor 27    (icms_interno_uf)
+    pis / cofins                  impostos_federais_venda (CUMULATIVO)
+
+Triggers nas três tabelas fazem pg_notify('cap_impostos'); o listener marca
+o cache como sujo e a próxima leitura recarrega, incrementando `versao`.
+Os cenários calculados levam essa versão (versaoImpostos).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+from flask import current_app
+
+from app.services import db_listener, pricing_data, structured_log
+
+CANAL = "cap_impostos"
+
+UFS = (
+    "AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO",
+    "MA", "MG", "MS", "MT", "PA", "PB", "PE", "PI", "PR",
+    "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO",
+)
+UF_IDX = {uf: i for i, uf in enumerate(UFS)}
+
+# Defaults do BuscaDadosICMS (COALESCE) e do regime cumulativo
+ICMS_INTERESTADUAL_PADRAO = 12.00
+ICMS_INTERNO_PADRAO = 18.00
+PIS_PADRAO = 0.65
+COFINS_PADRAO = 3.00
+
+_LOCK = threading.Lock()
+_ESTADO: Dict[str, Any] = {"tabelas": None, "versao": 0, "sujo": True, "carregado_em": 0.0}
+
+
+class TabelasTributarias:
+    def __init__(self, icms_inter: np.ndarray, icms_interno: np.ndarray,
+                 pis: Optional[float], cofins: Optional[float], versao: int):
+        self.icms_inter = icms_inter
+        self.icms_interno = icms_interno
+        self.pis = PIS_PADRAO if pis is None else pis
+        self.cofins = COFINS_PADRAO if cofins is None else cofins
+        self.versao = versao
+
+    def icms_por_origem(self, ufs_origem, uf_destino: str) -> np.ndarray:
+        """
+        Alíquota de ICMS aplicável para cada UF de origem → destino:
+        interna do destino quando a origem é a mesma UF, senão interestadual.
+        """
+        ufs_origem = list(ufs_origem)
+        d = UF_IDX.get(uf_destino)
+        interna = ICMS_INTERNO_PADRAO
+        if d is not None and np.isfinite(self.icms_interno[d]):
+            interna = float(self.icms_interno[d])
+
+        o = np.array([UF_IDX.get(uf, -1) for uf in ufs_origem], dtype=np.int64)
+        inter = np.full(len(o), ICMS_INTERESTADUAL_PADRAO, dtype=np.float64)
+        if d is not None:
+            conhecidas = o >= 0
+            valores = self.icms_inter[o[conhecidas], d]
+            inter[conhecidas] = np.where(np.isfinite(valores), valores, ICMS_INTERESTADUAL_PADRAO)
+
+        mesma_uf = np.array([uf == uf_destino for uf in ufs_origem], dtype=bool)
+        return np.where(mesma_uf, interna, inter)
+
+
+def _carregar(versao: int) -> TabelasTributarias:
+    icms_inter = np.full((len(UFS), len(UFS)), np.nan, dtype=np.float64)
+    for origem, destino, aliq in pricing_data.carregar_icms_interestadual():
+        o, d = UF_IDX.get(origem), UF_IDX.get(destino)
+        if o is not None and d is not None:
+            icms_inter[o, d] = aliq
+
+    icms_interno = np.full(len(UFS), np.nan, dtype=np.float64)
+    for uf, aliq in pricing_data.carregar_icms_interno().items():
+        if uf in UF_IDX:
+            icms_interno[UF_IDX[uf]] = aliq
+
+    pis, cofins = pricing_data.carregar_pis_cofins()
+    return TabelasTributarias(icms_inter, icms_interno, pis, cofins, versao)
+
+
+def invalidar(payload: str = "") -> None:
+    _ESTADO["sujo"] = True
+
+
+def tabelas() -> TabelasTributarias:
+    ttl = float(current_app.config.get("TAX_CACHE_TTL", 0) or 0)
+    expirado = ttl > 0 and time.time() - _ESTADO["carregado_em"] >= ttl
+    if _ESTADO["tabelas"] is not None and not _ESTADO["sujo"] and not expirado:
+        return _ESTADO["tabelas"]
+
+    with _LOCK:
+        if _ESTADO["tabelas"] is None or _ESTADO["sujo"] or expirado:
+            # limpa antes de ler: uma notificação durante a carga marca de novo
+            _ESTADO["sujo"] = False
+            try:
+                _ESTADO["tabelas"] = _carregar(_ESTADO["versao"] + 1)
+            except Exception:
+                _ESTADO["sujo"] = True
+                raise
+            _ESTADO["versao"] += 1
+            _ESTADO["carregado_em"] = time.time()
+            structured_log.evento("impostos.tabelas_carregadas", versao=_ESTADO["versao"])
+        return _ESTADO["tabelas"]
+
+
+def versao() -> Dict[str, Any]:
+    return {
+        "versao": _ESTADO["versao"],
+        "carregado_em": _ESTADO["carregado_em"] or None,
+        "pendente_recarga": bool(_ESTADO["sujo"]),
+    }
+
+
+def init_app(app) -> None:
+    if not (app.config.get("DATABASE_URL") or "").strip():
+        return
+    db_listener.registrar(CANAL, invalidar)
+    try:
+        with app.app_context():
+            tabelas()
+    except Exception as e:
+        # não derruba a app: a próxima cotação tenta de novo
+        structured_log.evento("impostos.falha_startup", "error", exc=e)
@@ -1,13 +1,16 @@
 // app/static/js/pages/precificar.js
 
 import {
+  fetchCidades,
   fetchSimulacao,
   formatCurrency,
   formatPercent,
 } from "../services/simulationService.js";
+import { enviarMensagemChat } from "../services/chatService.js";
 import { normalizarResposta } from "../services/n8nMapper.js";
-import { extrairLaudoHtml } from "../services/n8nLaudoMapper.js";
+import { extrairLaudoHtml, extrairLaudoUrl } from "../services/n8nLaudoMapper.js";
 import { initLaudoHandlers } from "./precificarLaudo.js";
+import { initGradeHandlers } from "./precificarGrade.js";
 
 export function init() {
   // --- Seletores de Elementos ---
@@ -21,6 +24,7 @@ export function init() {
 
   const resultadoSection = document.getElementById("resultado-section");
   const loadingSection = document.getElementById("loading-section");
+  const loadingStatus = document.getElementById("loading-status");
   const btnVoltar = document.getElementById("btn-voltar");
 
   const tabsHeader = document.getElementById("tabs-header");
@@ -84,6 +88,25 @@ export function init() {
     iframe: laudoIframe,
   });
 
+  // --- Grade what-if (sliders sem novas chamadas) ---
+  const gradeHandlers = initGradeHandlers({
+    container: document.getElementById("grade-section"),
+    sliderMargem: document.getElementById("grade-margem"),
+    sliderCustoFixo: document.getElementById("grade-custo-fixo"),
+    sliderPrecoNet: document.getElementById("grade-preco-net"),
+    campos: {
+      margem: document.getElementById("grade-margem-valor"),
+      custoFixo: document.getElementById("grade-custo-fixo-valor"),
+      precoNet: document.getElementById("grade-preco-net-valor"),
+      refinaria: document.getElementById("grade-refinaria"),
+      precoFinal: document.getElementById("grade-preco-final"),
+      valorTotal: document.getElementById("grade-valor-total"),
+      icms: document.getElementById("grade-icms"),
+      pis: document.getElementById("grade-pis"),
+      cofins: document.getElementById("grade-cofins"),
+    },
+  });
+
   // =========================
   //   RESULTADOS / CARDS
   // =========================
@@ -262,8 +285,20 @@ export function init() {
   // =========================
   //      ESTADO DE TELA
   // =========================
+  function atualizarStatusJob(job) {
+    if (!loadingStatus || !job) return;
+    if (job.status === "pendente") {
+      loadingStatus.textContent = job.posicao_fila
+        ? `Na fila de simulação (posição ${job.posicao_fila})...`
+        : "Na fila de simulação...";
+    } else {
+      loadingStatus.textContent = "Calculando melhor cenário...";
+    }
+  }
+
   function showLoading() {
     if (!simulacaoForm) return;
+    if (loadingStatus) loadingStatus.textContent = "Calculando melhor cenário...";
     simulacaoForm.classList.add("hidden");
     resultadoSection.classList.add("hidden");
     loadingSection.classList.remove("hidden");
@@ -276,6 +311,7 @@ export function init() {
     if (chatSendSim) chatSendSim.disabled = true;
 
     laudoHandlers.resetLaudo();
+    gradeHandlers.resetGrade();
     destruirGraficos();
   }
 
@@ -374,6 +410,7 @@ export function init() {
     if (chatSendSim) chatSendSim.disabled = true;
 
     laudoHandlers.resetLaudo();
+    gradeHandlers.resetGrade();
     destruirGraficos();
   }
 
@@ -381,7 +418,38 @@ export function init() {
   //      BUSCA DE CIDADES
   // =========================
   if (destinoUfSelect && destinoCidadeInput && cidadesDatalist) {
-    destinoUfSelect.addEventListener("change", async (e) => {
+    // Respostas já vistas nesta página (chave: UF|texto digitado)
+    const cidadesCache = new Map();
+    let buscaCidadesTimer = null;
+    let buscaCidadesSeq = 0;
+
+    function preencherCidades(cidades) {
+      cidadesDatalist.innerHTML = "";
+      cidades.forEach((cidade) => {
+        const option = document.createElement("option");
+        option.value = cidade.nome;
+        cidadesDatalist.appendChild(option);
+      });
+    }
+
+    async function buscarCidades(uf, q) {
+      const chave = `${uf}|${q.trim().toUpperCase()}`;
+      const seq = ++buscaCidadesSeq;
+      try {
+        if (!cidadesCache.has(chave)) {
+          cidadesCache.set(chave, await fetchCidades(uf, q));
+        }
+        // descarta respostas de buscas já superadas pela digitação
+        if (seq === buscaCidadesSeq) preencherCidades(cidadesCache.get(chave));
+        destinoCidadeInput.classList.remove("border-red-500");
+      } catch (error) {
+        console.error("Erro ao buscar cidades:", error);
+        destinoCidadeInput.placeholder = "Erro ao carregar cidades";
+        destinoCidadeInput.classList.add("border-red-500");
+      }
+    }
+
+    destinoUfSelect.addEventListener("change", (e) => {
       const uf = e.target.value;
 
       destinoCidadeInput.value = "";
@@ -395,35 +463,20 @@ export function init() {
         return;
       }
 
-      destinoCidadeInput.disabled = true;
-      destinoCidadeInput.placeholder = "Carregando cidades...";
-
-      try {
-        const response = await fetch(
-          `https://servicodados.ibge.gov.br/api/v1/localidades/estados/${uf}/municipios`,
-        );
-        if (!response.ok) {
-          throw new Error("Não foi possível carregar as cidades.");
-        }
-        const cidades = await response.json();
-        cidades.forEach((cidade) => {
-          const option = document.createElement("option");
-          option.value = cidade.nome;
-          cidadesDatalist.appendChild(option);
-        });
-
-        destinoCidadeInput.disabled = false;
-        destinoCidadeInput.placeholder = "Digite ou selecione a cidade";
-      } catch (error) {
-        console.error("Erro ao buscar cidades:", error);
-        destinoCidadeInput.disabled = true;
-        destinoCidadeInput.placeholder = "Erro ao carregar cidades";
-        destinoCidadeInput.classList.add("border-red-500");
-      }
+      destinoCidadeInput.disabled = false;
+      destinoCidadeInput.placeholder = "Digite ou selecione a cidade";
+      buscarCidades(uf, "");
     });
 
     destinoCidadeInput.addEventListener("input", () => {
       destinoCidadeInput.classList.remove("border-red-500");
+      const uf = destinoUfSelect.value;
+      if (!uf) return;
+      clearTimeout(buscaCidadesTimer);
+      buscaCidadesTimer = setTimeout(
+        () => buscarCidades(uf, destinoCidadeInput.value),
+        80,
+      );
     });
   }
 
@@ -476,7 +529,9 @@ export function init() {
     };
 
     try {
-      const apiResult = await fetchSimulacao(formData);
+      const apiResult = await fetchSimulacao(formData, {
+        onStatus: atualizarStatusJob,
+      });
 
       // 1) Mapper de cenários (agora mais robusto)
       const { opcoes } = normalizarResposta(apiResult, contextoForm);
@@ -486,15 +541,23 @@ export function init() {
 
       console.log("📊 opcoes normalizadas:", opcoes);
       console.log("📄 laudoHtml (laudo mapper) presente?", !!laudoHtml);
+      console.log("📄 laudoUrl presente?", !!extrairLaudoUrl(apiResult));
 
       if (!opcoes || opcoes.length === 0) {
         throw new Error("Simulação não retornou opções válidas.");
       }
 
-      // Prioriza o HTML vindo do mapper de laudo
-      laudoHandlers.setLaudoHtml(laudoHtml || opcoes[0]?.laudoHtml || null);
+      // Laudo sob demanda: só guarda a URL; o HTML é buscado ao abrir/baixar
+      const laudoUrl = extrairLaudoUrl(apiResult) || opcoes[0]?.laudoUrl || null;
+      if (laudoUrl) {
+        laudoHandlers.setLaudoUrl(laudoUrl);
+      } else {
+        // Prioriza o HTML vindo do mapper de laudo
+        laudoHandlers.setLaudoHtml(laudoHtml || opcoes[0]?.laudoHtml || null);
+      }
 
       showResults(opcoes);
+      gradeHandlers.carregar(formData);
     } catch (error) {
       console.error("Erro ao buscar simulação:", error);
       showProfile();
@@ -622,29 +685,29 @@ export function init() {
     if (chatSend) chatSend.disabled = true;
     if (chatSendSim) chatSendSim.disabled = true;
 
-    try {
-      const response = await fetch("/api/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          message: text,
-          session_id: chatSessionId,
-        }),
-      });
-      const data = await response.json();
-      console.log("🔎 /api/chat status:", response.status, "body:", data);
-
-      if (!response.ok) throw new Error(data.reply || "Erro na resposta da API");
-
-      const aiMessage = data.reply;
+    // bolha da IA: criada no primeiro pedaço e preenchida conforme o texto chega
+    let aiTexto = null;
+    const garantirBolhaIA = () => {
+      if (aiTexto) return aiTexto;
       const aiBubble = document.createElement("div");
       aiBubble.className = "flex justify-start";
       aiBubble.innerHTML =
-        '<div class="bg-gray-200 text-gray-800 p-2 px-3 rounded-lg max-w-xs whitespace-pre-line"><p class="text-sm">' +
-        aiMessage +
-        "</p></div>";
+        '<div class="bg-gray-200 text-gray-800 p-2 px-3 rounded-lg max-w-xs whitespace-pre-line"><p class="text-sm"></p></div>';
       aiTyping.classList.add("hidden");
       chatWindow.appendChild(aiBubble);
+      aiTexto = aiBubble.querySelector("p");
+      return aiTexto;
+    };
+
+    try {
+      const aiMessage = await enviarMensagemChat(text, chatSessionId, {
+        onTexto: (_pedaco, acumulado) => {
+          garantirBolhaIA().textContent = acumulado;
+          chatWindow.scrollTop = chatWindow.scrollHeight;
+        },
+      });
+      console.log("🔎 /api/chat/stream resposta:", aiMessage);
+      garantirBolhaIA().textContent = aiMessage;
     } catch (error) {
       console.error("Erro chat:", error);
       aiTyping.classList.add("hidden");
@@ -0,0 +1,157 @@
+// app/static/js/pages/precificarGrade.js
+// Sensibilidade "what-if" da simulação:
+// - busca a grade margem x custo fixo x preço net x refinaria uma vez
+//   (/api/simular/grid) logo depois do resultado
+// - os sliders só indexam a resposta colunar, sem novas chamadas ao servidor
+
+import {
+  fetchGradeWhatIf,
+  formatCurrency,
+  formatPercent,
+} from "../services/simulationService.js";
+
+const PONTOS_PRECO_NET = 10; // passos para cada lado do preço net informado
+
+function num(v) {
+  const n = Number(v);
+  return Number.isFinite(n) ? n : 0;
+}
+
+// Eixos pedidos ao backend a partir do formulário (a cotação base fica na grade)
+function montarEixos(formData) {
+  const margem = num(formData.get("margem"));
+  const custoFixo = num(formData.get("custo_fixo"));
+  const precoNet = num(formData.get("preco_net"));
+
+  const eixos = {
+    margem: { min: 0, max: Math.max(30, Math.ceil(margem * 2)), passo: 0.5 },
+    custo_fixo: { min: 0, max: Math.max(300, Math.ceil(custoFixo * 2)), passo: 10 },
+    // 0 = preço de tabela de cada refinaria
+    preco_net: [0],
+  };
+  if (margem) eixos.margem = [...gerar(eixos.margem), margem];
+  if (custoFixo) eixos.custo_fixo = [...gerar(eixos.custo_fixo), custoFixo];
+  if (precoNet > 0) {
+    const passo = Math.max(1, Math.round(precoNet * 0.02));
+    eixos.preco_net = [];
+    for (let i = -PONTOS_PRECO_NET; i <= PONTOS_PRECO_NET; i++) {
+      const v = precoNet + i * passo;
+      if (v > 0) eixos.preco_net.push(v);
+    }
+  }
+  return eixos;
+}
+
+function gerar({ min, max, passo }) {
+  const valores = [];
+  for (let v = min; v <= max + 1e-9; v += passo) valores.push(Math.round(v * 100) / 100);
+  return valores;
+}
+
+function indiceMaisProximo(valores, alvo) {
+  let melhor = 0;
+  valores.forEach((v, i) => {
+    if (Math.abs(v - alvo) < Math.abs(valores[melhor] - alvo)) melhor = i;
+  });
+  return melhor;
+}
+
+export function initGradeHandlers({
+  container,
+  sliderMargem,
+  sliderCustoFixo,
+  sliderPrecoNet,
+  campos, // { margem, custoFixo, precoNet, refinaria, precoFinal, valorTotal, icms, pis, cofins }
+}) {
+  let grade = null;
+  let requisicao = 0;
+
+  const setText = (el, val) => {
+    if (el) el.textContent = val;
+  };
+
+  function esconder() {
+    if (container) container.classList.add("hidden");
+  }
+
+  function configurarSlider(slider, valores, inicial) {
+    if (!slider) return;
+    slider.min = 0;
+    slider.max = Math.max(0, valores.length - 1);
+    slider.step = 1;
+    slider.value = indiceMaisProximo(valores, inicial);
+    slider.disabled = valores.length < 2;
+  }
+
+  // Lê a célula (margem, custo fixo, preço net) da refinaria vencedora
+  function atualizar() {
+    if (!grade) return;
+    const { eixos, colunas, vencedora, forma } = grade;
+    const [, C, P, R] = forma;
+    const im = num(sliderMargem?.value);
+    const ic = num(sliderCustoFixo?.value);
+    const ip = num(sliderPrecoNet?.value);
+
+    const combinacao = (im * C + ic) * P + ip;
+    const ir = vencedora[combinacao];
+
+    setText(campos.margem, formatPercent(eixos.margem[im]));
+    setText(campos.custoFixo, formatCurrency(eixos.custo_fixo[ic]));
+    setText(
+      campos.precoNet,
+      eixos.preco_net[ip] > 0 ? formatCurrency(eixos.preco_net[ip]) : "Tabela",
+    );
+
+    if (ir < 0) {
+      setText(campos.refinaria, "Sem preço para esta combinação");
+      ["precoFinal", "valorTotal", "icms", "pis", "cofins"].forEach((k) =>
+        setText(campos[k], "-"),
+      );
+      return;
+    }
+
+    const i = combinacao * R + ir;
+    const ref = grade.refinarias[ir];
+    setText(campos.refinaria, ref.nome || ref.codigo);
+    setText(campos.precoFinal, formatCurrency(colunas.precoFinal[i]));
+    setText(campos.valorTotal, formatCurrency(colunas.valorTotal[i]));
+    setText(campos.icms, formatCurrency(colunas.vlr_icms[i]));
+    setText(campos.pis, formatCurrency(colunas.vlr_pis[i]));
+    setText(campos.cofins, formatCurrency(colunas.vlr_cofins[i]));
+  }
+
+  async function carregar(formData) {
+    const atual = ++requisicao;
+    grade = null;
+    esconder();
+    try {
+      const resposta = await fetchGradeWhatIf(formData, montarEixos(formData));
+      if (atual !== requisicao) return; // nova simulação no meio do caminho
+      grade = resposta;
+    } catch (e) {
+      // Grade é complemento: sem ela o resultado continua valendo
+      console.warn("Grade what-if indisponível:", e.message);
+      return;
+    }
+
+    configurarSlider(sliderMargem, grade.eixos.margem, num(formData.get("margem")));
+    configurarSlider(sliderCustoFixo, grade.eixos.custo_fixo, num(formData.get("custo_fixo")));
+    configurarSlider(sliderPrecoNet, grade.eixos.preco_net, num(formData.get("preco_net")));
+    atualizar();
+    if (container) container.classList.remove("hidden");
+  }
+
+  function resetGrade() {
+    requisicao += 1;
+    grade = null;
+    esconder();
+  }
+
+  [sliderMargem, sliderCustoFixo, sliderPrecoNet].forEach((slider) => {
+    if (slider) slider.addEventListener("input", atualizar);
+  });
+
+  esconder();
+
+  return { carregar, resetGrade };
+}
@@ -1,6 +1,7 @@
 // app/static/js/pages/precificarLaudo.js
 // Responsável apenas por controlar o Laudo (HTML):
-// - estado interno do último laudo
+// - estado interno do último laudo (HTML pronto ou URL do /api/laudo/<id>,
+//   buscada só quando o usuário abre/baixa)
 // - habilitar/desabilitar botões
 // - visualizar em modal
 // - imprimir/baixar em PDF via print
@@ -13,10 +14,11 @@ export function initLaudoHandlers({
   iframe,
 }) {
   let ultimoLaudoHtml = null;
+  let ultimoLaudoUrl = null;
 
   // --- Helpers internos ---
   function atualizarBotoes() {
-    const hasLaudo = !!ultimoLaudoHtml;
+    const hasLaudo = !!(ultimoLaudoHtml || ultimoLaudoUrl);
     if (btnDownload) btnDownload.disabled = !hasLaudo;
     if (btnVisualizar) btnVisualizar.disabled = !hasLaudo;
   }
@@ -34,20 +36,53 @@ export function initLaudoHandlers({
     atualizarBotoes();
   }
 
+  function setLaudoUrl(url) {
+    ultimoLaudoUrl = url || null;
+    ultimoLaudoHtml = null;
+    atualizarBotoes();
+  }
+
   function resetLaudo() {
     ultimoLaudoHtml = null;
+    ultimoLaudoUrl = null;
     atualizarBotoes();
     fecharModal();
   }
 
+  // Busca o HTML no backend na primeira vez e guarda para os próximos cliques
+  async function obterLaudoHtml() {
+    if (ultimoLaudoHtml) return ultimoLaudoHtml;
+    if (!ultimoLaudoUrl) return null;
+
+    const response = await fetch(ultimoLaudoUrl);
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.message || `Erro ${response.status} ao carregar o laudo.`);
+    }
+    ultimoLaudoHtml = await response.text();
+    return ultimoLaudoHtml;
+  }
+
+  async function laudoOuAviso() {
+    try {
+      const html = await obterLaudoHtml();
+      if (!html) {
+        alert("Nenhum laudo disponível. Execute uma simulação primeiro.");
+      }
+      return html;
+    } catch (e) {
+      console.error("Erro ao carregar laudo:", e);
+      alert("Não foi possível carregar o laudo: " + e.message);
+      return null;
+    }
+  }
+
   // --- Eventos dos botões ---
   // Baixar / imprimir laudo
   if (btnDownload) {
-    btnDownload.addEventListener("click", () => {
-      if (!ultimoLaudoHtml) {
-        alert("Nenhum laudo disponível. Execute uma simulação primeiro.");
-        return;
-      }
+    btnDownload.addEventListener("click", async () => {
+      const laudoHtml = await laudoOuAviso();
+      if (!laudoHtml) return;
 
       let printIframe = document.getElementById("laudo-print-iframe");
       if (!printIframe) {
@@ -87,7 +122,7 @@ export function initLaudoHandlers({
           </style>
         </head>
         <body>
-          ${ultimoLaudoHtml}
+          ${laudoHtml}
         </body>
         </html>
       `);
@@ -107,12 +142,10 @@ export function initLaudoHandlers({
 
   // Visualizar laudo em modal (iframe)
   if (btnVisualizar && modal && iframe) {
-    btnVisualizar.addEventListener("click", () => {
-      if (!ultimoLaudoHtml) {
-        alert("Nenhum laudo disponível. Execute uma simulação primeiro.");
-        return;
-      }
-      iframe.srcdoc = ultimoLaudoHtml;
+    btnVisualizar.addEventListener("click", async () => {
+      const laudoHtml = await laudoOuAviso();
+      if (!laudoHtml) return;
+      iframe.srcdoc = laudoHtml;
       modal.classList.remove("hidden");
       modal.classList.add("flex");
     });
@@ -141,6 +174,7 @@ export function initLaudoHandlers({
   // Expõe API simples para o precificar.js
   return {
     setLaudoHtml,
+    setLaudoUrl,
     resetLaudo,
   };
 }
@@ -0,0 +1,72 @@
+// app/static/js/services/chatService.js
+
+/**
+ * Envia uma mensagem ao assistente pelo /api/chat/stream e entrega o texto
+ * aos pedaços, conforme o n8n gera (SSE: eventos delta / fim / erro).
+ * Sem ReadableStream no navegador, lê a resposta inteira de uma vez.
+ * @param {string} message - Texto do usuário.
+ * @param {string} sessionId - Sessão do chat (memória do agente no n8n).
+ * @param {{onTexto?: function(string, string): void}} [opcoes] - Chamado a cada
+ *   pedaço com (pedaço, texto acumulado até aqui).
+ * @returns {Promise<string>} - Resposta completa do assistente.
+ */
+export async function enviarMensagemChat(message, sessionId, { onTexto } = {}) {
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify({ message, session_id: sessionId }),
+    });
+
+    const tipo = response.headers.get('Content-Type') || '';
+    if (!response.ok || !tipo.includes('text/event-stream')) {
+        // erros antes do stream começar vêm em JSON ({"reply": ...})
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.reply || `Erro ${response.status}: Falha ao falar com o assistente.`);
+    }
+
+    let acumulado = '';
+    let final = null;
+    let erro = null;
+
+    const tratarEvento = (bruto) => {
+        let nome = 'message';
+        const dados = [];
+        for (const linha of bruto.split('\n')) {
+            if (linha.startsWith('event:')) nome = linha.slice(6).trim();
+            else if (linha.startsWith('data:')) dados.push(linha.slice(5).replace(/^ /, ''));
+        }
+        if (!dados.length) return;
+        const payload = JSON.parse(dados.join('\n'));
+        if (nome === 'delta') {
+            acumulado += payload.texto || '';
+            if (onTexto) onTexto(payload.texto || '', acumulado);
+        } else if (nome === 'fim') {
+            final = payload.reply;
+        } else if (nome === 'erro') {
+            erro = payload.reply;
+        }
+    };
+
+    if (!response.body || !response.body.getReader) {
+        const texto = await response.text();
+        texto.split('\n\n').forEach((bruto) => bruto.trim() && tratarEvento(bruto));
+    } else {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, '\n');
+            let fimEvento;
+            while ((fimEvento = buffer.indexOf('\n\n')) >= 0) {
+                tratarEvento(buffer.slice(0, fimEvento));
+                buffer = buffer.slice(fimEvento + 2);
+            }
+        }
+        if (buffer.trim()) tratarEvento(buffer);
+    }
+
+    if (erro) throw new Error(erro);
+    return final !== null ? final : acumulado;
+}
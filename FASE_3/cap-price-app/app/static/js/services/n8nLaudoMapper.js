@@ -54,6 +54,12 @@ export function extrairLaudoHtml(rawResponse) {
   const data = tentarParseJson(rawResponse);
   console.log("🧩 extrairLaudoHtml: data após parse:", data);
 
+  // 1.1) Formato v2: laudo único no topo ({ versao: 2, laudo: { html | url } })
+  if (data && typeof data === "object" && data.versao === 2) {
+    const html = data.laudo?.html;
+    return typeof html === "string" && html.trim() ? html : null;
+  }
+
   // 2) NOVO: caso o Flask já tenha mapeado e enviado laudoHtml direto
   //    Ex.: [ { ..., laudoHtml: "<html>...</html>" }, ... ]
   if (Array.isArray(data) && data.length > 0) {
@@ -96,3 +102,19 @@ export function extrairLaudoHtml(rawResponse) {
 
   return laudoHtml;
 }
+
+/**
+ * URL do laudo sob demanda (/api/laudo/<id>) que o Flask manda em cada cenário
+ * (v1) ou uma vez só em `laudo.url` (v2).
+ */
+export function extrairLaudoUrl(rawResponse) {
+  const data = tentarParseJson(rawResponse);
+  if (data && typeof data === "object" && data.versao === 2) {
+    return data.laudo?.url || null;
+  }
+  const itens = Array.isArray(data) ? data : [data];
+  const comUrl = itens.find(
+    (it) => it && typeof it === "object" && typeof it.laudoUrl === "string" && it.laudoUrl
+  );
+  return comUrl ? comUrl.laudoUrl : null;
+}
@@ -36,6 +36,38 @@ function encontrarBlocoDados(node, depth = 0) {
   return null;
 }
 
+/**
+ * Resposta v2 do Flask (Accept: application/vnd.capprice.simulacao.v2+json ou ?v=2):
+ * { versao: 2, laudo, comum, campos, cenarios: [[...], ...] }.
+ */
+export function ehRespostaV2(data) {
+  return (
+    !!data &&
+    typeof data === "object" &&
+    data.versao === 2 &&
+    Array.isArray(data.campos) &&
+    Array.isArray(data.cenarios)
+  );
+}
+
+/**
+ * Reconstrói os cenários planos (formato v1) a partir da resposta v2:
+ * cada cenário = comum + campos/linha + referência do laudo.
+ */
+export function expandirRespostaV2(data) {
+  const laudo = data.laudo || {};
+  return data.cenarios.map((linha) => {
+    const cenario = { ...(data.comum || {}) };
+    data.campos.forEach((campo, i) => {
+      cenario[campo] = linha[i];
+    });
+    if (laudo.id) cenario.laudoId = laudo.id;
+    if (laudo.url) cenario.laudoUrl = laudo.url;
+    if (laudo.html) cenario.laudoHtml = laudo.html;
+    return cenario;
+  });
+}
+
 /**
  * Tenta identificar se um objeto "flat" já parece ser
  * um cenário de precificação (sem jsons/dados).
@@ -110,7 +142,9 @@ function mapearCenario(cenario, contextoForm, tipo) {
     riscoFiscal: c.riscoFiscal || "",
     
     // Preserva o laudoHtml se vier em cada item
-    laudoHtml: c.laudoHtml || null 
+    laudoHtml: c.laudoHtml || null,
+    // Referência do laudo gerado sob demanda (GET /api/laudo/<id>)
+    laudoUrl: c.laudoUrl || null,
   };
 }
 
@@ -138,6 +172,14 @@ export function normalizarResposta(rawResponse, contextoForm = {}) {
     }
   }
 
+  // 1.1) Formato v2 (compacto): o laudo vem uma vez só, no topo
+  if (ehRespostaV2(data)) {
+    const opcoes = expandirRespostaV2(data).map((item, idx) =>
+      mapearCenario(item, contextoForm, idx === 0 ? "melhor" : "alternativo")
+    );
+    return { opcoes, laudoHtml: data.laudo?.html || null };
+  }
+
   // 2) DETECÇÃO INTELIGENTE DE LISTA JÁ MAPEADA (Correção Principal)
   // Se o main.py já mandou uma lista [Option1, Option2, Option3], detectamos aqui
   // antes que a lógica antiga descarte os itens extras.
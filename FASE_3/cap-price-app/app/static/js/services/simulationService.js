@@ -1,32 +1,71 @@
 // app/static/js/services/simulationService.js
 
 /**
- * Busca os dados da simulação no backend Python (/api/simular).
- * O backend Python, por sua vez, chamará o n8n.
+ * Busca os dados da simulação no backend Python.
+ * A simulação roda como job assíncrono (/api/simular/jobs): o POST devolve o id
+ * na hora e o resultado chega por SSE (EventSource) ou, se o stream falhar, por polling.
  * @param {FormData} formData - Os dados do formulário de simulação.
- * @returns {Promise<Array<Object>>} - Uma promessa que resolve para o array de resultados da simulação.
+ * @param {{onStatus?: function(Object): void}} [opcoes] - Callback com o status do job (fila/executando).
+ * O resultado vem no formato v2 (laudo único no topo, cenários compactos; ver
+ * n8nMapper.expandirRespostaV2), que os mappers entendem.
+ * @returns {Promise<Object|Array<Object>>} - Resposta v2 ou, de um backend antigo, o array de cenários.
  */
-export async function fetchSimulacao(formData) {
+export async function fetchSimulacao(formData, { onStatus } = {}) {
     // Converte FormData para um objeto JSON simples
     const data = Object.fromEntries(formData.entries());
 
-    console.log("Enviando para /api/simular:", data);
+    console.log("Enviando para /api/simular/jobs:", data);
 
-    const response = await fetch('/api/simular', {
+    // Mesma chave no retry: o backend devolve o job já criado em vez de simular de novo
+    const idempotencyKey = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+
+    const enviar = () => fetch('/api/simular/jobs', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+            'Idempotency-Key': idempotencyKey,
         },
         body: JSON.stringify(data),
     });
 
+    let response;
+    try {
+        response = await enviar();
+    } catch (err) {
+        console.warn("Falha de rede ao iniciar simulação, tentando de novo:", err);
+        response = await enviar();
+    }
+
     if (!response.ok) {
-        const errorData = await response.json();
-        console.error("Erro da API /api/simular:", errorData);
-        throw new Error(errorData.message || `Erro ${response.status}: Falha ao buscar simulação.`);
+        const errorData = await response.json().catch(() => ({}));
+        console.error("Erro da API /api/simular/jobs:", errorData);
+        throw new Error(errorData.message || `Erro ${response.status}: Falha ao iniciar simulação.`);
     }
 
-    const simulationResults = await response.json();
+    const job = await response.json();
+    if (onStatus) onStatus(job);
+
+    let final;
+    try {
+        final = await aguardarJobSSE(`${job.stream_url}?v=2`, onStatus);
+    } catch (err) {
+        console.warn("SSE indisponível, usando polling:", err);
+        final = await aguardarJobPolling(job.poll_url, onStatus);
+    }
+
+    if (final.status !== 'concluido') {
+        const errorData = final.resultado || {};
+        console.error("Erro da simulação:", errorData);
+        throw new Error(errorData.message || `Erro ${final.http_status}: Falha ao buscar simulação.`);
+    }
+
+    const simulationResults = final.resultado;
+
+    if (simulationResults && simulationResults.versao === 2) {
+        return simulationResults;
+    }
 
     // O frontend (precificar.js) espera um array de respostas.
     // Se o agente retornar apenas um objeto, colocamos ele dentro de um array.
@@ -38,6 +77,109 @@ export async function fetchSimulacao(formData) {
     return simulationResults;
 }
 
+/**
+ * Espera o job pelo stream SSE. Rejeita se o EventSource não existir, der erro
+ * antes de qualquer evento ou fechar de vez (aí o chamador cai no polling).
+ */
+function aguardarJobSSE(streamUrl, onStatus) {
+    return new Promise((resolve, reject) => {
+        if (typeof EventSource === 'undefined') {
+            reject(new Error('EventSource não suportado'));
+            return;
+        }
+        const es = new EventSource(streamUrl);
+        let recebeuEvento = false;
+
+        es.addEventListener('status', (ev) => {
+            recebeuEvento = true;
+            if (onStatus) onStatus(JSON.parse(ev.data));
+        });
+        es.addEventListener('resultado', (ev) => {
+            es.close();
+            resolve(JSON.parse(ev.data));
+        });
+        es.onerror = () => {
+            // Depois do primeiro evento, deixa o EventSource reconectar sozinho; se a
+            // reconexão for recusada (429 sem vaga de espera), ele fecha de vez
+            if (!recebeuEvento || es.readyState === EventSource.CLOSED) {
+                es.close();
+                reject(new Error('Falha no stream SSE'));
+            }
+        };
+    });
+}
+
+/**
+ * Polling com long-poll (?wait=) no endpoint do job até ele terminar.
+ */
+async function aguardarJobPolling(pollUrl, onStatus) {
+    let falhas = 0;
+    for (;;) {
+        const response = await fetch(`${pollUrl}?wait=20&v=2`, {
+            headers: { 'Accept': 'application/vnd.capprice.simulacao.v2+json, application/json' },
+        });
+        if (response.status === 429) {
+            // muitas esperas abertas no servidor: tenta de novo depois do Retry-After
+            const segundos = Number(response.headers.get('Retry-After')) || 2;
+            await new Promise((r) => setTimeout(r, segundos * 1000));
+            continue;
+        }
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({}));
+            if (response.status >= 500 && falhas < 3) {
+                falhas += 1;
+                await new Promise((r) => setTimeout(r, 1000 * falhas));
+                continue;
+            }
+            throw new Error(errorData.message || `Erro ${response.status}: Falha ao consultar simulação.`);
+        }
+        falhas = 0;
+        const job = await response.json();
+        if (job.status === 'concluido' || job.status === 'erro') return job;
+        if (onStatus) onStatus(job);
+    }
+}
+
+/**
+ * Grade what-if (/api/simular/grid) sobre a mesma cotação do formulário.
+ * Uma chamada só: os sliders da tela indexam a resposta colunar localmente.
+ * @param {FormData} formData - Os dados do formulário de simulação (cotação base).
+ * @param {Object} grade - Eixos: {margem, custo_fixo, preco_net}, cada um lista ou {min, max, passo}.
+ * @returns {Promise<Object>} - Grade colunar (eixos, forma, colunas, vencedora, refinarias).
+ */
+export async function fetchGradeWhatIf(formData, grade) {
+    const data = Object.fromEntries(formData.entries());
+    const response = await fetch('/api/simular/grid', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...data, grade }),
+    });
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.message || `Erro ${response.status}: Falha ao montar a grade.`);
+    }
+    return response.json();
+}
+
+/**
+ * Autocomplete de cidades (índice local de cap_cidades, sem acento/caixa).
+ * Sem `q` devolve todas as cidades da UF. A resposta é cacheável (ETag).
+ * @param {string} uf
+ * @param {string} [q]
+ * @param {number} [limite]
+ * @returns {Promise<Array<{nome: string, uf: string, ibge: ?string, lat: ?number, lon: ?number}>>}
+ */
+export async function fetchCidades(uf, q = '', limite = 20) {
+    const params = new URLSearchParams({ uf, q, limite: String(limite) });
+    const response = await fetch(`/api/cidades?${params}`);
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.message || `Erro ${response.status}: Falha ao buscar cidades.`);
+    }
+    const body = await response.json();
+    return body.cidades || [];
+}
+
 // Funções utilitárias que 'precificar.js' também importa
 export function formatCurrency(value) {
     if (typeof value !== 'number') value = parseFloat(value) || 0;
@@ -0,0 +1,156 @@
+# benchmarks/bench_normalizador.py
+"""
+Benchmark do normalizador de respostas de simulação (busca + mapeamento;
+a renderização do laudo é igual nos dois fluxos e fica de fora).
+
+Compara o fluxo antigo (várias buscas recursivas por "jsons"/"cenarios"/
+"results"/"htmls" no laudo e no mapper, e a procura por "TabelaV" em
+str(raiz)) com a passada única de
+app.services.simulation_normalizer, em respostas grandes com vários cenários
+e metadados do n8n antes dos dados.
+
+Uso (na pasta cap-price-app):
+    python benchmarks/bench_normalizador.py
+    python benchmarks/bench_normalizador.py --cenarios 10 100 1000 --repeticoes 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.simulation_normalizer import normalizar_resposta  # noqa: E402
+
+
+# ============================================================
+# Fluxo antigo (cópia só da parte de busca, para comparação)
+# ============================================================
+def _find_first_list(obj, key):
+    if isinstance(obj, dict):
+        if key in obj and isinstance(obj[key], list):
+            return obj[key], obj
+        for v in obj.values():
+            lista, dono = _find_first_list(v, key)
+            if lista is not None:
+                return lista, dono
+    elif isinstance(obj, list):
+        for item in obj:
+            lista, dono = _find_first_list(item, key)
+            if lista is not None:
+                return lista, dono
+    return None, None
+
+
+def _fluxo_antigo(resposta):
+    raiz = resposta[0] if isinstance(resposta, list) and resposta else resposta
+    raiz = raiz if isinstance(raiz, dict) else {}
+    # laudo (a flag TabelaV era str() da raiz inteira)
+    jsons, _ = _find_first_list(raiz, "jsons")
+    if not jsons:
+        jsons, _ = _find_first_list(raiz, "cenarios")
+    "tabelav" in str(raiz).lower()
+    # mapper
+    jsons, owner = _find_first_list(resposta, "jsons")
+    if not jsons:
+        jsons, owner = _find_first_list(resposta, "cenarios")
+    if not jsons:
+        jsons, owner = _find_first_list(resposta, "results")
+    if not (isinstance(owner, dict) and "htmls" in owner):
+        _find_first_list(resposta, "htmls")
+    if not jsons:
+        return []
+
+    def _num(val, default=0.0):
+        try:
+            return float(val)
+        except (TypeError, ValueError):
+            return default
+
+    resultados = []
+    for it in jsons:
+        if not isinstance(it, dict):
+            continue
+        resultados.append({
+            "origem": it.get("origem") or it.get("refinariaNome") or it.get("refinaria_nome")
+            or it.get("refinaria_codigo") or "Origem não informada",
+            "destino": it.get("destino") or it.get("destinoCidade") or "",
+            "quantidade": it.get("quantidade") or raiz.get("quantidade") or 0,
+            "precoNet": _num(it.get("precoNet") or it.get("preco_net") or 0),
+            "frete": _num(it.get("frete") or it.get("frete_por_ton") or 0),
+            "impostos": _num(it.get("impostos")),
+            "difal": _num(it.get("difal")),
+            "cmv": _num(it.get("cmv") or it.get("CMV") or it.get("preco_com_margem") or 0),
+            "margem": _num(it.get("margem") or it.get("margem_percentual") or 0),
+            "precoFinal": _num(it.get("precoFinal") or it.get("preco_final")
+                               or it.get("preco_final_unitario") or 0),
+            "produto": it.get("produto") or raiz.get("produto") or "",
+            "destinoCidade": it.get("destinoCidade") or raiz.get("destinoCidade") or "",
+            "destinoUF": it.get("destinoUF") or raiz.get("destinoUF") or "",
+            "refinariaNome": it.get("refinariaNome") or it.get("refinaria_nome") or "",
+            "filialRecomendada": it.get("filialRecomendada") or "",
+            "distanciaKm": _num(it.get("distanciaKm")),
+            "custoFixo": _num(it.get("custoFixo") or it.get("custo_fixo")),
+            "valorTotal": _num(it.get("valorTotal") or it.get("valor_total") or 0),
+        })
+    return resultados
+
+
+def _fluxo_novo(resposta):
+    # inclui a conversão para o dict do front, como no mapper do main.py
+    return [c.to_front() for c in normalizar_resposta(resposta).cenarios]
+
+
+# ============================================================
+# Respostas sintéticas
+# ============================================================
+def _cenario(i):
+    return {
+        "origem": f"Cidade {i}/SP", "destino": "Vitória/ES", "quantidade": 27,
+        "precoNet": 3000 + i, "frete": 250.5, "impostos": 600.1, "cmv": 3300,
+        "margem": 5, "precoFinal": 4100 + i, "produto": "CAP 50/70",
+        "refinariaNome": f"REF{i}", "distanciaKm": 500 + i, "valorTotal": 110700,
+        "laudo": "Texto do laudo " * 20, "motivo": "Menor preço final",
+        "icms": 12, "vlr_icms": 492, "pis": 0.65, "vlr_pis": 26.6,
+        "cofins": 3, "vlr_cofins": 123,
+    }
+
+
+def _resposta(n_cenarios, formato):
+    # metadados de execução do n8n antes dos dados (o pior caso da busca)
+    meta = {"execucao": [{"node": f"n{i}", "dados": {"itens": list(range(20))}} for i in range(200)]}
+    cenarios = [_cenario(i) for i in range(n_cenarios)]
+    if formato == "jsons":
+        return [{"meta": meta, "status": "success", "dados": {"jsons": cenarios, "htmls": []}}]
+    return {"meta": meta, "output": {"results": cenarios}}
+
+
+def _medir(funcao, resposta, repeticoes, rodadas=5):
+    """Melhor média entre `rodadas` (o GC das respostas grandes dá muito ruído)."""
+    melhor = float("inf")
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao(resposta)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor / repeticoes * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cenarios", type=int, nargs="+", default=[3, 50, 500, 5000])
+    ap.add_argument("--repeticoes", type=int, default=100)
+    args = ap.parse_args()
+
+    print(f"{'formato':<8} {'cenários':>9} {'antigo (ms)':>12} {'novo (ms)':>10} {'ganho':>7}")
+    for formato in ("jsons", "results"):
+        for n in args.cenarios:
+            resposta = _resposta(n, formato)
+            assert len(_fluxo_antigo(resposta)) == len(_fluxo_novo(resposta)) == n
+            antigo = _medir(_fluxo_antigo, resposta, args.repeticoes)
+            novo = _medir(_fluxo_novo, resposta, args.repeticoes)
+            print(f"{formato:<8} {n:>9} {antigo:>12.3f} {novo:>10.3f} {antigo / novo:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/bench_poda_refinarias.py
+"""
+Mede o custo do Calcula Frete local com e sem a poda espacial das refinarias
+(pricing_engine.refinarias_candidatas), por quantidade de origens. É daqui
+que sai o REFINARIAS_PODA_MIN: abaixo do ponto em que as duas colunas se
+cruzam, a avaliação completa é mais rápida. A equivalência dos resultados é
+verificada em tests/test_poda_refinarias.py.
+
+Usa os mesmos geradores aleatórios do teste (refinarias, preços, alíquotas e
+payloads variados); cada fluxo é medido com um destino novo, sem frete em cache.
+
+Uso (na pasta cap-price-app):
+    python benchmarks/bench_poda_refinarias.py
+    python benchmarks/bench_poda_refinarias.py --refinarias 100 1000 5000 --casos 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from flask import Flask  # noqa: E402
+
+from app.config import Config  # noqa: E402
+from app.services.pricing_engine import (  # noqa: E402
+    DestinoFrete,
+    PricingError,
+    calcular_cenarios,
+    normalizar_entrada,
+    refinarias_candidatas,
+)
+from tests.test_poda_refinarias import (  # noqa: E402
+    destino_aleatorio,
+    impostos_aleatorios,
+    payload_aleatorio,
+    precos_aleatorios,
+    refinarias_aleatorias,
+)
+
+
+def _exaustivo(entrada, refinarias, lat, lon, precos, impostos):
+    destino = DestinoFrete(refinarias, lat, lon)
+    calcular_cenarios(entrada, refinarias, *destino.fretes(), precos, impostos)
+    return len(refinarias)
+
+
+def _podado(entrada, refinarias, lat, lon, precos, impostos, k):
+    destino = DestinoFrete(refinarias, lat, lon)
+    candidatas = refinarias_candidatas(entrada, destino, precos, impostos, k)
+    if candidatas is None:
+        calcular_cenarios(entrada, refinarias, *destino.fretes(), precos, impostos)
+        return len(refinarias)
+    calcular_cenarios(entrada, [refinarias[i] for i in candidatas],
+                      *destino.fretes(candidatas), precos, impostos)
+    return len(candidatas)
+
+
+def _medir(funcao, *args):
+    inicio = time.perf_counter()
+    try:
+        resultado = funcao(*args)
+    except PricingError:
+        resultado = None
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refinarias", type=int, nargs="+", default=[10, 100, 500, 1000, 3000])
+    parser.add_argument("--casos", type=int, default=100)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    rng = np.random.default_rng(args.semente)
+    impostos = impostos_aleatorios(rng)
+
+    print(f"REFINARIAS_PODA_MIN atual: {Config.REFINARIAS_PODA_MIN}")
+    print(f"{'refinarias':>10} {'casos':>6} {'candidatas (média/máx)':>24} {'exaustivo ms':>13} {'podado ms':>10}")
+    with app.app_context():
+        for n in args.refinarias:
+            refinarias = refinarias_aleatorias(rng, n)
+            contagens = []
+            t_exaustivo = t_podado = 0.0
+            for _ in range(args.casos):
+                precos = precos_aleatorios(rng, refinarias)
+                entrada = normalizar_entrada(payload_aleatorio(rng, refinarias))
+                lat, lon = destino_aleatorio(rng)
+
+                t, _ = _medir(_exaustivo, entrada, refinarias, lat, lon, precos, impostos)
+                t_exaustivo += t
+                t, qtd = _medir(_podado, entrada, refinarias, lat, lon, precos, impostos, args.k)
+                t_podado += t
+                if qtd is not None:
+                    contagens.append(qtd)
+
+            print(
+                f"{n:>10} {args.casos:>6} {np.mean(contagens):>16.1f} / {max(contagens):<5} "
+                f"{t_exaustivo / args.casos * 1000:>13.3f} {t_podado / args.casos * 1000:>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
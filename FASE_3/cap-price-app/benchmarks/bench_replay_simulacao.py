@@ -0,0 +1,454 @@
+# benchmarks/bench_replay_simulacao.py
+"""
+Replay de respostas gravadas do n8n pelo pipeline do /api/simular, medindo
+só o custo do nosso lado (sem a espera do workflow).
+
+Gravações usadas:
+    - pinData do CAP_PRICE_OFICIAL_V5.json: body do Webhook + saída do
+      "Diretor de Pricing", passada pelo "Code Unifica Json" (portado abaixo),
+      que é o que o Webhook_Responde_APP devolve para a app;
+    - capturas de produção em --capturas (padrão: benchmarks/capturas/*.json),
+      cada arquivo {"payload": {...}, "resposta": <json do n8n>}.
+
+Um stub HTTP local faz o papel do n8n e devolve a resposta gravada. Fases:
+
+    parse_request   request.get_json do payload do front
+    parse_n8n       json da resposta do n8n (requests.Response.json)
+    normalizar      normalizar_resposta (passada única)
+    laudo_insumos   insumos_laudo + laudo_store.guardar_insumos
+    mapear          _mapear_resultados_simulacao
+    jsonify         jsonify da resposta atual (laudoId/laudoUrl)
+    laudo_html      renderizar_laudo (o que /api/laudo/<id> gera; antes era
+                    gerar_laudo_para_resposta_simulacao, a cada simulação)
+    jsonify_html    jsonify com o laudo HTML (alguns KB) embutido em cada cenário
+    encode_v2       resposta v2 (compactar + JSON + gzip), laudoId/laudoUrl
+    encode_v2_html  resposta v2 com o laudo HTML (uma vez só, no topo)
+    e2e             POST /api/simular inteiro via test client, contra o stub
+    e2e_sem_n8n     e2e menos o tempo da chamada ao stub
+
+Saída: p50/p95/p99 (ms) e memória por fase (pico e retida, tracemalloc, em
+uma passada separada para não distorcer os tempos). O baseline fica em
+benchmarks/baseline_replay.json; com --comparar a execução é comparada com
+ele e sai com código 1 se o p50 de alguma fase piorar mais que --tolerancia
+(e mais que --minimo-ms em valor absoluto: fases de microssegundos oscilam
+muito). p95/p99 aparecem na comparação, mas não reprovam.
+
+Uso (na pasta cap-price-app):
+    python benchmarks/bench_replay_simulacao.py
+    python benchmarks/bench_replay_simulacao.py --salvar-baseline
+    python benchmarks/bench_replay_simulacao.py --comparar --tolerancia 0.25
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+RAIZ_APP = os.path.join(AQUI, "..")
+WORKFLOW = os.path.join(RAIZ_APP, "..", "..", "CAP_PRICE_OFICIAL_V5.json")
+BASELINE = os.path.join(AQUI, "baseline_replay.json")
+
+sys.path.insert(0, RAIZ_APP)
+
+FASES = (
+    "parse_request", "parse_n8n", "normalizar", "laudo_insumos", "mapear",
+    "jsonify", "laudo_html", "jsonify_html", "encode_v2", "encode_v2_html", "e2e", "e2e_sem_n8n",
+)
+
+
+# ============================================================
+# Gravações
+# ============================================================
+def _unifica_json(itens):
+    """Porte do nó "Code Unifica Json": até 3 cenários completos em dados.jsons."""
+    jsons = []
+    for item in itens:
+        raw = item.get("json", {}).get("output", item.get("json"))
+        try:
+            parsed = json.loads(raw) if isinstance(raw, str) else raw
+        except ValueError:
+            continue
+        if not isinstance(parsed, dict):
+            continue
+
+        alternativos = parsed.get("cenariosAlternativos")
+        alternativos = alternativos if isinstance(alternativos, list) else []
+        base = {k: v for k, v in parsed.items() if k != "cenariosAlternativos"}
+
+        def _completo(override, refinaria):
+            c = {**base, **override}
+            if refinaria:
+                c["refinariaNome"] = refinaria
+            elif override.get("refinaria"):
+                c["refinariaNome"] = override["refinaria"]
+            if c.get("valorTotal") is None and c.get("precoFinal") is not None and c.get("quantidade") is not None:
+                c["valorTotal"] = float(c["quantidade"] or 0) * float(c["precoFinal"] or 0)
+            return c
+
+        def _primeiro(*valores):
+            return next((v for v in valores if v is not None), None)
+
+        cenarios = [_completo({}, base.get("refinariaNome"))]
+        for alt in alternativos:
+            if not isinstance(alt, dict):
+                continue
+            override = {
+                "precoNet": _primeiro(alt.get("precoNet"), alt.get("preco_net"), base.get("precoNet")),
+                "frete": _primeiro(alt.get("frete"), alt.get("frete_por_ton"), base.get("frete")),
+                "distanciaKm": _primeiro(alt.get("distanciaKm"), base.get("distanciaKm")),
+                "precoFinal": _primeiro(alt.get("precoFinal"), alt.get("preco_final"),
+                                        alt.get("preco_final_unitario"), base.get("precoFinal")),
+            }
+            cenarios.append(_completo(override, alt.get("refinaria") or alt.get("refinariaNome")
+                                      or alt.get("refinaria_nome")))
+
+        cenarios.sort(key=lambda c: float("inf") if c.get("precoFinal") is None else float(c["precoFinal"]))
+        jsons.extend(cenarios[:3])
+
+    return [{
+        "status": "success",
+        "registros": {"total_jsons": len(jsons), "total_htmls": 0},
+        "dados": {"jsons": jsons, "htmls": []},
+    }]
+
+
+def _gravacoes(pasta_capturas):
+    gravacoes = []
+    if os.path.exists(WORKFLOW):
+        with open(WORKFLOW, encoding="utf-8") as f:
+            pin = json.load(f).get("pinData") or {}
+        webhook = pin.get("Webhook") or []
+        diretor = pin.get("Diretor de Pricing") or []
+        if webhook and diretor:
+            gravacoes.append({
+                "nome": "pinData",
+                "payload": webhook[0]["json"].get("body") or {},
+                "resposta": _unifica_json(diretor),
+            })
+
+    for caminho in sorted(glob.glob(os.path.join(pasta_capturas, "*.json"))):
+        with open(caminho, encoding="utf-8") as f:
+            captura = json.load(f)
+        if isinstance(captura, dict) and "resposta" in captura:
+            gravacoes.append({
+                "nome": os.path.basename(caminho),
+                "payload": captura.get("payload") or {},
+                "resposta": captura["resposta"],
+            })
+    return gravacoes
+
+
+# ============================================================
+# Stub do n8n
+# ============================================================
+class _StubN8n(BaseHTTPRequestHandler):
+    corpo = b"[]"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.corpo)))
+        self.end_headers()
+        self.wfile.write(self.corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def _iniciar_stub():
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _StubN8n)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+# ============================================================
+# Medição
+# ============================================================
+def _percentis(amostras):
+    ms = np.asarray(amostras, dtype=np.float64) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 4),
+        "p95": round(float(np.percentile(ms, 95)), 4),
+        "p99": round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def _memoria(funcao, repeticoes):
+    """(pico, retida) em KB por chamada, média de `repeticoes` chamadas."""
+    picos, retidas = [], []
+    for _ in range(repeticoes):
+        gc.collect()
+        tracemalloc.start()
+        antes = tracemalloc.get_traced_memory()[0]
+        resultado = funcao()
+        atual, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del resultado
+        picos.append((pico - antes) / 1024)
+        retidas.append((atual - antes) / 1024)
+    return round(float(np.mean(picos)), 2), round(float(np.mean(retidas)), 2)
+
+
+def _fases(app, main, gravacao):
+    """Funções sem argumento, uma por fase, para uma gravação."""
+    from flask import jsonify
+
+    from app.routes.laudo_precificacao import insumos_laudo, renderizar_laudo
+    from app.services import laudo_store, simulation_response
+    from app.services.simulation_normalizer import normalizar_resposta
+
+    payload_bytes = json.dumps(gravacao["payload"]).encode("utf-8")
+    resposta_bytes = json.dumps(gravacao["resposta"]).encode("utf-8")
+    resposta_json = json.loads(resposta_bytes)
+    normalizada = normalizar_resposta(resposta_json)
+    insumos = insumos_laudo(normalizada)
+    laudo_id = laudo_store.store().guardar_insumos(insumos) if insumos else None
+    resultados = main._mapear_resultados_simulacao(normalizada, laudo_id)
+    with app.test_request_context():
+        html = renderizar_laudo(insumos) if insumos else ""
+    resultados_html = [{**r, "laudoHtml": html} for r in main._mapear_resultados_simulacao(normalizada)]
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s["user"] = {"user_id": "bench", "roles": [], "email": "bench@local"}
+
+    def _parse_request():
+        with app.test_request_context("/api/simular", method="POST", data=payload_bytes,
+                                      content_type="application/json"):
+            from flask import request
+            return request.get_json(silent=True)
+
+    def _laudo_insumos():
+        ins = insumos_laudo(normalizada)
+        return laudo_store.store().guardar_insumos(ins) if ins else None
+
+    # v1 e v2 medidos dentro do mesmo tipo de contexto (request, com o
+    # Accept-Encoding do navegador), montado fora da medição
+    ctx_encode = app.test_request_context(headers={"Accept-Encoding": "gzip, deflate, br"})
+
+    def _jsonify(corpo):
+        def _f():
+            with ctx_encode:
+                return jsonify(corpo).get_data()
+        return _f
+
+    def _encode_v2(corpo):
+        def _f():
+            with ctx_encode:
+                return simulation_response.resposta(corpo).get_data()
+        return _f
+
+    def _tamanhos(corpo):
+        with app.app_context():
+            v1 = len(jsonify(corpo).get_data())
+        with app.test_request_context():
+            v2 = len(simulation_response.resposta(corpo).get_data())
+        return v1, v2, len(_encode_v2(corpo)())
+
+    def _laudo_html():
+        with app.test_request_context():
+            return renderizar_laudo(insumos) if insumos else ""
+
+    def _e2e():
+        _StubN8n.corpo = resposta_bytes
+        r = cliente.post("/api/simular", data=payload_bytes, content_type="application/json")
+        if r.status_code != 200:
+            raise RuntimeError(f"/api/simular devolveu {r.status_code}: {r.get_data(as_text=True)[:300]}")
+        return r.get_data()
+
+    return {
+        "parse_request": _parse_request,
+        "parse_n8n": lambda: json.loads(resposta_bytes),
+        "normalizar": lambda: normalizar_resposta(resposta_json),
+        "laudo_insumos": _laudo_insumos,
+        "mapear": lambda: main._mapear_resultados_simulacao(normalizada, laudo_id),
+        "jsonify": _jsonify(resultados),
+        "laudo_html": _laudo_html,
+        "jsonify_html": _jsonify(resultados_html),
+        "encode_v2": _encode_v2(resultados),
+        "encode_v2_html": _encode_v2(resultados_html),
+        "e2e": _e2e,
+    }, len(html.encode("utf-8")), {
+        "laudo_id": _tamanhos(resultados),
+        "laudo_html": _tamanhos(resultados_html),
+    }
+
+
+def _rodar(app, main, gravacoes, repeticoes, aquecimento, repeticoes_memoria):
+    from app.services import http_client
+
+    amostras = {f: [] for f in FASES}
+    memoria = {f: [] for f in FASES}
+    tamanho_laudo = []
+    tamanhos = {}
+    saida_nula = open(os.devnull, "w")
+    try:
+        for gravacao in gravacoes:
+            fases, bytes_html, tamanhos[gravacao["nome"]] = _fases(app, main, gravacao)
+            tamanho_laudo.append(bytes_html)
+            for nome, funcao in fases.items():
+                # a rota imprime o payload e o corpo do n8n: custo real, mas sem poluir a saída
+                stdout, sys.stdout = sys.stdout, saida_nula
+                gc.disable()
+                try:
+                    for _ in range(aquecimento):
+                        funcao()
+                    for _ in range(repeticoes):
+                        if nome == "e2e":
+                            hist = http_client.cliente()._histograma("n8n-simulador")
+                            antes = hist.soma_ms
+                        inicio = time.perf_counter()
+                        funcao()
+                        dt = time.perf_counter() - inicio
+                        amostras[nome].append(dt)
+                        if nome == "e2e":
+                            amostras["e2e_sem_n8n"].append(dt - (hist.soma_ms - antes) / 1000)
+                    gc.enable()
+                    pico, retida = _memoria(funcao, repeticoes_memoria)
+                finally:
+                    gc.enable()
+                    sys.stdout = stdout
+                memoria[nome].append((pico, retida))
+    finally:
+        saida_nula.close()
+
+    resultado = {}
+    for nome in FASES:
+        if not amostras[nome]:
+            continue
+        linha = _percentis(amostras[nome])
+        mem = memoria.get(nome) or memoria["e2e"]
+        linha["pico_kb"] = round(float(np.mean([m[0] for m in mem])), 2)
+        linha["retida_kb"] = round(float(np.mean([m[1] for m in mem])), 2)
+        resultado[nome] = linha
+    return resultado, (max(tamanho_laudo) if tamanho_laudo else 0), tamanhos
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=AQUI, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _comparar(resultado, baseline, tolerancia, minimo_ms):
+    piorou = []
+    print(f"\nComparação com o baseline ({baseline.get('commit') or '?'}, {baseline.get('data', '')}):")
+    print(f"{'fase':<14} {'p50 base':>9} {'p50':>9} {'Δ':>8} {'p95 base':>9} {'p95':>9} {'Δ':>8}")
+    for nome, linha in resultado.items():
+        base = baseline.get("fases", {}).get(nome)
+        if not base:
+            continue
+        deltas = []
+        for p in ("p50", "p95"):
+            deltas.append((linha[p] - base[p]) / base[p] if base[p] > 0 else 0.0)
+        print(
+            f"{nome:<14} {base['p50']:>9.3f} {linha['p50']:>9.3f} {deltas[0]:>+7.0%} "
+            f"{base['p95']:>9.3f} {linha['p95']:>9.3f} {deltas[1]:>+7.0%}"
+        )
+        if deltas[0] > tolerancia and linha["p50"] - base["p50"] > minimo_ms:
+            piorou.append(nome)
+    return piorou
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capturas", default=os.path.join(AQUI, "capturas"))
+    parser.add_argument("--repeticoes", type=int, default=300)
+    parser.add_argument("--aquecimento", type=int, default=20)
+    parser.add_argument("--repeticoes-memoria", type=int, default=20)
+    parser.add_argument("--salvar-baseline", action="store_true")
+    parser.add_argument("--comparar", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.20)
+    parser.add_argument("--minimo-ms", type=float, default=0.05)
+    args = parser.parse_args()
+
+    gravacoes = _gravacoes(args.capturas)
+    if not gravacoes:
+        print("Nenhuma gravação encontrada (pinData do workflow ou --capturas).")
+        sys.exit(1)
+
+    stub = _iniciar_stub()
+    laudos = tempfile.TemporaryDirectory()
+    # motor n8n apontando para o stub; sem banco, sem cache de resultado e sem idempotência
+    os.environ.update({
+        "N8N_SIMULATOR_WEBHOOK_URL": f"http://127.0.0.1:{stub.server_address[1]}/webhook/CPV5x",
+        "PRICING_ENGINE": "n8n",
+        "DATABASE_URL": "",
+        "SIM_CACHE_MAX_BYTES": "0",
+        "SIM_IDEMPOTENCIA_TTL": "0",
+        "LAUDO_DIR": laudos.name,
+    })
+    from app import create_app
+    from app.routes import main as rotas
+
+    # o log estruturado escreve no stdout do momento do create_app (thread do
+    # listener): manda para /dev/null, mantendo o custo de resumir e enfileirar
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        app = create_app()
+    finally:
+        sys.stdout = stdout
+    try:
+        resultado, bytes_laudo, tamanhos = _rodar(app, rotas, gravacoes, args.repeticoes,
+                                        args.aquecimento, args.repeticoes_memoria)
+    finally:
+        stub.shutdown()
+        laudos.cleanup()
+
+    print(f"Gravações: {', '.join(g['nome'] for g in gravacoes)}; laudo HTML: {bytes_laudo / 1024:.1f} KB")
+    print(f"{'fase':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'pico KB':>9} {'retida KB':>10}")
+    for nome, linha in resultado.items():
+        print(
+            f"{nome:<14} {linha['p50']:>9.3f} {linha['p95']:>9.3f} {linha['p99']:>9.3f} "
+            f"{linha['pico_kb']:>9.1f} {linha['retida_kb']:>10.1f}"
+        )
+
+    print(f"\n{'corpo (bytes)':<32} {'v1':>9} {'v2':>9} {'v2 gzip':>9}")
+    for nome, por_tipo in tamanhos.items():
+        for tipo, (v1, v2, v2_gzip) in por_tipo.items():
+            print(f"{nome + ' / ' + tipo:<32} {v1:>9} {v2:>9} {v2_gzip:>9}")
+
+    if args.comparar:
+        if not os.path.exists(BASELINE):
+            print(f"\nSem baseline em {BASELINE}; rode com --salvar-baseline.")
+        else:
+            with open(BASELINE, encoding="utf-8") as f:
+                piorou = _comparar(resultado, json.load(f), args.tolerancia, args.minimo_ms)
+            if piorou:
+                print(f"\nREGRESSÃO no p50 (> {args.tolerancia:.0%}): {', '.join(piorou)}")
+                sys.exit(1)
+            print("\nOK: sem regressão acima da tolerância.")
+
+    if args.salvar_baseline:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": _commit(),
+                "data": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "maquina": platform.machine(),
+                "gravacoes": [g["nome"] for g in gravacoes],
+                "repeticoes": args.repeticoes,
+                "fases": resultado,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\nBaseline salvo em {BASELINE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# benchmarks/stub_chat_stream.py
+"""
+Stub local do webhook de chat do n8n que responde em streaming, para testar o
+/api/chat/stream sem o workflow (e sem LLM).
+
+Responde a qualquer POST com uma resposta fixa (ou o eco da mensagem, com
+--eco), quebrada em palavras, uma a cada --atraso segundos, com
+Transfer-Encoding: chunked. Formatos (--formato):
+
+    n8n     JSON por linha, como o webhook do n8n em modo streaming
+            ({"type": "begin"} / {"type": "item", "content": ...} / {"type": "end"})
+    sse     text/event-stream ("data: {...}" e "data: [DONE]")
+    texto   text/plain, só o texto
+    json    modo antigo: espera o tempo todo e manda {"output": ...} de uma vez
+    erro    começa o stream e manda {"type": "error"} no meio
+
+Uso (na pasta cap-price-app):
+    python benchmarks/stub_chat_stream.py --porta 5680 --formato n8n --atraso 0.05
+    N8N_CHAT_WEBHOOK_URL=http://127.0.0.1:5680/webhook/capchat flask --app run run
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPOSTA_PADRAO = (
+    "Para CAP 50/70 em Campinas/SP, a REPLAN em Paulínia segue como a origem "
+    "mais barata: o frete curto compensa o preço NET um pouco maior que o da "
+    "REVAP. Com margem de 10%, o preço final fica perto de R$ 3.900/t."
+)
+FORMATOS = ("n8n", "sse", "texto", "json", "erro")
+
+
+def _pedacos(texto):
+    palavras = texto.split(" ")
+    return [p + (" " if i < len(palavras) - 1 else "") for i, p in enumerate(palavras)]
+
+
+class StubChat(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    formato = "n8n"
+    atraso = 0.05
+    eco = False
+    resposta = RESPOSTA_PADRAO
+
+    def _chunk(self, dados: bytes):
+        self.wfile.write(f"{len(dados):x}\r\n".encode("ascii") + dados + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        texto = f"Você disse: {corpo.get('message', '')}" if self.eco else self.resposta
+        pedacos = _pedacos(texto)
+
+        if self.formato == "json":
+            time.sleep(self.atraso * len(pedacos))
+            dados = json.dumps({"output": texto}, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+            return
+
+        tipo = {
+            "sse": "text/event-stream; charset=utf-8",
+            "texto": "text/plain; charset=utf-8",
+        }.get(self.formato, "application/json; charset=utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            if self.formato in ("n8n", "erro"):
+                self._chunk(b'{"type":"begin","metadata":{"nodeName":"AI Agent"}}\n')
+            for i, pedaco in enumerate(pedacos):
+                time.sleep(self.atraso)
+                if self.formato == "erro" and i == len(pedacos) // 2:
+                    self._chunk(b'{"type":"error","content":"falha no agente"}\n')
+                    break
+                if self.formato == "sse":
+                    item = json.dumps({"content": pedaco}, ensure_ascii=False)
+                    self._chunk(f"data: {item}\n\n".encode("utf-8"))
+                elif self.formato == "texto":
+                    self._chunk(pedaco.encode("utf-8"))
+                else:
+                    item = json.dumps({"type": "item", "content": pedaco}, ensure_ascii=False)
+                    self._chunk((item + "\n").encode("utf-8"))
+            if self.formato == "n8n":
+                self._chunk(b'{"type":"end"}\n')
+            elif self.formato == "sse":
+                self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # o app fechou a conexão (cliente desistiu): normal num stream
+            self.close_connection = True
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    # centenas de conversas abrindo ao mesmo tempo (verificar_chat_stream.py)
+    request_queue_size = 512
+
+
+def iniciar(formato="n8n", atraso=0.05, porta=0, eco=False):
+    """Sobe o stub numa thread; devolve o servidor (server_address[1] = porta)."""
+    handler = type("StubChatConfigurado", (StubChat,), {
+        "formato": formato, "atraso": atraso, "eco": eco,
+    })
+    servidor = _Servidor(("127.0.0.1", porta), handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=5680)
+    parser.add_argument("--formato", choices=FORMATOS, default="n8n")
+    parser.add_argument("--atraso", type=float, default=0.05)
+    parser.add_argument("--eco", action="store_true")
+    args = parser.parse_args()
+
+    servidor = iniciar(args.formato, args.atraso, args.porta, args.eco)
+    print(f"Stub de chat ({args.formato}) em http://127.0.0.1:{servidor.server_address[1]}/webhook/capchat")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# benchmarks/verificar_admissao.py
+"""
+Verifica o controle de admissão (app/services/admission.py) com o chat,
+contra o stub de streaming (stub_chat_stream.py), sem n8n.
+
+Cenários:
+    1. um usuário dispara --rajada chats de uma vez: só ADMISSAO_CHAT_POR_USUARIO
+       executam, outros tantos esperam e o resto sai com 429 limite_usuario;
+    2. --usuarios usuários ao mesmo tempo: ADMISSAO_CHAT_GLOBAL executam,
+       ADMISSAO_CHAT_FILA esperam, o resto sai com 429 fila_cheia na hora
+       (bem antes de uma resposta do stub) e com Retry-After;
+    3. o SSE (/api/chat/stream, classe chat_stream) segura a vaga até o
+       stream fechar e a devolve mesmo quando o cliente desiste no meio;
+    4. a espera dos jobs (classe jobs_espera): SSE e long-poll ?wait= contam
+       por usuário e no total, acima disso 429 com Retry-After; a consulta
+       sem ?wait= não passa pela admissão.
+
+Mostra as métricas de GET /api/admissao/metricas no fim. Sai com código 1
+na primeira divergência.
+
+Uso (na pasta cap-price-app):
+    python benchmarks/verificar_admissao.py
+    python benchmarks/verificar_admissao.py --usuarios 30 --atraso 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, ".."))
+sys.path.insert(0, AQUI)
+
+import stub_chat_stream  # noqa: E402
+
+
+def _cliente(app, usuario):
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s["user"] = {"user_id": usuario, "roles": [], "email": f"{usuario}@local"}
+    return cliente
+
+
+def _chat(app, usuario):
+    inicio = time.perf_counter()
+    resp = _cliente(app, usuario).post("/api/chat", json={"message": "oi"})
+    return resp.status_code, resp.headers.get("Retry-After"), time.perf_counter() - inicio
+
+
+def _rajada(app, usuarios):
+    barreira = threading.Barrier(len(usuarios))
+
+    def um(usuario):
+        barreira.wait()
+        return _chat(app, usuario)
+
+    with ThreadPoolExecutor(max_workers=len(usuarios)) as pool:
+        return list(pool.map(um, usuarios))
+
+
+def _em_execucao(app, classe):
+    resp = _cliente(app, "metricas").get("/api/admissao/metricas")
+    return resp.get_json()[classe]["em_execucao"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atraso", type=float, default=0.02)
+    parser.add_argument("--usuarios", type=int, default=12)
+    parser.add_argument("--rajada", type=int, default=4)
+    args = parser.parse_args()
+
+    stub = stub_chat_stream.iniciar("json", args.atraso)
+    handler = stub.RequestHandlerClass
+    os.environ.update({
+        "N8N_CHAT_WEBHOOK_URL": f"http://127.0.0.1:{stub.server_address[1]}/webhook/capchat",
+        "DATABASE_URL": "",
+        "LOG_NIVEL": "error",
+        "ADMISSAO_CHAT_GLOBAL": "2",
+        "ADMISSAO_CHAT_POR_USUARIO": "1",
+        "ADMISSAO_CHAT_FILA": "1",
+        # a fila espera mais que uma resposta do stub: quem entra nela é atendido
+        "ADMISSAO_ESPERA_S": "10",
+    })
+    from app import create_app
+
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        app = create_app()
+    finally:
+        sys.stdout = stdout
+    resposta_s = args.atraso * len(stub_chat_stream._pedacos(stub_chat_stream.RESPOSTA_PADRAO))
+    falhas = []
+
+    # 1. um usuário só
+    resultados = _rajada(app, ["ana"] * args.rajada)
+    status = sorted(r[0] for r in resultados)
+    print(f"1 usuário, {args.rajada} chats: status {status}")
+    if status.count(200) != 2 or status.count(429) != args.rajada - 2:
+        falhas.append(f"rajada de um usuário: esperava 2x200 (1 executando + 1 na fila), veio {status}")
+
+    # 2. vários usuários
+    resultados = _rajada(app, [f"u{i}" for i in range(args.usuarios)])
+    ok = [r for r in resultados if r[0] == 200]
+    recusados = [r for r in resultados if r[0] == 429]
+    pior_429 = max((r[2] for r in recusados), default=0.0)
+    print(f"{args.usuarios} usuários: {len(ok)}x200, {len(recusados)}x429 "
+          f"(429 mais lento {pior_429 * 1000:.0f} ms; uma resposta do stub {resposta_s * 1000:.0f} ms)")
+    if len(ok) != 3 or len(recusados) != args.usuarios - 3:
+        falhas.append(f"vários usuários: esperava 3x200 (2 + 1 na fila), veio {len(ok)}x200")
+    if any(not r[1] for r in recusados):
+        falhas.append("429 sem Retry-After")
+    if pior_429 > resposta_s / 2:
+        falhas.append(f"429 demorou {pior_429:.3f}s (devia recusar na hora)")
+
+    # 3. SSE segura a vaga até fechar
+    handler.formato = "n8n"
+    resp = _cliente(app, "bia").post("/api/chat/stream", json={"message": "oi"}, buffered=False)
+    next(iter(resp.response))
+    durante = _em_execucao(app, "chat_stream")
+    resp.close()
+    depois = _em_execucao(app, "chat_stream")
+    print(f"SSE: em execução durante o stream {durante}, depois de fechar {depois}")
+    if durante != 1 or depois != 0:
+        falhas.append(f"SSE: vaga durante/depois = {durante}/{depois}, esperava 1/0")
+
+    # 4. espera dos jobs: um job parado por usuário
+    from app.services import job_store
+    liberar = threading.Event()
+
+    def _parado():
+        liberar.wait(30)
+        return [], 200
+
+    limite = app.config["ADMISSAO_JOBS_ESPERA_GLOBAL"]
+    por_usuario = app.config["ADMISSAO_JOBS_ESPERA_POR_USUARIO"]
+    jobs = {u: job_store.store().criar(u, _parado).id for u in [f"j{i}" for i in range(limite + 1)]}
+    abertos = []
+
+    def _sse(usuario):
+        resp = _cliente(app, usuario).get(f"/api/simular/jobs/{jobs[usuario]}/stream", buffered=False)
+        if resp.status_code == 200:
+            abertos.append(resp)
+        return resp.status_code, resp.headers.get("Retry-After")
+
+    do_mesmo = [_sse("j0")[0] for _ in range(por_usuario + 1)]
+    consulta = _cliente(app, "j0").get(f"/api/simular/jobs/{jobs['j0']}").status_code
+    inicio = time.perf_counter()
+    long_poll = _cliente(app, "j0").get(f"/api/simular/jobs/{jobs['j0']}?wait=20")
+    long_poll_s = time.perf_counter() - inicio
+    outros = [_sse(f"j{i}") for i in range(1, limite + 1)]
+    print(f"jobs: {por_usuario + 1} SSE do mesmo usuário {do_mesmo}; sem wait {consulta}; "
+          f"long-poll {long_poll.status_code} em {long_poll_s * 1000:.0f} ms; "
+          f"mais {limite} usuários: {sorted(o[0] for o in outros)}")
+    if do_mesmo != [200] * por_usuario + [429]:
+        falhas.append(f"jobs_espera por usuário: {do_mesmo}")
+    if consulta != 200:
+        falhas.append(f"consulta do job sem wait: {consulta}")
+    if long_poll.status_code != 429 or not long_poll.headers.get("Retry-After") or long_poll_s > 1:
+        falhas.append(f"long-poll acima do limite: {long_poll.status_code} em {long_poll_s:.2f}s")
+    esperados = limite - por_usuario
+    if sorted(o[0] for o in outros) != [200] * esperados + [429] * (limite - esperados):
+        falhas.append(f"jobs_espera global: {outros}")
+    if any(o[0] == 429 and not o[1] for o in outros):
+        falhas.append("jobs_espera: 429 sem Retry-After")
+    # streams abertos na mesma thread: fecham na ordem inversa (pilha de contextos do Flask)
+    for resp in reversed(abertos):
+        resp.close()
+    liberar.set()
+    if _em_execucao(app, "jobs_espera") != 0:
+        falhas.append("jobs_espera: vagas não devolvidas ao fechar os streams")
+
+    metricas = _cliente(app, "metricas").get("/api/admissao/metricas").get_json()
+    print("\n" + json.dumps(metricas["chat"], indent=2, ensure_ascii=False))
+    stub.shutdown()
+    if falhas:
+        print("\nFALHOU:\n  " + "\n  ".join(falhas))
+        sys.exit(1)
+    print("\nOK: limites por usuário e global, fila e 429 com Retry-After.")
+
+
+if __name__ == "__main__":
+    main()
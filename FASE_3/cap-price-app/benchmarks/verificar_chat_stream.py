@@ -0,0 +1,238 @@
+# benchmarks/verificar_chat_stream.py
+"""
+Verifica o chat em streaming contra o stub (stub_chat_stream.py): o relay em
+aiohttp (services/chat_relay.py, o que atende no Docker) e a rota Flask
+/api/chat/stream (python run.py), em todos os formatos do upstream.
+
+Sobe o app Flask num servidor WSGI local (no papel do gunicorn) e o relay
+num event loop numa thread só, na frente dele, como no Dockerfile.
+
+Para cada formato confere que os deltas concatenados são a resposta do stub,
+que o evento "fim" traz o mesmo texto e que o primeiro delta chega bem antes
+do fim (exceto no modo antigo, JSON único). O formato "erro" tem que terminar
+com o evento "erro".
+
+Depois, no relay:
+    - --concorrentes streams de usuários diferentes ao mesmo tempo (padrão
+      200, com CHAT_RELAY_MAX_STREAMS no mesmo valor) e mais --excedentes:
+      todos os admitidos terminam com "fim" num tempo perto do de um stream
+      só, no mesmo event loop, e os excedentes saem na hora com 429 e
+      Retry-After;
+    - um usuário acima de ADMISSAO_CHAT_STREAM_POR_USUARIO recebe 429;
+    - sem sessão, 401;
+    - as demais rotas passam pelo proxy até o app (com e sem sessão).
+Sai com código 1 na primeira divergência.
+
+Uso (na pasta cap-price-app):
+    python benchmarks/verificar_chat_stream.py
+    python benchmarks/verificar_chat_stream.py --atraso 0.02 --concorrentes 500
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, ".."))
+sys.path.insert(0, AQUI)
+
+import stub_chat_stream  # noqa: E402
+
+
+def _eventos(blocos, inicio):
+    """(nome, dados, segundos desde o POST) de cada evento SSE, na ordem."""
+    buffer = ""
+    for bloco in blocos:
+        buffer += bloco.decode("utf-8") if isinstance(bloco, bytes) else bloco
+        while "\n\n" in buffer:
+            bruto, buffer = buffer.split("\n\n", 1)
+            campos = dict(linha.split(": ", 1) for linha in bruto.split("\n") if ": " in linha)
+            if "event" in campos:
+                yield campos["event"], json.loads(campos["data"]), time.perf_counter() - inicio
+
+
+class Relay:
+    """Relay aiohttp num event loop próprio (uma thread), na frente do app."""
+
+    def __init__(self, config, upstream):
+        from aiohttp import web
+        from app.services import chat_relay
+
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(chat_relay.criar_app(config, upstream))
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0, backlog=1024)
+        self.loop.run_until_complete(site.start())
+        self.url = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def parar(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def _cookie(app, usuario):
+    dados = {"user": {"user_id": usuario, "roles": [], "email": f"{usuario}@local"}}
+    return {app.config["SESSION_COOKIE_NAME"]: app.session_interface.get_signing_serializer(app).dumps(dados)}
+
+
+def _conversar_relay(relay, app, usuario="verificacao", mensagem="Qual a melhor origem?"):
+    """(status, eventos, segundos, Retry-After)."""
+    cookies = _cookie(app, usuario) if usuario else {}
+    inicio = time.perf_counter()
+    with requests.post(f"{relay.url}/api/chat/stream", json={"message": mensagem}, cookies=cookies,
+                       stream=True, timeout=60) as resp:
+        if resp.status_code != 200:
+            return resp.status_code, [], time.perf_counter() - inicio, resp.headers.get("Retry-After")
+        eventos = list(_eventos(resp.iter_content(chunk_size=None), inicio))
+    return resp.status_code, eventos, time.perf_counter() - inicio, None
+
+
+def _conversar_flask(app, usuario="verificacao", mensagem="Qual a melhor origem?"):
+    cliente = app.test_client()
+    with cliente.session_transaction() as s:
+        s["user"] = {"user_id": usuario, "roles": [], "email": f"{usuario}@local"}
+    inicio = time.perf_counter()
+    resp = cliente.post("/api/chat/stream", json={"message": mensagem}, buffered=False)
+    if resp.status_code != 200:
+        return resp.status_code, [], time.perf_counter() - inicio, resp.headers.get("Retry-After")
+    eventos = list(_eventos(resp.response, inicio))
+    resp.close()
+    return resp.status_code, eventos, time.perf_counter() - inicio, None
+
+
+def _simultaneos(total, conversar):
+    barreira = threading.Barrier(total)
+
+    def _um(i):
+        barreira.wait()
+        return conversar(i)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=total) as pool:
+        resultados = list(pool.map(_um, range(total)))
+    return resultados, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atraso", type=float, default=0.03)
+    parser.add_argument("--concorrentes", type=int, default=200,
+                        help="streams abertos ao mesmo tempo no relay (CHAT_RELAY_MAX_STREAMS)")
+    parser.add_argument("--excedentes", type=int, default=2)
+    args = parser.parse_args()
+
+    stub = stub_chat_stream.iniciar("n8n", args.atraso)
+    handler = stub.RequestHandlerClass
+    os.environ.update({
+        "N8N_CHAT_WEBHOOK_URL": f"http://127.0.0.1:{stub.server_address[1]}/webhook/capchat",
+        "DATABASE_URL": "",
+        "LOG_NIVEL": "error",
+        "CHAT_RELAY_MAX_STREAMS": str(args.concorrentes),
+    })
+    from werkzeug.serving import make_server
+
+    from app import create_app
+
+    # o log estruturado escreve no stdout do create_app; os erros esperados
+    # (formato "erro") não precisam poluir a saída
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        app = create_app()
+    finally:
+        sys.stdout = stdout
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    wsgi = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=wsgi.serve_forever, daemon=True).start()
+    relay = Relay(app.config, f"http://127.0.0.1:{wsgi.server_port}")
+
+    esperado = stub_chat_stream.RESPOSTA_PADRAO
+    por_usuario = app.config["ADMISSAO_CHAT_STREAM_POR_USUARIO"]
+    falhas = []
+
+    print(f"{'via':<6} {'formato':<8} {'status':>6} {'deltas':>7} {'1º delta s':>11} {'total s':>8}")
+    for via, conversar in (("relay", lambda: _conversar_relay(relay, app)), ("flask", lambda: _conversar_flask(app))):
+        for formato in stub_chat_stream.FORMATOS:
+            handler.formato = formato
+            status, eventos, total, _ = conversar()
+            deltas = [e for e in eventos if e[0] == "delta"]
+            texto = "".join(d[1]["texto"] for d in deltas)
+            primeiro = deltas[0][2] if deltas else float("nan")
+            print(f"{via:<6} {formato:<8} {status:>6} {len(deltas):>7} {primeiro:>11.3f} {total:>8.3f}")
+
+            if status != 200 or not eventos:
+                falhas.append(f"{via}/{formato}: status {status}, sem eventos")
+            elif formato == "erro":
+                if eventos[-1][0] != "erro" or not esperado.startswith(texto):
+                    falhas.append(f"{via}/{formato}: esperava deltas parciais + evento erro, veio {eventos[-1]}")
+            else:
+                if texto != esperado or eventos[-1][0] != "fim" or eventos[-1][1]["reply"] != esperado:
+                    falhas.append(f"{via}/{formato}: texto diferente do stub ({texto[:60]!r}...)")
+                if formato != "json" and primeiro > total / 4:
+                    falhas.append(f"{via}/{formato}: primeiro delta em {primeiro:.3f}s de {total:.3f}s "
+                                  "(não fez streaming)")
+
+    handler.formato = "n8n"
+    _, _, um, _ = _conversar_relay(relay, app)
+    total = args.concorrentes + args.excedentes
+    resultados, juntos = _simultaneos(total, lambda i: _conversar_relay(relay, app, usuario=f"verificacao{i}"))
+    admitidos = [r for r in resultados if r[0] == 200]
+    recusados = [r for r in resultados if r[0] == 429]
+    pior_429 = max((r[2] for r in recusados), default=0.0)
+    print(f"\nrelay, 1 stream: {um:.2f}s; {total} ao mesmo tempo (limite {args.concorrentes}, uma thread): "
+          f"{len(admitidos)}x200 em {juntos:.2f}s, {len(recusados)}x429 (mais lento {pior_429 * 1000:.0f} ms)")
+    if len(admitidos) != args.concorrentes or len(recusados) != args.excedentes:
+        falhas.append(f"streams concorrentes: esperava {args.concorrentes}x200 e {args.excedentes}x429, "
+                      f"veio {sorted(set(r[0] for r in resultados))}")
+    if any(not r[1] or r[1][-1][0] != "fim" for r in admitidos):
+        falhas.append("streams concorrentes: algum admitido não terminou com 'fim'")
+    if any(not r[3] for r in recusados):
+        falhas.append("429 sem Retry-After")
+    # os clientes, o stub e o relay dividem o mesmo processo (e a CPU): "na hora"
+    # aqui é antes de um stream terminar, ou seja, sem esperar vaga
+    if pior_429 > um:
+        falhas.append(f"429 demorou {pior_429:.3f}s (devia recusar sem esperar vaga)")
+    if juntos > um * 3:
+        falhas.append(f"streams concorrentes levaram {juntos:.2f}s (um só: {um:.2f}s)")
+
+    resultados, _ = _simultaneos(por_usuario + 1, lambda i: _conversar_relay(relay, app, usuario="repetido"))
+    status = sorted(r[0] for r in resultados)
+    print(f"relay, {por_usuario + 1} streams do mesmo usuário (limite {por_usuario}): {status}")
+    if status != [200] * por_usuario + [429]:
+        falhas.append(f"limite por usuário: esperava {por_usuario}x200 e 1x429, veio {status}")
+
+    status, _, _, _ = _conversar_relay(relay, app, usuario=None)
+    if status != 401:
+        falhas.append(f"relay sem sessão: esperava 401, veio {status}")
+
+    metricas = requests.get(f"{relay.url}/api/admissao/metricas", cookies=_cookie(app, "verificacao"), timeout=10)
+    sem_sessao = requests.get(f"{relay.url}/api/admissao/metricas", timeout=10)
+    do_relay = requests.get(f"{relay.url}/api/chat/relay/metricas", cookies=_cookie(app, "verificacao"),
+                            timeout=10).json()
+    print(f"proxy: /api/admissao/metricas {metricas.status_code} (sem sessão {sem_sessao.status_code}); "
+          f"relay: pico {do_relay['pico']}, recusados {do_relay['recusados']}")
+    if metricas.status_code != 200 or "chat_stream" not in metricas.json():
+        falhas.append(f"proxy: /api/admissao/metricas veio {metricas.status_code}")
+    if sem_sessao.status_code != 401:
+        falhas.append(f"proxy sem sessão: esperava 401, veio {sem_sessao.status_code}")
+    if do_relay["abertos"] != 0 or do_relay["pico"] != args.concorrentes:
+        falhas.append(f"métricas do relay: {do_relay}")
+
+    relay.parar()
+    wsgi.shutdown()
+    stub.shutdown()
+    if falhas:
+        print("\nFALHOU:\n  " + "\n  ".join(falhas))
+        sys.exit(1)
+    print("\nOK: streaming em todos os formatos, relay sem thread por stream.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+-- ============================================================================
+-- CAP PRICE - Triggers de NOTIFY para invalidar caches em memória da app
+-- Database: capssys_bd (schema public)
+--
+-- A app escuta os canais com LISTEN (app/services/db_listener.py).
+-- Os triggers são por statement: uma carga em lote gera um único NOTIFY.
+-- ============================================================================
+
+BEGIN;
+
+-- ----------------------------------------------------------------------------
+-- Canal cap_impostos: icms_interestadual, icms_interno_uf, impostos_federais_venda
+-- ----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION public.fn_notify_cap_impostos()
+RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('cap_impostos', TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notify_icms_interestadual ON public.icms_interestadual;
+CREATE TRIGGER trg_notify_icms_interestadual
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.icms_interestadual
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_notify_cap_impostos();
+
+DROP TRIGGER IF EXISTS trg_notify_icms_interno_uf ON public.icms_interno_uf;
+CREATE TRIGGER trg_notify_icms_interno_uf
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.icms_interno_uf
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_notify_cap_impostos();
+
+DROP TRIGGER IF EXISTS trg_notify_impostos_federais_venda ON public.impostos_federais_venda;
+CREATE TRIGGER trg_notify_impostos_federais_venda
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.impostos_federais_venda
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_notify_cap_impostos();
+
+COMMIT;
+
+
+-- ----------------------------------------------------------------------------
+-- Canal cap_precos: cap_precos_refinarias (somente linhas com preco_atual = 'S')
+-- Invalida o cache de resultados de simulação. Payload = produto_id.
+-- ----------------------------------------------------------------------------
+BEGIN;
+
+CREATE OR REPLACE FUNCTION public.fn_notify_cap_precos()
+RETURNS trigger AS $$
+BEGIN
+  IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.preco_atual = 'S' THEN
+    PERFORM pg_notify('cap_precos', NEW.produto_id::text);
+  END IF;
+  IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.preco_atual = 'S' THEN
+    PERFORM pg_notify('cap_precos', OLD.produto_id::text);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notify_cap_precos_refinarias ON public.cap_precos_refinarias;
+CREATE TRIGGER trg_notify_cap_precos_refinarias
+AFTER INSERT OR UPDATE OR DELETE ON public.cap_precos_refinarias
+FOR EACH ROW EXECUTE FUNCTION public.fn_notify_cap_precos();
+
+COMMIT;
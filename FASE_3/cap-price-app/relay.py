@@ -0,0 +1,33 @@
+"""
+Processo da frente no Docker: relay do chat em streaming (aiohttp) e proxy
+das demais rotas para o gunicorn. Ver app/services/chat_relay.py.
+
+    python relay.py --port 5000 --upstream unix:/tmp/capprice.sock
+"""
+import argparse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from aiohttp import web  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from app.config import Config  # noqa: E402
+from app.services import chat_relay, structured_log  # noqa: E402
+
+
+if __name__ == "__main__":
+    # só config e log: o relay não abre banco nem carrega os caches do app
+    flask_app = Flask("relay")
+    flask_app.config.from_object(Config)
+    structured_log.init_app(flask_app, "cap-price-app")
+
+    parser = argparse.ArgumentParser(description="Relay do chat em streaming + proxy para o gunicorn")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--upstream", default=flask_app.config["CHAT_RELAY_UPSTREAM"],
+                        help='gunicorn: "unix:/caminho.sock" ou "http://host:porta"')
+    args = parser.parse_args()
+
+    web.run_app(chat_relay.criar_app(flask_app.config, args.upstream), host=args.host, port=args.port,
+                access_log=None)
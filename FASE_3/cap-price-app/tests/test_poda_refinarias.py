@@ -0,0 +1,156 @@
+# tests/test_poda_refinarias.py
+"""
+A poda espacial das refinarias (pricing_engine.refinarias_candidatas) tem de
+devolver exatamente os mesmos cenários da avaliação exaustiva.
+
+Gera refinarias/terminais aleatórios no território, preços NET com dispersão,
+alíquotas de ICMS aleatórias por par de UF e payloads variados (margem, custo
+fixo, override de preço, refinarias permitidas). Para cada payload compara
+calcular_cenarios sobre todas as refinarias com calcular_cenarios só sobre as
+candidatas, e cada tamanho tem de podar de fato (menos candidatas que
+refinarias) em parte dos casos.
+
+Em produção a poda está desligada por padrão: REFINARIAS_PODA_MIN=1500 fica
+acima de qualquer quantidade real de origens. Aqui o mínimo é passado como 0
+para exercitar o caminho podado em todos os tamanhos.
+
+Uso (na pasta cap-price-app):
+    python -m pytest tests/test_poda_refinarias.py -q
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import Config  # noqa: E402
+from app.services.pricing_engine import (  # noqa: E402
+    DestinoFrete,
+    PricingError,
+    calcular_cenarios,
+    normalizar_entrada,
+    refinarias_candidatas,
+)
+from app.services.tax_cache import UFS, TabelasTributarias  # noqa: E402
+
+K_VIZINHAS = 8
+
+
+@pytest.fixture(autouse=True)
+def contexto_app():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    with app.app_context():
+        yield
+
+
+def refinarias_aleatorias(rng, n_refinarias):
+    refinarias = []
+    for i in range(n_refinarias):
+        sem_coord = rng.random() < 0.03
+        refinarias.append({
+            "codigo": f"R{i:05d}",
+            "nome": f"Refinaria {i}",
+            "cidade": f"Cidade {i}",
+            "estado": UFS[rng.integers(len(UFS))],
+            "lat": None if sem_coord else float(rng.uniform(-33.7, 5.2)),
+            "lon": None if sem_coord else float(rng.uniform(-73.9, -34.8)),
+        })
+    return refinarias
+
+
+def precos_aleatorios(rng, refinarias):
+    base = rng.uniform(2500, 4000)
+    dispersao = float(rng.choice([0.01, 0.05, 0.2]))
+    return {
+        r["codigo"]: float(base * (1 + rng.uniform(-dispersao, dispersao)))
+        for r in refinarias if rng.random() > 0.1
+    }
+
+
+def payload_aleatorio(rng, refinarias):
+    payload = {
+        "produto": "CAP 50/70",
+        "destino_cidade": "Destino",
+        "destino_uf": UFS[rng.integers(len(UFS))],
+        "quantidade": float(rng.integers(1, 60)),
+        "margem": float(rng.choice([0, 2.5, 5, 10, 30])),
+        "custo_fixo": float(rng.choice([0, 50, 300])),
+    }
+    sorteio = rng.random()
+    if sorteio < 0.15:
+        payload["refinaria"] = refinarias[rng.integers(len(refinarias))]["codigo"]
+        payload["preco_net"] = float(rng.uniform(1500, 4000))
+    elif sorteio < 0.30:
+        qtd = int(rng.integers(1, min(40, len(refinarias)) + 1))
+        payload["refinarias_permitidas"] = [
+            refinarias[i]["codigo"] for i in rng.choice(len(refinarias), qtd, replace=False)
+        ]
+    return payload
+
+
+def destino_aleatorio(rng):
+    return float(rng.uniform(-33.7, 5.2)), float(rng.uniform(-73.9, -34.8))
+
+
+def impostos_aleatorios(rng):
+    icms_inter = rng.choice([4.0, 7.0, 12.0], size=(len(UFS), len(UFS)))
+    icms_interno = rng.choice([17.0, 18.0, 19.0, 20.0, 22.0], size=len(UFS))
+    return TabelasTributarias(icms_inter, icms_interno, 1.65, 7.6, 1)
+
+
+def _cenarios(entrada, refinarias, fretes, precos, impostos):
+    try:
+        return calcular_cenarios(entrada, refinarias, *fretes, precos, impostos)
+    except PricingError as e:
+        return str(e)
+
+
+# com 10 origens, k=8 quase não deixa o que podar: k menor para a poda rodar
+@pytest.mark.parametrize("n_refinarias, casos, k_vizinhas", [
+    (10, 40, 3), (100, 80, K_VIZINHAS), (1000, 80, K_VIZINHAS), (3000, 30, K_VIZINHAS),
+])
+def test_poda_igual_a_avaliacao_exaustiva(n_refinarias, casos, k_vizinhas):
+    rng = np.random.default_rng(n_refinarias)
+    impostos = impostos_aleatorios(rng)
+    refinarias = refinarias_aleatorias(rng, n_refinarias)
+
+    podados = 0
+    for caso in range(casos):
+        precos = precos_aleatorios(rng, refinarias)
+        entrada = normalizar_entrada(payload_aleatorio(rng, refinarias))
+        destino = DestinoFrete(refinarias, *destino_aleatorio(rng))
+
+        exaustivo = _cenarios(entrada, refinarias, destino.fretes(), precos, impostos)
+        candidatas = refinarias_candidatas(
+            entrada, destino, precos, impostos, k_vizinhas, minimo_refinarias=0
+        )
+        if candidatas is None:
+            continue
+        if len(candidatas) < n_refinarias:
+            podados += 1
+        podado = _cenarios(
+            entrada, [refinarias[i] for i in candidatas], destino.fretes(candidatas), precos, impostos
+        )
+        assert podado == exaustivo, f"caso {caso}, entrada {entrada}"
+
+    # o teste só vale se o caminho podado rodou de verdade
+    assert podados >= casos // 2, f"só {podados} de {casos} casos podaram"
+
+
+def test_poda_desligada_abaixo_do_minimo():
+    rng = np.random.default_rng(7)
+    refinarias = refinarias_aleatorias(rng, 200)
+    precos = precos_aleatorios(rng, refinarias)
+    entrada = normalizar_entrada(payload_aleatorio(rng, refinarias))
+    destino = DestinoFrete(refinarias, -23.5, -46.6)
+    impostos = impostos_aleatorios(rng)
+
+    assert refinarias_candidatas(entrada, destino, precos, impostos, K_VIZINHAS, 201) is None
+    assert refinarias_candidatas(entrada, destino, precos, impostos, 0) is None
+    # padrão de produção: desligada para qualquer quantidade realista de origens
+    assert refinarias_candidatas(entrada, destino, precos, impostos, K_VIZINHAS,
+                                 Config.REFINARIAS_PODA_MIN) is None